@@ -0,0 +1,279 @@
+# apod_analytics.py
+
+# Columnar analytics over APOD records.
+# The records are turned into a few NumPy arrays in one pass, and every
+# statistic is then computed with vectorised operations on those arrays.
+
+import argparse
+import json
+
+import numpy as np
+
+from apod_store import iter_records
+
+# Media types are stored as small integer codes; anything unknown becomes 'other'
+MEDIA_TYPES = ('image', 'video', 'other')
+MEDIA_CODES = {'image': 0, 'video': 1}
+
+
+class ApodColumns:
+    """
+    The columns of an APOD archive that the analytics need. Explanations are
+    reduced to their lengths, so the columns stay small however long the text is.
+
+    Parameters:
+    - dates (ndarray): datetime64[D] array of record dates (NaT where missing).
+    - media (ndarray): int8 array of media type codes (indexes into MEDIA_TYPES).
+    - explanation_lengths (ndarray): int32 array of explanation lengths in characters.
+    """
+
+    def __init__(self, dates, media, explanation_lengths):
+        self.dates = dates
+        self.media = media
+        self.explanation_lengths = explanation_lengths
+
+    def __len__(self):
+        return len(self.dates)
+
+
+def build_apod_columns(records):
+    """
+    Builds the analytics columns from APOD records in a single pass.
+
+    Parameters:
+    - records (iterable): APOD records, e.g. an ApodDataset or a stream from iter_records.
+
+    Returns:
+    - ApodColumns: The columns, in record order.
+
+    Raises:
+    - ValueError: If a record's date is not a valid 'YYYY-MM-DD' date; the message
+      names the record. A missing date becomes NaT.
+    """
+    dates = []
+    media = []
+    lengths = []
+    other = len(MEDIA_TYPES) - 1
+    for entry in records:
+        dates.append(entry.get('date'))
+        media.append(MEDIA_CODES.get(entry.get('media_type'), other))
+        lengths.append(len(entry.get('explanation') or ''))
+    try:
+        date_column = np.array(dates, dtype='datetime64[D]')
+    except ValueError:
+        # Convert one at a time to find the record to blame
+        for number, date in enumerate(dates):
+            try:
+                np.datetime64(date, 'D')
+            except ValueError:
+                raise ValueError(f"record {number + 1} has an invalid date {date!r}") from None
+        raise
+    return ApodColumns(
+        date_column,
+        np.array(media, dtype=np.int8),
+        np.array(lengths, dtype=np.int32),
+    )
+
+
+def _period_counts(periods, media):
+    """
+    Counts each media type per period (month or year).
+
+    Parameters:
+    - periods (ndarray): datetime64 array of the period each record falls in, without NaT.
+    - media (ndarray): Media type codes matching `periods`.
+
+    Returns:
+    - dict: {period label: {media type: count}} in period order.
+    """
+    unique_periods, inverse = np.unique(periods, return_inverse=True)
+    width = len(MEDIA_TYPES)
+    counts = np.bincount(inverse * width + media, minlength=len(unique_periods) * width)
+    counts = counts.reshape(len(unique_periods), width)
+    return {
+        str(period): dict(zip(MEDIA_TYPES, row.tolist()))
+        for period, row in zip(unique_periods, counts)
+    }
+
+
+def _rolling_series(dates, media, lengths, window):
+    """
+    Computes rolling statistics over a daily calendar, so that days with no record
+    count as empty days rather than being skipped.
+
+    Parameters:
+    - dates (ndarray): datetime64[D] array of record dates, without NaT.
+    - media (ndarray): Media type codes matching `dates`.
+    - lengths (ndarray): Explanation lengths matching `dates`.
+    - window (int): Window size in days.
+
+    Returns:
+    - dict: Lists of 'date', 'records', 'video_share' and 'mean_explanation_length',
+      one entry per calendar day from the first date with a full window onwards.
+    """
+    first = dates.min()
+    day_index = (dates - first).astype(np.int64)
+    span = int(day_index.max()) + 1
+
+    # Per-day totals, then window sums as differences of cumulative sums
+    daily_records = np.bincount(day_index, minlength=span)
+    daily_videos = np.bincount(day_index, weights=(media == MEDIA_CODES['video']), minlength=span)
+    daily_lengths = np.bincount(day_index, weights=lengths, minlength=span)
+
+    def window_sums(values):
+        cumulative = np.concatenate(([0], np.cumsum(values)))
+        return cumulative[window:] - cumulative[:-window]
+
+    if span < window:
+        return {'date': [], 'records': [], 'video_share': [], 'mean_explanation_length': []}
+    records = window_sums(daily_records)
+    videos = window_sums(daily_videos)
+    total_lengths = window_sums(daily_lengths)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        video_share = np.where(records > 0, videos / records, 0.0)
+        mean_length = np.where(records > 0, total_lengths / records, 0.0)
+
+    window_ends = first + np.arange(window - 1, span)
+    return {
+        'date': window_ends.astype(str).tolist(),
+        'records': records.astype(int).tolist(),
+        'video_share': np.round(video_share, 4).tolist(),
+        'mean_explanation_length': np.round(mean_length, 1).tolist(),
+    }
+
+
+def compute_media_analytics(columns, top_k=5, percentiles=(25, 50, 75, 90, 99), window=30):
+    """
+    Computes media counts, explanation length statistics and rolling windows.
+
+    Parameters:
+    - columns (ApodColumns): Columns built by build_apod_columns.
+    - top_k (int): Number of longest explanations to report (negative counts as 0).
+    - percentiles (tuple): Explanation length percentiles to report.
+    - window (int): Rolling window size in days.
+
+    Returns:
+    - dict: JSON-serialisable results with 'totals', 'by_year', 'by_month',
+      'explanation_length', 'top_longest' and 'rolling' sections.
+    """
+    media = columns.media
+    lengths = columns.explanation_lengths
+    totals = dict(zip(MEDIA_TYPES, np.bincount(media, minlength=len(MEDIA_TYPES)).tolist()))
+    totals['records'] = len(columns)
+    results = {'totals': totals}
+    if not len(columns):
+        return results
+
+    # Longest explanations; argmax keeps the first record on ties, like a plain loop would
+    longest = int(np.argmax(lengths))
+    k = max(0, min(top_k, len(lengths)))
+    top = np.argpartition(-lengths, k - 1)[:k] if k else np.arange(0)
+    top = top[np.lexsort((top, -lengths[top]))]
+    results['explanation_length'] = {
+        'mean': round(float(lengths.mean()), 1),
+        'min': int(lengths.min()),
+        'max': int(lengths.max()),
+        'percentiles': {str(p): round(float(v), 1) for p, v in zip(percentiles, np.percentile(lengths, percentiles))},
+        'longest_date': str(columns.dates[longest]),
+    }
+    results['top_longest'] = [
+        {'date': str(columns.dates[i]), 'length': int(lengths[i])} for i in top
+    ]
+
+    # Period aggregates only make sense for records with a valid date
+    valid = ~np.isnat(columns.dates)
+    dates = columns.dates[valid]
+    if len(dates):
+        results['by_year'] = _period_counts(dates.astype('datetime64[Y]'), media[valid])
+        results['by_month'] = _period_counts(dates.astype('datetime64[M]'), media[valid])
+        results['rolling'] = dict(window=window, **_rolling_series(dates, media[valid], lengths[valid], window))
+    return results
+
+
+def update_media_totals(totals, columns):
+    """
+    Adds a batch of records to running media totals, so the statistics that can
+    be kept exactly without the full history (counts per media type and year,
+    explanation length mean and maximum) are updated incrementally.
+
+    Parameters:
+    - totals (dict): Totals returned by an earlier call, or None to start from scratch.
+    - columns (ApodColumns): Columns of the new records only.
+
+    Returns:
+    - dict: The updated totals, with 'totals', 'by_year' and 'explanation_length' sections.
+    """
+    if totals is None:
+        totals = {
+            'totals': dict.fromkeys(MEDIA_TYPES + ('records',), 0),
+            'by_year': {},
+            'explanation_length': {'chars': 0, 'mean': 0.0, 'max': 0, 'longest_date': None},
+        }
+    if not len(columns):
+        return totals
+
+    counts = np.bincount(columns.media, minlength=len(MEDIA_TYPES)).tolist()
+    for media_type, count in zip(MEDIA_TYPES, counts):
+        totals['totals'][media_type] += count
+    totals['totals']['records'] += len(columns)
+
+    valid = ~np.isnat(columns.dates)
+    if valid.any():
+        years = _period_counts(columns.dates[valid].astype('datetime64[Y]'), columns.media[valid])
+        for year, year_counts in years.items():
+            row = totals['by_year'].setdefault(year, dict.fromkeys(MEDIA_TYPES, 0))
+            for media_type, count in year_counts.items():
+                row[media_type] += count
+
+    lengths = columns.explanation_lengths
+    stats = totals['explanation_length']
+    stats['chars'] += int(lengths.sum())
+    stats['mean'] = round(stats['chars'] / totals['totals']['records'], 1)
+    longest = int(np.argmax(lengths))
+    if int(lengths[longest]) > stats['max']:
+        stats['max'] = int(lengths[longest])
+        stats['longest_date'] = str(columns.dates[longest])
+    return totals
+
+
+def _int_at_least(value, minimum):
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value!r} is not a whole number")
+    if number < minimum:
+        raise argparse.ArgumentTypeError(f"{value!r} must be at least {minimum}")
+    return number
+
+
+def positive_int(value):
+    """
+    argparse type for options that must be a whole number of at least 1.
+    """
+    return _int_at_least(value, 1)
+
+
+def non_negative_int(value):
+    """
+    argparse type for options that must be a whole number of at least 0.
+    """
+    return _int_at_least(value, 0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print APOD media analytics as JSON.")
+    parser.add_argument('data_file', nargs='?', help="APOD data file (defaults to the store)")
+    parser.add_argument('--top-k', type=non_negative_int, default=5, help="number of longest explanations to list")
+    parser.add_argument('--window', type=positive_int, default=30, help="rolling window size in days")
+    parser.add_argument('--no-rolling', action='store_true', help="leave the rolling series out")
+    args = parser.parse_args(argv)
+
+    analytics = compute_media_analytics(build_apod_columns(iter_records(args.data_file)),
+                                        top_k=args.top_k, window=args.window)
+    if args.no_rolling:
+        analytics.pop('rolling', None)
+    print(json.dumps(analytics, indent=2))
+
+
+if __name__ == "__main__":
+    main()
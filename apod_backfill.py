@@ -0,0 +1,315 @@
+# apod_backfill.py
+
+# Resumable backfills of the APOD archive.
+# A journal next to the store records the state of every date a backfill is
+# responsible for (pending, failed or done). An interrupted backfill resumes from
+# the journal without re-walking the range, and failed dates are retried later
+# with exponential backoff instead of being dropped.
+
+import argparse
+import datetime
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+
+from apod_data_retrieval import APOD_API_URL, fetch_multiple_apod_data
+from apod_index import load_date_index
+from apod_store import STORE_FILE, JsonlAppender, iter_jsonl
+
+# The first day of the APOD archive
+APOD_FIRST_DATE = datetime.date(1995, 6, 16)
+
+# Date states kept in the journal
+PENDING = 'pending'
+FAILED = 'failed'
+DONE = 'done'
+
+
+def journal_path_for(store_path):
+    """
+    Returns the backfill journal used for a store.
+
+    Parameters:
+    - store_path (str): The JSON Lines store.
+
+    Returns:
+    - str: The journal file path ('<store>.backfill.jsonl').
+    """
+    return store_path + '.backfill.jsonl'
+
+
+class BackfillJournal:
+    """
+    An append-only log of date state changes. Each line is
+    {"date": "YYYY-MM-DD", "state": ..., "attempts": n, "next_retry": timestamp},
+    and the last line for a date is its current state. The log is rewritten
+    with one line per date when it grows much longer than that. The file is only
+    opened (and created) on the first write, so reading the counts never changes it.
+
+    Parameters:
+    - path (str): The journal file.
+    - retry_delay (float): Seconds to wait before the first retry of a failed date;
+      each later retry waits twice as long.
+    - max_retry_delay (float): Upper limit on the wait between retries.
+    - max_attempts (int): Failed dates are not retried after this many attempts.
+    """
+
+    def __init__(self, path, retry_delay=300.0, max_retry_delay=86400.0, max_attempts=8):
+        self.path = path
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_attempts = max_attempts
+        self.entries = {}
+        self.lines = 0
+        if os.path.exists(path):
+            for entry in iter_jsonl(path):
+                if isinstance(entry, dict) and 'date' in entry:
+                    self.entries[entry['date']] = entry
+                    self.lines += 1
+        self.log = None
+
+    def _write(self, entry):
+        if self.log is None:
+            # Drop superseded lines before appending to a log that has grown too long
+            if self.lines > 2 * len(self.entries) + 1000:
+                self.compact()
+            self.log = JsonlAppender(self.path)
+        self.entries[entry['date']] = entry
+        self.log.append(entry)
+
+    def plan(self, dates):
+        """
+        Adds dates to the journal as pending. Dates the journal already knows keep their state.
+
+        Parameters:
+        - dates (iterable): datetime.date objects.
+
+        Returns:
+        - int: The number of dates added.
+        """
+        added = 0
+        for day in dates:
+            key = day.isoformat()
+            if key not in self.entries:
+                self._write({'date': key, 'state': PENDING, 'attempts': 0, 'next_retry': 0})
+                added += 1
+        return added
+
+    def mark_done(self, key):
+        """
+        Records that a date ('YYYY-MM-DD') is in the store.
+        """
+        entry = self.entries.get(key, {})
+        self._write({'date': key, 'state': DONE, 'attempts': entry.get('attempts', 0) + 1, 'next_retry': 0})
+
+    def mark_failed(self, key, now=None):
+        """
+        Records a failed attempt for a date ('YYYY-MM-DD') and schedules its next retry.
+        """
+        now = time.time() if now is None else now
+        attempts = self.entries.get(key, {}).get('attempts', 0) + 1
+        delay = min(self.max_retry_delay, self.retry_delay * 2 ** (attempts - 1))
+        self._write({'date': key, 'state': FAILED, 'attempts': attempts, 'next_retry': now + delay})
+
+    def due(self, now=None):
+        """
+        Lists the dates that should be fetched now: every pending date, and failed
+        dates whose retry time has come and that have attempts left.
+
+        Parameters:
+        - now (float): The current time (defaults to time.time()).
+
+        Returns:
+        - list: datetime.date objects, in order.
+        """
+        now = time.time() if now is None else now
+        return sorted(
+            datetime.date.fromisoformat(key) for key, entry in self.entries.items()
+            if entry['state'] == PENDING
+            or (entry['state'] == FAILED and entry['attempts'] < self.max_attempts and entry['next_retry'] <= now)
+        )
+
+    def next_retry_time(self):
+        """
+        Returns the earliest scheduled retry, or None if no failed date has attempts left.
+        """
+        times = [entry['next_retry'] for entry in self.entries.values()
+                 if entry['state'] == FAILED and entry['attempts'] < self.max_attempts]
+        return min(times) if times else None
+
+    def counts(self):
+        """
+        Counts the dates in each state.
+
+        Returns:
+        - dict: Number of 'pending', 'failed' and 'done' dates, plus 'gave_up' for
+          failed dates that have used all their attempts.
+        """
+        counts = {PENDING: 0, FAILED: 0, DONE: 0, 'gave_up': 0}
+        for entry in self.entries.values():
+            counts[entry['state']] += 1
+            if entry['state'] == FAILED and entry['attempts'] >= self.max_attempts:
+                counts['gave_up'] += 1
+        return counts
+
+    def compact(self):
+        """
+        Rewrites the journal with only the current state of each date.
+        """
+        log = self.log
+        if log is not None:
+            log.close()
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for key in sorted(self.entries):
+                f.write(json.dumps(self.entries[key]) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        self.lines = len(self.entries)
+        if log is not None:
+            self.log = JsonlAppender(self.path)
+
+    def close(self):
+        """
+        Syncs and closes the journal.
+        """
+        if self.log is not None:
+            self.log.close()
+
+
+def run_backfill(api_key, dates, store_path=STORE_FILE, journal_path=None, wait=False,
+                 retry_delay=300.0, max_attempts=8, api_url=APOD_API_URL, **fetch_options):
+    """
+    Fetches a set of dates through the journal. Dates already in the store are
+    marked done without a request, the rest are fetched, and dates that are still
+    missing afterwards are marked failed and scheduled for a retry.
+
+    Parameters:
+    - api_key (str): Your NASA API key.
+    - dates (iterable): datetime.date objects to backfill. They are added to the journal,
+      together with anything already pending or due from earlier runs.
+    - store_path (str): The JSON Lines store.
+    - journal_path (str): The journal (defaults to journal_path_for(store_path)).
+    - wait (bool): Keep running, sleeping until each scheduled retry, until no date has a
+      retry left. By default only the dates that are due now are fetched.
+    - retry_delay (float): Seconds before the first retry of a failed date.
+    - max_attempts (int): How many times a date is tried before giving up on it.
+    - api_url (str): The APOD endpoint.
+    - **fetch_options: Passed on to fetch_multiple_apod_data (max_workers, media_cache, ...).
+
+    Returns:
+    - dict: The journal counts after the run.
+    """
+    journal = BackfillJournal(journal_path or journal_path_for(store_path),
+                              retry_delay=retry_delay, max_attempts=max_attempts)
+    try:
+        journal.plan(dates)
+        while True:
+            due = journal.due()
+            if due:
+                # The store is the source of truth, so dates fetched by a run that
+                # died before updating the journal are simply marked done
+                date_index = load_date_index(store_path)
+                to_fetch = []
+                for day in due:
+                    if day in date_index:
+                        journal.mark_done(day.isoformat())
+                    else:
+                        to_fetch.append(day)
+                if to_fetch:
+                    print(f"Backfilling {len(to_fetch)} dates ({to_fetch[0]} to {to_fetch[-1]}).")
+                    fetch_multiple_apod_data(api_key, None, None, output_file=store_path, api_url=api_url,
+                                             dates=to_fetch, **fetch_options)
+                    date_index = load_date_index(store_path)
+                    for day in to_fetch:
+                        if day in date_index:
+                            journal.mark_done(day.isoformat())
+                        else:
+                            journal.mark_failed(day.isoformat())
+                    journal.log.sync()
+
+            next_retry = journal.next_retry_time()
+            if not wait or next_retry is None:
+                break
+            delay = next_retry - time.time()
+            if delay > 0:
+                print(f"Waiting {delay:.0f}s for the next scheduled retry.")
+                time.sleep(delay)
+        counts = journal.counts()
+    finally:
+        journal.close()
+
+    print(f"Backfill journal: {counts[DONE]} done, {counts[PENDING]} pending, "
+          f"{counts[FAILED]} failed ({counts['gave_up']} given up).")
+    return counts
+
+
+def archive_gaps(store_path=STORE_FILE, start=APOD_FIRST_DATE, end=None):
+    """
+    Finds every date between the start of the archive and today that is missing from the store.
+
+    Parameters:
+    - store_path (str): The JSON Lines store.
+    - start (datetime.date): The first date to check.
+    - end (datetime.date): The last date to check (defaults to today).
+
+    Returns:
+    - list: datetime.date objects, in order.
+    """
+    end = end or datetime.date.today()
+    return load_date_index(store_path).missing_dates(start, end)
+
+
+def main(argv=None):
+    """
+    Command line entry point: 'range START END', 'fill-gaps' or 'status'.
+    """
+    parser = argparse.ArgumentParser(description="Resumable APOD backfills.")
+    parser.add_argument('--store', default=STORE_FILE, help="The JSON Lines store.")
+    parser.add_argument('--wait', action='store_true', help="Keep running until every scheduled retry is done.")
+    parser.add_argument('--retry-delay', type=float, default=300.0, help="Seconds before the first retry.")
+    parser.add_argument('--max-attempts', type=int, default=8, help="Attempts per date before giving up.")
+    parser.add_argument('--workers', type=int, default=8, help="Requests in flight at once.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    range_parser = commands.add_parser('range', help="Backfill a date range.")
+    range_parser.add_argument('start', help="Start date (DD/MM/YYYY).")
+    range_parser.add_argument('end', help="End date (DD/MM/YYYY).")
+    commands.add_parser('fill-gaps', help="Backfill every date missing from the archive.")
+    commands.add_parser('resume', help="Fetch whatever is pending or due in the journal.")
+    commands.add_parser('status', help="Show the journal counts.")
+    args = parser.parse_args(argv)
+
+    if args.command == 'status':
+        journal = BackfillJournal(journal_path_for(args.store), max_attempts=args.max_attempts)
+        print(json.dumps(journal.counts(), indent=2))
+        journal.close()
+        return
+
+    load_dotenv()
+    api_key = os.getenv('API_KEY')
+    if not api_key:
+        print("Error: Please set the API_KEY environment variable.")
+        return
+
+    if args.command == 'range':
+        try:
+            start = datetime.datetime.strptime(args.start, '%d/%m/%Y').date()
+            end = datetime.datetime.strptime(args.end, '%d/%m/%Y').date()
+        except ValueError as ve:
+            print(f"Date format error: {ve}")
+            return
+        dates = [start + datetime.timedelta(days=i) for i in range((end - start).days + 1)]
+    elif args.command == 'fill-gaps':
+        dates = archive_gaps(args.store)
+        print(f"Found {len(dates)} dates missing from the archive.")
+    else:
+        dates = []
+    run_backfill(api_key, dates, store_path=args.store, wait=args.wait, retry_delay=args.retry_delay,
+                 max_attempts=args.max_attempts, max_workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+# apod_columnar_export.py
+
+# Columnar export of the APOD data for dashboards.
+# The summary columns (typed date, categorical media type, title, url) are written
+# one file per year, and the explanations go to a separate set of files, so
+# summary queries never read them. Needs the optional 'pyarrow' package.
+
+import os
+import shutil
+
+from apod_store import iter_records
+
+# Where the export is written by default
+COLUMNAR_EXPORT_DIR = 'apod_columnar'
+
+# Supported formats: compressed Parquet, or uncompressed Arrow IPC files that
+# can be memory-mapped and read without copying
+FILE_EXTENSIONS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+# Partition for records without a date, so the export still holds every record
+NULL_PARTITION = '__null__'
+
+
+def _import_pyarrow():
+    """
+    Imports pyarrow, printing a message if it isn't installed.
+
+    Returns:
+    - module: The pyarrow module, or None.
+    """
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.ipc
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError:
+        print("Error: the columnar export needs pyarrow. Install it with 'pip install pyarrow'.")
+        return None
+
+
+def _build_tables(pa, records):
+    """
+    Builds the summary and explanation tables from APOD records.
+
+    Returns:
+    - tuple: (summary table, explanation table), both sorted by date.
+    """
+    dates = []
+    titles = []
+    media_types = []
+    urls = []
+    explanations = []
+    for entry in records:
+        dates.append(entry.get('date'))
+        titles.append(entry.get('title'))
+        media_types.append(entry.get('media_type'))
+        urls.append(entry.get('url'))
+        explanations.append(entry.get('explanation'))
+
+    date_column = pa.array(dates, pa.string()).cast(pa.date32())
+    summary = pa.table({
+        'date': date_column,
+        'title': pa.array(titles, pa.string()),
+        'media_type': pa.array(media_types, pa.string()).dictionary_encode().cast(
+            pa.dictionary(pa.int8(), pa.string())),
+        'url': pa.array(urls, pa.string()),
+    })
+    explanation = pa.table({
+        'date': date_column,
+        'explanation': pa.array(explanations, pa.string()),
+    })
+    return summary.sort_by('date'), explanation.sort_by('date')
+
+
+def _write_partitioned(pa, table, directory, file_format, compression):
+    """
+    Writes a table as one file per year: '<directory>/year=YYYY/part-0<ext>'.
+    Rows without a date go to '<directory>/year=__null__/part-0<ext>'.
+    """
+    years = pa.compute.year(table['date'])
+    for year in pa.compute.unique(years).to_pylist():
+        if year is None:
+            part = table.filter(pa.compute.is_null(years))
+            year = NULL_PARTITION
+        else:
+            part = table.filter(pa.compute.equal(years, year))
+        part_dir = os.path.join(directory, f"year={year}")
+        os.makedirs(part_dir, exist_ok=True)
+        path = os.path.join(part_dir, 'part-0' + FILE_EXTENSIONS[file_format])
+        if file_format == 'parquet':
+            pa.parquet.write_table(part, path, compression=compression)
+        else:
+            with pa.OSFile(path, 'wb') as sink:
+                with pa.ipc.new_file(sink, part.schema) as writer:
+                    writer.write_table(part)
+
+
+def export_apod_columnar(dataset=None, data_file=None, output_dir=COLUMNAR_EXPORT_DIR,
+                         file_format='parquet', compression='zstd'):
+    """
+    Writes the APOD data as a year-partitioned columnar export. Any previous
+    export in output_dir is replaced.
+
+    The layout is:
+    - '<output_dir>/summary/year=YYYY/part-0.<ext>': date (date32), title,
+      media_type (dictionary-encoded) and url.
+    - '<output_dir>/explanations/year=YYYY/part-0.<ext>': date and explanation.
+    Records without a date are kept in a 'year=__null__' partition.
+
+    Parameters:
+    - dataset (ApodDataset): Records already loaded by read_apod_data. If None, the
+      records are streamed from data_file.
+    - data_file (str): The data file to read when no dataset is given.
+    - output_dir (str): The export directory.
+    - file_format (str): 'parquet' for compressed Parquet, or 'arrow' for uncompressed
+      Arrow IPC files that read_apod_columnar can memory-map without copying.
+    - compression (str): Parquet compression codec.
+
+    Returns:
+    - int: The number of records exported, or None on error.
+    """
+    pa = _import_pyarrow()
+    if pa is None:
+        return None
+    if file_format not in FILE_EXTENSIONS:
+        print(f"Error: unknown columnar format '{file_format}'.")
+        return None
+
+    try:
+        records = dataset if dataset is not None else iter_records(data_file)
+        summary, explanation = _build_tables(pa, records)
+        # Write next to the old export, then swap it in
+        temp_dir = output_dir + '.tmp'
+        if os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir)
+        _write_partitioned(pa, summary, os.path.join(temp_dir, 'summary'), file_format, compression)
+        _write_partitioned(pa, explanation, os.path.join(temp_dir, 'explanations'), file_format, compression)
+        if os.path.exists(output_dir):
+            shutil.rmtree(output_dir)
+        os.replace(temp_dir, output_dir)
+    except FileNotFoundError as e:
+        print(f"Error: file not found: {e}")
+        return None
+    except PermissionError:
+        print(f"Error: Permission denied when writing to '{output_dir}'.")
+        return None
+    except Exception as e:
+        print(f"An unexpected error occurred during the columnar export: {e}")
+        return None
+
+    print(f"Exported {summary.num_rows} entries to '{output_dir}' ({file_format}).")
+    return summary.num_rows
+
+
+def read_apod_columnar(output_dir=COLUMNAR_EXPORT_DIR, part='summary', years=None, columns=None):
+    """
+    Reads a columnar export back into a pyarrow Table, using memory-mapped files.
+    Arrow IPC exports are read without copying; Parquet exports are decompressed
+    from the mapped file.
+
+    Parameters:
+    - output_dir (str): The export directory.
+    - part (str): 'summary' or 'explanations'.
+    - years (iterable): Only read these years (e.g. [2019, 2020]); None reads all,
+      including the records without a date.
+    - columns (list): Only read these columns; None reads all.
+
+    Returns:
+    - pyarrow.Table: The requested data sorted by date, or None on error.
+    """
+    pa = _import_pyarrow()
+    if pa is None:
+        return None
+    directory = os.path.join(output_dir, part)
+    if not os.path.isdir(directory):
+        print(f"Error: '{directory}' not found. Run export_apod_columnar first.")
+        return None
+
+    wanted = None if years is None else {int(year) for year in years}
+    tables = []
+    for name in sorted(os.listdir(directory)):
+        if not name.startswith('year='):
+            continue
+        if wanted is not None and (name[5:] == NULL_PARTITION or int(name[5:]) not in wanted):
+            continue
+        for file_name in sorted(os.listdir(os.path.join(directory, name))):
+            path = os.path.join(directory, name, file_name)
+            if file_name.endswith('.parquet'):
+                # The file sits in a year=YYYY directory; without partitioning=None
+                # pyarrow would add a hive 'year' column the Arrow files lack
+                tables.append(pa.parquet.read_table(path, columns=columns, memory_map=True,
+                                                    partitioning=None))
+            elif file_name.endswith('.arrow'):
+                table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+                tables.append(table.select(columns) if columns else table)
+    if not tables:
+        return None
+    # Dictionary columns may use different dictionaries per file, so unify them
+    return pa.concat_tables(tables, promote_options='permissive').unify_dictionaries()
@@ -0,0 +1,361 @@
+# apod_daemon.py
+
+# A long-running poller that keeps the APOD store and everything derived from it
+# up to date. Each cycle fetches only the newest days, appends them to the store,
+# appends them to the CSV summary and folds them into running media totals.
+# Nothing reloads the full history, so cycles (and start-up) stay cheap however
+# large the archive gets. Metrics are served in the Prometheus text format,
+# together with the stage timings and HTTP latency histogram from instrumentation.py.
+
+import argparse
+import bisect
+import datetime
+import json
+import os
+import signal
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+
+from apod_analytics import build_apod_columns, update_media_totals
+from apod_data_processing import write_apod_summary_to_csv
+from apod_data_retrieval import APOD_API_URL, fetch_multiple_apod_data
+from apod_http_client import ApodClient
+from apod_index import load_date_index
+from apod_store import STORE_FILE, iter_jsonl_tail
+from instrumentation import add_instrumentation_arguments, configure_from_options, get_instrumentation, stage
+
+# Running media totals, kept next to the CSV summary
+MEDIA_STATS_FILE = 'apod_media_stats.json'
+
+# Upper bounds of the fetch duration histogram buckets, in seconds
+FETCH_DURATION_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class DaemonMetrics:
+    """
+    Counters, gauges and a fetch duration histogram for the daemon, rendered in
+    the Prometheus text exposition format. Safe to update from one thread while
+    the metrics server reads from another.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {
+            'apod_poll_cycles_total': 0,
+            'apod_items_fetched_total': 0,
+            'apod_http_requests_total': 0,
+        }
+        self.errors = {}
+        self.gauges = {
+            'apod_store_records': 0,
+            'apod_last_success_timestamp_seconds': 0,
+            'apod_last_cycle_duration_seconds': 0,
+            'apod_pending_dates': 0,
+        }
+        self.bucket_counts = [0] * len(FETCH_DURATION_BUCKETS)
+        self.duration_sum = 0.0
+        self.duration_count = 0
+        self.latency = {}
+        # (timestamp, items) per cycle, for the items fetched over the last day
+        self.recent_items = deque()
+
+    def record_error(self, stage_name):
+        """
+        Counts an error in a stage of the cycle ('fetch', 'csv' or 'stats').
+        """
+        with self.lock:
+            self.errors[stage_name] = self.errors.get(stage_name, 0) + 1
+
+    def record_fetch(self, duration, items, http_requests, client_stats):
+        """
+        Records one fetch: its duration, the items it added and the HTTP client's latency.
+        """
+        now = time.time()
+        with self.lock:
+            position = bisect.bisect_left(FETCH_DURATION_BUCKETS, duration)
+            if position < len(self.bucket_counts):
+                self.bucket_counts[position] += 1
+            self.duration_sum += duration
+            self.duration_count += 1
+            self.counters['apod_items_fetched_total'] += items
+            self.counters['apod_http_requests_total'] += http_requests
+            self.recent_items.append((now, items))
+            self.latency = {key[len('latency_'):]: value for key, value in client_stats.items()
+                            if key.startswith('latency_')}
+
+    def items_per_day(self, now=None):
+        """
+        Returns the number of items fetched over the last 24 hours.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            while self.recent_items and self.recent_items[0][0] < now - 86400:
+                self.recent_items.popleft()
+            return sum(items for _, items in self.recent_items)
+
+    def render(self):
+        """
+        Renders every metric in the Prometheus text format.
+
+        Returns:
+        - str: The metrics page.
+        """
+        items_per_day = self.items_per_day()
+        lines = []
+        with self.lock:
+            for name, value in self.counters.items():
+                lines += [f"# TYPE {name} counter", f"{name} {value}"]
+            lines.append("# TYPE apod_errors_total counter")
+            for stage_name, value in sorted(self.errors.items()):
+                lines.append(f'apod_errors_total{{stage="{stage_name}"}} {value}')
+            for name, value in self.gauges.items():
+                lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+            lines += ["# TYPE apod_items_per_day gauge", f"apod_items_per_day {items_per_day}"]
+
+            lines.append("# TYPE apod_fetch_duration_seconds histogram")
+            cumulative = 0
+            for bound, count in zip(FETCH_DURATION_BUCKETS, self.bucket_counts):
+                cumulative += count
+                lines.append(f'apod_fetch_duration_seconds_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f'apod_fetch_duration_seconds_bucket{{le="+Inf"}} {self.duration_count}')
+            lines.append(f"apod_fetch_duration_seconds_sum {self.duration_sum}")
+            lines.append(f"apod_fetch_duration_seconds_count {self.duration_count}")
+
+            lines.append("# TYPE apod_http_request_latency_seconds gauge")
+            for key, value in sorted(self.latency.items()):
+                lines.append(f'apod_http_request_latency_seconds{{stat="{key}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def start_metrics_server(metrics, port=9108, host='127.0.0.1'):
+    """
+    Serves GET /metrics on a background thread.
+
+    Parameters:
+    - metrics (DaemonMetrics): The metrics to serve.
+    - port (int): Port to listen on; 0 picks a free port.
+    - host (str): Address to listen on.
+
+    Returns:
+    - ThreadingHTTPServer: The server. Call shutdown() when finished.
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = (metrics.render() + get_instrumentation().render_prometheus()).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class ApodDaemon:
+    """
+    Polls the APOD API for the newest days and updates the derived files.
+
+    Parameters:
+    - api_key (str): Your NASA API key.
+    - store_path (str): The JSON Lines store.
+    - csv_file (str): The CSV summary to append to.
+    - stats_file (str): The running media totals file.
+    - lookback_days (int): How many of the most recent days to check each cycle, so a
+      day that wasn't published yet (or failed) is picked up by a later cycle.
+    - api_url (str): The APOD endpoint.
+    - metrics (DaemonMetrics): Where to record metrics (a new one if None).
+    - media_cache (MediaCache): Optional media cache for the new records' images.
+    """
+
+    def __init__(self, api_key, store_path=STORE_FILE, csv_file='apod_summary.csv',
+                 stats_file=MEDIA_STATS_FILE, lookback_days=3, api_url=APOD_API_URL,
+                 metrics=None, media_cache=None):
+        self.api_key = api_key
+        self.store_path = store_path
+        self.csv_file = csv_file
+        self.stats_file = stats_file
+        self.lookback_days = lookback_days
+        self.api_url = api_url
+        self.metrics = metrics or DaemonMetrics()
+        self.media_cache = media_cache
+        # One client for the daemon's lifetime, so connections are reused across cycles
+        self.client = ApodClient(pool_maxsize=2)
+        self.stop_event = threading.Event()
+
+    def load_media_totals(self):
+        """
+        Loads the running media totals, or None if there are none yet or the store changed.
+        """
+        if not os.path.exists(self.stats_file):
+            return None
+        try:
+            with open(self.stats_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        store_size = os.path.getsize(self.store_path) if os.path.exists(self.store_path) else 0
+        if state.get('store_size', 0) > store_size:
+            return None
+        return state
+
+    def update_media_totals(self):
+        """
+        Folds the records appended since the last update into the media totals file.
+
+        Returns:
+        - dict: The updated totals.
+        """
+        state = self.load_media_totals() or {'store_size': 0, 'totals': None}
+        position = state['store_size']
+        records = []
+        for _, position, record in iter_jsonl_tail(self.store_path, state['store_size']):
+            records.append(record)
+        totals = update_media_totals(state['totals'], build_apod_columns(records))
+        temp_path = self.stats_file + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'store_size': position, 'totals': totals}, f, indent=2)
+        os.replace(temp_path, self.stats_file)
+        return totals
+
+    @stage('apod.poll_cycle')
+    def run_cycle(self, today=None):
+        """
+        Runs one poll: fetch the newest missing days, then update the CSV and media totals.
+
+        Parameters:
+        - today (datetime.date): The newest day to fetch (defaults to today).
+
+        Returns:
+        - int: The number of records fetched.
+        """
+        today = today or datetime.date.today()
+        cycle_start = time.perf_counter()
+        date_index = load_date_index(self.store_path)
+        dates = date_index.missing_dates(today - datetime.timedelta(days=self.lookback_days - 1), today)
+        fetched = 0
+        failed = 0
+        pending = 0
+        if dates:
+            stats = fetch_multiple_apod_data(self.api_key, None, None, max_workers=2, output_file=self.store_path,
+                                             api_url=self.api_url, client=self.client,
+                                             media_cache=self.media_cache, dates=dates)
+            if stats is None:
+                failed = len(dates)
+            else:
+                fetched = stats['fetched']
+                self.metrics.record_fetch(stats['elapsed'], fetched, stats['http_requests'], stats['client'])
+                # The API answers 404 for today until the day's entry is published; that
+                # date is pending and is picked up by a later cycle, so it isn't an error
+                pending = int(today.isoformat() in stats['not_found_dates'])
+                failed = stats['failed'] - pending
+            if failed:
+                self.metrics.record_error('fetch')
+
+        # Only touch the derived files when the store has grown since they were updated
+        state = self.load_media_totals()
+        store_size = os.path.getsize(self.store_path) if os.path.exists(self.store_path) else 0
+        if state is None or state['store_size'] != store_size:
+            # The writer reports its own errors; the totals (and with them the store
+            # size checked above) only move on once the CSV is current, so a failed
+            # write is retried on the next cycle
+            if not write_apod_summary_to_csv(data_file=self.store_path, csv_file=self.csv_file):
+                self.metrics.record_error('csv')
+            else:
+                try:
+                    self.update_media_totals()
+                except Exception as e:
+                    print(f"Error updating '{self.stats_file}': {e}")
+                    self.metrics.record_error('stats')
+
+        with self.metrics.lock:
+            self.metrics.counters['apod_poll_cycles_total'] += 1
+            self.metrics.gauges['apod_store_records'] = len(date_index) + fetched
+            self.metrics.gauges['apod_last_cycle_duration_seconds'] = round(time.perf_counter() - cycle_start, 3)
+            self.metrics.gauges['apod_pending_dates'] = pending
+            if not failed or fetched:
+                self.metrics.gauges['apod_last_success_timestamp_seconds'] = round(time.time())
+        return fetched
+
+    def run_forever(self, interval=3600.0):
+        """
+        Runs a cycle every `interval` seconds until stop() is called.
+
+        Parameters:
+        - interval (float): Seconds between the start of one cycle and the next.
+        """
+        while not self.stop_event.is_set():
+            started = time.monotonic()
+            try:
+                fetched = self.run_cycle()
+                print(f"Poll finished: {fetched} new entries.")
+            except Exception as e:
+                print(f"An unexpected error occurred during the poll: {e}")
+                self.metrics.record_error('cycle')
+            self.stop_event.wait(max(0.0, interval - (time.monotonic() - started)))
+        self.client.close()
+
+    def stop(self):
+        """
+        Asks run_forever to return after the current cycle.
+        """
+        self.stop_event.set()
+
+
+def main(argv=None):
+    """
+    Command line entry point for the daemon.
+    """
+    parser = argparse.ArgumentParser(description="Poll the APOD API and keep the derived files up to date.")
+    parser.add_argument('--interval', type=float, default=3600.0, help="Seconds between polls.")
+    parser.add_argument('--lookback-days', type=int, default=3, help="Recent days checked on every poll.")
+    parser.add_argument('--store', default=STORE_FILE, help="The JSON Lines store.")
+    parser.add_argument('--csv', default='apod_summary.csv', help="The CSV summary.")
+    parser.add_argument('--metrics-port', type=int, default=9108, help="Port for /metrics; 0 disables it.")
+    parser.add_argument('--once', action='store_true', help="Run a single poll and exit.")
+    add_instrumentation_arguments(parser)
+    args = parser.parse_args(argv)
+    # Always record metrics when they are served, even without a trace or metrics file
+    configure_from_options(args.trace, args.metrics_file, args.log_spans, args.verbose,
+                           enabled=True if args.metrics_port and not args.once else None)
+
+    load_dotenv()
+    api_key = os.getenv('API_KEY')
+    if not api_key:
+        print("Error: Please set the API_KEY environment variable.")
+        return
+
+    daemon = ApodDaemon(api_key, store_path=args.store, csv_file=args.csv, lookback_days=args.lookback_days)
+    if args.once:
+        daemon.run_cycle()
+        return
+
+    server = None
+    if args.metrics_port:
+        server = start_metrics_server(daemon.metrics, args.metrics_port)
+        print(f"Serving metrics on http://127.0.0.1:{args.metrics_port}/metrics")
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+    try:
+        daemon.run_forever(args.interval)
+    except KeyboardInterrupt:
+        daemon.stop()
+    finally:
+        if server is not None:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,15 @@
 import json
 import os
 import csv
+import importlib.util
+import itertools
 from datetime import datetime
+from apod_analytics import build_apod_columns, compute_media_analytics
+from apod_columnar_export import export_apod_columnar
+from apod_index import load_date_index
+from apod_store import (LEGACY_JSON_FILE, STORE_FILE, ensure_store, iter_jsonl_tail, iter_records, load_apod_dataset,
+                        resolve_data_file)
+from instrumentation import configure_from_env, count, span, stage, verbose
 
 
 def format_date(date_str):
@@ -20,158 +28,431 @@ def format_date(date_str):
     except ValueError:
         return date_str  # Return as-is if the format doesn't match
 
-#Changing the dates again because i dont like the format
-def read_apod_data():
+def load_apod_dataset_safely(data_file=None):
     """
-    Reads the 'apod_data.json' file and loads its content into a Python dictionary.
+    Loads the APOD data store once into a shared ApodDataset, printing a message
+    instead of raising if the file is missing, unreadable or empty.
+    Repeated calls in the same process reuse the cached dataset while the file is unchanged.
+
+    Parameters:
+    - data_file (str): The data file to read. Defaults to 'apod_data.jsonl', or
+      'apod_data.json' if the JSON Lines store hasn't been created yet.
 
     Returns:
-    - data_list (list): List of dictionaries containing APOD data.
+    - ApodDataset: The loaded records, or None if they could not be loaded.
     """
+    data_file = resolve_data_file(data_file)
     try:
-        with open('apod_data.json', 'r', encoding='utf-8') as f:
-            data_list = json.load(f)
-        # Check if the file is empty
-        if not data_list:
-            print("Error: 'apod_data.json' is empty.")
-            return None
-        else:
-            print(f"Successfully loaded data from 'apod_data.json'.\n")
-            # Loop through the data and print date and title
-            for entry in data_list:
-                print(f"Date: {format_date(entry.get('date'))}, Title: {entry.get('title')}")
-            return data_list
+        dataset = load_apod_dataset(data_file)
     except FileNotFoundError:
-        print("Error: 'apod_data.json' file not found.")
+        print(f"Error: '{data_file}' file not found.")
         return None
     except PermissionError:
-        print("Error: Permission denied when accessing 'apod_data.json'.")
+        print(f"Error: Permission denied when accessing '{data_file}'.")
         return None
     except json.JSONDecodeError:
-        print("Error: 'apod_data.json' is empty or corrupt.")
+        print(f"Error: '{data_file}' is empty or corrupt.")
         return None
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         return None
+    # Check if the file is empty
+    if not dataset:
+        print(f"Error: '{data_file}' is empty.")
+        return None
+    return dataset
 
-
-def analyze_apod_media():
+def stream_apod_records_safely(data_file=None):
     """
-    Analyzes the APOD data to count the total number of images and videos,
-    and identifies the date with the most detailed explanation.
+    Opens the APOD data store as a stream of records, printing a message instead of
+    raising if the file is missing, unreadable or empty. Records are parsed one at a
+    time, so memory use stays constant however large the archive is.
+
+    Parameters:
+    - data_file (str): The data file to read (see load_apod_dataset_safely).
+
+    Returns:
+    - iterator: An iterator over the records, or None if they could not be read.
     """
+    data_file = resolve_data_file(data_file)
     try:
-        with open('apod_data.json', 'r', encoding='utf-8') as f:
-            data_list = json.load(f)
-        if not data_list:
-            print("Error: 'apod_data.json' is empty.")
-            return
+        records = iter_records(data_file)
+        # Read the first record now so a missing or corrupt file is reported here
+        first = next(records, None)
     except FileNotFoundError:
-        print("Error: 'apod_data.json' file not found.")
-        return
+        print(f"Error: '{data_file}' file not found.")
+        return None
     except PermissionError:
-        print("Error: Permission denied when accessing 'apod_data.json'.")
-        return
+        print(f"Error: Permission denied when accessing '{data_file}'.")
+        return None
     except json.JSONDecodeError:
-        print("Error: 'apod_data.json' is empty or corrupt.")
-        return
+        print(f"Error: '{data_file}' is empty or corrupt.")
+        return None
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
-        return
+        return None
+    if first is None:
+        print(f"Error: '{data_file}' is empty.")
+        return None
+    return itertools.chain([first], records)
 
-    total_images = 0
-    total_videos = 0
-    longest_explanation = ''
-    longest_explanation_date = ''
-
-    for entry in data_list:
-        media_type = entry.get('media_type')
-        if media_type == 'image':
-            total_images += 1
-        elif media_type == 'video':
-            total_videos += 1
-        # Check for the longest explanation
-        explanation = entry.get('explanation', '')
-        if len(explanation) > len(longest_explanation):
-            longest_explanation = explanation
-            longest_explanation_date = entry.get('date')
+#Changing the dates again because i dont like the format
+@stage('apod.read')
+def read_apod_data(data_file=None, print_records=None):
+    """
+    Reads the APOD data store and loads its content into a shared dataset.
 
-    print("\nAnalysis Results:")
-    print(f"Total number of images: {total_images}")
-    print(f"Total number of videos: {total_videos}")
-    print(f"The date with the most detailed explanation is {format_date(longest_explanation_date)}")
+    Parameters:
+    - data_file (str): The data file to read (see load_apod_dataset_safely).
+    - print_records (bool): Print the date and title of every record. Defaults to
+      the instrumentation's verbose setting (APOD_VERBOSE), since printing a line
+      per record dominates the run time on a large archive.
 
+    Returns:
+    - dataset (ApodDataset): The APOD records, which can be passed on to
+      analyze_apod_media and write_apod_summary_to_csv so the file is only parsed once.
+    """
+    dataset = load_apod_dataset_safely(data_file)
+    if dataset is None:
+        return None
+    print(f"Successfully loaded {len(dataset)} records from '{dataset.path}'.\n")
+    count('apod_records_read_total', len(dataset))
+    if print_records is None:
+        print_records = verbose()
+    if print_records:
+        # Loop through the data and print date and title
+        for entry in dataset:
+            print(f"Date: {format_date(entry.get('date'))}, Title: {entry.get('title')}")
+    return dataset
 
-def write_apod_summary_to_csv():
+
+@stage('apod.analyze')
+def analyze_apod_media(dataset=None, data_file=None, top_k=5, window=30):
     """
-    Extracts date, title, media type, and URL from 'apod_data.json' and writes to 'apod_summary.csv'.
-    If the CSV file exists, new entries are appended. If the file does not exist, a new one is created.
+    Analyzes the APOD data to count the total number of images and videos,
+    and identifies the date with the most detailed explanation.
+    The full results (per-year and per-month media counts, explanation length
+    percentiles, the top-K longest entries and rolling windows) are returned as a dict.
+
+    Parameters:
+    - dataset (ApodDataset): Records already loaded by read_apod_data. If None, the
+      records are streamed from data_file in constant memory.
+    - data_file (str): The data file to read when no dataset is given.
+    - top_k (int): Number of longest explanations to include.
+    - window (int): Rolling window size in days.
+
+    Returns:
+    - dict: The results of apod_analytics.compute_media_analytics, or None on error.
     """
-    try:
-        with open('apod_data.json', 'r', encoding='utf-8') as f:
-            data_list = json.load(f)
-        if not data_list:
-            print("Error: 'apod_data.json' is empty.")
+    if dataset is None:
+        dataset = stream_apod_records_safely(data_file)
+        if dataset is None:
             return
-    except FileNotFoundError:
-        print("Error: 'apod_data.json' file not found.")
-        return
-    except PermissionError:
-        print("Error: Permission denied when accessing 'apod_data.json'.")
-        return
+
+    # Build the columns in one pass, then compute every statistic on them at once
+    try:
+        columns = build_apod_columns(dataset)
     except json.JSONDecodeError:
-        print("Error: 'apod_data.json' is empty or corrupt.")
+        print("Error: the APOD data is corrupt.")
         return
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+    except (ValueError, KeyError) as e:
+        print(f"Error: the APOD data contains a malformed record: {e}")
         return
+    analytics = compute_media_analytics(columns, top_k=top_k, window=window)
+
+    print("\nAnalysis Results:")
+    print(f"Total number of images: {analytics['totals']['image']}")
+    print(f"Total number of videos: {analytics['totals']['video']}")
+    # Without any records there is no explanation length section
+    if 'explanation_length' in analytics:
+        longest_date = analytics['explanation_length']['longest_date']
+        print(f"The date with the most detailed explanation is {format_date(longest_date)}")
+    else:
+        print("There are no APOD records to compare explanations.")
+    return analytics
+
+
+def load_date_index_safely(store_path=STORE_FILE):
+    """
+    Loads the date index of the JSON Lines store, migrating 'apod_data.json' into
+    the store first if needed, and printing a message instead of raising on errors.
+
+    Parameters:
+    - store_path (str): The JSON Lines store.
 
-    # Define CSV file name
-    csv_file = 'apod_summary.csv'
+    Returns:
+    - DateIndex: The up-to-date index, or None if it could not be loaded.
+    """
+    try:
+        ensure_store(store_path, os.path.join(os.path.dirname(store_path), LEGACY_JSON_FILE))
+        if not os.path.exists(store_path):
+            print(f"Error: '{store_path}' file not found.")
+            return None
+        return load_date_index(store_path)
+    except PermissionError:
+        print(f"Error: Permission denied when accessing '{store_path}'.")
+        return None
+    except Exception as e:
+        print(f"An unexpected error occurred while loading the date index: {e}")
+        return None
+
+
+def parse_display_date(date_str):
+    """
+    Parses a date given in DD/MM/YYYY format, printing a message if it is invalid.
+
+    Parameters:
+    - date_str (str): The date string in DD/MM/YYYY format.
+
+    Returns:
+    - datetime: The parsed date, or None if the format doesn't match.
+    """
+    try:
+        return datetime.strptime(date_str, '%d/%m/%Y')
+    except ValueError as ve:
+        print(f"Date format error: {ve}")
+        return None
+
+
+def get_apod_entry(date, store_path=STORE_FILE):
+    """
+    Looks up the APOD entry for one date using the store's date index, without
+    reading any other records.
+
+    Parameters:
+    - date (str): The date in DD/MM/YYYY format.
+    - store_path (str): The JSON Lines store.
+
+    Returns:
+    - dict: The APOD entry, or None if there is no entry for that date.
+    """
+    day = parse_display_date(date)
+    date_index = load_date_index_safely(store_path)
+    if day is None or date_index is None:
+        return None
+    entry = date_index.lookup(day)
+    if entry is None:
+        print(f"No APOD entry found for {date}.")
+    return entry
+
+
+def get_apod_entries(start_date, end_date, store_path=STORE_FILE):
+    """
+    Reads the APOD entries between two dates (inclusive) using the store's date index.
+
+    Parameters:
+    - start_date (str): The first date in DD/MM/YYYY format.
+    - end_date (str): The last date in DD/MM/YYYY format.
+    - store_path (str): The JSON Lines store.
+
+    Returns:
+    - list: The APOD entries in date order, or None on error.
+    """
+    start_day = parse_display_date(start_date)
+    end_day = parse_display_date(end_date)
+    date_index = load_date_index_safely(store_path)
+    if start_day is None or end_day is None or date_index is None:
+        return None
+    return date_index.lookup_range(start_day, end_day)
+
+
+def find_missing_dates(start_date, end_date, store_path=STORE_FILE):
+    """
+    Lists the dates between start_date and end_date (inclusive) that have no APOD
+    entry in the store, using only the date index.
+
+    Parameters:
+    - start_date (str): The first date in DD/MM/YYYY format.
+    - end_date (str): The last date in DD/MM/YYYY format.
+    - store_path (str): The JSON Lines store.
+
+    Returns:
+    - list: The missing dates in DD/MM/YYYY format, or None on error.
+    """
+    start_day = parse_display_date(start_date)
+    end_day = parse_display_date(end_date)
+    date_index = load_date_index_safely(store_path)
+    if start_day is None or end_day is None or date_index is None:
+        return None
+    return [day.strftime('%d/%m/%Y') for day in date_index.missing_dates(start_day, end_day)]
+
+
+# Columns of the summary CSV
+SUMMARY_FIELDS = ['date', 'title', 'media_type', 'url']
+
+
+def summary_state_path(csv_file):
+    """
+    Returns the sidecar file that records how far the data has been exported to a CSV.
+
+    Parameters:
+    - csv_file (str): The summary CSV.
+
+    Returns:
+    - str: The state file path ('<csv>.state.json').
+    """
+    return csv_file + '.state.json'
+
+
+def load_summary_state(csv_file, data_file):
+    """
+    Loads the export high-water mark for a CSV, if it still describes the current files.
+    The mark is ignored if the CSV was changed since the last export, if it was
+    written from a different data file, or if the data file shrank. A JSON array
+    file has to be exactly the same size, because it can't be appended to.
+
+    Parameters:
+    - csv_file (str): The summary CSV.
+    - data_file (str): The data file being exported.
+
+    Returns:
+    - dict: The state ('data_file', 'record_count', 'data_size', 'csv_size'), or None.
+    """
+    try:
+        with open(summary_state_path(csv_file), 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        csv_size = os.path.getsize(csv_file)
+        data_size = os.path.getsize(data_file)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if state.get('data_file') != os.path.abspath(data_file) or state.get('csv_size') != csv_size:
+        return None
+    if state.get('data_size', 0) > data_size:
+        return None
+    if not data_file.endswith('.jsonl') and state.get('data_size') != data_size:
+        return None
+    return state
+
+
+def save_summary_state(csv_file, data_file, record_count, data_size):
+    """
+    Records how far the data has been exported to a CSV.
+
+    Parameters:
+    - csv_file (str): The summary CSV.
+    - data_file (str): The data file that was exported.
+    - record_count (int): Number of records of the data file covered by the CSV.
+    - data_size (int): Number of bytes of the data file covered by the CSV.
+    """
+    path = summary_state_path(csv_file)
+    state = {
+        'data_file': os.path.abspath(data_file),
+        'record_count': record_count,
+        'data_size': data_size,
+        'csv_size': os.path.getsize(csv_file),
+    }
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(path + '.tmp', path)
+
+
+def summary_row(entry):
+    """
+    Builds one summary CSV row from an APOD record.
+
+    Parameters:
+    - entry (dict): The APOD record.
+
+    Returns:
+    - dict: The row, with the date in DD/MM/YYYY format.
+    """
+    return {
+        'date': format_date(entry.get('date')),
+        'title': entry.get('title'),
+        'media_type': entry.get('media_type'),
+        'url': entry.get('url')
+    }
+
+
+@stage('apod.summary_csv')
+def write_apod_summary_to_csv(dataset=None, data_file=None, csv_file='apod_summary.csv'):
+    """
+    Extracts date, title, media type, and URL from the APOD data and writes to 'apod_summary.csv'.
+    If the CSV file exists, new entries are appended. If the file does not exist, a new one is created.
+
+    After each export a high-water mark is saved next to the CSV ('<csv>.state.json').
+    The next run then only reads and formats the records added since then. For the
+    JSON Lines store it seeks straight to them. Without a usable mark, the run falls
+    back to skipping every date already in the CSV.
+
+    Parameters:
+    - dataset (ApodDataset): Records already loaded by read_apod_data. If None, the
+      records are streamed from data_file in constant memory.
+    - data_file (str): The data file to read when no dataset is given.
+    - csv_file (str): The summary CSV to append to.
+
+    Returns:
+    - bool: True if the CSV is up to date, False if it could not be written.
+    """
+    data_file = dataset.path if dataset is not None else resolve_data_file(data_file)
     file_exists = os.path.isfile(csv_file)
+    state = load_summary_state(csv_file, data_file) if file_exists else None
     try:
-        # Read existing dates to avoid duplicates
-        existing_dates = set()
-        if file_exists:
-            with open(csv_file, 'r', encoding='utf-8') as readfile:
-                reader = csv.DictReader(readfile)
-                for row in reader:
-                    existing_dates.add(row['date'])
-            print(f"Loaded existing dates from '{csv_file}'.")
+        if state is not None and (dataset is not None or data_file.endswith('.jsonl')):
+            # Only the records added since the last export need to be read
+            if dataset is not None:
+                rows = [summary_row(entry) for entry in dataset.records[state['record_count']:]]
+                data_size = dataset.size
+            else:
+                data_size = state['data_size']
+                rows = []
+                for _, data_size, entry in iter_jsonl_tail(data_file, state['data_size']):
+                    rows.append(summary_row(entry))
+            record_count = state['record_count'] + len(rows)
+            print(f"Resuming export to '{csv_file}' after {state['record_count']} records.")
         else:
-            print(f"'{csv_file}' not found. Creating a new one.")
+            # Read existing dates to avoid duplicates
+            existing_dates = set()
+            if file_exists:
+                with open(csv_file, 'r', encoding='utf-8') as readfile:
+                    reader = csv.DictReader(readfile)
+                    for row in reader:
+                        existing_dates.add(row['date'])
+                print(f"Loaded existing dates from '{csv_file}'.")
+            else:
+                print(f"'{csv_file}' not found. Creating a new one.")
+
+            if dataset is None:
+                data_size = os.path.getsize(data_file) if os.path.exists(data_file) else 0
+                dataset = stream_apod_records_safely(data_file)
+                if dataset is None:
+                    return False
+            else:
+                data_size = dataset.size
+            rows = []
+            record_count = 0
+            for entry in dataset:
+                record_count += 1
+                row = summary_row(entry)
+                if row['date'] not in existing_dates:
+                    rows.append(row)
 
         with open(csv_file, 'a', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['date', 'title', 'media_type', 'url']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            writer = csv.DictWriter(csvfile, fieldnames=SUMMARY_FIELDS)
             # If file does not exist, write header, else append new entries
             if not file_exists:
                 writer.writeheader()
                 print(f"Header written to '{csv_file}'.")
-            # Write entries
-            new_entries = 0
-            for entry in data_list:
-                date = format_date(entry.get('date'))
-                if date in existing_dates:
-                    continue  # Skip if date already exists
-                writer.writerow({
-                    'date': date,
-                    'title': entry.get('title'),
-                    'media_type': entry.get('media_type'),
-                    'url': entry.get('url')
-                })
-                new_entries += 1
-            if new_entries > 0:
-                print(f"Successfully appended {new_entries} new entries to '{csv_file}'.")
-            else:
-                print(f"No new entries were added to '{csv_file}'.")
+            # Write all new entries in one go
+            writer.writerows(rows)
+        save_summary_state(csv_file, data_file, record_count, data_size)
+        count('apod_summary_rows_written_total', len(rows))
+        if rows:
+            print(f"Successfully appended {len(rows)} new entries to '{csv_file}'.")
+        else:
+            print(f"No new entries were added to '{csv_file}'.")
+        return True
     except PermissionError:
         print(f"Error: Permission denied when writing to '{csv_file}'.")
     except Exception as e:
         print(f"An unexpected error occurred while writing to CSV: {e}")
+    return False
 
 
 if __name__ == "__main__":
+    # Timings and counters are only recorded when asked for (see instrumentation.py)
+    configure_from_env()
+
     # Read and load the data
     print("Reading APOD data...")
     data = read_apod_data()
@@ -179,10 +460,16 @@ if __name__ == "__main__":
     # Analyze the data
     if data:
         print("\nAnalyzing APOD data...")
-        analyze_apod_media()
+        analyze_apod_media(data)
 
         # Write summary to CSV
         print("\nWriting summary to CSV...")
-        write_apod_summary_to_csv()
+        write_apod_summary_to_csv(data)
+
+        # Write the columnar export too when the optional pyarrow package is installed
+        if importlib.util.find_spec('pyarrow') is not None:
+            print("\nWriting columnar export...")
+            with span('apod.columnar_export'):
+                export_apod_columnar(data)
     else:
         print("Data could not be loaded. Exiting program.")
@@ -6,18 +6,140 @@ from dotenv import load_dotenv  # To load environment variables from .env file
 import requests
 import datetime
 import time
-import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from apod_http_client import ApodClient
+from apod_index import load_date_index
+from apod_search import SEARCH_INDEX_DIR, update_search_index
+from apod_store import STORE_FILE, LEGACY_JSON_FILE, JsonlAppender, ensure_store, iter_jsonl_tail
+from instrumentation import configure_from_env, count, span, stage, verbose
 
 # Load the .env file to access environment variables
 load_dotenv()
 
-def get_apod_data(api_key, date):
+# API endpoint for NASA's APOD
+APOD_API_URL = 'https://api.nasa.gov/planetary/apod'
+
+# Client used when a caller doesn't pass its own, created on first use
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client():
+    """
+    Returns the shared module-level ApodClient, creating it on first use.
+
+    Returns:
+    - ApodClient: The shared client.
+    """
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = ApodClient()
+        return _default_client
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket used to pace requests to the APOD API.
+
+    Each request takes one token. Tokens refill at `rate` per second up to `capacity`,
+    so short bursts are allowed but the long-run request rate never exceeds `rate`.
+    The bucket also reads the API's quota headers and slows down when the hourly
+    quota is almost used up.
+
+    Parameters:
+    - rate (float): Tokens added per second (the sustained requests/sec limit).
+    - capacity (float): Maximum number of tokens the bucket can hold (the burst size).
+    - low_water (int): When 'X-RateLimit-Remaining' drops to this value or below, the
+      remaining quota is spread evenly over the rest of the quota window.
+    - quota_window (float): Length of the API quota window in seconds (one hour for api.nasa.gov).
+    """
+
+    def __init__(self, rate=5.0, capacity=None, low_water=10, quota_window=3600.0):
+        self.base_rate = float(rate)
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity else max(1.0, float(rate))
+        self.low_water = low_water
+        self.quota_window = quota_window
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        # Add the tokens earned since the last refill, capped at capacity
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def acquire(self):
+        """
+        Blocks until a token is available and then takes it.
+        """
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def update_from_headers(self, headers):
+        """
+        Adjusts the refill rate using the API's 'X-RateLimit-Remaining' header.
+
+        Parameters:
+        - headers (Mapping): The response headers returned by the API.
+        """
+        remaining = headers.get('X-RateLimit-Remaining')
+        if remaining is None:
+            return
+        try:
+            remaining = int(remaining)
+        except ValueError:
+            return
+        with self.lock:
+            self._refill()
+            if remaining <= self.low_water:
+                # Spread whatever is left over the quota window instead of burning it now
+                self.rate = min(self.base_rate, max(remaining, 1) / self.quota_window)
+                self.tokens = min(self.tokens, 1.0)
+            else:
+                self.rate = self.base_rate
+
+
+def extract_apod_fields(data):
+    """
+    Keeps only the fields we store from a single APOD API record.
+
+    Parameters:
+    - data (dict): One record as returned by the APOD API.
+
+    Returns:
+    - dict: The date, title, url, explanation and media_type of the record.
+    """
+    return {
+        'date': data.get('date'),
+        'title': data.get('title'),
+        'url': data.get('url'),
+        'explanation': data.get('explanation'),
+        'media_type': data.get('media_type')
+    }
+
+
+def get_apod_data(api_key, date, api_url=APOD_API_URL, rate_limiter=None, client=None, statuses=None):
     """
     Fetches Astronomy Picture of the Day (APOD) data for a specific date from NASA's APOD API.
 
     Parameters:
     - api_key (str): Your NASA API key.
     - date (str): The date for which to fetch the APOD data in 'DD/MM/YYYY' format.
+    - api_url (str): The APOD endpoint, overridable to point at a local stub server.
+    - rate_limiter (TokenBucket): Optional limiter to take a token from before each attempt.
+    - client (ApodClient): The HTTP client to send the request with (the shared default if None).
+    - statuses (dict): Optional dict that receives the HTTP status code of a failed
+      request, keyed by the 'YYYY-MM-DD' date (e.g. 404 for a day not published yet).
 
     Returns:
     - dict: A dictionary containing the APOD data for the specified date.
@@ -27,34 +149,27 @@ def get_apod_data(api_key, date):
         date_obj = datetime.datetime.strptime(date, '%d/%m/%Y')
         api_date = date_obj.strftime('%Y-%m-%d')
 
-        # API endpoint for NASA's APOD
-        url = 'https://api.nasa.gov/planetary/apod'
-
         # Parameters for the API request
         params = {
             'api_key': api_key,
             'date': api_date,
         }
 
-        # Send GET request to the API
-        response = requests.get(url, params=params)
+        # Send GET request to the API, retrying temporary failures
+        if client is None:
+            client = get_default_client()
+        response = client.get(api_url, params=params, rate_limiter=rate_limiter)
         response.raise_for_status()  # Raise exception for HTTP errors
 
         # Parse the JSON response
         data = response.json()
 
         # Extract the required fields
-        result = {
-            'date': data.get('date'),
-            'title': data.get('title'),
-            'url': data.get('url'),
-            'explanation': data.get('explanation'),
-            'media_type': data.get('media_type')
-        }
-
-        return result
+        return extract_apod_fields(data)
 
     except requests.exceptions.HTTPError as http_err:
+        if statuses is not None and http_err.response is not None:
+            statuses[api_date] = http_err.response.status_code
         print(f"HTTP error occurred for date {date}: {http_err}")
     except requests.exceptions.ConnectionError as conn_err:
         print(f"Connection error occurred for date {date}: {conn_err}")
@@ -63,74 +178,297 @@ def get_apod_data(api_key, date):
     except Exception as err:
         print(f"An unexpected error occurred for date {date}: {err}")
 
-def fetch_multiple_apod_data(api_key, start_date, end_date):
+def get_apod_range_data(api_key, start_date, end_date, api_url=APOD_API_URL, rate_limiter=None, client=None):
+    """
+    Fetches APOD data for every date between start_date and end_date (inclusive) in a
+    single request, using the API's 'start_date'/'end_date' range parameters.
+
+    Parameters:
+    - api_key (str): Your NASA API key.
+    - start_date (str): The first date of the range in 'DD/MM/YYYY' format.
+    - end_date (str): The last date of the range in 'DD/MM/YYYY' format.
+    - api_url (str): The APOD endpoint, overridable to point at a local stub server.
+    - rate_limiter (TokenBucket): Optional limiter to take a token from before each attempt.
+    - client (ApodClient): The HTTP client to send the request with (the shared default if None).
+
+    Returns:
+    - list: A list of APOD dictionaries, or None if the request failed.
+    """
+    try:
+        # Convert dates from DD/MM/YYYY to YYYY-MM-DD for the API
+        api_start = datetime.datetime.strptime(start_date, '%d/%m/%Y').strftime('%Y-%m-%d')
+        api_end = datetime.datetime.strptime(end_date, '%d/%m/%Y').strftime('%Y-%m-%d')
+
+        # Parameters for the API request
+        params = {
+            'api_key': api_key,
+            'start_date': api_start,
+            'end_date': api_end,
+        }
+
+        # Send GET request to the API, retrying temporary failures
+        if client is None:
+            client = get_default_client()
+        response = client.get(api_url, params=params, rate_limiter=rate_limiter)
+        response.raise_for_status()  # Raise exception for HTTP errors
+
+        # A range query answers with a JSON list of records
+        return [extract_apod_fields(item) for item in response.json()]
+
+    except requests.exceptions.HTTPError as http_err:
+        print(f"HTTP error occurred for range {start_date} to {end_date}: {http_err}")
+    except requests.exceptions.ConnectionError as conn_err:
+        print(f"Connection error occurred for range {start_date} to {end_date}: {conn_err}")
+    except requests.exceptions.Timeout as timeout_err:
+        print(f"Timeout error occurred for range {start_date} to {end_date}: {timeout_err}")
+    except Exception as err:
+        print(f"An unexpected error occurred for range {start_date} to {end_date}: {err}")
+
+def split_into_ranges(dates, chunk_days=100):
+    """
+    Groups dates into contiguous (start, end) ranges of at most chunk_days days each.
+
+    Parameters:
+    - dates (list): Sorted datetime objects, e.g. the dates missing from the data file.
+    - chunk_days (int): The maximum number of days in one range.
+
+    Returns:
+    - list: A list of (start, end) datetime tuples, both ends inclusive.
+    """
+    ranges = []
+    one_day = datetime.timedelta(days=1)
+    for day in dates:
+        # Extend the current range if this day directly follows it and there is room left
+        if ranges and day == ranges[-1][1] + one_day and (day - ranges[-1][0]).days < chunk_days:
+            ranges[-1] = (ranges[-1][0], day)
+        else:
+            ranges.append((day, day))
+    return ranges
+
+def valid_range_records(records, chunk_start, chunk_end):
     """
-    Fetches APOD data for a range of dates and saves it to 'apod_data.json'.
+    Keeps the records of a range response that have a valid date inside the range.
+
+    Parameters:
+    - records (list): The records returned for the range.
+    - chunk_start (datetime): The first date of the range.
+    - chunk_end (datetime): The last date of the range.
+
+    Returns:
+    - list: The usable records sorted by date, one per date. Dates left without a
+      record are fetched again one day at a time by the caller.
+    """
+    by_date = {}
+    for record in records:
+        try:
+            day = datetime.date.fromisoformat(record['date'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if chunk_start.date() <= day <= chunk_end.date():
+            by_date[day.isoformat()] = dict(record, date=day.isoformat())
+    if len(by_date) < len(records):
+        print(f"Warning: ignored {len(records) - len(by_date)} records without a valid date in the range "
+              f"{chunk_start.strftime('%d/%m/%Y')} to {chunk_end.strftime('%d/%m/%Y')}.")
+    return [by_date[date] for date in sorted(by_date)]
+
+@stage('apod.fetch')
+def fetch_multiple_apod_data(api_key, start_date, end_date, max_workers=8, requests_per_second=5.0,
+                             output_file=STORE_FILE, api_url=APOD_API_URL,
+                             use_range=True, chunk_days=100, client=None, search_index_dir=None,
+                             update_search=True, media_cache=None, dates=None, print_progress=None):
+    """
+    Fetches APOD data for a range of dates and appends it to the 'apod_data.jsonl' store.
+
+    Dates that are already in the store are skipped, using the store's date index
+    ('<store>.idx.npz') rather than a scan of every record. The missing dates are grouped into
+    contiguous ranges of at most chunk_days days, and each range is fetched with a single
+    'start_date'/'end_date' request. Only ranges whose request fails are retried one day
+    at a time. Requests run concurrently on a bounded thread pool, paced by a shared
+    TokenBucket. Each result is appended to the store as soon as it arrives (each range
+    in date order), and appends are fsynced in batches, so an interrupted run keeps
+    everything fetched so far. If the store doesn't exist yet, an 'apod_data.json' next
+    to it is migrated into it first. Afterwards the new records are added to the
+    full-text search index and, if a media cache is given, their images are downloaded into it.
 
     Parameters:
     - api_key (str): Your NASA API key.
     - start_date (str): The start date in 'DD/MM/YYYY' format.
     - end_date (str): The end date in 'DD/MM/YYYY' format.
+    - max_workers (int): Maximum number of requests in flight at once.
+    - requests_per_second (float): Sustained request rate allowed by the rate limiter.
+    - output_file (str): The JSON Lines store to append the results to.
+    - api_url (str): The APOD endpoint, overridable to point at a local stub server.
+    - use_range (bool): Fetch missing dates with range requests; False fetches one day per request.
+    - chunk_days (int): The maximum number of days in one range request.
+    - client (ApodClient): The HTTP client to use. By default a new client with one pooled
+      connection per worker is created for the run.
+    - search_index_dir (str): The search index to update (defaults to 'apod_search_index'
+      next to the store).
+    - update_search (bool): Set to False to skip updating the search index.
+    - media_cache (MediaCache): Optional media cache to download the new records' images into.
+    - dates (iterable): Fetch exactly these dates (datetime.date objects) instead of the
+      start_date to end_date range; start_date and end_date are then ignored.
+    - print_progress (bool): Print a line for every range or date as it is added. Defaults
+      to the instrumentation's verbose setting (APOD_VERBOSE); the summary line is always printed.
+
+    Returns:
+    - dict: Run statistics (dates requested, fetched, failed, HTTP requests sent, elapsed
+      seconds, requests/sec, the client's retry/latency counters, the media cache counts and
+      the 'YYYY-MM-DD' dates that failed, with those that got a 404 also listed in
+      'not_found_dates'), or None if the dates could not be parsed.
     """
     # Convert string dates from DD/MM/YYYY to datetime objects
     #Could have read the documentation wrong but i don't like the format of the dates
-    try:
-        start_dt = datetime.datetime.strptime(start_date, '%d/%m/%Y')
-        end_dt = datetime.datetime.strptime(end_date, '%d/%m/%Y')
-    except ValueError as ve:
-        print(f"Date format error: {ve}")
-        return
-
-    # Calculate the number of days between start and end dates
-    delta = datetime.timedelta(days=1)
-    current_date = start_dt
-
-    # Initialize a list to hold all the APOD data
-    data_list = []
-
-    # Check if 'apod_data.json' already exists
-    if os.path.exists('apod_data.json'):
-        # Load existing data to avoid duplicates
+    if dates is None:
         try:
-            with open('apod_data.json', 'r') as f:
-                data_list = json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
-            # If the file is empty or not found, start with an empty list
-            data_list = []
+            start_dt = datetime.datetime.strptime(start_date, '%d/%m/%Y')
+            end_dt = datetime.datetime.strptime(end_date, '%d/%m/%Y')
+        except ValueError as ve:
+            print(f"Date format error: {ve}")
+            return
+
+    # Move any data from the old single-file format into the store (first run only)
+    ensure_store(output_file, os.path.join(os.path.dirname(output_file), LEGACY_JSON_FILE))
+
+    # Use the store's date index to work out which dates in the range still need
+    # fetching, without reading the records themselves
+    date_index = load_date_index(output_file)
+    if dates is None:
+        wanted = (end_dt - start_dt).days + 1
+        missing = date_index.missing_dates(start_dt, end_dt)
     else:
-        data_list = []
+        wanted_dates = sorted(set(dates))
+        wanted = len(wanted_dates)
+        missing = [day for day in wanted_dates if day not in date_index]
+    missing_dates = [datetime.datetime.combine(day, datetime.time()) for day in missing]
+    skipped = wanted - len(missing_dates)
+    count('apod_dates_skipped_total', skipped)
+    if skipped > 0:
+        print(f"Data for {skipped} dates already exists. Skipping them.")
+    if print_progress is None:
+        print_progress = verbose()
+
+    rate_limiter = TokenBucket(rate=requests_per_second, capacity=max_workers)
+    own_client = client is None
+    if own_client:
+        client = ApodClient(pool_maxsize=max_workers)
+    fetched = 0
+    failed_dates = []
+    # HTTP status of each failed per-day request, keyed by date
+    failed_statuses = {}
+    http_requests = 0
+    start_time = time.perf_counter()
+    store = JsonlAppender(output_file)
+    # Where this run's records start in the store
+    store_start = store.f.tell()
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Pass 1: one request per chunk of missing dates
+            single_dates = [] if use_range else missing_dates
+            if use_range:
+                futures = {
+                    executor.submit(get_apod_range_data, api_key, chunk_start.strftime('%d/%m/%Y'),
+                                    chunk_end.strftime('%d/%m/%Y'), api_url, rate_limiter, client): (chunk_start, chunk_end)
+                    for chunk_start, chunk_end in split_into_ranges(missing_dates, chunk_days)
+                }
+                http_requests += len(futures)
+                for future in as_completed(futures):
+                    chunk_start, chunk_end = futures[future]
+                    records = future.result()
+                    if records is None:
+                        # Fall back to per-day requests for this chunk only
+                        single_dates.extend(day for day in missing_dates if chunk_start <= day <= chunk_end)
+                        continue
+                    records = valid_range_records(records, chunk_start, chunk_end)
+                    for record in records:
+                        date_index.add(record['date'], store.append(record))
+                    fetched += len(records)
+                    # Dates the range response left out get a per-day request, so they are retried
+                    # or end up in failed_dates instead of silently going missing
+                    returned = {record['date'] for record in records}
+                    single_dates.extend(day for day in missing_dates if chunk_start <= day <= chunk_end
+                                        and day.strftime('%Y-%m-%d') not in returned)
+                    count('apod_records_fetched_total', len(records), mode='range')
+                    if print_progress:
+                        print(f"Data added for {chunk_start.strftime('%d/%m/%Y')} to "
+                              f"{chunk_end.strftime('%d/%m/%Y')} ({len(records)} entries)")
 
-    # Keep track of dates we already have data for
-    existing_dates = set(item['date'] for item in data_list)
+            # Pass 2: one request per date that still needs fetching
+            futures = {
+                executor.submit(get_apod_data, api_key, day.strftime('%d/%m/%Y'), api_url, rate_limiter, client,
+                                statuses=failed_statuses): day
+                for day in single_dates
+            }
+            http_requests += len(futures)
+            for future in as_completed(futures):
+                day = futures[future]
+                data = future.result()
+                # A response without a valid date for the day asked for counts as a failure
+                records = valid_range_records([data], day, day) if data else []
+                if records:
+                    date_index.add(records[0]['date'], store.append(records[0]))
+                    fetched += 1
+                    count('apod_records_fetched_total', mode='day')
+                    if print_progress:
+                        print(f"Data added for {day.strftime('%d/%m/%Y')}")
+                else:
+                    failed_dates.append(day.strftime('%Y-%m-%d'))
+                    count('apod_dates_failed_total')
+    finally:
+        if own_client:
+            client.close()
+        # Sync whatever was fetched, even if the run was interrupted, then update the index
+        try:
+            store.close()
+            count('apod_records_written_total', fetched)
+            date_index.store_size = os.path.getsize(output_file)
+            date_index.save()
+        except IOError as e:
+            print(f"Error writing to file: {e}")
 
-    # Loop through each date in the range
-    while current_date <= end_dt:
-        # Format the date as DD/MM/YYYY for display and input to get_apod_data
-        date_str = current_date.strftime('%d/%m/%Y')
+    elapsed = time.perf_counter() - start_time
 
-        # Convert date to YYYY-MM-DD to check against existing data
-        api_date_str = current_date.strftime('%Y-%m-%d')
+    # Index only the records appended since the search index was last updated
+    if update_search and fetched:
+        if search_index_dir is None:
+            search_index_dir = os.path.join(os.path.dirname(output_file), SEARCH_INDEX_DIR)
+        try:
+            with span('apod.search_index'):
+                update_search_index(output_file, search_index_dir)
+        except Exception as e:
+            print(f"Error updating the search index: {e}")
 
-        if api_date_str in existing_dates:
-            print(f"Data for {date_str} already exists. Skipping to next date.")
-        else:
-            # Fetch data for the current date
-            data = get_apod_data(api_key, date_str)
-            if data:
-                data_list.append(data)
-                # Save the updated data list to the JSON file
-                print(f"Data added for {date_str}")
-                try:
-                    with open('apod_data.json', 'w') as f:
-                        json.dump(data_list, f, indent=4)
-                except IOError as e:
-                    print(f"Error writing to file: {e}")
-        # Respect the API rate limit (barely)
-        time.sleep(0.1)
-        # Move to the next date
-        current_date += delta
+    # Download the images of the records appended by this run
+    media_stats = None
+    if media_cache is not None and fetched:
+        new_records = (record for _, _, record in iter_jsonl_tail(output_file, store_start))
+        with span('apod.media_cache'):
+            media_stats = media_cache.cache_records(new_records, max_workers=max_workers)
+        print(f"Media cache: {media_stats['downloaded']} downloaded, {media_stats['not-modified']} "
+              f"not modified, {media_stats['failed']} failed, {media_stats['videos']} videos skipped.")
+
+    requests_per_sec = http_requests / elapsed if elapsed > 0 else 0.0
+    client_stats = client.stats()
+    print(f"Fetched {fetched} of {len(missing_dates)} dates with {http_requests} requests in "
+          f"{elapsed:.2f}s ({requests_per_sec:.1f} requests/sec, {len(failed_dates)} failed, "
+          f"{client_stats['retries']} retries).")
+    return {
+        'requested': len(missing_dates),
+        'fetched': fetched,
+        'failed': len(failed_dates),
+        'http_requests': http_requests,
+        'elapsed': elapsed,
+        'requests_per_second': requests_per_sec,
+        'client': client_stats,
+        'media': media_stats,
+        'failed_dates': sorted(failed_dates),
+        'not_found_dates': sorted(date for date in failed_dates if failed_statuses.get(date) == 404),
+    }
 
 if __name__ == "__main__":
+    # Timings and counters are only recorded when asked for (see instrumentation.py)
+    configure_from_env()
+
     # Retrieve the API key from environment variables
     api_key = os.getenv('API_KEY')
 
@@ -0,0 +1,183 @@
+# apod_http_client.py
+
+# A reusable HTTP client for the APOD API: pooled keep-alive connections,
+# per-request timeouts and retries with exponential backoff and jitter.
+
+import email.utils
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import count, observe
+
+# Status codes worth retrying: rate limited, or a temporary server-side problem
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value):
+    """
+    Converts a 'Retry-After' header into a number of seconds to wait.
+
+    Parameters:
+    - value (str): The header value, either a number of seconds or an HTTP date.
+
+    Returns:
+    - float: Seconds to wait, or None if the header is missing or unreadable.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class ApodClient:
+    """
+    Sends GET requests over a shared requests.Session with connection pooling,
+    timeouts and retries. One client can be shared by every worker thread.
+
+    Parameters:
+    - timeout (float or tuple): Per-request timeout in seconds, or a (connect, read) tuple.
+    - max_retries (int): How many times a failed request is retried before giving up.
+    - backoff_factor (float): Base delay in seconds; attempt n waits up to backoff_factor * 2**n.
+    - max_backoff (float): Upper limit on a single wait, including waits asked for by 'Retry-After'.
+    - pool_maxsize (int): Number of keep-alive connections kept per host.
+    - transport (requests.adapters.BaseAdapter): Optional adapter mounted for http:// and
+      https:// instead of the pooled HTTPAdapter, e.g. a fake transport for tests.
+    - sleep (callable): Function used to wait between attempts (time.sleep by default).
+    """
+
+    def __init__(self, timeout=(3.05, 30), max_retries=4, backoff_factor=0.5, max_backoff=30.0,
+                 pool_maxsize=16, transport=None, sleep=time.sleep):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.sleep = sleep
+
+        # Keep-alive connection pool shared by all requests made through this client
+        self.session = requests.Session()
+        adapter = transport if transport is not None else HTTPAdapter(
+            pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # Counters, guarded by a lock because worker threads share the client
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.retry_count = 0
+        self.failure_count = 0
+        self.latencies = deque(maxlen=10000)
+
+    def backoff_delay(self, attempt, response=None):
+        """
+        Works out how long to wait before the next attempt.
+
+        Parameters:
+        - attempt (int): The number of the attempt that just failed, starting at 0.
+        - response (requests.Response): The failed response, if there was one.
+
+        Returns:
+        - float: Seconds to wait.
+        """
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                return min(retry_after, self.max_backoff)
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * (2 ** attempt)))
+
+    def get(self, url, params=None, rate_limiter=None, headers=None):
+        """
+        Sends a GET request, retrying on 429/5xx responses, connection errors and timeouts.
+
+        Parameters:
+        - url (str): The URL to request.
+        - params (dict): Query string parameters.
+        - rate_limiter (TokenBucket): Optional limiter to take a token from before every attempt.
+        - headers (dict): Extra request headers, e.g. 'If-None-Match' for revalidation.
+
+        Returns:
+        - requests.Response: The final response. It may still be an error response once
+          the retries run out, so callers should call raise_for_status().
+        """
+        attempt = 0
+        while True:
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._record(time.perf_counter() - start, type(e).__name__)
+                if attempt >= self.max_retries:
+                    with self.lock:
+                        self.failure_count += 1
+                    raise
+                self._retry_wait(attempt)
+                attempt += 1
+                continue
+
+            self._record(time.perf_counter() - start, response.status_code)
+            if rate_limiter is not None:
+                rate_limiter.update_from_headers(response.headers)
+            if response.status_code not in RETRY_STATUS_CODES:
+                return response
+            if attempt >= self.max_retries:
+                with self.lock:
+                    self.failure_count += 1
+                return response
+            self._retry_wait(attempt, response)
+            attempt += 1
+
+    def _record(self, latency, outcome):
+        with self.lock:
+            self.request_count += 1
+            self.latencies.append(latency)
+        # Also reported to the instrumentation registry, when it is enabled
+        observe('apod_http_request_duration_seconds', latency)
+        count('apod_http_request_outcomes_total', outcome=outcome)
+
+    def _retry_wait(self, attempt, response=None):
+        with self.lock:
+            self.retry_count += 1
+        count('apod_http_retries_total')
+        self.sleep(self.backoff_delay(attempt, response))
+
+    def stats(self):
+        """
+        Summarises the client's counters.
+
+        Returns:
+        - dict: Request, retry and failure counts plus mean, median, 95th percentile
+          and maximum latency in seconds over the most recent requests.
+        """
+        with self.lock:
+            latencies = sorted(self.latencies)
+            stats = {
+                'requests': self.request_count,
+                'retries': self.retry_count,
+                'failures': self.failure_count,
+            }
+        if latencies:
+            stats['latency_mean'] = sum(latencies) / len(latencies)
+            stats['latency_p50'] = latencies[len(latencies) // 2]
+            stats['latency_p95'] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            stats['latency_max'] = latencies[-1]
+        return stats
+
+    def close(self):
+        """
+        Closes the pooled connections.
+        """
+        self.session.close()
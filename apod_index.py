@@ -0,0 +1,301 @@
+# apod_index.py
+
+# A persistent date index for the JSON Lines store.
+# The index is a sorted array of date ordinals with the byte offset of each
+# record's line in the store, so point lookups and range slices are binary
+# searches plus a seek, and gaps in a range are found without reading any records.
+
+import datetime
+import json
+import os
+
+import numpy as np
+
+from apod_store import STORE_FILE, iter_jsonl_tail
+
+
+def index_path_for(store_path):
+    """
+    Returns the sidecar index file used for a store.
+
+    Parameters:
+    - store_path (str): The JSON Lines store.
+
+    Returns:
+    - str: The index file path ('<store>.idx.npz').
+    """
+    return store_path + '.idx.npz'
+
+
+def to_ordinal(value):
+    """
+    Converts a date given as a 'YYYY-MM-DD' string, datetime or date into its ordinal.
+
+    Parameters:
+    - value (str, datetime.date or datetime.datetime): The date to convert.
+
+    Returns:
+    - int: The proleptic Gregorian ordinal of the date.
+    """
+    if isinstance(value, str):
+        return datetime.date.fromisoformat(value).toordinal()
+    if isinstance(value, datetime.datetime):
+        return value.date().toordinal()
+    return value.toordinal()
+
+
+class DateIndex:
+    """
+    Sorted date ordinals and the matching byte offsets of each record in the store.
+    If the store holds the same date more than once, the last appended record wins.
+
+    Parameters:
+    - store_path (str): The JSON Lines store the offsets point into.
+    - ordinals (ndarray): Sorted int32 array of date ordinals.
+    - offsets (ndarray): int64 array of line offsets, matching `ordinals`.
+    - store_size (int): How many bytes of the store have been indexed.
+    """
+
+    def __init__(self, store_path, ordinals=None, offsets=None, store_size=0):
+        self.store_path = store_path
+        self.ordinals = ordinals if ordinals is not None else np.empty(0, dtype=np.int32)
+        self.offsets = offsets if offsets is not None else np.empty(0, dtype=np.int64)
+        self.store_size = store_size
+        # Single adds are buffered and merged in one sort before the next read
+        self.pending_dates = []
+        self.pending_offsets = []
+
+    def __len__(self):
+        self.merge_pending()
+        return len(self.ordinals)
+
+    def __contains__(self, value):
+        self.merge_pending()
+        ordinal = to_ordinal(value)
+        position = np.searchsorted(self.ordinals, ordinal)
+        return position < len(self.ordinals) and self.ordinals[position] == ordinal
+
+    def add_many(self, dates, offsets):
+        """
+        Adds records to the index, keeping it sorted.
+
+        Parameters:
+        - dates (list): Dates of the new records ('YYYY-MM-DD' strings or date objects).
+        - offsets (list): Byte offsets of the new records' lines, matching `dates`.
+        """
+        if self.pending_dates:
+            dates = self.pending_dates + list(dates)
+            offsets = self.pending_offsets + list(offsets)
+            self.pending_dates = []
+            self.pending_offsets = []
+        if not len(dates):
+            return
+        new_ordinals = np.array([to_ordinal(d) for d in dates], dtype=np.int32)
+        new_offsets = np.array(offsets, dtype=np.int64)
+        ordinals = np.concatenate((self.ordinals, new_ordinals))
+        all_offsets = np.concatenate((self.offsets, new_offsets))
+        # Stable sort by date, then keep the last occurrence of each date (the newest append)
+        order = np.argsort(ordinals, kind='stable')
+        ordinals = ordinals[order]
+        all_offsets = all_offsets[order]
+        keep = np.append(ordinals[1:] != ordinals[:-1], True)
+        self.ordinals = ordinals[keep]
+        self.offsets = all_offsets[keep]
+
+    def add(self, date, offset):
+        """
+        Adds one record to the index. The record is buffered and merged into the
+        sorted arrays on the next lookup or save, so many adds cost a single sort.
+
+        Parameters:
+        - date (str or datetime.date): The record's date.
+        - offset (int): Byte offset of the record's line in the store.
+        """
+        self.pending_dates.append(date)
+        self.pending_offsets.append(offset)
+
+    def merge_pending(self):
+        """
+        Merges buffered adds into the sorted arrays.
+        """
+        if self.pending_dates:
+            self.add_many([], [])
+
+    def catch_up(self):
+        """
+        Indexes any records appended to the store since the index was last updated.
+        A half-written last line is left for a later call, and records without a
+        valid date are skipped with a warning.
+
+        Returns:
+        - int: The number of records added to the index.
+        """
+        if not os.path.exists(self.store_path):
+            return 0
+        dates = []
+        offsets = []
+        position = self.store_size
+        for start, position, record in iter_jsonl_tail(self.store_path, self.store_size):
+            date = record.get('date') if isinstance(record, dict) else None
+            if not date:
+                continue
+            try:
+                dates.append(datetime.date.fromisoformat(date))
+            except (TypeError, ValueError):
+                print(f"Warning: skipping the record at byte {start} of '{self.store_path}' "
+                      f"with an invalid date {date!r}.")
+                continue
+            offsets.append(start)
+        self.add_many(dates, offsets)
+        self.store_size = position
+        return len(dates)
+
+    def offset_of(self, value):
+        """
+        Finds the byte offset of the record for a date.
+
+        Parameters:
+        - value (str or datetime.date): The date to look up.
+
+        Returns:
+        - int: The offset, or None if the date isn't in the store.
+        """
+        self.merge_pending()
+        ordinal = to_ordinal(value)
+        position = np.searchsorted(self.ordinals, ordinal)
+        if position < len(self.ordinals) and self.ordinals[position] == ordinal:
+            return int(self.offsets[position])
+        return None
+
+    def range_offsets(self, start, end):
+        """
+        Finds the offsets of all records between two dates (inclusive), in date order.
+
+        Parameters:
+        - start (str or datetime.date): The first date of the range.
+        - end (str or datetime.date): The last date of the range.
+
+        Returns:
+        - ndarray: The matching byte offsets.
+        """
+        self.merge_pending()
+        low = np.searchsorted(self.ordinals, to_ordinal(start), side='left')
+        high = np.searchsorted(self.ordinals, to_ordinal(end), side='right')
+        return self.offsets[low:high]
+
+    def missing_dates(self, start, end):
+        """
+        Finds the dates in a range that have no record in the store.
+
+        Parameters:
+        - start (str or datetime.date): The first date of the range.
+        - end (str or datetime.date): The last date of the range.
+
+        Returns:
+        - list: datetime.date objects for each missing date, in order.
+        """
+        first = to_ordinal(start)
+        last = to_ordinal(end)
+        if last < first:
+            return []
+        self.merge_pending()
+        low = np.searchsorted(self.ordinals, first, side='left')
+        high = np.searchsorted(self.ordinals, last, side='right')
+        wanted = np.arange(first, last + 1, dtype=np.int32)
+        missing = wanted[~np.isin(wanted, self.ordinals[low:high], assume_unique=True)]
+        return [datetime.date.fromordinal(int(ordinal)) for ordinal in missing]
+
+    def read_records(self, offsets):
+        """
+        Reads the records at the given offsets from the store.
+
+        Parameters:
+        - offsets (iterable): Byte offsets of record lines.
+
+        Returns:
+        - list: The records, in the same order as `offsets`.
+        """
+        records = []
+        with open(self.store_path, 'rb') as f:
+            for offset in offsets:
+                f.seek(int(offset))
+                records.append(json.loads(f.readline()))
+        return records
+
+    def lookup(self, value):
+        """
+        Reads the record for a single date.
+
+        Parameters:
+        - value (str or datetime.date): The date to look up.
+
+        Returns:
+        - dict: The APOD record, or None if the date isn't in the store.
+        """
+        offset = self.offset_of(value)
+        if offset is None:
+            return None
+        return self.read_records([offset])[0]
+
+    def lookup_range(self, start, end):
+        """
+        Reads every record between two dates (inclusive), in date order.
+
+        Parameters:
+        - start (str or datetime.date): The first date of the range.
+        - end (str or datetime.date): The last date of the range.
+
+        Returns:
+        - list: The APOD records in the range.
+        """
+        return self.read_records(self.range_offsets(start, end))
+
+    def save(self, path=None):
+        """
+        Writes the index next to the store. The file is written to a temporary
+        name and renamed into place, so readers never see a half-written index.
+
+        Parameters:
+        - path (str): Where to write the index (defaults to index_path_for(store_path)).
+        """
+        self.merge_pending()
+        path = path or index_path_for(self.store_path)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            np.savez(f, ordinals=self.ordinals, offsets=self.offsets,
+                     store_size=np.array(self.store_size, dtype=np.int64))
+        os.replace(temp_path, path)
+
+
+def load_date_index(store_path=STORE_FILE, save=True):
+    """
+    Loads the date index for a store and brings it up to date with any records
+    appended since it was saved. The index is rebuilt from scratch if it is
+    missing, unreadable or doesn't match the store (e.g. the store was replaced).
+
+    Parameters:
+    - store_path (str): The JSON Lines store.
+    - save (bool): Write the index back to disk if it had to be updated.
+
+    Returns:
+    - DateIndex: The up-to-date index.
+    """
+    index = None
+    path = index_path_for(store_path)
+    store_size = os.path.getsize(store_path) if os.path.exists(store_path) else 0
+    if os.path.exists(path):
+        try:
+            with np.load(path) as saved:
+                index = DateIndex(store_path, saved['ordinals'], saved['offsets'], int(saved['store_size']))
+        except (OSError, ValueError, KeyError):
+            index = None
+    if index is not None and index.store_size > store_size:
+        # The store is smaller than what was indexed, so it isn't the same file any more
+        index = None
+    if index is None:
+        index = DateIndex(store_path)
+
+    if index.catch_up() or not os.path.exists(path):
+        if save and os.path.exists(store_path):
+            index.save()
+    return index
@@ -0,0 +1,329 @@
+# apod_media_cache.py
+
+# A local on-disk cache of APOD images and their thumbnails.
+# Files are stored under the SHA-256 of their content, so the same image linked
+# from several URLs is only kept once. Cached URLs are revalidated with
+# ETag/Last-Modified, and the least recently used files are evicted once the
+# cache grows past its size limit. Video entries are recorded but not downloaded.
+
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import requests
+
+from apod_http_client import ApodClient
+
+# Where the cache lives by default, and its default size limit
+MEDIA_CACHE_DIR = 'apod_media_cache'
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+# Longest side of generated thumbnails, in pixels
+THUMBNAIL_SIZE = 256
+
+
+def make_thumbnail(source, destination, size=THUMBNAIL_SIZE):
+    """
+    Writes a JPEG thumbnail of an image. Runs in a worker process.
+
+    Parameters:
+    - source (str): The cached image file.
+    - destination (str): The thumbnail file to write.
+    - size (int): Longest side of the thumbnail in pixels.
+
+    Returns:
+    - str: The destination path, or None if the image could not be read.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    try:
+        with Image.open(source) as image:
+            image.thumbnail((size, size))
+            image.convert('RGB').save(destination + '.tmp', 'JPEG', quality=85)
+        os.replace(destination + '.tmp', destination)
+        return destination
+    except (OSError, ValueError):
+        return None
+
+
+class MediaCache:
+    """
+    A content-addressed media cache with a JSON manifest.
+
+    Layout:
+    - '<directory>/objects/<first 2 hex digits>/<sha256><extension>': downloaded files.
+    - '<directory>/thumbnails/<sha256>.jpg': thumbnails.
+    - '<directory>/manifest.json': per-URL entries (media type, date, sha256, size,
+      ETag, Last-Modified and last access time). Videos only get a media type and date.
+
+    Parameters:
+    - directory (str): The cache directory.
+    - max_bytes (int): Size limit for cached files; least recently used ones are evicted past it.
+    - client (ApodClient): HTTP client used for downloads (a new one if None).
+    """
+
+    def __init__(self, directory=MEDIA_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, client=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.client = client or ApodClient()
+        self.lock = threading.Lock()
+        self.manifest_path = os.path.join(directory, 'manifest.json')
+        self.entries = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def save(self):
+        """
+        Writes the manifest atomically.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with self.lock:
+            data = json.dumps(self.entries, indent=1)
+        with open(self.manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(self.manifest_path + '.tmp', self.manifest_path)
+
+    def object_path(self, sha256, extension=''):
+        """
+        Returns where a file with the given hash is stored.
+        """
+        return os.path.join(self.directory, 'objects', sha256[:2], sha256 + extension)
+
+    def stored_object_paths(self, sha256):
+        """
+        Lists the files stored for a content hash, whatever their extension.
+        """
+        directory = os.path.dirname(self.object_path(sha256))
+        if not os.path.isdir(directory):
+            return []
+        return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                if os.path.splitext(name)[0] == sha256 and not name.endswith('.tmp')]
+
+    def thumbnail_path(self, sha256):
+        """
+        Returns where the thumbnail of a file with the given hash is stored.
+        """
+        return os.path.join(self.directory, 'thumbnails', sha256 + '.jpg')
+
+    def path_for(self, url):
+        """
+        Looks up the cached file for a URL and marks it as recently used.
+
+        Parameters:
+        - url (str): The media URL.
+
+        Returns:
+        - str: The cached file path, or None if the URL isn't cached.
+        """
+        with self.lock:
+            entry = self.entries.get(url)
+            if not entry or 'sha256' not in entry:
+                return None
+            entry['last_access'] = time.time()
+            path = self.object_path(entry['sha256'], entry.get('extension', ''))
+        return path if os.path.exists(path) else None
+
+    def record_video(self, url, date=None):
+        """
+        Records a video entry without downloading it.
+        """
+        with self.lock:
+            self.entries[url] = {'media_type': 'video', 'date': date, 'skipped': True}
+
+    def fetch(self, url, date=None):
+        """
+        Downloads a URL into the cache, or revalidates it if it is already cached.
+
+        Parameters:
+        - url (str): The image URL.
+        - date (str): The APOD date the image belongs to, kept in the manifest.
+
+        Returns:
+        - str: 'downloaded', 'not-modified' or 'failed'.
+        """
+        with self.lock:
+            entry = dict(self.entries.get(url) or {})
+        headers = {}
+        cached = entry.get('sha256') and os.path.exists(self.object_path(entry['sha256'], entry.get('extension', '')))
+        if cached:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            response = self.client.get(url, headers=headers)
+            if response.status_code == 304 and headers:
+                with self.lock:
+                    # evict() may have removed the entry (and its file) while the request was in flight
+                    current = self.entries.get(url)
+                    if current is not None:
+                        current['last_access'] = time.time()
+                if current is not None:
+                    return 'not-modified'
+                # Ask again without the conditional headers, so the file is downloaded
+                response = self.client.get(url)
+            if response.status_code == 304:
+                # Nothing cached to fall back on, and a 304 has no body to store
+                print(f"Error downloading {url}: 304 Not Modified without a cached copy")
+                return 'failed'
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            print(f"Error downloading {url}: {e}")
+            return 'failed'
+
+        content = response.content
+        sha256 = hashlib.sha256(content).hexdigest()
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip()
+        extension = os.path.splitext(url.split('?')[0])[1].lower() or mimetypes.guess_extension(content_type) or ''
+        # Content already stored under another extension (e.g. '.jpeg' for a '.jpg' URL)
+        # is reused, so each hash has a single file
+        stored = self.stored_object_paths(sha256)
+        if stored:
+            extension = os.path.splitext(stored[0])[1]
+        path = self.object_path(sha256, extension)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Unique temporary name, since two URLs can share the same content
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(content)
+            os.replace(temp_path, path)
+
+        with self.lock:
+            self.entries[url] = {
+                'media_type': 'image',
+                'date': date,
+                'sha256': sha256,
+                'extension': extension,
+                'size': len(content),
+                'content_type': content_type,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'last_access': time.time(),
+            }
+        return 'downloaded'
+
+    def cache_records(self, records, max_workers=8, thumbnails=True, thumbnail_workers=None):
+        """
+        Downloads (or revalidates) the images of APOD records concurrently,
+        records video entries, generates missing thumbnails in a process pool and
+        evicts old files if the cache is over its size limit.
+
+        Parameters:
+        - records (iterable): APOD records.
+        - max_workers (int): Number of concurrent downloads.
+        - thumbnails (bool): Generate thumbnails for newly downloaded images.
+        - thumbnail_workers (int): Number of thumbnail processes (defaults to the CPU count).
+
+        Returns:
+        - dict: Counts of 'downloaded', 'not-modified', 'failed' and 'videos', plus
+          'thumbnails' generated and 'evicted' files.
+        """
+        counts = {'downloaded': 0, 'not-modified': 0, 'failed': 0, 'videos': 0, 'thumbnails': 0, 'evicted': 0}
+        images = {}
+        for record in records:
+            url = record.get('url')
+            if not url:
+                continue
+            if record.get('media_type') == 'video':
+                self.record_video(url, record.get('date'))
+                counts['videos'] += 1
+            elif record.get('media_type') == 'image':
+                images[url] = record.get('date')
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(self.fetch, url, date) for url, date in images.items()]
+            for future in as_completed(futures):
+                counts[future.result()] += 1
+
+        if thumbnails:
+            counts['thumbnails'] = self.make_thumbnails(images, thumbnail_workers)
+        counts['evicted'] = self.evict()
+        self.save()
+        return counts
+
+    def make_thumbnails(self, urls=None, max_workers=None):
+        """
+        Generates missing thumbnails in a pool of worker processes.
+
+        Parameters:
+        - urls (iterable): Only make thumbnails for these URLs; None means every cached image.
+        - max_workers (int): Number of worker processes (defaults to the CPU count).
+
+        Returns:
+        - int: The number of thumbnails generated.
+        """
+        jobs = {}
+        with self.lock:
+            for url in (self.entries if urls is None else urls):
+                entry = self.entries.get(url) or {}
+                if 'sha256' not in entry:
+                    continue
+                destination = self.thumbnail_path(entry['sha256'])
+                if not os.path.exists(destination):
+                    jobs[destination] = self.object_path(entry['sha256'], entry.get('extension', ''))
+        if not jobs:
+            return 0
+
+        os.makedirs(os.path.join(self.directory, 'thumbnails'), exist_ok=True)
+        made = 0
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(make_thumbnail, source, destination) for destination, source in jobs.items()]
+            for future in as_completed(futures):
+                if future.result():
+                    made += 1
+        return made
+
+    def total_size(self):
+        """
+        Returns the total size in bytes of the distinct cached files.
+        """
+        with self.lock:
+            sizes = {entry['sha256']: entry.get('size', 0) for entry in self.entries.values() if 'sha256' in entry}
+        return sum(sizes.values())
+
+    def evict(self, max_bytes=None):
+        """
+        Deletes the least recently used files (and their thumbnails) until the
+        cache is within its size limit.
+
+        Parameters:
+        - max_bytes (int): Size limit to enforce (defaults to the cache's own limit).
+
+        Returns:
+        - int: The number of files deleted.
+        """
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        with self.lock:
+            # A file is as recent as the most recent URL pointing at it
+            files = {}
+            for url, entry in self.entries.items():
+                if 'sha256' not in entry:
+                    continue
+                info = files.setdefault(entry['sha256'], {'size': entry.get('size', 0), 'last_access': 0,
+                                                          'extension': entry.get('extension', ''), 'urls': []})
+                info['last_access'] = max(info['last_access'], entry.get('last_access', 0))
+                info['urls'].append(url)
+
+            total = sum(info['size'] for info in files.values())
+            deleted = 0
+            for sha256, info in sorted(files.items(), key=lambda item: item[1]['last_access']):
+                if total <= limit:
+                    break
+                # Every copy of the content goes, even one left under another extension
+                for path in self.stored_object_paths(sha256) + [self.thumbnail_path(sha256)]:
+                    if os.path.exists(path):
+                        os.remove(path)
+                for url in info['urls']:
+                    del self.entries[url]
+                total -= info['size']
+                deleted += 1
+        return deleted
@@ -0,0 +1,512 @@
+# apod_search.py
+
+# Full-text search over APOD titles and explanations.
+# The index is an inverted index split into segments. Each segment is a set of
+# NumPy arrays and a sorted term list that are memory-mapped when queried, so
+# starting a query doesn't load any explanations or postings into memory.
+# New records from the store are added as a new segment, and small segments are
+# merged once there are too many of them.
+
+import argparse
+import datetime
+import json
+import math
+import mmap
+import os
+import re
+import shutil
+import sys
+
+import numpy as np
+
+from apod_store import LEGACY_JSON_FILE, STORE_FILE, ensure_store, iter_jsonl_tail
+
+# Where the search index lives by default
+SEARCH_INDEX_DIR = 'apod_search_index'
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Merge segments together once there are more than this many
+MAX_SEGMENTS = 8
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """
+    Splits text into lowercase alphanumeric tokens, e.g. "M31's core" -> ['m31', 's', 'core'].
+
+    Parameters:
+    - text (str): The text to tokenise.
+
+    Returns:
+    - list: The tokens in order.
+    """
+    return TOKEN_PATTERN.findall((text or '').lower())
+
+
+def parse_query(query):
+    """
+    Splits a query into quoted phrases and single terms.
+
+    Parameters:
+    - query (str): e.g. 'betelgeuse "red supergiant"'.
+
+    Returns:
+    - tuple: (terms, phrases) where terms is a list of tokens outside quotes and
+      phrases is a list of token lists, one per quoted phrase.
+    """
+    phrases = [tokenize(phrase) for phrase in re.findall(r'"([^"]*)"', query)]
+    phrases = [phrase for phrase in phrases if phrase]
+    terms = tokenize(re.sub(r'"[^"]*"', ' ', query))
+    return terms, phrases
+
+
+def _write_segment(directory, documents):
+    """
+    Writes one segment from already tokenised documents.
+
+    Parameters:
+    - directory (str): The segment directory to create.
+    - documents (list): (date ordinal, {term: positions list}, token count) tuples.
+    """
+    postings = {}
+    for doc_id, (_, term_positions, _) in enumerate(documents):
+        for term, positions in term_positions.items():
+            postings.setdefault(term, []).append((doc_id, positions))
+
+    terms = sorted(postings)
+    encoded = [term.encode('utf-8') for term in terms]
+    term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    term_offsets[1:] = np.cumsum([len(term) for term in encoded])
+    term_postings = np.zeros(len(terms) + 1, dtype=np.int64)
+    post_docs = []
+    post_tf = []
+    post_positions = [0]
+    positions = []
+    for i, term in enumerate(terms):
+        for doc_id, doc_positions in postings[term]:
+            post_docs.append(doc_id)
+            post_tf.append(len(doc_positions))
+            positions.extend(doc_positions)
+            post_positions.append(len(positions))
+        term_postings[i + 1] = len(post_docs)
+
+    os.makedirs(directory)
+    with open(os.path.join(directory, 'terms.bin'), 'wb') as f:
+        f.write(b''.join(encoded))
+    arrays = {
+        'term_offsets': term_offsets,
+        'term_postings': term_postings,
+        'post_docs': np.array(post_docs, dtype=np.int32),
+        'post_tf': np.array(post_tf, dtype=np.int32),
+        'post_positions': np.array(post_positions, dtype=np.int64),
+        'positions': np.array(positions, dtype=np.int32),
+        'doc_dates': np.array([doc[0] for doc in documents], dtype=np.int32),
+        'doc_lengths': np.array([doc[2] for doc in documents], dtype=np.int32),
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, name + '.npy'), array)
+
+
+def tokenize_record(record):
+    """
+    Tokenises a record's title and explanation into term positions.
+    Explanation positions start one past the title, so a phrase never spans both.
+
+    Parameters:
+    - record (dict): An APOD record.
+
+    Returns:
+    - tuple: (date ordinal, {term: positions list}, token count), or None if the
+      record has no usable date.
+    """
+    try:
+        ordinal = datetime.date.fromisoformat(record.get('date') or '').toordinal()
+    except (TypeError, ValueError):
+        # A missing, malformed or non-string date (e.g. a number)
+        return None
+    title_tokens = tokenize(record.get('title'))
+    tokens = title_tokens + [None] + tokenize(record.get('explanation'))
+    term_positions = {}
+    for position, token in enumerate(tokens):
+        if token is not None:
+            term_positions.setdefault(token, []).append(position)
+    return ordinal, term_positions, len(tokens) - 1
+
+
+class Segment:
+    """
+    A read-only, memory-mapped index segment.
+
+    Parameters:
+    - directory (str): The segment directory.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        load = lambda name: np.load(os.path.join(directory, name + '.npy'), mmap_mode='r')
+        self.term_offsets = load('term_offsets')
+        self.term_postings = load('term_postings')
+        self.post_docs = load('post_docs')
+        self.post_tf = load('post_tf')
+        self.post_positions = load('post_positions')
+        self.positions = load('positions')
+        self.doc_dates = load('doc_dates')
+        self.doc_lengths = load('doc_lengths')
+        self.term_count = len(self.term_offsets) - 1
+        self.terms = None
+        if self.term_count:
+            with open(os.path.join(directory, 'terms.bin'), 'rb') as f:
+                self.terms = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.doc_dates)
+
+    def term(self, i):
+        """
+        Returns the i-th term in sorted order.
+        """
+        return self.terms[int(self.term_offsets[i]):int(self.term_offsets[i + 1])].decode('utf-8')
+
+    def find_term(self, term):
+        """
+        Binary searches the sorted term list.
+
+        Parameters:
+        - term (str): The term to find.
+
+        Returns:
+        - int: The term's number in this segment, or None if it doesn't occur.
+        """
+        target = term.encode('utf-8')
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            current = self.terms[int(self.term_offsets[middle]):int(self.term_offsets[middle + 1])]
+            if current < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.term_count and self.term(low) == term:
+            return low
+        return None
+
+    def postings(self, term):
+        """
+        Returns the postings of a term.
+
+        Parameters:
+        - term (str): The term to look up.
+
+        Returns:
+        - tuple: (first posting number, doc ids, term frequencies), or None if the
+          term doesn't occur in this segment.
+        """
+        number = self.find_term(term)
+        if number is None:
+            return None
+        start = int(self.term_postings[number])
+        end = int(self.term_postings[number + 1])
+        return start, self.post_docs[start:end], self.post_tf[start:end]
+
+    def doc_positions(self, posting):
+        """
+        Returns the token positions stored for one posting.
+        """
+        return self.positions[int(self.post_positions[posting]):int(self.post_positions[posting + 1])]
+
+    def close(self):
+        if self.terms is not None:
+            self.terms.close()
+
+
+class SearchIndex:
+    """
+    An on-disk, segmented inverted index over APOD titles and explanations.
+
+    Parameters:
+    - directory (str): The index directory. It is created when records are first added.
+    """
+
+    def __init__(self, directory=SEARCH_INDEX_DIR):
+        self.directory = directory
+        self.manifest = {'segments': [], 'next_segment': 0, 'store_size': 0}
+        manifest_path = os.path.join(directory, 'manifest.json')
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        self.segments = [Segment(os.path.join(directory, name)) for name in self.manifest['segments']]
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+
+    def _save_manifest(self):
+        manifest_path = os.path.join(self.directory, 'manifest.json')
+        with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+    def _new_segment(self, documents):
+        name = f"seg_{self.manifest['next_segment']:06d}"
+        self.manifest['next_segment'] += 1
+        temp_dir = os.path.join(self.directory, name + '.tmp')
+        if os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir)
+        _write_segment(temp_dir, documents)
+        os.replace(temp_dir, os.path.join(self.directory, name))
+        return name
+
+    def add_records(self, records):
+        """
+        Indexes new records as a new segment. A record for a date that is already
+        indexed replaces the older one.
+
+        Parameters:
+        - records (iterable): APOD records.
+
+        Returns:
+        - int: The number of records indexed.
+        """
+        # If a date comes up more than once, the last record for it wins
+        documents = list({doc[0]: doc for doc in map(tokenize_record, records) if doc is not None}.values())
+        if not documents:
+            return 0
+        os.makedirs(self.directory, exist_ok=True)
+        name = self._new_segment(documents)
+        self.manifest['segments'].append(name)
+        self.segments.append(Segment(os.path.join(self.directory, name)))
+        if len(self.segments) > MAX_SEGMENTS:
+            self.merge()
+        else:
+            self._save_manifest()
+        return len(documents)
+
+    def catch_up(self, store_path=STORE_FILE):
+        """
+        Indexes the records appended to the store since the last call.
+        If the store is smaller than what was indexed, the index is rebuilt.
+
+        Parameters:
+        - store_path (str): The JSON Lines store.
+
+        Returns:
+        - int: The number of records indexed.
+        """
+        if not os.path.exists(store_path):
+            return 0
+        if os.path.getsize(store_path) < self.manifest['store_size']:
+            self.clear()
+        records = []
+        position = self.manifest['store_size']
+        for _, position, record in iter_jsonl_tail(store_path, position):
+            records.append(record)
+        self.manifest['store_size'] = position
+        count = self.add_records(records)
+        if not count and os.path.isdir(self.directory):
+            self._save_manifest()
+        return count
+
+    def clear(self):
+        """
+        Removes every segment from the index.
+        """
+        self.close()
+        for name in self.manifest['segments']:
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+        self.manifest = {'segments': [], 'next_segment': self.manifest['next_segment'], 'store_size': 0}
+        self.segments = []
+
+    def merge(self):
+        """
+        Merges all segments into one, dropping documents replaced by newer ones.
+        The postings are copied from the existing segments, so nothing is re-tokenised.
+        """
+        seen = set()
+        documents = []
+        # Walk the newest segment first so the newest copy of each date is kept
+        for segment in reversed(self.segments):
+            doc_terms = [dict() for _ in range(len(segment))]
+            for number in range(segment.term_count):
+                term = segment.term(number)
+                for posting in range(int(segment.term_postings[number]), int(segment.term_postings[number + 1])):
+                    doc_terms[segment.post_docs[posting]][term] = segment.doc_positions(posting).tolist()
+            for doc_id in range(len(segment)):
+                ordinal = int(segment.doc_dates[doc_id])
+                if ordinal not in seen:
+                    seen.add(ordinal)
+                    documents.append((ordinal, doc_terms[doc_id], int(segment.doc_lengths[doc_id])))
+        documents.sort(key=lambda doc: doc[0])
+
+        old_names = self.manifest['segments']
+        self.close()
+        name = self._new_segment(documents)
+        self.manifest['segments'] = [name]
+        self._save_manifest()
+        for old_name in old_names:
+            shutil.rmtree(os.path.join(self.directory, old_name), ignore_errors=True)
+        self.segments = [Segment(os.path.join(self.directory, name))]
+
+    def search(self, query, limit=10):
+        """
+        Ranks documents against a query with BM25. Quoted phrases must appear
+        exactly (consecutive tokens); their words also count towards the score.
+
+        Parameters:
+        - query (str): e.g. 'M31 "dust lanes"'.
+        - limit (int): Maximum number of results.
+
+        Returns:
+        - list: Dictionaries with 'date' (YYYY-MM-DD) and 'score', best match first.
+        """
+        terms, phrases = parse_query(query)
+        query_terms = list(dict.fromkeys(terms + [token for phrase in phrases for token in phrase]))
+        if not query_terms or not self.segments:
+            return []
+
+        # Collection statistics across all segments
+        total_docs = sum(len(segment) for segment in self.segments)
+        average_length = max(sum(float(np.sum(segment.doc_lengths)) for segment in self.segments) / total_docs, 1.0)
+        postings = [{term: segment.postings(term) for term in query_terms} for segment in self.segments]
+        doc_freq = {term: sum(len(p[term][1]) for p in postings if p[term] is not None) for term in query_terms}
+        idf = {term: math.log(1 + (total_docs - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+
+        results = []
+        seen = set()
+        for segment, segment_postings in reversed(list(zip(self.segments, postings))):
+            scores = np.zeros(len(segment))
+            matched = np.zeros(len(segment), dtype=bool)
+            length_norm = BM25_K1 * (1 - BM25_B + BM25_B * segment.doc_lengths / average_length)
+            for term in query_terms:
+                if segment_postings[term] is None:
+                    continue
+                _, docs, tf = segment_postings[term]
+                scores[docs] += idf[term] * tf * (BM25_K1 + 1) / (tf + length_norm[docs])
+                matched[docs] = True
+            for phrase in phrases:
+                matched &= self._phrase_mask(segment, segment_postings, phrase)
+
+            for doc_id in np.flatnonzero(matched):
+                ordinal = int(segment.doc_dates[doc_id])
+                # Newer segments come first, so older copies of a date are skipped
+                if ordinal not in seen:
+                    results.append((float(scores[doc_id]), ordinal))
+            # A date in this segment supersedes older copies even if this copy didn't match
+            seen.update(segment.doc_dates.tolist())
+
+        results.sort(key=lambda result: (-result[0], -result[1]))
+        return [
+            {'date': datetime.date.fromordinal(ordinal).isoformat(), 'score': round(score, 4)}
+            for score, ordinal in results[:limit]
+        ]
+
+    @staticmethod
+    def _phrase_mask(segment, segment_postings, phrase):
+        """
+        Finds the documents of a segment that contain a phrase.
+
+        Returns:
+        - ndarray: Boolean mask over the segment's documents.
+        """
+        mask = np.zeros(len(segment), dtype=bool)
+        term_postings = [segment_postings[term] for term in phrase]
+        if any(p is None for p in term_postings):
+            return mask
+        # Only documents containing every word of the phrase can match
+        candidates = term_postings[0][1]
+        for _, docs, _ in term_postings[1:]:
+            candidates = np.intersect1d(candidates, docs)
+        for doc_id in candidates:
+            starts = None
+            for offset, (first, docs, _) in enumerate(term_postings):
+                posting = first + int(np.searchsorted(docs, doc_id))
+                shifted = segment.doc_positions(posting) - offset
+                starts = shifted if starts is None else np.intersect1d(starts, shifted, assume_unique=True)
+                if not len(starts):
+                    break
+            mask[doc_id] = starts is not None and len(starts) > 0
+        return mask
+
+
+def update_search_index(store_path=STORE_FILE, index_dir=SEARCH_INDEX_DIR):
+    """
+    Brings the search index up to date with the store, indexing only new records.
+
+    Parameters:
+    - store_path (str): The JSON Lines store.
+    - index_dir (str): The search index directory.
+
+    Returns:
+    - int: The number of records indexed.
+    """
+    index = SearchIndex(index_dir)
+    try:
+        return index.catch_up(store_path)
+    finally:
+        index.close()
+
+
+def main(argv=None):
+    """
+    Command line entry point: 'build', 'update' or 'query'.
+
+    Returns:
+    - int: The exit status: 1 on errors, else 0.
+    """
+    parser = argparse.ArgumentParser(description="Full-text search over APOD titles and explanations.")
+    parser.add_argument('--index-dir', default=SEARCH_INDEX_DIR, help="search index directory")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+
+    build = subcommands.add_parser('build', help="rebuild the index from the whole store")
+    build.add_argument('--store', default=STORE_FILE, help="JSON Lines store to index")
+    update = subcommands.add_parser('update', help="index records added to the store since the last update")
+    update.add_argument('--store', default=STORE_FILE, help="JSON Lines store to index")
+    query = subcommands.add_parser('query', help='search, e.g. query Betelgeuse or query \'"dust lanes" M31\'')
+    query.add_argument('terms', nargs='+', help="search terms; wrap phrases in double quotes")
+    query.add_argument('--limit', type=int, default=10, help="maximum number of results")
+    query.add_argument('--store', default=STORE_FILE, help="store used to show titles")
+    args = parser.parse_args(argv)
+
+    if args.command in ('build', 'update'):
+        if not args.store.endswith('.jsonl'):
+            print(f"Error: '{args.store}' is not a JSON Lines store. Pass the .jsonl store; "
+                  f"a legacy '{LEGACY_JSON_FILE}' next to it is migrated automatically.")
+            return 1
+        ensure_store(args.store, os.path.join(os.path.dirname(args.store), LEGACY_JSON_FILE))
+        if not os.path.exists(args.store):
+            print(f"Error: '{args.store}' file not found.")
+            return 1
+        index = SearchIndex(args.index_dir)
+        if args.command == 'build':
+            index.clear()
+        count = index.catch_up(args.store)
+        index.close()
+        print(f"Indexed {count} records into '{args.index_dir}'.")
+        return 0
+
+    if not os.path.exists(os.path.join(args.index_dir, 'manifest.json')):
+        print(f"Error: no search index found in '{args.index_dir}'. Run the 'build' subcommand first.")
+        return 1
+    index = SearchIndex(args.index_dir)
+    results = index.search(' '.join(args.terms), limit=args.limit)
+    index.close()
+    if not results:
+        print("No matches found.")
+        return 0
+
+    # Titles come from the store through the date index, so only matching records are read
+    titles = {}
+    if os.path.exists(args.store):
+        from apod_index import load_date_index
+        date_index = load_date_index(args.store)
+        titles = {result['date']: (date_index.lookup(result['date']) or {}).get('title') for result in results}
+    for result in results:
+        print(f"{result['date']}  {result['score']:7.3f}  {titles.get(result['date']) or ''}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,437 @@
+# apod_store.py
+
+# Append-only storage for APOD records.
+# Records are kept in a JSON Lines file (one JSON object per line), so adding a
+# record is a single append instead of rewriting the whole file.
+
+import json
+import os
+
+# The JSON Lines store, and the original single-array JSON file it replaces
+STORE_FILE = 'apod_data.jsonl'
+LEGACY_JSON_FILE = 'apod_data.json'
+
+
+class JsonlAppender:
+    """
+    Appends records to a JSON Lines file, calling fsync after every `fsync_every`
+    records and on close, so a crash loses at most one unsynced batch.
+
+    Use it as a context manager:
+
+        with JsonlAppender('apod_data.jsonl') as store:
+            store.append(record)
+
+    Parameters:
+    - path (str): The JSON Lines file to append to. It is created if it doesn't exist.
+    - fsync_every (int): Number of appended records between fsync calls.
+    """
+
+    def __init__(self, path=STORE_FILE, fsync_every=50):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.unsynced = 0
+        self.f = open(path, 'ab')
+        # If a previous run crashed mid-line, start on a fresh line so the broken
+        # fragment stays on its own line and is skipped by the reader
+        if self.f.tell() > 0:
+            with open(path, 'rb') as check:
+                check.seek(-1, os.SEEK_END)
+                if check.read(1) != b'\n':
+                    self.f.write(b'\n')
+
+    def append(self, record):
+        """
+        Appends one record as a single line.
+
+        Parameters:
+        - record (dict): The APOD record to store.
+
+        Returns:
+        - int: The byte offset of the new line in the file.
+        """
+        offset = self.f.tell()
+        self.f.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+        self.unsynced += 1
+        if self.unsynced >= self.fsync_every:
+            self.sync()
+        return offset
+
+    def sync(self):
+        """
+        Flushes buffered records and fsyncs them to disk.
+        """
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.unsynced = 0
+
+    def close(self):
+        """
+        Syncs any remaining records and closes the file.
+        """
+        if not self.f.closed:
+            self.sync()
+            self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def append_records(records, path=STORE_FILE, fsync_every=50):
+    """
+    Appends a batch of records to the store.
+
+    Parameters:
+    - records (iterable): The APOD records to append.
+    - path (str): The JSON Lines file to append to.
+    - fsync_every (int): Number of appended records between fsync calls.
+
+    Returns:
+    - int: The number of records appended.
+    """
+    count = 0
+    with JsonlAppender(path, fsync_every) as store:
+        for record in records:
+            store.append(record)
+            count += 1
+    return count
+
+
+def read_jsonl(path):
+    """
+    Reads every record from a JSON Lines file. Blank lines and lines that aren't
+    valid JSON (e.g. a half-written last line after a crash) are skipped.
+
+    Parameters:
+    - path (str): The JSON Lines file to read.
+
+    Returns:
+    - list: The records in the order they were appended.
+    """
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                print(f"Warning: skipping unreadable line {line_number} in '{path}'.")
+    return records
+
+
+def resolve_data_file(path=None):
+    """
+    Works out which data file to read from.
+
+    Parameters:
+    - path (str): An explicit data file, or None to pick the default.
+
+    Returns:
+    - str: `path` if given, otherwise the JSON Lines store if it exists, otherwise
+      the legacy 'apod_data.json' file.
+    """
+    if path:
+        return path
+    if os.path.exists(STORE_FILE) or not os.path.exists(LEGACY_JSON_FILE):
+        return STORE_FILE
+    return LEGACY_JSON_FILE
+
+
+def load_records(path=None):
+    """
+    Loads every APOD record from either store format.
+
+    Parameters:
+    - path (str): The data file to read, or None to use resolve_data_file().
+      Files ending in '.jsonl' are read as JSON Lines, anything else as a JSON array.
+
+    Returns:
+    - list: List of dictionaries containing APOD data.
+
+    Raises:
+    - FileNotFoundError: If the file doesn't exist.
+    - json.JSONDecodeError: If a JSON array file is empty or corrupt.
+    """
+    path = resolve_data_file(path)
+    if path.endswith('.jsonl'):
+        return read_jsonl(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def iter_jsonl(path):
+    """
+    Yields records from a JSON Lines file one line at a time, so memory use
+    doesn't grow with the size of the file. Unreadable lines are skipped as in read_jsonl.
+
+    Parameters:
+    - path (str): The JSON Lines file to read.
+
+    Yields:
+    - dict: One APOD record.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Warning: skipping unreadable line {line_number} in '{path}'.")
+
+
+def iter_jsonl_tail(path, offset=0):
+    """
+    Yields the records appended to a JSON Lines file after a byte offset, with the
+    byte range of each line. A half-written last line is not yielded, and lines
+    that aren't valid JSON are skipped.
+
+    Parameters:
+    - path (str): The JSON Lines file to read.
+    - offset (int): Where to start reading; must be the start of a line.
+
+    Yields:
+    - tuple: (start offset, end offset, record) for each complete line.
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        position = offset
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            start = position
+            position += len(line)
+            try:
+                record = json.loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+            yield start, position, record
+
+
+# Characters that can continue a number or literal cut off at the end of a chunk
+_NUMBER_CHARS = '0123456789+-.eE'
+# A decoding error this close to the end of the buffer may just be a cut-off
+# element (e.g. 'Infinit' or a partial '\\uXXXX' escape) rather than bad input
+_MAX_CUT_OFF = 8
+
+
+def iter_json_array(path, chunk_size=1 << 16):
+    """
+    Yields the elements of a top-level JSON array one at a time, reading the file
+    in chunks. Only the current chunk and the element being parsed are held in memory.
+
+    Parameters:
+    - path (str): The JSON file to read, e.g. the legacy 'apod_data.json'.
+    - chunk_size (int): Number of characters read from the file at a time.
+
+    Yields:
+    - dict: One APOD record.
+
+    Raises:
+    - json.JSONDecodeError: If the file is empty, isn't a JSON array or is cut short.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = ''
+        pos = 0
+        finished = False
+        # What comes next: the opening '[', the first element (or ']'),
+        # another element after a ',', or a ',' / ']' after an element
+        expect = 'open'
+        while True:
+            # Skip whitespace, reading another chunk when the buffer runs out
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos >= len(buffer):
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    message = 'Expecting value' if expect == 'open' else 'Unterminated array'
+                    raise json.JSONDecodeError(message, buffer, pos)
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+
+            char = buffer[pos]
+            if expect == 'open':
+                if char != '[':
+                    raise json.JSONDecodeError("Expecting '['", buffer, pos)
+                pos += 1
+                expect = 'first'
+            elif expect == 'separator':
+                if char == ']':
+                    return
+                if char != ',':
+                    raise json.JSONDecodeError("Expecting ',' delimiter", buffer, pos)
+                pos += 1
+                expect = 'element'
+            elif expect == 'first' and char == ']':
+                return
+            else:
+                try:
+                    element, end = decoder.raw_decode(buffer, pos)
+                    # A number or literal cut off by the chunk ("12" of "1234", "1." of
+                    # "1.5") still decodes, so it is only complete once something that
+                    # can't continue it follows
+                    incomplete = (not finished and not isinstance(element, (str, dict, list))
+                                  and not buffer[end:].strip(_NUMBER_CHARS))
+                except json.JSONDecodeError as e:
+                    # Only an error at the end of the buffer (or an open string) can be
+                    # a cut-off element; anything else is malformed whatever follows
+                    cut_off = len(buffer) - e.pos <= _MAX_CUT_OFF or e.msg.startswith('Unterminated string')
+                    if finished or not cut_off:
+                        raise
+                    incomplete = True
+                if incomplete:
+                    chunk = f.read(chunk_size)
+                    finished = not chunk
+                    buffer = buffer[pos:] + chunk
+                    pos = 0
+                    continue
+                yield element
+                pos = end
+                expect = 'separator'
+
+
+def iter_records(path=None):
+    """
+    Streams APOD records from either store format without loading the whole file.
+
+    Parameters:
+    - path (str): The data file to read, or None to use resolve_data_file().
+      Files ending in '.jsonl' are read line by line, anything else is parsed
+      incrementally as a JSON array.
+
+    Returns:
+    - iterator: An iterator over the records. Errors such as FileNotFoundError are
+      raised when iteration starts.
+    """
+    path = resolve_data_file(path)
+    if path.endswith('.jsonl'):
+        return iter_jsonl(path)
+    return iter_json_array(path)
+
+
+def migrate_json_to_jsonl(json_path=LEGACY_JSON_FILE, jsonl_path=STORE_FILE):
+    """
+    Converts the legacy 'apod_data.json' array into the JSON Lines store, sorted by date.
+    The new file is written to a temporary name and renamed into place, so a crash
+    never leaves a half-written store behind. The legacy file is left untouched.
+
+    Parameters:
+    - json_path (str): The legacy JSON array file.
+    - jsonl_path (str): The JSON Lines file to create.
+
+    Returns:
+    - int: The number of records migrated.
+    """
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data_list = json.load(f)
+    data_list.sort(key=lambda item: item.get('date') or '')
+
+    temp_path = jsonl_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        for record in data_list:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, jsonl_path)
+    print(f"Migrated {len(data_list)} records from '{json_path}' to '{jsonl_path}'.")
+    return len(data_list)
+
+
+def ensure_store(jsonl_path=STORE_FILE, json_path=LEGACY_JSON_FILE):
+    """
+    Runs the one-time migration if the JSON Lines store doesn't exist yet but the
+    legacy JSON file does.
+
+    Parameters:
+    - jsonl_path (str): The JSON Lines store.
+    - json_path (str): The legacy JSON array file.
+    """
+    if os.path.exists(jsonl_path) or not os.path.exists(json_path):
+        return
+    try:
+        migrate_json_to_jsonl(json_path, jsonl_path)
+    except json.JSONDecodeError:
+        # An empty or corrupt legacy file has nothing worth keeping
+        print(f"Warning: '{json_path}' is empty or corrupt, starting a new store.")
+
+
+class ApodDataset:
+    """
+    The APOD records from one data file, loaded once and shared by every
+    processing stage. Iterate over it, index it or take len() like a list.
+    Treat the records as read-only, because the same object is handed out by the cache.
+
+    Parameters:
+    - path (str): The data file the records were loaded from.
+    - records (list): The loaded records.
+    - mtime_ns (int): The file's modification time when it was loaded.
+    - size (int): The file's size in bytes when it was loaded.
+    """
+
+    def __init__(self, path, records, mtime_ns, size):
+        self.path = path
+        self.records = records
+        self.mtime_ns = mtime_ns
+        self.size = size
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+    def matches(self, stat_result):
+        """
+        Checks whether the file still looks the same as when it was loaded.
+
+        Parameters:
+        - stat_result (os.stat_result): A fresh os.stat() of the data file.
+
+        Returns:
+        - bool: True if the modification time and size are unchanged.
+        """
+        return stat_result.st_mtime_ns == self.mtime_ns and stat_result.st_size == self.size
+
+
+# Datasets already loaded in this process, keyed by absolute path
+_dataset_cache = {}
+
+
+def load_apod_dataset(path=None, use_cache=True):
+    """
+    Loads a data file into an ApodDataset. In a long-running process, asking for the
+    same file again returns the cached dataset without re-parsing it, as long as the
+    file's modification time and size haven't changed.
+
+    Parameters:
+    - path (str): The data file to read, or None to use resolve_data_file().
+    - use_cache (bool): Set to False to always re-read the file.
+
+    Returns:
+    - ApodDataset: The loaded records.
+
+    Raises:
+    - FileNotFoundError: If the file doesn't exist.
+    - json.JSONDecodeError: If a JSON array file is empty or corrupt.
+    """
+    path = resolve_data_file(path)
+    key = os.path.abspath(path)
+    stat_result = os.stat(path)
+    cached = _dataset_cache.get(key)
+    if use_cache and cached is not None and cached.matches(stat_result):
+        return cached
+
+    dataset = ApodDataset(path, load_records(path), stat_result.st_mtime_ns, stat_result.st_size)
+    _dataset_cache[key] = dataset
+    return dataset
@@ -0,0 +1,383 @@
+# array_statistics.py
+
+# Statistics of large 1-D or 2-D NumPy arrays, computed a block of rows at a
+# time. One pass gathers everything numpyArrayThingy needs: per-column and
+# overall mean/variance (merged with Chan's pairwise formula, so they stay
+# accurate on billions of values), min/max, how many values are divisible by a
+# number (optionally streaming them to a caller's output), and a value
+# histogram for the median of small integer types. Replacing values above a
+# threshold is a second pass that works in place. Because only one block is in
+# memory at a time, the arrays can be np.memmap files larger than RAM.
+
+import numpy as np
+
+# Bytes of input read per block; temporaries are a few times this
+CHUNK_BYTES = 8 * 1024 ** 2
+
+# Integer types up to this many bytes get an exact value histogram in the main pass
+HISTOGRAM_MAX_ITEMSIZE = 2
+
+# Bins used when a median has to be narrowed down by histogram passes
+MEDIAN_BINS = 1 << 16
+
+# The histogram median re-bins until at most this many values are left to partition
+MEDIAN_MAX_CANDIDATES = CHUNK_BYTES // 8
+
+# In-memory arrays up to this size take the median with np.partition on a copy
+PARTITION_MAX_ELEMENTS = 50_000_000
+
+
+def as_rows(arr):
+    """
+    Returns a 2-D view of arr, treating a 1-D array as one column.
+    """
+    return arr.reshape(-1, 1) if arr.ndim == 1 else arr
+
+
+def default_chunk_rows(arr):
+    """
+    Returns the number of rows that makes a block of about CHUNK_BYTES.
+    """
+    rows = as_rows(arr)
+    return max(1, CHUNK_BYTES // max(rows.shape[1] * rows.itemsize, 1))
+
+
+def iter_blocks(arr, chunk_rows=None):
+    """
+    Yields consecutive views of up to chunk_rows rows of a 2-D array.
+    """
+    rows = as_rows(arr)
+    chunk_rows = chunk_rows or default_chunk_rows(rows)
+    for start in range(0, len(rows), chunk_rows):
+        yield rows[start:start + chunk_rows]
+
+
+class ColumnMoments:
+    """
+    Count, mean and sum of squared deviations (M2) of every column, updated a
+    block at a time and mergeable with another instance.
+
+    Parameters:
+    - width (int): Number of columns.
+    """
+
+    def __init__(self, width):
+        self.count = 0
+        self.mean = np.zeros(width)
+        self.m2 = np.zeros(width)
+
+    def update(self, block):
+        """
+        Adds a 2-D block of rows.
+        """
+        if not len(block):
+            return
+        other = ColumnMoments(block.shape[1])
+        other.count = count = len(block)
+        if _histogram_offset(block.dtype) is not None:
+            # Small integers: exact integer sums, without a float64 copy of the block
+            sums = block.sum(axis=0, dtype=np.int64)
+            squares = np.einsum('ij,ij->j', block, block, dtype=np.int64, casting='unsafe')
+            other.mean = sums / count
+            other.m2 = np.array([(count * int(q) - int(s) ** 2) / count for s, q in zip(sums, squares)])
+        else:
+            other.mean = block.mean(axis=0, dtype=np.float64)
+            centred = block - other.mean
+            other.m2 = np.einsum('ij,ij->j', centred, centred)
+        self.merge(other)
+
+    def merge(self, other):
+        """
+        Merges another ColumnMoments over the same columns into this one.
+
+        Returns:
+        - ColumnMoments: self.
+        """
+        if not other.count:
+            return self
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 = self.m2 + other.m2 + delta ** 2 * (self.count * other.count / total)
+        self.mean = self.mean + delta * (other.count / total)
+        self.count = total
+        return self
+
+    def variance(self, ddof=0):
+        """
+        Returns the variance of each column.
+        """
+        return self.m2 / max(self.count - ddof, 1)
+
+    def overall(self, ddof=0):
+        """
+        Pools the columns into the moments of all values together.
+
+        Returns:
+        - tuple: (number of values, mean, variance).
+        """
+        count = self.count * len(self.mean)
+        if not count:
+            return 0, np.nan, np.nan
+        mean = self.mean.mean()
+        m2 = self.m2.sum() + self.count * ((self.mean - mean) ** 2).sum()
+        return count, mean, m2 / max(count - ddof, 1)
+
+
+class ArrayStatistics:
+    """
+    The result of fused_statistics.
+
+    Attributes:
+    - count (int): Number of values.
+    - mean, var, std (float): Over all values (population variance, as ndarray.var()).
+    - minimum, maximum: Smallest and largest value.
+    - column_mean, column_var (ndarray): Per column.
+    - median (float): The median of all values, as np.median.
+    - divisible_count (int): Number of values divisible by the requested divisor
+      (None if no divisor was given).
+    """
+
+    def __init__(self, moments, minimum, maximum, median, divisible_count):
+        self.count, self.mean, self.var = moments.overall()
+        self.std = float(np.sqrt(self.var))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.column_mean = moments.mean
+        self.column_var = moments.variance()
+        self.median = median
+        self.divisible_count = divisible_count
+
+
+def _histogram_offset(dtype):
+    """
+    Returns the value that maps to bin 0 in the exact histogram of a small integer
+    dtype, or None if the dtype doesn't get one.
+    """
+    if dtype.kind in 'ui' and dtype.itemsize <= HISTOGRAM_MAX_ITEMSIZE:
+        return int(np.iinfo(dtype).min)
+    return None
+
+
+def _middle_ranks(count):
+    """
+    Returns the 0-based ranks of the one or two middle values.
+    """
+    return sorted({(count - 1) // 2, count // 2})
+
+
+def _add_to_histogram(counts, block):
+    """
+    Counts the values of a small integer block into an exact histogram whose bin 0
+    is the dtype's minimum. Signed values are mapped by flipping the sign bit of
+    their unsigned view, which avoids an int64 copy.
+    """
+    flat = block.reshape(-1)
+    if flat.dtype.kind == 'i':
+        unsigned = np.dtype(f'u{flat.itemsize}')
+        flat = flat.view(unsigned) ^ unsigned.type(1 << (8 * flat.itemsize - 1))
+    counts += np.bincount(flat, minlength=counts.size)
+
+
+def _median_from_histogram(counts, offset, count):
+    """
+    Reads the median off an exact value histogram.
+    """
+    cumulative = np.cumsum(counts)
+    values = [np.searchsorted(cumulative, rank, side='right') + offset for rank in _middle_ranks(count)]
+    return float(np.mean(values))
+
+
+def _bin_of(values, low, scale):
+    """
+    Puts each value of a 1-D array in one of MEDIAN_BINS equal-width bins starting
+    at low. Values outside the bins are clamped to the first or last one, so the bin
+    number never decreases as the value grows.
+    """
+    bins = ((values - low) * scale).astype(np.int64)
+    return np.clip(bins, 0, MEDIAN_BINS - 1)
+
+
+def _select(block, low, high, selection):
+    """
+    Returns the values of a block that are still candidates for the median: those
+    in [low, high] whose bin under selection = (bin low, scale, first bin, last bin)
+    is one of the selected bins. Every value is a candidate if selection is None.
+    """
+    values = block.reshape(-1)
+    if selection is None:
+        return values
+    bin_low, scale, first, last = selection
+    values = values[(values >= low) & (values <= high)]
+    bins = _bin_of(values, bin_low, scale)
+    return values[(bins >= first) & (bins <= last)]
+
+
+def chunked_median(arr, count, minimum, maximum, chunk_rows=None):
+    """
+    Computes the exact median of an array too large to copy and partition. Each
+    pass counts the candidate values in MEDIAN_BINS equal-width bins and keeps
+    only the bins holding the middle ranks; this repeats over the narrower range
+    until at most MEDIAN_MAX_CANDIDATES values are left, which are then collected
+    and partitioned. A skewed array therefore costs extra passes, not memory.
+    As with np.median, the result is nan if the array contains a NaN.
+
+    Parameters:
+    - arr (ndarray): 1-D or 2-D array, e.g. an np.memmap.
+    - count (int): Number of values.
+    - minimum, maximum: The smallest and largest value (nan if there is a NaN).
+    - chunk_rows (int): Rows per block.
+
+    Returns:
+    - float: The median.
+    """
+    if np.isnan(minimum) or np.isnan(maximum):
+        return float('nan')
+    ranks = _middle_ranks(count)
+    # The candidates are the values in [low, high] inside the selected bins; since a
+    # bin number never decreases with the value, they are all the values between
+    # their own minimum and maximum, which become low and high after each pass
+    low, high = minimum, maximum
+    selection = None
+    bin_low, bin_high = float(minimum), float(maximum)
+    below = 0
+    candidates = count
+    while candidates > MEDIAN_MAX_CANDIDATES and low != high:
+        bin_low, bin_high = max(bin_low, float(low)), min(bin_high, float(high))
+        if not (np.isfinite(bin_high - bin_low) and bin_low < bin_high):
+            break
+        scale = MEDIAN_BINS / (bin_high - bin_low)
+        counts = np.zeros(MEDIAN_BINS, dtype=np.int64)
+        new_low, new_high = None, None
+        for block in iter_blocks(arr, chunk_rows):
+            values = _select(block, low, high, selection)
+            if not len(values):
+                continue
+            counts += np.bincount(_bin_of(values, bin_low, scale), minlength=MEDIAN_BINS)
+            smallest, largest = values.min(), values.max()
+            new_low = smallest if new_low is None else min(new_low, smallest)
+            new_high = largest if new_high is None else max(new_high, largest)
+
+        cumulative = below + np.cumsum(counts)
+        wanted = np.searchsorted(cumulative, ranks, side='right')
+        first, last = int(wanted.min()), int(wanted.max())
+        before = cumulative[first - 1] if first else below
+        low, high = new_low, new_high
+        if cumulative[last] - before == candidates:
+            if (bin_low, bin_high) == (float(low), float(high)):
+                # The values can't be told apart any finer (float resolution); collect them
+                break
+            # The bins were wider than the candidates; count them again over their own range
+            bin_low, bin_high = float(low), float(high)
+            continue
+        selection = (bin_low, scale, first, last)
+        below, candidates = before, cumulative[last] - before
+        bin_low, bin_high = bin_low + first / scale, bin_low + (last + 1) / scale
+    if low == high:
+        return float(low)
+
+    values = np.concatenate([np.array(_select(block, low, high, selection), copy=True)
+                             for block in iter_blocks(arr, chunk_rows)])
+    local = [rank - below for rank in ranks]
+    values.partition(local)
+    return float(np.mean(values[local]))
+
+
+def median(arr, chunk_rows=None, stats=None):
+    """
+    Computes the median of all values without sorting the whole array.
+
+    Parameters:
+    - arr (ndarray): 1-D or 2-D array.
+    - chunk_rows (int): Rows per block for the histogram passes.
+    - stats (tuple): (count, minimum, maximum) if already known.
+
+    Returns:
+    - float: The median, as np.median would give.
+    """
+    if arr.size <= PARTITION_MAX_ELEMENTS and not isinstance(arr, np.memmap):
+        # Partitioning only places the middle values, unlike the full sort in np.median
+        values = np.array(arr, copy=True).reshape(-1)
+        ranks = _middle_ranks(len(values))
+        if values.dtype.kind == 'f':
+            # NaN sorts last, so placing the last value as well shows whether there is one
+            values.partition(ranks + [len(values) - 1])
+            if np.isnan(values[-1]):
+                return float('nan')
+        else:
+            values.partition(ranks)
+        return float(np.mean(values[ranks]))
+    if stats is None:
+        stats = (arr.size, arr.min(), arr.max())
+    return chunked_median(arr, *stats, chunk_rows=chunk_rows)
+
+
+def fused_statistics(arr, divisor=None, chunk_rows=None, divisible_out=None):
+    """
+    Computes the statistics of an array in one pass over its blocks (plus the
+    median passes for wide dtypes that are larger than PARTITION_MAX_ELEMENTS).
+
+    Parameters:
+    - arr (ndarray): 1-D or 2-D numeric array, e.g. an np.memmap.
+    - divisor (int): Count the values divisible by this; None skips it.
+    - chunk_rows (int): Rows per block (default: about CHUNK_BYTES of input).
+    - divisible_out: Receives the divisible values, in array order, as 1-D blocks
+      through its append() method, e.g. a list or an array_store.NpyWriter. None
+      only counts them, so memory stays bounded by the block size.
+
+    Returns:
+    - ArrayStatistics: The statistics, or None if arr is empty.
+    """
+    rows = as_rows(arr)
+    if not rows.size:
+        print("Error: cannot compute statistics of an empty array.")
+        return None
+    moments = ColumnMoments(rows.shape[1])
+    minimum, maximum = None, None
+    offset = _histogram_offset(rows.dtype)
+    counts = np.zeros(1 << (8 * rows.itemsize), dtype=np.int64) if offset is not None else None
+    divisible_count = 0 if divisor else None
+
+    for block in iter_blocks(rows, chunk_rows):
+        moments.update(block)
+        low, high = block.min(), block.max()
+        # np.minimum/np.maximum keep a NaN whichever block it is in, as arr.min() does
+        minimum = low if minimum is None else np.minimum(minimum, low)
+        maximum = high if maximum is None else np.maximum(maximum, high)
+        if counts is not None:
+            _add_to_histogram(counts, block)
+        if divisor:
+            matches = block % divisor == 0
+            divisible_count += int(np.count_nonzero(matches))
+            if divisible_out is not None:
+                divisible_out.append(block[matches])
+
+    if counts is not None:
+        middle = _median_from_histogram(counts, offset, rows.size)
+    else:
+        middle = median(arr, chunk_rows, (rows.size, minimum, maximum))
+    return ArrayStatistics(moments, minimum, maximum, middle, divisible_count)
+
+
+def replace_above(arr, threshold, value, chunk_rows=None):
+    """
+    Replaces every value greater than threshold with value, in place and a block
+    at a time (so it also works on a writable np.memmap).
+
+    Parameters:
+    - arr (ndarray): 1-D or 2-D array; modified in place.
+    - threshold: Values above this are replaced.
+    - value: The replacement, cast to arr's dtype.
+    - chunk_rows (int): Rows per block.
+
+    Returns:
+    - int: The number of values replaced.
+    """
+    replaced = 0
+    value = np.asarray(value).astype(arr.dtype)
+    for block in iter_blocks(arr, chunk_rows):
+        above = block > threshold
+        replaced += int(np.count_nonzero(above))
+        np.copyto(block, value, where=above)
+    if isinstance(arr, np.memmap):
+        arr.flush()
+    return replaced
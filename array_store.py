@@ -0,0 +1,247 @@
+# array_store.py
+
+# Binary on-disk arrays for data too large for memory.
+# Arrays are plain .npy files, so np.load(path, mmap_mode='r') opens them
+# without reading anything; pages are only loaded as blocks are touched.
+# NpyWriter appends rows to a .npy file whose final length isn't known in
+# advance, which lets the iris CSV be converted in one streaming pass into:
+#
+#   <directory>/measurements.npy   float32, one row per flower, IRIS_MEASUREMENTS columns
+#   <directory>/species.npy        int8 species codes (-1 for missing)
+#   <directory>/species.json       the species names, indexed by code
+#
+# The statistics and correlation below read these (or any 2-D memmap) a block
+# of rows at a time, so memory use depends on the block size only.
+
+import json
+import os
+
+import numpy as np
+
+from array_statistics import iter_blocks
+
+# Default directory for the converted iris arrays
+IRIS_ARRAYS_DIR = 'iris_arrays'
+
+# Total size reserved for a .npy header, so it can be rewritten in place with the final shape
+NPY_HEADER_BYTES = 128
+
+
+def _npy_header(dtype, shape):
+    """
+    Builds a version 1.0 .npy header of exactly NPY_HEADER_BYTES bytes.
+    """
+    header = repr({'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)), 'fortran_order': False,
+                   'shape': tuple(shape)})
+    prefix = np.lib.format.magic(1, 0)
+    length = NPY_HEADER_BYTES - len(prefix) - 2
+    header = header.ljust(length - 1) + '\n'
+    if len(header) != length:
+        raise ValueError(f"Shape {shape} does not fit in a {NPY_HEADER_BYTES}-byte .npy header.")
+    return prefix + length.to_bytes(2, 'little') + header.encode('latin1')
+
+
+class NpyWriter:
+    """
+    Appends rows to a .npy file. The header is written with the final row count
+    on close, so the file can be produced in one pass without knowing its length.
+
+    Use it as a context manager:
+
+        with NpyWriter('measurements.npy', 'float32', columns=4) as writer:
+            writer.append(block)
+
+    Parameters:
+    - path (str): The .npy file to create (overwritten if it exists).
+    - dtype (numpy dtype): Element type.
+    - columns (int): Columns per row; None writes a 1-D array.
+    """
+
+    def __init__(self, path, dtype, columns=None):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.columns = columns
+        self.rows = 0
+        self.f = open(path, 'wb')
+        self.f.write(_npy_header(self.dtype, self._shape()))
+
+    def _shape(self):
+        return (self.rows,) if self.columns is None else (self.rows, self.columns)
+
+    def append(self, block):
+        """
+        Appends a block of rows, converted to the writer's dtype.
+
+        Parameters:
+        - block (ndarray): Rows with the writer's number of columns (or a 1-D block).
+        """
+        block = np.ascontiguousarray(block, dtype=self.dtype)
+        self.f.write(block.tobytes())
+        self.rows += len(block)
+
+    def close(self):
+        """
+        Rewrites the header with the final shape and closes the file.
+        """
+        if not self.f.closed:
+            self.f.seek(0)
+            self.f.write(_npy_header(self.dtype, self._shape()))
+            self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def create_npy(path, shape, dtype):
+    """
+    Creates a .npy file of the given shape and returns it as a writable memmap,
+    e.g. to pass as out= to generate_constrained_array.
+    """
+    return np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=tuple(shape))
+
+
+def open_npy(path, mode='r'):
+    """
+    Opens a .npy file as a memmap ('r' read-only, 'r+' writable, 'c' copy-on-write).
+
+    Returns:
+    - np.memmap: The array, or None if the file could not be opened.
+    """
+    try:
+        return np.load(path, mmap_mode=mode)
+    except FileNotFoundError:
+        print(f"Error: The file '{path}' was not found.")
+    except ValueError as e:
+        print(f"Error: '{path}' is not a valid .npy file: {e}")
+    return None
+
+
+def convert_iris_csv(csv_file='iris.csv', directory=IRIS_ARRAYS_DIR, chunksize=1_000_000, corrections=None):
+    """
+    Converts an iris-schema CSV file into .npy arrays, one chunk at a time.
+
+    Parameters:
+    - csv_file (str): The CSV file to read.
+    - directory (str): Where to write the arrays (created if needed).
+    - chunksize (int): Rows read per chunk.
+    - corrections (tuple): Optional (row patches, rules) from iris_corrections.load_corrections,
+      applied to each chunk before it is written.
+
+    Returns:
+    - int: The number of rows written, or None if the file could not be read.
+    """
+    import pandas as pd
+    from iris_streaming import IRIS_DTYPES, IRIS_MEASUREMENTS, correct_chunk
+
+    os.makedirs(directory, exist_ok=True)
+    species = {}
+    try:
+        with NpyWriter(os.path.join(directory, 'measurements.npy'), np.float32, len(IRIS_MEASUREMENTS)) as values, \
+                NpyWriter(os.path.join(directory, 'species.npy'), np.int8) as codes:
+            for chunk in pd.read_csv(csv_file, dtype=IRIS_DTYPES, chunksize=chunksize):
+                if corrections is not None:
+                    correct_chunk(chunk, corrections)
+                values.append(chunk[IRIS_MEASUREMENTS].to_numpy(dtype=np.float32))
+                # Chunk category codes -> file-wide codes; the trailing -1 keeps missing values missing
+                labels = chunk['Species'].cat
+                lookup = np.array([species.setdefault(name, len(species)) for name in labels.categories] + [-1])
+                codes.append(lookup[labels.codes.to_numpy()])
+            rows = values.rows
+    except FileNotFoundError:
+        print(f"Error: The file '{csv_file}' was not found.")
+        return None
+    except (pd.errors.ParserError, pd.errors.EmptyDataError, ValueError) as e:
+        print(f"Error: The CSV file is corrupt or improperly formatted: {e}")
+        return None
+
+    with open(os.path.join(directory, 'species.json'), 'w', encoding='utf-8') as f:
+        json.dump(sorted(species, key=species.get), f)
+    print(f"Converted {rows} rows of '{csv_file}' to .npy arrays in '{directory}'.\n")
+    return rows
+
+
+def load_iris_arrays(directory=IRIS_ARRAYS_DIR):
+    """
+    Opens converted iris arrays as read-only memmaps.
+
+    Returns:
+    - tuple: (measurements, species codes, species names), or None if they are missing.
+    """
+    measurements = open_npy(os.path.join(directory, 'measurements.npy'))
+    codes = open_npy(os.path.join(directory, 'species.npy'))
+    if measurements is None or codes is None:
+        return None
+    try:
+        with open(os.path.join(directory, 'species.json'), 'r', encoding='utf-8') as f:
+            names = json.load(f)
+    except FileNotFoundError:
+        print(f"Error: '{directory}' has no species.json; convert the CSV file again.")
+        return None
+    return measurements, codes, names
+
+
+def array_correlation(arr, columns=None, chunk_rows=None):
+    """
+    Computes the Pearson correlation matrix of the columns of a 2-D array (e.g. a
+    memmap), a block of rows at a time. Rows with a NaN or infinite value are skipped.
+
+    Parameters:
+    - arr (ndarray): 2-D numeric array.
+    - columns (list): Column names; defaults to 0..n-1.
+    - chunk_rows (int): Rows per block.
+
+    Returns:
+    - DataFrame: The correlation matrix.
+    """
+    from iris_streaming import RunningMoments
+
+    moments = RunningMoments(columns if columns is not None else range(arr.shape[1]))
+    for block in iter_blocks(arr, chunk_rows):
+        moments.update(block)
+    return moments.correlation()
+
+
+def iris_statistics_from_arrays(directory=IRIS_ARRAYS_DIR, chunk_rows=1_000_000):
+    """
+    Computes the same IrisStatistics as stream_iris_statistics, from converted
+    .npy arrays instead of the CSV file. The ratio features are computed per
+    block into reused buffers.
+
+    Parameters:
+    - directory (str): The converted arrays (see convert_iris_csv).
+    - chunk_rows (int): Rows per block.
+
+    Returns:
+    - IrisStatistics: The statistics, or None if the arrays could not be opened.
+    """
+    from iris_features import IRIS_FEATURES, compute_ratio
+    from iris_streaming import IRIS_MEASUREMENTS, IrisStatistics
+
+    loaded = load_iris_arrays(directory)
+    if loaded is None:
+        return None
+    measurements, codes, names = loaded
+    position = {column: number for number, column in enumerate(IRIS_MEASUREMENTS)}
+    stats = IrisStatistics()
+    stats.dtypes = dict({column: str(measurements.dtype) for column in IRIS_MEASUREMENTS}, Species='category')
+    # One block of measurements plus ratio columns, and the float32 ratio buffers, reused for every block
+    rows = min(chunk_rows, len(measurements))
+    buffer = np.empty((rows, len(IRIS_MEASUREMENTS) + len(IRIS_FEATURES)))
+    ratios = np.empty(rows, dtype=np.float32)
+
+    for start in range(0, len(measurements), chunk_rows):
+        block = measurements[start:start + chunk_rows]
+        combined = buffer[:len(block)]
+        combined[:, :len(IRIS_MEASUREMENTS)] = block
+        for offset, (numerator, denominator) in enumerate(IRIS_FEATURES.values(), start=len(IRIS_MEASUREMENTS)):
+            combined[:, offset] = compute_ratio(block[:, position[numerator]], block[:, position[denominator]], ratios)
+        stats.rows += len(block)
+        species = codes[start:start + chunk_rows]
+        counts = np.bincount(species[species >= 0], minlength=len(names))
+        for name, count in zip(names, counts):
+            stats.species_counts[name] = stats.species_counts.get(name, 0) + int(count)
+        stats.moments.update(combined)
+    return stats
@@ -0,0 +1,209 @@
+# apod_stub_server.py
+
+# A tiny local stand-in for NASA's APOD API, used to test and benchmark the
+# retrieval code without a network connection or an API key.
+
+import datetime
+import email.utils
+import hashlib
+import json
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+# Last-Modified date reported for every stub image
+IMAGE_LAST_MODIFIED = email.utils.formatdate(946684800, usegmt=True)
+
+
+def fake_png(seed, width=64, height=48):
+    """
+    Builds a small solid-colour PNG image, so the stub can serve fixture images
+    without any imaging library.
+
+    Parameters:
+    - seed (int): Picks the colour.
+    - width (int): Image width in pixels.
+    - height (int): Image height in pixels.
+
+    Returns:
+    - bytes: The PNG file.
+    """
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    pixel = bytes(((seed * 37) % 256, (seed * 91) % 256, (seed * 53) % 256))
+    rows = b''.join(b'\x00' + pixel * width for _ in range(height))
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(rows)) + chunk(b'IEND', b'')
+
+
+def fake_apod_entry(api_date, media_base_url=None):
+    """
+    Builds a fake APOD record for a date.
+
+    Parameters:
+    - api_date (str): The date in YYYY-MM-DD format.
+    - media_base_url (str): If given, image URLs point here instead of apod.example.
+
+    Returns:
+    - dict: A record shaped like the API's JSON response.
+    """
+    # Every seventh day is a video, roughly matching the real archive
+    ordinal = datetime.date.fromisoformat(api_date).toordinal()
+    media_type = 'video' if ordinal % 7 == 0 else 'image'
+    return {
+        'date': api_date,
+        'title': f"Stub Picture for {api_date}",
+        'url': f"{media_base_url or 'https://apod.example/image'}/{api_date}.{'png' if media_base_url else 'jpg'}",
+        'explanation': f"A stub explanation for {api_date}. " * (1 + ordinal % 5),
+        'media_type': media_type,
+        'service_version': 'v1',
+    }
+
+
+class ApodStubHandler(BaseHTTPRequestHandler):
+    """
+    Serves GET /planetary/apod?date=YYYY-MM-DD with a fake record, and
+    GET /planetary/apod?start_date=...&end_date=... with a list of fake records,
+    along with fake 'X-RateLimit-*' quota headers. GET /image/YYYY-MM-DD.png
+    serves a fixture image with ETag/Last-Modified revalidation.
+    """
+
+    def do_GET(self):
+        server = self.server
+        parsed = urlparse(self.path)
+        params = parse_qs(parsed.query)
+        if parsed.path.startswith('/image/'):
+            self._send_image(parsed.path[len('/image/'):])
+            return
+        if parsed.path != '/planetary/apod':
+            self._send_json(404, {'error': 'not found'})
+            return
+
+        # Simulate network and server latency
+        if server.latency:
+            time.sleep(server.latency)
+
+        with server.lock:
+            server.request_count += 1
+            server.quota_remaining = max(server.quota_remaining - 1, 0)
+            remaining = server.quota_remaining
+
+        if 'start_date' in params and 'end_date' in params:
+            self._send_range(params['start_date'][0], params['end_date'][0], remaining)
+            return
+        if 'date' not in params:
+            self._send_json(400, {'msg': 'date is required'}, remaining)
+            return
+        api_date = params['date'][0]
+        if api_date in server.failing_dates:
+            self._send_json(500, {'msg': 'stub failure'}, remaining)
+            return
+        if api_date in server.unpublished_dates:
+            # What the real API answers for today before the day's entry is uploaded
+            self._send_json(404, {'code': 404, 'msg': f"No data available for date: {api_date}"}, remaining)
+            return
+        try:
+            self._send_json(200, fake_apod_entry(api_date, server.media_base_url), remaining)
+        except ValueError:
+            self._send_json(400, {'msg': f"bad date {api_date}"}, remaining)
+
+    def _send_range(self, start_date, end_date, remaining):
+        try:
+            start = datetime.date.fromisoformat(start_date)
+            end = datetime.date.fromisoformat(end_date)
+        except ValueError:
+            self._send_json(400, {'msg': 'bad date range'}, remaining)
+            return
+        days = [(start + datetime.timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+        # A range containing a failing date fails as a whole, like a real server error would
+        if any(day in self.server.failing_dates for day in days):
+            self._send_json(500, {'msg': 'stub failure'}, remaining)
+            return
+        self._send_json(200, [fake_apod_entry(day, self.server.media_base_url) for day in days
+                              if day not in self.server.unpublished_dates], remaining)
+
+    def _send_image(self, name):
+        with self.server.lock:
+            self.server.image_request_count += 1
+        try:
+            body = fake_png(datetime.date.fromisoformat(name.rsplit('.', 1)[0]).toordinal())
+        except ValueError:
+            self._send_json(404, {'error': 'not found'})
+            return
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', IMAGE_LAST_MODIFIED)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, payload, remaining=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if remaining is not None:
+            self.send_header('X-RateLimit-Limit', str(self.server.quota_limit))
+            self.send_header('X-RateLimit-Remaining', str(remaining))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keep benchmark output readable
+        pass
+
+
+def start_stub_server(latency=0.0, quota_limit=1000, failing_dates=(), port=0, serve_images=False):
+    """
+    Starts the stub APOD server on a background thread.
+
+    Parameters:
+    - latency (float): Seconds to sleep before answering each request.
+    - quota_limit (int): Value reported in the 'X-RateLimit-Limit' header.
+    - failing_dates (iterable): Dates (YYYY-MM-DD) that should answer with HTTP 500.
+    - port (int): Port to listen on; 0 picks a free port.
+    - serve_images (bool): Point image URLs at the stub's own /image/ endpoint, so
+      the media cache can be exercised offline.
+
+    Returns:
+    - tuple: (server, api_url). Call server.shutdown() when finished.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), ApodStubHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.quota_limit = quota_limit
+    server.quota_remaining = quota_limit
+    server.failing_dates = set(failing_dates)
+    # Dates answered with 404 (left out of ranges), like a day that isn't published yet
+    server.unpublished_dates = set()
+    server.request_count = 0
+    server.image_request_count = 0
+    server.lock = threading.Lock()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    server.media_base_url = base_url + '/image' if serve_images else None
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    api_url = base_url + '/planetary/apod'
+    return server, api_url
+
+
+if __name__ == "__main__":
+    stub, url = start_stub_server(port=8765)
+    print(f"Stub APOD API listening on {url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stub.shutdown()
@@ -0,0 +1,88 @@
+# bench_apod_streaming.py
+
+# Compares peak memory (RSS) of the load-everything processing path against the
+# streaming path on a large synthetic APOD archive.
+
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+# Make the project scripts importable when run from the benchmarks folder
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from synthetic_data import write_synthetic_apod_archive
+
+
+def peak_rss_mb():
+    """
+    Returns this process's peak resident set size in megabytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_child(mode, data_file):
+    """
+    Runs one processing path in this (child) process and prints its peak RSS and time.
+
+    Parameters:
+    - mode (str): 'load' to load the whole dataset first, 'stream' to stream the records.
+    - data_file (str): The archive to process.
+    """
+    import contextlib
+    import io
+    from apod_data_processing import analyze_apod_media, write_apod_summary_to_csv
+    from apod_store import load_apod_dataset
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == 'load':
+            dataset = load_apod_dataset(data_file)
+            analyze_apod_media(dataset)
+            write_apod_summary_to_csv(dataset)
+        else:
+            analyze_apod_media(data_file=data_file)
+            write_apod_summary_to_csv(data_file=data_file)
+    print(f"{peak_rss_mb():.1f} {time.perf_counter() - start:.3f}")
+
+
+def run_streaming_benchmark(days=20000, explanation_chars=3000):
+    """
+    Measures both processing paths on JSON array and JSON Lines archives, each in a
+    fresh subprocess so their peak RSS figures don't mix.
+
+    Parameters:
+    - days (int): Number of records in the synthetic archive.
+    - explanation_chars (int): Rough length of each explanation.
+
+    Returns:
+    - list: (format, mode, peak RSS in MB, seconds) tuples.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for extension in ('.json', '.jsonl'):
+            data_file = write_synthetic_apod_archive(
+                os.path.join(tmp, 'apod_data' + extension), days, explanation_chars)
+            for mode in ('load', 'stream'):
+                # Each run gets its own working directory for apod_summary.csv
+                run_dir = tempfile.mkdtemp(dir=tmp)
+                output = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), '--child', mode, data_file],
+                    cwd=run_dir, capture_output=True, text=True, check=True).stdout
+                rss, seconds = output.split()[-2:]
+                results.append((extension, mode, float(rss), float(seconds)))
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == '--child':
+        run_child(sys.argv[2], sys.argv[3])
+    else:
+        days = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+        for extension, mode, rss, seconds in run_streaming_benchmark(days):
+            print(f"{extension:6} {mode:6}: peak RSS {rss:7.1f} MB, {seconds:.2f}s")
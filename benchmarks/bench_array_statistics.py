@@ -0,0 +1,85 @@
+# bench_array_statistics.py
+
+# Compares the separate NumPy calls numpyArrayThingy used to make (mean twice,
+# std, a full-sort median, per-column var, a % 15 mask and a copy for the
+# replacement) with the blocked single pass in array_statistics, in memory and
+# on a memory-mapped .npy file. Peak memory is what tracemalloc sees allocated,
+# so pages of the memory-mapped file itself are not counted.
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+# Make the project scripts importable when run from the benchmarks folder
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import numpy as np
+
+from array_statistics import fused_statistics, replace_above
+from numpy_array_thing import generate_constrained_array
+
+
+def separate_calls(arr):
+    """
+    The original Part 2/3 code: every statistic is its own pass over the array.
+    """
+    divisible = arr[arr % 15 == 0]
+    mean = arr.mean()
+    replaced = arr.copy()
+    replaced[replaced > 75] = int(mean)
+    arr.mean(), arr.std(), np.median(arr), arr.var(axis=0)
+    return divisible
+
+
+def fused(arr):
+    """
+    The same results from array_statistics, replacing in place.
+    """
+    divisible = []
+    stats = fused_statistics(arr, divisor=15, divisible_out=divisible)
+    replace_above(arr, 75, int(stats.mean))
+    return np.concatenate(divisible)
+
+
+def measure(function, arr):
+    """
+    Returns:
+    - tuple: (peak MB allocated while function ran, seconds).
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    function(arr)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024 ** 2, seconds
+
+
+def run_statistics_benchmark(rows=2_000_000, columns=64):
+    """
+    Times both versions on an in-memory array and the fused one on a memmap.
+
+    Returns:
+    - list: (label, peak MB, seconds) tuples.
+    """
+    arr = generate_constrained_array((rows, columns), rng=0, chunk_rows=1_000_000)
+    results = [('separate calls (in memory)', *measure(separate_calls, arr.copy())),
+               ('fused (in memory)', *measure(fused, arr.copy()))]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'array.npy')
+        np.save(path, arr)
+        del arr
+        mapped = np.load(path, mmap_mode='r+')
+        results.append(('fused (memmap)', *measure(fused, mapped)))
+        del mapped
+    return results
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    print(f"{rows:,} x 64 uint8 array")
+    for label, peak, seconds in run_statistics_benchmark(rows):
+        print(f"{label:<27} peak {peak:8.1f} MB, {seconds:.2f}s")
@@ -0,0 +1,61 @@
+# bench_array_store.py
+
+# Compares the iris statistics streamed from CSV with the same statistics read
+# from converted .npy memmaps, on a large synthetic iris-schema file. Peak
+# memory is what tracemalloc sees allocated. Pages of a memory-mapped file
+# also show up in RSS, but the kernel can drop them at any time, so they don't
+# limit the file size the way allocations do.
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+# Make the project scripts importable when run from the benchmarks folder
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from array_store import convert_iris_csv, iris_statistics_from_arrays
+from iris_streaming import stream_iris_statistics
+from synthetic_data import write_synthetic_iris_csv
+
+
+def measure(function, *args):
+    """
+    Returns:
+    - tuple: (peak MB allocated while function ran, seconds).
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    function(*args)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024 ** 2, seconds
+
+
+def run_array_store_benchmark(rows=5_000_000, chunk_rows=500_000):
+    """
+    Times the CSV conversion, then the statistics from CSV and from the arrays.
+
+    Returns:
+    - list: (label, peak MB, seconds, file MB) tuples.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = write_synthetic_iris_csv(os.path.join(tmp, 'iris_large.csv'), rows)
+        directory = os.path.join(tmp, 'iris_arrays')
+        convert = measure(convert_iris_csv, csv_file, directory, chunk_rows)
+        array_mb = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)) / 1024 ** 2
+        return [
+            ('convert CSV to .npy', *convert, array_mb),
+            ('statistics from CSV', *measure(stream_iris_statistics, csv_file, chunk_rows),
+             os.path.getsize(csv_file) / 1024 ** 2),
+            ('statistics from .npy', *measure(iris_statistics_from_arrays, directory, chunk_rows), array_mb),
+        ]
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+    for label, peak, seconds, size in run_array_store_benchmark(rows):
+        print(f"{label:<21} peak {peak:7.1f} MB, {seconds:6.2f}s  (input/output {size:.0f} MB)")
@@ -0,0 +1,81 @@
+# bench_columnar_export.py
+
+# Compares file size and load time of apod_summary.csv against the Parquet and
+# Arrow IPC columnar exports, on a synthetic APOD archive.
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+# Make the project scripts importable when run from the benchmarks folder
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from apod_columnar_export import export_apod_columnar, read_apod_columnar
+from apod_data_processing import write_apod_summary_to_csv
+from synthetic_data import write_synthetic_apod_archive
+
+
+def directory_size(path):
+    """
+    Returns the total size in bytes of the files under a directory.
+    """
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names)
+
+
+def best_time(function, repeat=5):
+    """
+    Runs a function several times and returns the fastest run in seconds.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run_columnar_benchmark(days=20000):
+    """
+    Writes the CSV summary and both columnar exports of a synthetic archive, then
+    times loading each into a pandas DataFrame with a typed date column.
+
+    Parameters:
+    - days (int): Number of records in the synthetic archive.
+
+    Returns:
+    - list: (label, size in bytes, load seconds) tuples.
+    """
+    import pandas as pd
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        data_file = write_synthetic_apod_archive(os.path.join(tmp, 'apod_data.jsonl'), days)
+        csv_file = os.path.join(tmp, 'apod_summary.csv')
+        parquet_dir = os.path.join(tmp, 'parquet')
+        arrow_dir = os.path.join(tmp, 'arrow')
+        with contextlib.redirect_stdout(io.StringIO()):
+            write_apod_summary_to_csv(data_file=data_file, csv_file=csv_file)
+            export_apod_columnar(data_file=data_file, output_dir=parquet_dir)
+            export_apod_columnar(data_file=data_file, output_dir=arrow_dir, file_format='arrow')
+
+        load_csv = lambda: pd.read_csv(csv_file, parse_dates=['date'], dayfirst=True,
+                                       dtype={'media_type': 'category'})
+        results.append(('csv (pandas.read_csv)', os.path.getsize(csv_file), best_time(load_csv)))
+        for label, directory in (('parquet', parquet_dir), ('arrow ipc', arrow_dir)):
+            summary_dir = os.path.join(directory, 'summary')
+            results.append((f"{label} -> pyarrow.Table", directory_size(summary_dir),
+                            best_time(lambda: read_apod_columnar(directory))))
+            results.append((f"{label} -> DataFrame", directory_size(summary_dir),
+                            best_time(lambda: read_apod_columnar(directory).to_pandas())))
+    return results
+
+
+if __name__ == "__main__":
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    for label, size, seconds in run_columnar_benchmark(days):
+        print(f"{label:26}: {size / 1024:8.1f} KB, load {seconds * 1000:7.2f} ms")
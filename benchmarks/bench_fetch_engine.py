@@ -0,0 +1,52 @@
+# bench_fetch_engine.py
+
+# Compares serial, concurrent and range-query fetch_multiple_apod_data runs against the local stub API.
+
+import datetime
+import os
+import sys
+import tempfile
+
+# Make the project scripts importable when run from the benchmarks folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from apod_data_retrieval import fetch_multiple_apod_data
+from apod_stub_server import start_stub_server
+
+
+def run_fetch_benchmark(days=90, latency=0.05, worker_counts=(1, 4, 16)):
+    """
+    Backfills `days` days from the stub server with per-day requests once per worker
+    count, and then once more using range requests.
+
+    Parameters:
+    - days (int): Number of days to fetch in each run.
+    - latency (float): Simulated per-request latency of the stub server in seconds.
+    - worker_counts (tuple): The max_workers values to compare.
+
+    Returns:
+    - dict: Run statistics keyed by a run label.
+    """
+    server, api_url = start_stub_server(latency=latency, quota_limit=100000)
+    start = datetime.date(2020, 1, 1)
+    end_date = (start + datetime.timedelta(days=days - 1)).strftime('%d/%m/%Y')
+    results = {}
+    try:
+        runs = [(f"per-day, max_workers={workers}", workers, False) for workers in worker_counts]
+        runs.append((f"range, max_workers={max(worker_counts)}", max(worker_counts), True))
+        for label, workers, use_range in runs:
+            with tempfile.TemporaryDirectory() as tmp:
+                output_file = os.path.join(tmp, 'apod_data.jsonl')
+                results[label] = fetch_multiple_apod_data(
+                    'DEMO_KEY', start.strftime('%d/%m/%Y'), end_date, max_workers=workers,
+                    requests_per_second=1000.0, output_file=output_file, api_url=api_url,
+                    use_range=use_range, chunk_days=30)
+    finally:
+        server.shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    for label, stats in run_fetch_benchmark().items():
+        print(f"{label}: {stats['http_requests']} requests, {stats['requests_per_second']:.1f} requests/sec "
+              f"({stats['fetched']} fetched in {stats['elapsed']:.2f}s)")
@@ -0,0 +1,84 @@
+# bench_instrumentation.py
+
+# Measures what the instrumentation costs: the per-call overhead of span(),
+# count() and observe() while disabled and while enabled, and the time
+# read_apod_data spends with and without its per-record output on a large
+# synthetic archive.
+
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+# Make the project scripts importable when run from the benchmarks folder
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import instrumentation
+from instrumentation import count, observe, span
+from synthetic_data import write_synthetic_apod_archive
+
+
+def time_calls(calls=1_000_000):
+    """
+    Times a span, a counter increment and a histogram observation per iteration.
+
+    Returns:
+    - float: Nanoseconds per iteration.
+    """
+    start = time.perf_counter()
+    for _ in range(calls):
+        with span('bench.stage'):
+            count('bench_items_total')
+            observe('bench_latency_seconds', 0.01)
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def time_read(data_file, print_records, repeat=3):
+    """
+    Returns the best time of read_apod_data in milliseconds, with its output sent to os.devnull.
+    """
+    from apod_data_processing import read_apod_data
+
+    best = None
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        # The first call loads and caches the dataset, so the timed calls measure the output only
+        read_apod_data(data_file, print_records=False)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            read_apod_data(data_file, print_records=print_records)
+            seconds = time.perf_counter() - start
+            best = seconds if best is None else min(best, seconds)
+    return best * 1000
+
+
+def run_instrumentation_benchmark(calls=200_000, days=20000):
+    """
+    Runs both measurements.
+
+    Parameters:
+    - calls (int): Iterations of the span/count/observe loop.
+    - days (int): Records in the synthetic archive.
+
+    Returns:
+    - dict: Timings keyed by a label.
+    """
+    results = {}
+    instrumentation.configure(enabled=False)
+    results['span+count+observe, disabled (ns)'] = time_calls(calls)
+    instrumentation.configure(enabled=True)
+    results['span+count+observe, enabled (ns)'] = time_calls(calls)
+    instrumentation.configure(enabled=False)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_file = os.path.join(tmp, 'apod_data.jsonl')
+        write_synthetic_apod_archive(data_file, days, explanation_chars=200)
+        results[f'read_apod_data, {days} records, quiet (ms)'] = time_read(data_file, False)
+        results[f'read_apod_data, {days} records, per-record output (ms)'] = time_read(data_file, True)
+    return results
+
+
+if __name__ == "__main__":
+    for label, value in run_instrumentation_benchmark().items():
+        print(f"{label:<55} {value:10.4f}")
@@ -0,0 +1,53 @@
+# bench_iris_batch.py
+
+# Measures how batch throughput over iris-schema shards scales with the number
+# of worker processes.
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+# Make the project scripts importable when run from the benchmarks folder
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from iris_batch import run_batch
+from synthetic_data import write_synthetic_iris_csv
+
+
+def run_batch_benchmark(shards=16, rows_per_shard=250_000):
+    """
+    Runs the batch over the same synthetic shards with 1, 2, 4, ... workers, up to
+    the CPU count.
+
+    Parameters:
+    - shards (int): Number of shard files.
+    - rows_per_shard (int): Rows in each shard.
+
+    Returns:
+    - list: (workers, seconds, rows/sec) tuples.
+    """
+    cpus = os.cpu_count() or 1
+    worker_counts = sorted({1, cpus} | {2 ** i for i in range(1, cpus.bit_length()) if 2 ** i <= cpus})
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(shards):
+            write_synthetic_iris_csv(os.path.join(tmp, f"shard_{i:03d}.csv"), rows_per_shard, seed=i)
+        pattern = os.path.join(tmp, 'shard_*.csv')
+        for workers in worker_counts:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                run_batch([pattern], max_workers=workers, report_file=None)
+            seconds = time.perf_counter() - start
+            results.append((workers, seconds, shards * rows_per_shard / seconds))
+    return results
+
+
+if __name__ == "__main__":
+    baseline = None
+    for workers, seconds, rate in run_batch_benchmark():
+        baseline = baseline or rate
+        print(f"{workers:3d} workers: {seconds:6.2f}s, {rate / 1e6:5.2f}M rows/sec ({rate / baseline:.2f}x)")
@@ -0,0 +1,72 @@
+# bench_iris_features.py
+
+# Compares peak extra memory and time of the ratio features computed with plain
+# pandas division (as add_new_features used to) against the buffered
+# computation in iris_features, on a large synthetic iris-schema frame.
+
+import os
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+# Make the project scripts importable when run from the benchmarks folder
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import numpy as np
+
+from iris_features import IRIS_FEATURES, add_features
+from synthetic_data import synthetic_iris_frame
+
+
+def pandas_division(df):
+    """
+    The original feature code: one pandas division per ratio, then an inf cleanup.
+    """
+    for name, (numerator, denominator) in IRIS_FEATURES.items():
+        df[name] = df[numerator] / df[denominator]
+    df.replace([np.inf, -np.inf], np.nan, inplace=True)
+
+
+def measure(function, df):
+    """
+    Runs a feature function on a copy of the frame.
+
+    Returns:
+    - tuple: (peak extra MB allocated while it ran, seconds).
+    """
+    df = df.copy()
+    tracemalloc.start()
+    start = time.perf_counter()
+    function(df)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024 ** 2, seconds
+
+
+def run_features_benchmark(rows=10_000_000):
+    """
+    Measures each way of adding the ratio features.
+
+    Parameters:
+    - rows (int): Rows in the synthetic frame.
+
+    Returns:
+    - list: (label, peak MB, seconds) tuples.
+    """
+    df = synthetic_iris_frame(rows)
+    # Make a few widths zero so the zero-division handling is exercised
+    df.loc[df.index[::100000], 'Petal.Width'] = 0.0
+    cases = {
+        'pandas division + replace': pandas_division,
+        'iris_features (float64)': lambda frame: add_features(frame),
+        'iris_features (float32)': lambda frame: add_features(frame, dtype=np.float32),
+    }
+    return [(label, *measure(function, df)) for label, function in cases.items()]
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    for label, peak, seconds in run_features_benchmark(rows):
+        print(f"{label:<27} peak {peak:8.1f} MB, {seconds:.2f}s")
@@ -0,0 +1,73 @@
+# bench_iris_plotting.py
+
+# Times the scatter and pair plots on synthetic iris-schema frames of growing
+# size, and reports the size of the files they produce. The seaborn plots are
+# only run on the smaller frames, since they take minutes beyond that.
+
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+# Make the project scripts importable when run from the benchmarks folder
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import contextlib
+import io
+
+from iris_data_analysis_thing import add_new_features, create_pair_plot, create_scatter_plot_with_regression
+from synthetic_data import synthetic_iris_frame
+
+# Largest frame the seaborn plots are run on
+SEABORN_MAX_ROWS = 20_000
+
+
+def time_plot(function, df, output_file, **options):
+    """
+    Runs one plot function with its output silenced.
+
+    Returns:
+    - tuple: (seconds, output file size in KB).
+    """
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        function(df, output_file, **options)
+    seconds = time.perf_counter() - start
+    return seconds, os.path.getsize(output_file) / 1024
+
+
+def run_plotting_benchmark(sizes=(1_000, 20_000, 1_000_000, 5_000_000)):
+    """
+    Times each plot at each frame size.
+
+    Parameters:
+    - sizes (tuple): Row counts to try.
+
+    Returns:
+    - list: (rows, label, seconds, KB) tuples.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in sizes:
+            df = synthetic_iris_frame(rows)
+            with contextlib.redirect_stdout(io.StringIO()):
+                df = add_new_features(df)
+            cases = {
+                'scatter (scalable)': (create_scatter_plot_with_regression, 'scatter.pdf', {'scalable': True}),
+                'pair (hist2d)': (create_pair_plot, 'pair.png', {'scalable': True}),
+                'pair (sample)': (create_pair_plot, 'pair.png', {'scalable': True, 'off_diagonal': 'sample'}),
+            }
+            if rows <= SEABORN_MAX_ROWS:
+                cases['scatter (seaborn)'] = (create_scatter_plot_with_regression, 'scatter.pdf', {'scalable': False})
+                cases['pair (seaborn)'] = (create_pair_plot, 'pair.png', {'scalable': False})
+            for label, (function, name, options) in cases.items():
+                seconds, size = time_plot(function, df, os.path.join(directory, name), **options)
+                results.append((rows, label, seconds, size))
+    return results
+
+
+if __name__ == "__main__":
+    sizes = tuple(int(arg) for arg in sys.argv[1:]) or (1_000, 20_000, 1_000_000, 5_000_000)
+    for rows, label, seconds, size in run_plotting_benchmark(sizes):
+        print(f"{rows:>10,} rows  {label:<20} {seconds:7.2f}s  {size:9.1f} KB")
@@ -0,0 +1,57 @@
+# bench_iris_startup.py
+
+# Measures start-up time of the iris analysis CLI. Each command runs in a fresh
+# interpreter, so the timings include every import it triggers. The eager import
+# of pandas, numpy, seaborn and matplotlib that the script used to do at module
+# level is timed too, for comparison.
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCH_DIR)
+SCRIPT = os.path.join(PROJECT_DIR, 'iris_data_analysis_thing.py')
+
+COMMANDS = {
+    'import module': [sys.executable, '-c', 'import iris_data_analysis_thing'],
+    'eager imports (old)': [sys.executable, '-c',
+                            'import pandas, numpy, seaborn, matplotlib; matplotlib.use("Agg"); import matplotlib.pyplot'],
+    '--help': [sys.executable, SCRIPT, '--help'],
+    'inspect': [sys.executable, SCRIPT, 'inspect'],
+    'correlate': [sys.executable, SCRIPT, 'correlate'],
+    'plot --kind scatter': [sys.executable, SCRIPT, 'plot', '--kind', 'scatter'],
+}
+
+
+def time_command(command, cwd, repeat=3):
+    """
+    Runs a command several times and returns the fastest wall time in seconds.
+    """
+    env = dict(os.environ, PYTHONPATH=PROJECT_DIR)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run_startup_benchmark(repeat=3):
+    """
+    Times each command in a scratch directory holding a copy of iris.csv.
+
+    Returns:
+    - dict: {command label: seconds}.
+    """
+    with tempfile.TemporaryDirectory() as work_dir:
+        shutil.copy(os.path.join(PROJECT_DIR, 'iris.csv'), work_dir)
+        return {label: time_command(command, work_dir, repeat) for label, command in COMMANDS.items()}
+
+
+if __name__ == "__main__":
+    for label, seconds in run_startup_benchmark().items():
+        print(f"{label:<22} {seconds * 1000:8.0f} ms")
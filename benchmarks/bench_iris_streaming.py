@@ -0,0 +1,78 @@
+# bench_iris_streaming.py
+
+# Compares peak memory (RSS) and time of the in-memory iris correlation against
+# the chunked streaming mode, on a large synthetic iris-schema CSV.
+
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+# Make the project scripts importable when run from the benchmarks folder
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from synthetic_data import write_synthetic_iris_csv
+
+
+def peak_rss_mb():
+    """
+    Returns this process's peak resident set size in megabytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_child(mode, csv_file):
+    """
+    Computes the correlation matrix in this (child) process and prints its peak RSS and time.
+
+    Parameters:
+    - mode (str): 'load' to read the whole file with pandas defaults, 'stream' to read it in chunks.
+    - csv_file (str): The CSV file to process.
+    """
+    import pandas as pd
+    from iris_streaming import IRIS_NUMERIC_COLUMNS, stream_iris_statistics
+
+    start = time.perf_counter()
+    if mode == 'load':
+        df = pd.read_csv(csv_file)
+        df['Petal Ratio'] = df['Petal.Length'] / df['Petal.Width']
+        df['Sepal Ratio'] = df['Sepal.Length'] / df['Sepal.Width']
+        df[IRIS_NUMERIC_COLUMNS].corr()
+    else:
+        stream_iris_statistics(csv_file, chunksize=500_000).moments.correlation()
+    print(f"{peak_rss_mb():.1f} {time.perf_counter() - start:.3f}")
+
+
+def run_streaming_benchmark(rows=5_000_000):
+    """
+    Measures both modes, each in a fresh subprocess so their peak RSS figures don't mix.
+
+    Parameters:
+    - rows (int): Number of rows in the synthetic CSV.
+
+    Returns:
+    - list: (mode, peak RSS in MB, seconds) tuples.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = write_synthetic_iris_csv(os.path.join(tmp, 'iris_large.csv'), rows)
+        for mode in ('load', 'stream'):
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode, csv_file],
+                                    capture_output=True, text=True, check=True).stdout
+            rss, seconds = output.split()[-2:]
+            results.append((mode, float(rss), float(seconds)))
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == '--child':
+        run_child(sys.argv[2], sys.argv[3])
+    else:
+        rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+        for mode, rss, seconds in run_streaming_benchmark(rows):
+            print(f"{mode:6}: peak RSS {rss:7.1f} MB, {seconds:.2f}s")
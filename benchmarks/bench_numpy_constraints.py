@@ -0,0 +1,93 @@
+# bench_numpy_constraints.py
+
+# Compares the original nested-loop constraint fixing of numpyArrayThingy
+# with the vectorised make_row_sums_even/fix_total in numpy_array_thing, and
+# times generate_constrained_array on a large array in chunked mode.
+
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+# Make the project scripts importable when run from the benchmarks folder
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import numpy as np
+
+from numpy_array_thing import fix_total, generate_constrained_array, make_row_sums_even
+
+
+def loop_constraints(arr):
+    """
+    The original code: a Python loop over rows for the even row sums, then a
+    search over elements for the multiple-of-5 total.
+    """
+    for i in range(arr.shape[0]):
+        if arr[i].sum() % 2 != 0:
+            for j in range(arr.shape[1]):
+                if arr[i, j] < 100:
+                    arr[i, j] += 1
+                    break
+                elif arr[i, j] > 10:
+                    arr[i, j] -= 1
+                    break
+    remainder = arr.sum() % 5
+    if remainder != 0:
+        adjustment = 5 - remainder
+        if arr[-1, -1] + adjustment <= 100:
+            arr[-1, -1] += adjustment
+        elif arr[-1, -1] - remainder >= 10:
+            arr[-1, -1] -= remainder
+
+
+def vectorised_constraints(arr):
+    """
+    The same fix with whole-array mask arithmetic.
+    """
+    fix_total(arr, make_row_sums_even(arr, 10, 100), 10, 100, 5)
+
+
+def run_constraints_benchmark(shapes=((20, 5), (10_000, 5), (200_000, 64))):
+    """
+    Times both constraint fixes on the same random arrays.
+
+    Parameters:
+    - shapes (tuple): Array shapes to try.
+
+    Returns:
+    - list: (shape, loop seconds, vectorised seconds) tuples.
+    """
+    results = []
+    rng = np.random.default_rng(0)
+    for shape in shapes:
+        arr = rng.integers(10, 100, size=shape, endpoint=True)
+        timings = []
+        for function in (loop_constraints, vectorised_constraints):
+            copy = arr.copy()
+            start = time.perf_counter()
+            function(copy)
+            timings.append(time.perf_counter() - start)
+        results.append((shape, *timings))
+    return results
+
+
+def time_generation(shape=(10_000_000, 64), chunk_rows=1_000_000):
+    """
+    Times generate_constrained_array end to end in chunked mode.
+
+    Returns:
+    - float: Seconds taken.
+    """
+    start = time.perf_counter()
+    arr = generate_constrained_array(shape, rng=0, chunk_rows=chunk_rows)
+    seconds = time.perf_counter() - start
+    assert arr is not None and arr.sum(dtype=np.int64) % 5 == 0
+    return seconds
+
+
+if __name__ == "__main__":
+    for shape, loop, vectorised in run_constraints_benchmark():
+        print(f"{str(shape):<14} loops {loop * 1000:9.2f} ms, vectorised {vectorised * 1000:8.2f} ms "
+              f"({loop / vectorised:.0f}x)")
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    print(f"generate_constrained_array(({rows:,}, 64), chunk_rows=1,000,000): {time_generation((rows, 64)):.2f}s")
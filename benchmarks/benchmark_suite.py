@@ -0,0 +1,425 @@
+# benchmark_suite.py
+
+# Benchmark harness covering the hot paths of all four scripts.
+# For each scale it generates synthetic inputs (an APOD archive, an iris-schema
+# CSV and a large integer array) and starts the local stub APOD API. Each stage
+# then runs in a fresh process, so every stage gets its own peak-RSS figure.
+# A stage is run once for wall time and peak RSS, and once more in another
+# fresh process under tracemalloc for the peak of traced allocations, since
+# tracing slows Python code down. Results are saved as JSON and can be
+# compared against a stored baseline, flagging stages that got slower or bigger.
+#
+#   python benchmarks/benchmark_suite.py --scales small medium
+#   python benchmarks/benchmark_suite.py --save-baseline
+#   python benchmarks/benchmark_suite.py --baseline benchmarks/baseline.json
+
+import argparse
+import contextlib
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+# Make the project scripts importable when run from the benchmarks folder
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# Default locations of the results and of the baseline they are compared with
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+BASELINE_FILE = os.path.join(BENCH_DIR, 'baseline.json')
+
+# Input sizes per scale
+SCALES = {
+    'small': {'apod_days': 1_000, 'iris_rows': 50_000, 'array_rows': 200_000},
+    'medium': {'apod_days': 5_000, 'iris_rows': 1_000_000, 'array_rows': 2_000_000},
+    'large': {'apod_days': 10_000, 'iris_rows': 5_000_000, 'array_rows': 10_000_000},
+}
+
+# A stage is flagged when it is this much slower or bigger than the baseline...
+DEFAULT_TOLERANCE = 0.25
+# ...and the difference is larger than measurement noise
+MIN_SECONDS_DIFFERENCE = 0.05
+MIN_MB_DIFFERENCE = 10.0
+
+
+def peak_rss_mb():
+    """
+    Returns this process's peak resident set size in megabytes since the last
+    reset_peak_rss(). Falls back to getrusage, whose figure on Linux includes the
+    parent's peak, when /proc isn't available.
+    """
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def reset_peak_rss():
+    """
+    Resets the peak RSS to the current RSS where Linux allows it.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def current_rss_mb():
+    """
+    Returns this process's current resident set size in megabytes (the peak if
+    /proc isn't available).
+    """
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def unique_path(directory, prefix, suffix):
+    """
+    Returns a new file name in directory, so repeated runs of a stage start from scratch.
+    """
+    return os.path.join(directory, f"{prefix}_{os.getpid()}_{time.perf_counter_ns()}{suffix}")
+
+
+# Stages: each has a setup that loads its inputs (not measured) and a run that is
+# measured. Both run in the child process; setup returns the argument for run.
+
+def _setup_paths(inputs):
+    return inputs
+
+
+def _apod_fetch(inputs):
+    from apod_data_retrieval import fetch_multiple_apod_data
+    start = datetime.date(2000, 1, 1)
+    end = start + datetime.timedelta(days=inputs['apod_days'] - 1)
+    output_file = unique_path(inputs['workdir'], 'fetch', '.jsonl')
+    fetch_multiple_apod_data('DEMO_KEY', start.strftime('%d/%m/%Y'), end.strftime('%d/%m/%Y'),
+                             requests_per_second=1000.0, output_file=output_file,
+                             api_url=inputs['api_url'], update_search=False)
+
+
+def _apod_read(inputs):
+    from apod_data_processing import read_apod_data
+    read_apod_data(inputs['apod_archive'])
+
+
+def _apod_analyze(inputs):
+    from apod_data_processing import analyze_apod_media
+    analyze_apod_media(data_file=inputs['apod_archive'])
+
+
+def _apod_summary(inputs):
+    from apod_data_processing import write_apod_summary_to_csv
+    csv_file = unique_path(inputs['workdir'], 'summary', '.csv')
+    write_apod_summary_to_csv(data_file=inputs['apod_archive'], csv_file=csv_file)
+
+
+def _iris_load(inputs):
+    from iris_data_analysis_thing import load_and_inspect_data
+    load_and_inspect_data(inputs['iris_csv'])
+
+
+def _setup_iris_frame(inputs):
+    from iris_data_analysis_thing import load_and_inspect_data
+    return load_and_inspect_data(inputs['iris_csv'])
+
+
+def _iris_correct_and_features(df):
+    from iris_data_analysis_thing import add_new_features, correct_data_errors
+    add_new_features(correct_data_errors(df))
+
+
+def _setup_iris_features(inputs):
+    from iris_data_analysis_thing import prepare_data
+    return prepare_data(inputs['iris_csv'], 'features')
+
+
+def _iris_correlate(df):
+    from iris_data_analysis_thing import calculate_correlations
+    calculate_correlations(df)
+
+
+def _iris_plot(df):
+    from iris_data_analysis_thing import create_pair_plot, create_scatter_plot_with_regression
+    with tempfile.TemporaryDirectory() as workdir:
+        create_scatter_plot_with_regression(df, os.path.join(workdir, 'scatter.pdf'))
+        create_pair_plot(df, os.path.join(workdir, 'pair.png'))
+
+
+def _iris_stream(inputs):
+    from iris_streaming import stream_iris_statistics
+    stream_iris_statistics(inputs['iris_csv'], chunksize=500_000)
+
+
+def _numpy_generate(inputs):
+    from numpy_array_thing import generate_constrained_array
+    generate_constrained_array((inputs['array_rows'], 64), rng=0, chunk_rows=1_000_000)
+
+
+def _numpy_statistics(inputs):
+    from array_statistics import fused_statistics
+    from array_store import open_npy
+    fused_statistics(open_npy(inputs['array_file']), divisor=15)
+
+
+def _numpy_thingy(inputs):
+    from numpy_array_thing import numpyArrayThingy
+    numpyArrayThingy(seed=0)
+
+
+STAGES = {
+    'apod.fetch': (_setup_paths, _apod_fetch),
+    'apod.read_apod_data': (_setup_paths, _apod_read),
+    'apod.analyze_apod_media': (_setup_paths, _apod_analyze),
+    'apod.write_summary_csv': (_setup_paths, _apod_summary),
+    'iris.load': (_setup_paths, _iris_load),
+    'iris.correct_and_features': (_setup_iris_frame, _iris_correct_and_features),
+    'iris.calculate_correlations': (_setup_iris_features, _iris_correlate),
+    'iris.plots': (_setup_iris_features, _iris_plot),
+    'iris.stream_statistics': (_setup_paths, _iris_stream),
+    'numpy.generate': (_setup_paths, _numpy_generate),
+    'numpy.fused_statistics': (_setup_paths, _numpy_statistics),
+    'numpy.numpyArrayThingy': (_setup_paths, _numpy_thingy),
+}
+
+
+def measure_stage(name, inputs, allocations=False):
+    """
+    Runs one stage and measures it. Runs in a fresh child process, with the
+    stage's own output discarded.
+
+    Parameters:
+    - name (str): A key of STAGES.
+    - inputs (dict): Paths and sizes of the generated inputs.
+    - allocations (bool): Measure the peak of traced allocations instead of time and RSS.
+
+    Returns:
+    - dict: {'alloc_peak_mb': ...} with allocations, else seconds, peak_rss_mb and
+      rss_increase_mb (the peak above the RSS before the stage started).
+    """
+    setup, run = STAGES[name]
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        state = setup(inputs)
+        if allocations:
+            tracemalloc.start()
+            run(state)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return {'alloc_peak_mb': peak / 1024 ** 2}
+        reset_peak_rss()
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+        run(state)
+        seconds = time.perf_counter() - start
+    peak = peak_rss_mb()
+    return {'seconds': seconds, 'peak_rss_mb': peak, 'rss_increase_mb': max(peak - rss_before, 0.0)}
+
+
+def run_in_child(context, name, inputs, allocations):
+    """
+    Runs measure_stage in a new process and returns its result.
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(measure_stage, name, inputs, allocations).result()
+
+
+def generate_inputs(scale, workdir):
+    """
+    Writes the synthetic inputs of one scale.
+
+    Returns:
+    - dict: Sizes and paths, passed to every stage.
+    """
+    from synthetic_data import (write_synthetic_apod_archive, write_synthetic_array,
+                                write_synthetic_iris_csv)
+
+    sizes = SCALES[scale]
+    inputs = dict(sizes, workdir=workdir)
+    inputs['apod_archive'] = write_synthetic_apod_archive(os.path.join(workdir, 'apod_data.jsonl'),
+                                                          sizes['apod_days'])
+    inputs['iris_csv'] = write_synthetic_iris_csv(os.path.join(workdir, 'iris.csv'), sizes['iris_rows'])
+    inputs['array_file'] = write_synthetic_array(os.path.join(workdir, 'array.npy'),
+                                                 sizes['array_rows'])
+    return inputs
+
+
+def run_suite(scales=('small',), stages=None, allocations=True):
+    """
+    Runs the selected stages at each scale, each stage in a fresh process.
+
+    Parameters:
+    - scales (iterable): Keys of SCALES.
+    - stages (iterable): Keys of STAGES; None runs them all.
+    - allocations (bool): Also measure traced allocations.
+
+    Returns:
+    - dict: {'meta': environment details, 'results': list of per-stage dicts}.
+    """
+    import numpy as np
+    import pandas as pd
+    from apod_stub_server import start_stub_server
+
+    stages = list(stages or STAGES)
+    results = []
+    # Spawned children start from a clean interpreter, so imports count towards their stage
+    context = multiprocessing.get_context('spawn')
+    server, api_url = start_stub_server(quota_limit=10 ** 9)
+    try:
+        for scale in scales:
+            with tempfile.TemporaryDirectory() as workdir:
+                print(f"Generating {scale} inputs: {SCALES[scale]}")
+                inputs = dict(generate_inputs(scale, workdir), api_url=api_url)
+                for name in stages:
+                    try:
+                        measured = run_in_child(context, name, inputs, False)
+                        # A second fresh process, so caches warmed by the first run
+                        # don't hide allocations
+                        measured['alloc_peak_mb'] = None
+                        if allocations:
+                            traced = run_in_child(context, name, inputs, True)
+                            measured['alloc_peak_mb'] = traced['alloc_peak_mb']
+                    except Exception as e:
+                        print(f"  {name:<30} failed: {e}")
+                        continue
+                    results.append(dict(stage=name, scale=scale, **measured))
+                    print(format_result(results[-1]))
+    finally:
+        server.shutdown()
+
+    meta = {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'scales': {scale: SCALES[scale] for scale in scales},
+    }
+    return {'meta': meta, 'results': results}
+
+
+def format_result(result):
+    """
+    Formats one stage result as a table row.
+    """
+    alloc = "       n/a"
+    if result['alloc_peak_mb'] is not None:
+        alloc = f"{result['alloc_peak_mb']:8.1f} MB"
+    return (f"  {result['stage']:<30} {result['seconds']:8.3f}s  "
+            f"peak RSS {result['peak_rss_mb']:8.1f} MB "
+            f"(+{result['rss_increase_mb']:7.1f})  allocations {alloc}")
+
+
+def compare_with_baseline(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Finds stages that are slower or use more memory than in the baseline.
+
+    Parameters:
+    - results (dict): As returned by run_suite.
+    - baseline (dict): An earlier run_suite result.
+    - tolerance (float): Allowed relative increase, e.g. 0.25 for 25%.
+
+    Returns:
+    - list: (stage, scale, metric, baseline value, new value) for each regression.
+    """
+    previous = {(entry['stage'], entry['scale']): entry for entry in baseline.get('results', [])}
+    checks = (('seconds', MIN_SECONDS_DIFFERENCE), ('rss_increase_mb', MIN_MB_DIFFERENCE),
+              ('alloc_peak_mb', MIN_MB_DIFFERENCE))
+    regressions = []
+    for entry in results['results']:
+        old = previous.get((entry['stage'], entry['scale']))
+        if old is None:
+            continue
+        for metric, noise in checks:
+            if entry.get(metric) is None or old.get(metric) is None:
+                continue
+            if entry[metric] > old[metric] * (1 + tolerance) and entry[metric] - old[metric] > noise:
+                regressions.append((entry['stage'], entry['scale'], metric, old[metric], entry[metric]))
+    return regressions
+
+
+def format_regression(stage, scale, metric, old, new):
+    """
+    Formats one regression found by compare_with_baseline.
+
+    The change is relative, or absolute when the baseline value is zero (the RSS
+    increase is clamped at zero, so a stage can start from nothing).
+    """
+    change = f"+{(new / old - 1) * 100:.0f}%" if old else f"+{new - old:.3f} from zero"
+    return f"REGRESSION {stage} ({scale}): {metric} {old:.3f} -> {new:.3f} ({change})"
+
+
+def save_results(results, path):
+    """
+    Writes results as JSON, creating the folder if needed.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved as '{path}'.")
+
+
+def main(argv=None):
+    """
+    Command line entry point.
+
+    Returns:
+    - int: The exit status: 1 if regressions were found, else 0.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths of the project scripts.")
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=['small'],
+                        help="Input sizes to run.")
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=None,
+                        help="Stages to run (default: all).")
+    parser.add_argument('--no-allocations', action='store_true',
+                        help="Skip the tracemalloc run of each stage.")
+    parser.add_argument('--output', default=None,
+                        help="Results file (default: results/benchmark_<time>.json).")
+    parser.add_argument('--baseline', default=None, help="Compare against this results file.")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help=f"Also save the results as {BASELINE_FILE}.")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed relative increase before a stage is flagged.")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.scales, args.stages, not args.no_allocations)
+    output = args.output or os.path.join(RESULTS_DIR,
+                                         f"benchmark_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+    save_results(results, output)
+    if args.save_baseline:
+        save_results(results, BASELINE_FILE)
+
+    if args.baseline:
+        try:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            print(f"Error: could not read the baseline '{args.baseline}': {e}")
+            return 1
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(format_regression(*regression))
+        if regressions:
+            return 1
+        print(f"No regressions against '{args.baseline}' (tolerance {args.tolerance:.0%}).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+# synthetic_data.py
+
+# Generators for synthetic data files used by the benchmarks.
+
+import datetime
+import json
+import random
+
+# The first day of the real APOD archive
+APOD_FIRST_DATE = datetime.date(1995, 6, 16)
+
+WORDS = ['nebula', 'galaxy', 'star', 'comet', 'Betelgeuse', 'M31', 'Andromeda', 'Orion',
+         'supernova', 'aurora', 'eclipse', 'Jupiter', 'Saturn', 'Moon', 'dust', 'light',
+         'telescope', 'spiral', 'cluster', 'planet', 'the', 'of', 'and', 'a', 'in', 'is']
+
+
+def synthetic_apod_records(days, explanation_chars=3000, start=APOD_FIRST_DATE, seed=0):
+    """
+    Yields `days` fake APOD records on consecutive dates.
+
+    Parameters:
+    - days (int): Number of records to generate.
+    - explanation_chars (int): Rough length of each explanation, in characters.
+    - start (datetime.date): Date of the first record.
+    - seed (int): Seed for the random word choice, so runs are repeatable.
+
+    Yields:
+    - dict: A record with the same fields as apod_data.json.
+    """
+    rng = random.Random(seed)
+    for i in range(days):
+        day = start + datetime.timedelta(days=i)
+        words = []
+        length = 0
+        target = rng.randint(explanation_chars // 2, explanation_chars * 3 // 2)
+        while length < target:
+            word = rng.choice(WORDS)
+            words.append(word)
+            length += len(word) + 1
+        yield {
+            'date': day.isoformat(),
+            'title': f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}",
+            'url': f"https://apod.example/image/{day:%y%m}/{i}.jpg",
+            'explanation': ' '.join(words),
+            'media_type': 'video' if rng.random() < 0.1 else 'image',
+        }
+
+
+def write_synthetic_apod_archive(path, days, explanation_chars=3000, seed=0):
+    """
+    Writes a synthetic APOD archive, as a JSON array if `path` ends in '.json'
+    or as JSON Lines if it ends in '.jsonl'.
+
+    Parameters:
+    - path (str): The file to write.
+    - days (int): Number of records to generate.
+    - explanation_chars (int): Rough length of each explanation, in characters.
+    - seed (int): Seed for the random word choice.
+
+    Returns:
+    - str: The path written.
+    """
+    records = synthetic_apod_records(days, explanation_chars, seed=seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+        else:
+            # Written one element at a time so the generator itself stays small
+            f.write('[\n')
+            for i, record in enumerate(records):
+                if i:
+                    f.write(',\n')
+                f.write(json.dumps(record, indent=4))
+            f.write('\n]')
+    return path
+
+
+# Per-species means and standard deviations of the four iris measurements
+# (sepal length, sepal width, petal length, petal width), close to the real data
+IRIS_SPECIES_PARAMETERS = {
+    'setosa': ((5.01, 3.43, 1.46, 0.25), (0.35, 0.38, 0.17, 0.11)),
+    'versicolor': ((5.94, 2.77, 4.26, 1.33), (0.52, 0.31, 0.47, 0.20)),
+    'virginica': ((6.59, 2.97, 5.55, 2.03), (0.64, 0.32, 0.55, 0.27)),
+}
+IRIS_HEADER = ['Sepal.Length', 'Sepal.Width', 'Petal.Length', 'Petal.Width', 'Species']
+
+
+def synthetic_iris_frame(rows, seed=0):
+    """
+    Builds a DataFrame of fake iris measurements with the iris.csv schema.
+
+    Parameters:
+    - rows (int): Number of rows.
+    - seed (int): Seed for the random generator.
+
+    Returns:
+    - DataFrame: The rows, with species drawn uniformly.
+    """
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    names = list(IRIS_SPECIES_PARAMETERS)
+    species = rng.integers(0, len(names), rows)
+    means = np.array([IRIS_SPECIES_PARAMETERS[name][0] for name in names])
+    stds = np.array([IRIS_SPECIES_PARAMETERS[name][1] for name in names])
+    values = rng.standard_normal((rows, 4)) * stds[species] + means[species]
+    # Measurements are positive and recorded to one decimal place, like the real file
+    values = np.round(np.clip(values, 0.1, None), 1)
+    frame = pd.DataFrame(values, columns=IRIS_HEADER[:4])
+    frame['Species'] = pd.Categorical.from_codes(species, names)
+    return frame
+
+
+def write_synthetic_iris_csv(path, rows, seed=0, chunk_rows=1_000_000):
+    """
+    Writes a fake iris-schema CSV file, a chunk at a time so large files can be
+    generated in bounded memory.
+
+    Parameters:
+    - path (str): The file to write.
+    - rows (int): Number of rows.
+    - seed (int): Seed for the random generator; each chunk uses seed + chunk number.
+    - chunk_rows (int): Rows generated per chunk.
+
+    Returns:
+    - str: The path written.
+    """
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        for number, first in enumerate(range(0, rows, chunk_rows)):
+            chunk = synthetic_iris_frame(min(chunk_rows, rows - first), seed + number)
+            chunk.to_csv(f, header=number == 0, index=False)
+    return path
+
+
+def write_synthetic_array(path, rows, columns=64, seed=0, chunk_rows=1_000_000):
+    """
+    Writes a constrained random integer array (see numpy_array_thing) to a .npy
+    file, a block of rows at a time through a memory map.
+
+    Parameters:
+    - path (str): The .npy file to write.
+    - rows (int): Number of rows.
+    - columns (int): Number of columns.
+    - seed (int): Seed for the random generator.
+    - chunk_rows (int): Rows generated at a time.
+
+    Returns:
+    - str: The path written.
+    """
+    from array_store import create_npy
+    from numpy_array_thing import generate_constrained_array, smallest_int_dtype
+
+    out = create_npy(path, (rows, columns), smallest_int_dtype(10, 100))
+    generate_constrained_array(out.shape, rng=seed, chunk_rows=chunk_rows, out=out)
+    out.flush()
+    return path
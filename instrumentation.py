@@ -0,0 +1,488 @@
+# instrumentation.py
+
+# Timers, counters and histograms for the APOD and iris pipelines, reported to
+# pluggable sinks instead of being printed. Stages are wrapped in spans:
+#
+#     with span('apod.read') as current:
+#         ...
+#         current.set(records=len(dataset))
+#
+# or decorated with @stage('apod.read'). Each finished span is passed to the
+# sinks and its duration goes into the stage_duration_seconds histogram.
+# Counters (count) and histograms (observe) are kept in the same registry and
+# can be rendered in the Prometheus text format.
+#
+# Instrumentation is off until configure() is called. While it is off, span()
+# returns a shared do-nothing object and count()/observe() return straight away,
+# so leaving the calls in the hot paths costs one attribute check each.
+#
+# The scripts' __main__ blocks call configure_from_env(), which reads:
+#
+#   APOD_TRACE=<file>         write every span as a JSON line to <file>
+#   APOD_METRICS_FILE=<file>  write the metrics in the Prometheus text format to <file> on exit
+#   APOD_LOG_SPANS=1          log every span through the 'apod' logger
+#   APOD_VERBOSE=1            print per-record progress (e.g. every record read)
+
+import atexit
+import bisect
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+# Upper bounds of the default histogram buckets, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Histogram that every finished span is observed into, labelled by stage
+STAGE_DURATION_METRIC = 'stage_duration_seconds'
+
+
+class _NoopSpan:
+    """
+    Stands in for a Span while instrumentation is disabled.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """
+    Times one run of a stage. Use it as a context manager; spans opened inside
+    it on the same thread record it as their parent.
+
+    Parameters:
+    - registry (Instrumentation): The registry the span reports to.
+    - name (str): The stage name, e.g. 'apod.fetch'.
+    - attributes (dict): Extra fields to report with the span.
+    """
+
+    __slots__ = ('registry', 'name', 'attributes', 'parent', 'start_time', 'start', 'duration', 'status')
+
+    def __init__(self, registry, name, attributes):
+        self.registry = registry
+        self.name = name
+        self.attributes = attributes
+        self.parent = None
+        self.start_time = None
+        self.start = None
+        self.duration = None
+        self.status = 'ok'
+
+    def set(self, **attributes):
+        """
+        Adds fields to report with the span, e.g. the number of records processed.
+        """
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        stack = self.registry._stack()
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self.start_time = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        stack = self.registry._stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        if exc_type is not None:
+            self.status = 'error'
+            self.attributes['error'] = exc_type.__name__
+        self.registry._finish(self)
+        return False
+
+    def to_dict(self):
+        """
+        Returns the span as a JSON-serialisable dict.
+        """
+        return {
+            'type': 'span',
+            'name': self.name,
+            'parent': self.parent,
+            'start': round(self.start_time, 6),
+            'duration': round(self.duration, 6),
+            'status': self.status,
+            'thread': threading.current_thread().name,
+            'attributes': self.attributes,
+        }
+
+
+class Histogram:
+    """
+    Bucket counts, sum and count of observed values.
+
+    Parameters:
+    - buckets (tuple): Sorted upper bounds of the buckets.
+    """
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        position = bisect.bisect_left(self.buckets, value)
+        if position < len(self.counts):
+            self.counts[position] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items())) if labels else ()
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+
+class Instrumentation:
+    """
+    Registry of counters and histograms, plus the sinks that finished spans are
+    reported to. Safe to update from several threads.
+
+    Parameters:
+    - sinks (list): Objects with on_span(span) and close(registry) methods.
+    - enabled (bool): Whether spans and metrics are recorded at all.
+    - verbose (bool): Whether per-record progress should be printed.
+    """
+
+    def __init__(self, sinks=(), enabled=True, verbose=False):
+        self.sinks = list(sinks)
+        self.enabled = enabled
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.local = threading.local()
+
+    def _stack(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def span(self, name, **attributes):
+        """
+        Returns a context manager that times a stage.
+
+        Parameters:
+        - name (str): The stage name.
+        - attributes: Extra fields to report with the span.
+
+        Returns:
+        - Span: The span, or a do-nothing stand-in while disabled.
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, attributes)
+
+    def count(self, name, amount=1, **labels):
+        """
+        Adds amount to a counter.
+        """
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, buckets=DURATION_BUCKETS, **labels):
+        """
+        Records a value (e.g. a latency in seconds) in a histogram.
+        """
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def _finish(self, finished):
+        self.observe(STAGE_DURATION_METRIC, finished.duration, stage=finished.name)
+        if finished.status == 'error':
+            self.count('stage_errors_total', stage=finished.name)
+        for sink in self.sinks:
+            sink.on_span(finished)
+
+    def render_prometheus(self):
+        """
+        Renders every counter and histogram in the Prometheus text format.
+
+        Returns:
+        - str: The metrics text.
+        """
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+            seen = set()
+            for (name, key), value in counters:
+                if name not in seen:
+                    seen.add(name)
+                    lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name}{_format_labels(key)} {value}")
+            for (name, key), histogram in histograms:
+                if name not in seen:
+                    seen.add(name)
+                    lines.append(f"# TYPE {name} histogram")
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {histogram.count}")
+                lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum}")
+                lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return '\n'.join(lines) + '\n' if lines else ''
+
+    def close(self):
+        """
+        Lets every sink write out what it has buffered. Safe to call more than once.
+        """
+        sinks, self.sinks = self.sinks, []
+        for sink in sinks:
+            try:
+                sink.close(self)
+            except OSError as e:
+                print(f"Error writing instrumentation output: {e}")
+
+
+class LoggingSink:
+    """
+    Logs every finished span, and the counters on close, through the logging module.
+
+    Parameters:
+    - logger (logging.Logger): Defaults to the 'apod' logger.
+    - level (int): Level to log at.
+    """
+
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or logging.getLogger('apod')
+        self.level = level
+
+    def on_span(self, finished):
+        if self.logger.isEnabledFor(self.level):
+            details = ''.join(f" {name}={value}" for name, value in finished.attributes.items())
+            self.logger.log(self.level, "%s finished in %.3fs (%s)%s", finished.name, finished.duration,
+                            finished.status, details)
+
+    def close(self, registry):
+        with registry.lock:
+            counters = sorted(registry.counters.items())
+        for (name, key), value in counters:
+            self.logger.log(self.level, "%s%s = %s", name, _format_labels(key), value)
+
+
+class JsonlSink:
+    """
+    Writes every finished span as one JSON line, and a final 'metrics' line
+    with the counters and histogram totals on close.
+
+    Parameters:
+    - path (str): The file to append to.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.f = open(path, 'a', encoding='utf-8')
+
+    def on_span(self, finished):
+        line = json.dumps(finished.to_dict(), default=str) + '\n'
+        with self.lock:
+            self.f.write(line)
+
+    def close(self, registry):
+        with registry.lock:
+            counters = {name + _format_labels(key): value for (name, key), value in sorted(registry.counters.items())}
+            histograms = {name + _format_labels(key): {'count': histogram.count, 'sum': round(histogram.sum, 6)}
+                          for (name, key), histogram in sorted(registry.histograms.items(), key=lambda item: item[0])}
+        with self.lock:
+            self.f.write(json.dumps({'type': 'metrics', 'time': round(time.time(), 6), 'counters': counters,
+                                     'histograms': histograms}) + '\n')
+            self.f.close()
+
+
+class PrometheusTextSink:
+    """
+    Writes the metrics in the Prometheus text format on close, e.g. for the
+    node_exporter textfile collector. The file is replaced atomically.
+
+    Parameters:
+    - path (str): The file to write.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def on_span(self, finished):
+        pass
+
+    def close(self, registry):
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(registry.render_prometheus())
+        os.replace(temp_path, self.path)
+
+
+# The registry used by span(), count(), observe() and stage(); disabled until configured
+_registry = Instrumentation(enabled=False)
+
+
+def get_instrumentation():
+    """
+    Returns the current module-level registry.
+    """
+    return _registry
+
+
+def configure(sinks=(), enabled=True, verbose=False):
+    """
+    Replaces the module-level registry, closing the previous one's sinks. The new
+    registry is closed automatically when the interpreter exits.
+
+    Parameters:
+    - sinks (list): Sinks to report to (LoggingSink, JsonlSink, PrometheusTextSink).
+    - enabled (bool): Record spans and metrics. With no sinks this still keeps
+      the metrics in memory, e.g. for a /metrics endpoint.
+    - verbose (bool): Print per-record progress.
+
+    Returns:
+    - Instrumentation: The new registry.
+    """
+    global _registry
+    _registry.close()
+    _registry = Instrumentation(sinks, enabled, verbose)
+    atexit.register(_registry.close)
+    return _registry
+
+
+def configure_from_env(environ=None):
+    """
+    Configures the module-level registry from the APOD_TRACE, APOD_METRICS_FILE,
+    APOD_LOG_SPANS and APOD_VERBOSE environment variables. Instrumentation stays
+    disabled if none of the sinks is requested.
+
+    Returns:
+    - Instrumentation: The registry.
+    """
+    environ = os.environ if environ is None else environ
+    return configure_from_options(environ.get('APOD_TRACE'), environ.get('APOD_METRICS_FILE'),
+                                  environ.get('APOD_LOG_SPANS', '') not in ('', '0'),
+                                  environ.get('APOD_VERBOSE', '') not in ('', '0'))
+
+
+def configure_from_options(trace_file=None, metrics_file=None, log_spans=False, verbose=False, enabled=None):
+    """
+    Builds the sinks for the common options and configures the registry with them.
+
+    Parameters:
+    - trace_file (str): JSON Lines file for the spans.
+    - metrics_file (str): Prometheus text file written on exit.
+    - log_spans (bool): Log the spans through the 'apod' logger.
+    - verbose (bool): Print per-record progress.
+    - enabled (bool): Record spans and metrics; defaults to whether any sink was requested.
+
+    Returns:
+    - Instrumentation: The registry.
+    """
+    sinks = []
+    if log_spans:
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+        sinks.append(LoggingSink())
+    if trace_file:
+        sinks.append(JsonlSink(trace_file))
+    if metrics_file:
+        sinks.append(PrometheusTextSink(metrics_file))
+    return configure(sinks, enabled=bool(sinks) if enabled is None else enabled, verbose=verbose)
+
+
+def add_instrumentation_arguments(parser):
+    """
+    Adds --trace, --metrics-file, --log-spans and --verbose to an argparse parser.
+    Their defaults come from the matching environment variables.
+    """
+    parser.add_argument('--trace', default=os.environ.get('APOD_TRACE'),
+                        help="Write a JSON line per timed stage to this file.")
+    parser.add_argument('--metrics-file', default=os.environ.get('APOD_METRICS_FILE'),
+                        help="Write counters and timings in the Prometheus text format to this file.")
+    parser.add_argument('--log-spans', action='store_true',
+                        default=os.environ.get('APOD_LOG_SPANS', '') not in ('', '0'),
+                        help="Log the duration of every stage.")
+    parser.add_argument('--verbose', action='store_true',
+                        default=os.environ.get('APOD_VERBOSE', '') not in ('', '0'),
+                        help="Print per-record progress.")
+
+
+def span(name, **attributes):
+    """
+    Times a stage on the module-level registry; see Instrumentation.span.
+    """
+    if not _registry.enabled:
+        return NOOP_SPAN
+    return Span(_registry, name, attributes)
+
+
+def count(name, amount=1, **labels):
+    """
+    Adds amount to a counter on the module-level registry.
+    """
+    if _registry.enabled:
+        _registry.count(name, amount, **labels)
+
+
+def observe(name, value, buckets=DURATION_BUCKETS, **labels):
+    """
+    Records a value in a histogram on the module-level registry.
+    """
+    if _registry.enabled:
+        _registry.observe(name, value, buckets, **labels)
+
+
+def verbose():
+    """
+    Returns True if per-record progress should be printed.
+    """
+    return _registry.verbose
+
+
+def stage(name):
+    """
+    Decorator that runs a function inside span(name) while instrumentation is enabled.
+
+    Parameters:
+    - name (str): The stage name.
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _registry.enabled:
+                return function(*args, **kwargs)
+            with _registry.span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
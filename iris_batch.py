@@ -0,0 +1,132 @@
+# iris_batch.py
+
+# Batch analysis of many iris-schema CSV shards on a process pool.
+# Each worker streams one shard, adds the ratio features and returns its partial
+# statistics (counts and co-moments). The parent merges them into one global
+# correlation matrix and writes a report with one row per shard.
+
+import csv
+import glob
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from iris_streaming import IrisStatistics, read_iris_statistics
+
+
+def analyze_shard(csv_file, chunksize=1_000_000, corrections=None):
+    """
+    Computes the statistics of one shard. Runs in a worker process.
+
+    Parameters:
+    - csv_file (str): The shard to read.
+    - chunksize (int): Rows per chunk.
+    - corrections (tuple): Optional (row patches, rules) applied to every shard, with
+      row numbers counted from the start of each shard.
+
+    Returns:
+    - tuple: (csv_file, IrisStatistics, error message or None).
+    """
+    try:
+        return csv_file, read_iris_statistics(csv_file, chunksize, corrections), None
+    except Exception as e:
+        return csv_file, None, str(e)
+
+
+def strongest_correlations(correlation_matrix):
+    """
+    Finds the most positive and most negative correlation between two different columns.
+
+    Parameters:
+    - correlation_matrix (DataFrame): The pairwise correlation matrix.
+
+    Returns:
+    - tuple: ((column pair, value) for the highest positive, (column pair, value) for the
+      highest negative), or (None, None) if there are no finite correlations.
+    """
+    unstacked = correlation_matrix.unstack()
+    unstacked = unstacked[unstacked < 1].dropna()
+    if unstacked.empty:
+        return None, None
+    return (unstacked.idxmax(), unstacked.max()), (unstacked.idxmin(), unstacked.min())
+
+
+def write_shard_report(results, report_file):
+    """
+    Writes one CSV row per shard: rows, rows per species, rows left out of the
+    statistics and the strongest correlations.
+
+    Parameters:
+    - results (dict): {shard path: IrisStatistics}.
+    - report_file (str): The CSV file to write.
+    """
+    species = sorted({name for stats in results.values() for name in stats.species_counts})
+    fields = ['shard', 'rows'] + species + ['skipped_rows', 'highest_positive', 'highest_positive_value',
+                                            'highest_negative', 'highest_negative_value']
+    try:
+        with open(report_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            for path, stats in sorted(results.items()):
+                positive, negative = strongest_correlations(stats.moments.correlation())
+                row = {'shard': path, 'rows': stats.rows, 'skipped_rows': stats.moments.skipped}
+                row.update({name: stats.species_counts.get(name, 0) for name in species})
+                if positive is not None:
+                    row.update({
+                        'highest_positive': ' / '.join(positive[0]),
+                        'highest_positive_value': round(float(positive[1]), 4),
+                        'highest_negative': ' / '.join(negative[0]),
+                        'highest_negative_value': round(float(negative[1]), 4),
+                    })
+                writer.writerow(row)
+        print(f"Shard report saved as '{report_file}'.\n")
+    except PermissionError:
+        print(f"Error: Permission denied when writing to '{report_file}'.")
+
+
+def expand_shards(patterns):
+    """
+    Expands file names and glob patterns into a sorted list of shard paths.
+    """
+    paths = set()
+    for pattern in patterns:
+        matches = glob.glob(pattern)
+        paths.update(matches if matches else [pattern])
+    return sorted(paths)
+
+
+def run_batch(patterns, max_workers=None, chunksize=1_000_000, report_file='iris_batch_report.csv',
+              corrections=None):
+    """
+    Analyses every shard on a process pool and merges the results.
+
+    Parameters:
+    - patterns (list): Shard paths or glob patterns.
+    - max_workers (int): Number of worker processes (defaults to the CPU count).
+    - chunksize (int): Rows per chunk inside each worker.
+    - report_file (str): Where to write the per-shard report; None skips it.
+    - corrections (tuple): Optional (row patches, rules) applied to every shard.
+
+    Returns:
+    - tuple: (merged IrisStatistics, {shard path: IrisStatistics}), or (None, {}) if
+      no shard could be read.
+    """
+    shards = expand_shards(patterns)
+    results = {}
+    failures = 0
+    total = IrisStatistics()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(analyze_shard, path, chunksize, corrections) for path in shards]
+        for future in as_completed(futures):
+            path, stats, error = future.result()
+            if stats is None:
+                print(f"Error: could not analyse '{path}': {error}")
+                failures += 1
+                continue
+            results[path] = stats
+            total.merge(stats)
+
+    print(f"Analysed {len(results)} of {len(shards)} shards ({total.rows} rows, {failures} failed).\n")
+    if not results:
+        return None, {}
+    if report_file:
+        write_shard_report(results, report_file)
+    return total, results
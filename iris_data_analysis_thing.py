@@ -1,8 +1,12 @@
-import pandas as pd
-import numpy as np
-import seaborn as sns
-import matplotlib.pyplot as plt
+import argparse
 
+from instrumentation import add_instrumentation_arguments, configure_from_options, count, span, stage
+
+# pandas, seaborn and matplotlib are imported inside the functions that use them,
+# so '--help' and the non-plot subcommands don't pay for the plotting libraries
+
+
+@stage('iris.load')
 def load_and_inspect_data(csv_file='iris.csv'):
     """
     Loads the iris dataset from a CSV file and inspects its basic properties.
@@ -13,6 +17,7 @@ def load_and_inspect_data(csv_file='iris.csv'):
     Returns:
     - df (DataFrame): Loaded pandas DataFrame.
     """
+    import pandas as pd
     try:
         # Read the iris.csv file into a DataFrame
         df = pd.read_csv(csv_file)
@@ -20,6 +25,7 @@ def load_and_inspect_data(csv_file='iris.csv'):
 
         # a. Number of data points
         num_data_points = df.shape[0]
+        count('iris_rows_loaded_total', num_data_points)
         print(f"Number of data points: {num_data_points}\n")
 
         # b. Data types of the columns
@@ -52,71 +58,75 @@ def load_and_inspect_data(csv_file='iris.csv'):
         print(f"An unexpected error occurred: {e}")
         return None
 
-def correct_data_errors(df):
+@stage('iris.correct')
+def correct_data_errors(df, corrections_file=None, audit_file=None):
     """
-    Corrects errors in the 35th and 38th rows of the DataFrame.
+    Corrects known errors in the DataFrame using a patch file (by default the fixes
+    for the 35th and 38th rows in 'iris_corrections.csv'). See iris_corrections.py
+    for the patch file format.
 
     Parameters:
     - df (DataFrame): The pandas DataFrame to correct.
+    - corrections_file (str): The patch file to apply; None uses 'iris_corrections.csv'
+      from the working directory, or the copy next to this script.
+    - audit_file (str): Where to save the table of changed cells; None skips it.
 
     Returns:
     - df (DataFrame): The corrected DataFrame.
     """
+    from iris_corrections import correct_from_file
     try:
-        # Display original 35th and 38th rows (1-indexed)
-        print("Original 35th row:")
-        print(df.iloc[34], "\n")
-
-        print("Original 38th row:")
-        print(df.iloc[37], "\n")
-
-        # Correct the 35th row
-        df.iloc[34] = [4.9, 3.1, 1.5, 0.2, 'setosa']
-
-        # Correct the 38th row
-        df.iloc[37] = [4.9, 3.6, 1.4, 0.1, 'setosa']
-
-        # Display corrected rows
-        print("Corrected 35th row:")
-        print(df.iloc[34], "\n")
-
-        print("Corrected 38th row:")
-        print(df.iloc[37], "\n")
-
-        return df
-    except IndexError:
-        print("Error: The DataFrame does not have enough rows to correct.")
+        # Keep the original values of the patched rows to show them afterwards
+        original = df.copy() if len(df) <= 1000 else None
+        audit = correct_from_file(df, corrections_file, audit_file)
+        if audit is None or audit.empty:
+            return df
+        count('iris_cells_corrected_total', len(audit))
+
+        # Display the original and corrected versions of the first few changed rows (1-indexed)
+        for row in audit['row'].drop_duplicates().head(10):
+            if original is not None:
+                print(f"Original row {row}:")
+                print(original.iloc[row - 1], "\n")
+            print(f"Corrected row {row}:")
+            print(df.iloc[row - 1], "\n")
         return df
     except Exception as e:
         print(f"An unexpected error occurred while correcting data: {e}")
         return df
 
-def add_new_features(df):
+@stage('iris.features')
+def add_new_features(df, zero_division='nan', dtype=None):
     """
-    Adds 'Petal Ratio' and 'Sepal Ratio' features to the DataFrame.
+    Adds 'Petal Ratio' and 'Sepal Ratio' features to the DataFrame. The ratios are
+    defined in iris_features.IRIS_FEATURES and computed into preallocated buffers.
 
     Parameters:
     - df (DataFrame): The pandas DataFrame to modify.
+    - zero_division (str or float): What a ratio with a zero width becomes: 'nan' (the
+      default), 'inf', a fill value, or 'error' to leave the DataFrame unchanged.
+    - dtype (str): Result dtype for the ratios, e.g. 'float32' to halve their memory.
 
     Returns:
     - df (DataFrame): The modified DataFrame with new features.
     """
+    from iris_features import IRIS_FEATURES, add_features
     try:
-        # Calculate Petal Ratio (Petal.Length / Petal.Width)
-        df['Petal Ratio'] = df['Petal.Length'] / df['Petal.Width']
-
-        # Calculate Sepal Ratio (Sepal.Length / Sepal.Width)
-        df['Sepal Ratio'] = df['Sepal.Length'] / df['Sepal.Width']
+        zero_counts = add_features(df, IRIS_FEATURES, zero_division=zero_division, dtype=dtype)
+        zero_rows = {name: count for name, count in zero_counts.items() if count}
+        if zero_rows and zero_division == 'error':
+            print(f"Error: Division by zero encountered while calculating ratios: {zero_rows}")
+            return df
+        if zero_rows:
+            print(f"Warning: zero widths in {zero_rows}; those ratios were set to {zero_division}.")
 
         print("Added 'Petal Ratio' and 'Sepal Ratio' to the DataFrame.\n")
         return df
-    except ZeroDivisionError:
-        print("Error: Division by zero encountered while calculating ratios.")
-        return df
     except Exception as e:
         print(f"An unexpected error occurred while adding new features: {e}")
         return df
 
+@stage('iris.save')
 def save_corrected_data(df, output_file='iris_corrected.csv'):
     """
     Saves the corrected DataFrame to a CSV file.
@@ -127,12 +137,14 @@ def save_corrected_data(df, output_file='iris_corrected.csv'):
     """
     try:
         df.to_csv(output_file, index=False)
+        count('iris_rows_saved_total', len(df))
         print(f"Modified DataFrame saved as '{output_file}'.\n")
     except PermissionError:
         print(f"Error: Permission denied when writing to '{output_file}'.")
     except Exception as e:
         print(f"An unexpected error occurred while saving the DataFrame: {e}")
 
+@stage('iris.correlate')
 def calculate_correlations(df):
     """
     Calculates pairwise correlations between all numeric columns and identifies
@@ -150,31 +162,7 @@ def calculate_correlations(df):
 
         # Calculate the correlation matrix
         correlation_matrix = df[numeric_cols].corr()
-
-        print("Pairwise correlation matrix:")
-        print(correlation_matrix, "\n")
-
-        # Unstack the correlation matrix to a Series
-        corr_unstacked = correlation_matrix.unstack()
-
-        # Remove self-correlations
-        corr_unstacked = corr_unstacked[corr_unstacked < 1]
-
-        # Find the highest positive correlation
-        highest_positive = corr_unstacked.idxmax()
-        highest_positive_value = corr_unstacked.max()
-        print(f"Highest positive correlation is between {highest_positive} with a correlation of {highest_positive_value:.2f}")
-
-        # Find the highest negative correlation
-        highest_negative = corr_unstacked.idxmin()
-        highest_negative_value = corr_unstacked.min()
-        print(f"Highest negative correlation is between {highest_negative} with a correlation of {highest_negative_value:.2f}\n")
-
-        # Interpretation
-        print("Interpretation:")
-        print(f"- The highest positive correlation between {highest_positive} indicates a strong direct relationship.")
-        print(f"- The highest negative correlation between {highest_negative} indicates a strong inverse relationship.\n")
-
+        report_correlations(correlation_matrix)
         return correlation_matrix
     except KeyError:
         print("Error: One or more specified columns are not in the DataFrame.")
@@ -183,7 +171,40 @@ def calculate_correlations(df):
         print(f"An unexpected error occurred while calculating correlations: {e}")
         return None
 
-def create_scatter_plot_with_regression(df, output_file='iris_scatter_with_regression.pdf'):
+def report_correlations(correlation_matrix):
+    """
+    Prints a correlation matrix with its highest positive and negative correlations.
+
+    Parameters:
+    - correlation_matrix (DataFrame): The pairwise correlation matrix.
+    """
+    print("Pairwise correlation matrix:")
+    print(correlation_matrix, "\n")
+
+    # Unstack the correlation matrix to a Series
+    corr_unstacked = correlation_matrix.unstack()
+
+    # Remove self-correlations
+    corr_unstacked = corr_unstacked[corr_unstacked < 1]
+
+    # Find the highest positive correlation
+    highest_positive = corr_unstacked.idxmax()
+    highest_positive_value = corr_unstacked.max()
+    print(f"Highest positive correlation is between {highest_positive} with a correlation of {highest_positive_value:.2f}")
+
+    # Find the highest negative correlation
+    highest_negative = corr_unstacked.idxmin()
+    highest_negative_value = corr_unstacked.min()
+    print(f"Highest negative correlation is between {highest_negative} with a correlation of {highest_negative_value:.2f}\n")
+
+    # Interpretation
+    print("Interpretation:")
+    print(f"- The highest positive correlation between {highest_positive} indicates a strong direct relationship.")
+    print(f"- The highest negative correlation between {highest_negative} indicates a strong inverse relationship.\n")
+
+@stage('iris.scatter_plot')
+def create_scatter_plot_with_regression(df, output_file='iris_scatter_with_regression.pdf', scalable=None,
+                                        max_points=None):
     """
     Creates a scatter plot with Sepal Ratio on the x-axis and Petal Ratio on the y-axis,
     colored by species, and adds a linear regression line for each species.
@@ -191,7 +212,26 @@ def create_scatter_plot_with_regression(df, output_file='iris_scatter_with_regre
     Parameters:
     - df (DataFrame): The pandas DataFrame to plot.
     - output_file (str): The filename for the saved plot.
+    - scalable (bool): Use the sampled, rasterised plot from iris_plotting. Defaults to
+      doing so when df has more than SCALABLE_PLOT_THRESHOLD rows.
+    - max_points (int): Points drawn in the scalable plot (default MAX_PLOT_POINTS).
     """
+    import iris_plotting
+    if scalable is None:
+        scalable = len(df) > iris_plotting.SCALABLE_PLOT_THRESHOLD
+    if scalable:
+        try:
+            iris_plotting.scalable_scatter_with_regression(
+                df, output_file, max_points=max_points or iris_plotting.MAX_PLOT_POINTS)
+            print(f"Scatter plot saved as '{output_file}'.\n")
+        except KeyError as e:
+            print(f"Error: Column not found in DataFrame: {e}")
+        except Exception as e:
+            print(f"An unexpected error occurred while creating the scatter plot: {e}")
+        return
+
+    import seaborn as sns
+    plt = iris_plotting.import_pyplot()
     try:
         # Set the aesthetic style of the plots
         sns.set(style="whitegrid")
@@ -223,18 +263,39 @@ def create_scatter_plot_with_regression(df, output_file='iris_scatter_with_regre
     except Exception as e:
         print(f"An unexpected error occurred while creating the scatter plot: {e}")
 
-def create_pair_plot(df):
+@stage('iris.pair_plot')
+def create_pair_plot(df, output_file='iris_pair_plot.png', scalable=None, off_diagonal='hist2d', max_points=None):
     """
     Creates a pair plot for the four original numeric features and the two new ratio features,
     colored by species.
 
     Parameters:
     - df (DataFrame): The pandas DataFrame to plot.
+    - output_file (str): The filename for the saved plot.
+    - scalable (bool): Use histograms and 2-D histograms from iris_plotting instead of KDEs and
+      scatters. Defaults to doing so when df has more than SCALABLE_PLOT_THRESHOLD rows.
+    - off_diagonal (str): In the scalable plot, 'hist2d' or a stratified 'sample'.
+    - max_points (int): Points drawn per panel with off_diagonal='sample'.
     """
-    try:
-        # Select the columns for the pair plot
-        pairplot_cols = ['Sepal.Length', 'Sepal.Width', 'Petal.Length', 'Petal.Width', 'Petal Ratio', 'Sepal Ratio']
+    import iris_plotting
+    # Select the columns for the pair plot
+    pairplot_cols = ['Sepal.Length', 'Sepal.Width', 'Petal.Length', 'Petal.Width', 'Petal Ratio', 'Sepal Ratio']
+    if scalable is None:
+        scalable = len(df) > iris_plotting.SCALABLE_PLOT_THRESHOLD
+    if scalable:
+        try:
+            iris_plotting.scalable_pair_plot(df, pairplot_cols, output_file, off_diagonal=off_diagonal,
+                                             max_points=max_points or iris_plotting.MAX_PLOT_POINTS)
+            print(f"Pair plot saved as '{output_file}'.\n")
+        except KeyError as e:
+            print(f"Error: Column not found in DataFrame: {e}")
+        except Exception as e:
+            print(f"An unexpected error occurred while creating the pair plot: {e}")
+        return
 
+    import seaborn as sns
+    plt = iris_plotting.import_pyplot()
+    try:
         # Create the pair plot
         sns.pairplot(df[pairplot_cols + ['Species']], hue='Species', height=2.5, diag_kind='kde')
 
@@ -242,17 +303,17 @@ def create_pair_plot(df):
         plt.tight_layout()
 
         # Save the pair plot as an image
-        plt.savefig('iris_pair_plot.png')
+        plt.savefig(output_file)
         plt.close()
-        print("Pair plot saved as 'iris_pair_plot.png'.\n")
+        print(f"Pair plot saved as '{output_file}'.\n")
     except KeyError as e:
         print(f"Error: Column not found in DataFrame: {e}")
     except Exception as e:
         print(f"An unexpected error occurred while creating the pair plot: {e}")
 
-def main():
+def main(csv_file='iris.csv'):
     # Step 1: Load and inspect the data
-    df = load_and_inspect_data('iris.csv')
+    df = load_and_inspect_data(csv_file)
     if df is None:
         return
 
@@ -274,5 +335,139 @@ def main():
     # Step 7: Create a pair plot
     create_pair_plot(df)
 
+def prepare_data(csv_file, step, corrections_file=None, audit_file=None):
+    """
+    Runs the pipeline steps a subcommand depends on.
+
+    Parameters:
+    - csv_file (str): Path to the iris CSV file.
+    - step (str): The last step to run: 'inspect', 'correct' or 'features'.
+    - corrections_file (str): The patch file for correct_data_errors.
+    - audit_file (str): Where correct_data_errors saves the changed cells.
+
+    Returns:
+    - df (DataFrame): The prepared DataFrame, or None if it could not be loaded.
+    """
+    df = load_and_inspect_data(csv_file)
+    if df is None or step == 'inspect':
+        return df
+    df = correct_data_errors(df, corrections_file, audit_file)
+    if step == 'correct':
+        return df
+    return add_new_features(df)
+
+def run_cli(argv=None):
+    """
+    Command line entry point. Each subcommand only runs (and imports) what it needs;
+    without a subcommand the whole pipeline runs, as main() does.
+
+    Parameters:
+    - argv (list): Command line arguments (defaults to sys.argv).
+    """
+    parser = argparse.ArgumentParser(description="Iris data analysis.")
+    parser.add_argument('--csv', default='iris.csv', help="Path to the iris CSV file.")
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help="Stream the file in chunks of this many rows (inspect and correlate only), "
+                             "so memory stays bounded on very large files.")
+    parser.add_argument('--corrections', default=None,
+                        help="Patch file (CSV or JSON) of corrections to apply (default: iris_corrections.csv).")
+    parser.add_argument('--audit', default=None, help="Save the table of corrected cells to this CSV file.")
+    parser.add_argument('--arrays', default=None,
+                        help="Read inspect and correlate from .npy arrays made by 'convert' instead of the CSV file.")
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('inspect', help="Load the data and print its shape, dtypes and species.")
+    correct = commands.add_parser('correct', help="Correct the known bad rows and save the result.")
+    correct.add_argument('--output', default='iris_corrected.csv', help="Where to save the corrected data.")
+    features = commands.add_parser('features', help="Correct the data, add the ratio features and save it.")
+    features.add_argument('--output', default='iris_corrected.csv', help="Where to save the data.")
+    commands.add_parser('correlate', help="Print the correlation matrix and the strongest correlations.")
+    convert = commands.add_parser('convert', help="Correct the data and save it as memory-mappable .npy arrays.")
+    convert.add_argument('--output', default='iris_arrays', help="Directory for the arrays.")
+    plot = commands.add_parser('plot', help="Create the scatter and pair plots.")
+    plot.add_argument('--kind', choices=('scatter', 'pair', 'both'), default='both', help="Which plots to create.")
+    plot.add_argument('--scatter-output', default='iris_scatter_with_regression.pdf', help="Scatter plot file.")
+    plot.add_argument('--pair-output', default='iris_pair_plot.png', help="Pair plot file.")
+    plot.add_argument('--scalable', action=argparse.BooleanOptionalAction, default=None,
+                      help="Force the sampled/binned plots on or off (default: on above 20,000 rows).")
+    plot.add_argument('--max-points', type=int, default=None, help="Points drawn in the scalable plots.")
+    plot.add_argument('--off-diagonal', choices=('hist2d', 'sample'), default='hist2d',
+                      help="Off-diagonal panels of the scalable pair plot.")
+    batch = commands.add_parser('batch', help="Analyse many CSV shards in parallel and merge the correlations.")
+    batch.add_argument('shards', nargs='+', help="Shard files or glob patterns (e.g. 'data/*.csv').")
+    batch.add_argument('--workers', type=int, default=None, help="Worker processes (defaults to the CPU count).")
+    batch.add_argument('--report', default='iris_batch_report.csv', help="Per-shard report file.")
+    add_instrumentation_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_from_options(args.trace, args.metrics_file, args.log_spans, args.verbose)
+
+    if args.command is None:
+        main(args.csv)
+        return
+
+    if args.command == 'batch':
+        from iris_batch import run_batch
+        from iris_corrections import load_corrections
+        # The default patch file fixes rows of iris.csv, so shards are only patched on request
+        corrections = load_corrections(args.corrections) if args.corrections else None
+        if args.corrections and corrections is None:
+            return
+        with span('iris.batch'):
+            total, _ = run_batch(args.shards, args.workers, args.chunksize or 1_000_000, args.report, corrections)
+        if total is not None:
+            report_correlations(total.moments.correlation())
+        return
+
+    if args.command == 'convert':
+        from array_store import convert_iris_csv
+        from iris_corrections import load_corrections
+        corrections = load_corrections(args.corrections)
+        if corrections is not None:
+            with span('iris.convert'):
+                convert_iris_csv(args.csv, args.output, args.chunksize or 1_000_000, corrections)
+        return
+
+    if args.arrays and args.command in ('inspect', 'correlate'):
+        from array_store import iris_statistics_from_arrays
+        from iris_streaming import print_iris_statistics
+        # The arrays already hold the corrected data
+        with span('iris.array_statistics'):
+            stats = iris_statistics_from_arrays(args.arrays, args.chunksize or 1_000_000)
+        if stats is None:
+            return
+        if args.command == 'inspect':
+            print_iris_statistics(stats)
+        else:
+            report_correlations(stats.moments.correlation())
+        return
+
+    if args.chunksize and args.command in ('inspect', 'correlate'):
+        from iris_corrections import load_corrections
+        from iris_streaming import print_iris_statistics, stream_iris_statistics
+        # Inspect shows the file as it is; correlate uses the corrected data, like the in-memory path
+        corrections = load_corrections(args.corrections) if args.command == 'correlate' else None
+        with span('iris.stream_statistics'):
+            stats = stream_iris_statistics(args.csv, args.chunksize, corrections)
+        if stats is None:
+            return
+        if args.command == 'inspect':
+            print_iris_statistics(stats)
+        else:
+            report_correlations(stats.moments.correlation())
+        return
+
+    target_stage = {'inspect': 'inspect', 'correct': 'correct'}.get(args.command, 'features')
+    df = prepare_data(args.csv, target_stage, args.corrections, args.audit)
+    if df is None:
+        return
+    if args.command in ('correct', 'features'):
+        save_corrected_data(df, args.output)
+    elif args.command == 'correlate':
+        calculate_correlations(df)
+    elif args.command == 'plot':
+        if args.kind in ('scatter', 'both'):
+            create_scatter_plot_with_regression(df, args.scatter_output, args.scalable, args.max_points)
+        if args.kind in ('pair', 'both'):
+            create_pair_plot(df, args.pair_output, args.scalable, args.off_diagonal, args.max_points)
+
 if __name__ == "__main__":
-    main()
+    run_cli()
@@ -0,0 +1,116 @@
+# iris_features.py
+
+# Declarative derived columns for the iris data.
+# Each feature is a ratio of two columns with an explicit policy for zero
+# denominators. Features are computed straight into preallocated output buffers
+# (with numexpr when it is installed, else NumPy ufuncs with out=), so no
+# full-size temporaries are created. pandas copies each result into the frame.
+
+import numpy as np
+
+# Derived features: name -> (numerator column, denominator column)
+IRIS_FEATURES = {
+    'Petal Ratio': ('Petal.Length', 'Petal.Width'),
+    'Sepal Ratio': ('Sepal.Length', 'Sepal.Width'),
+}
+
+# What a ratio becomes when its denominator is zero (a missing input always gives NaN):
+# - 'nan': NaN, so the row is ignored by corr() and friends
+# - 'inf': keep IEEE results (+/-inf for x/0, NaN for 0/0)
+# - 'error': leave the frame unchanged and report the offending rows
+# - a number: that value
+ZERO_DIVISION_POLICIES = ('nan', 'inf', 'error')
+
+
+def _import_numexpr():
+    """
+    Returns the numexpr module, or None if it isn't installed.
+    """
+    try:
+        import numexpr
+        return numexpr
+    except ImportError:
+        return None
+
+
+def compute_ratio(numerator, denominator, out=None, zero_division='nan', use_numexpr=True):
+    """
+    Divides two arrays into an output buffer, applying a zero-division policy.
+
+    Parameters:
+    - numerator (ndarray): The numerator values.
+    - denominator (ndarray): The denominator values.
+    - out (ndarray): Buffer to write into; a new one is allocated if None. It must be at
+      least as long as the inputs; only the first len(numerator) entries are written.
+    - zero_division (str or float): One of ZERO_DIVISION_POLICIES, or a fill value.
+    - use_numexpr (bool): Use numexpr if it is installed.
+
+    Returns:
+    - ndarray: The filled part of the buffer.
+    """
+    numerator = np.asarray(numerator)
+    denominator = np.asarray(denominator)
+    dtype = np.result_type(numerator, denominator, np.float32)
+    if out is None:
+        out = np.empty(len(numerator), dtype=dtype)
+    out = out[:len(numerator)]
+    fill = np.nan if zero_division in ('nan', 'error') else zero_division
+
+    numexpr = _import_numexpr() if use_numexpr else None
+    if numexpr is not None:
+        # One fused pass over the inputs, no temporaries
+        if zero_division == 'inf':
+            numexpr.evaluate('a / b', local_dict={'a': numerator, 'b': denominator}, out=out, casting='unsafe')
+        else:
+            numexpr.evaluate('where(b == 0, fill, a / b)',
+                             local_dict={'a': numerator, 'b': denominator, 'fill': out.dtype.type(fill)},
+                             out=out, casting='unsafe')
+        return out
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(numerator, denominator, out=out, casting='unsafe')
+    if zero_division != 'inf':
+        # Only the (usually empty) set of zero denominators is touched afterwards
+        zeros = np.flatnonzero(denominator == 0)
+        if len(zeros):
+            out[zeros] = fill
+    return out
+
+
+def add_features(df, features=IRIS_FEATURES, zero_division='nan', dtype=None, buffers=None, use_numexpr=True):
+    """
+    Adds derived ratio columns to a DataFrame.
+
+    Parameters:
+    - df (DataFrame): The data; modified in place.
+    - features (dict): name -> (numerator column, denominator column).
+    - zero_division (str or float): One of ZERO_DIVISION_POLICIES, or a fill value.
+    - dtype (str or numpy dtype): Result dtype; defaults to the inputs' float type.
+    - buffers (dict): Optional name -> ndarray buffers to compute into, e.g. reused across
+      chunks. Missing buffers are allocated and added to the dict. pandas copies the
+      result into the frame, so the buffers are scratch space and safe to reuse.
+    - use_numexpr (bool): Use numexpr if it is installed.
+
+    Returns:
+    - dict: name -> number of rows with a zero denominator. With the 'error' policy
+      the frame is left unchanged if any count is non-zero.
+    """
+    zero_counts = {}
+    for name, (numerator, denominator) in features.items():
+        zero_counts[name] = int(np.count_nonzero(df[denominator].to_numpy() == 0))
+    if zero_division == 'error' and any(zero_counts.values()):
+        return zero_counts
+
+    for name, (numerator, denominator) in features.items():
+        a = df[numerator].to_numpy()
+        b = df[denominator].to_numpy()
+        result_dtype = np.dtype(dtype) if dtype is not None else np.result_type(a, b, np.float32)
+        buffer = None if buffers is None else buffers.get(name)
+        if buffer is None or len(buffer) < len(df) or buffer.dtype != result_dtype:
+            buffer = np.empty(len(df), dtype=result_dtype)
+            if buffers is not None:
+                buffers[name] = buffer
+        result = compute_ratio(a, b, buffer, zero_division, use_numexpr)
+        # pandas 2.2 copies on assignment, so the column never aliases the buffer
+        df[name] = result
+    return zero_counts
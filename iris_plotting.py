@@ -0,0 +1,220 @@
+# iris_plotting.py
+
+# Plots for iris-schema data with too many rows for seaborn's lmplot/pairplot.
+# Points are drawn from a stratified per-species sample (or aggregated into
+# 2-D histograms), regression lines are fitted on all rows with closed-form least
+# squares, and dense layers are rasterised so vector outputs stay small.
+# Render time is therefore bounded by the sample size and bin counts rather
+# than the number of rows.
+
+import numpy as np
+
+# Above this many rows the plotting functions switch to the scalable versions
+SCALABLE_PLOT_THRESHOLD = 20_000
+
+# Default number of points drawn in sampled scatter layers
+MAX_PLOT_POINTS = 5_000
+
+MARKERS = ['o', 's', 'D', '^', 'v', 'P', 'X']
+
+
+def import_pyplot():
+    """
+    Imports matplotlib.pyplot with the non-interactive 'Agg' backend, so plots can
+    be saved without a display.
+
+    Returns:
+    - module: matplotlib.pyplot.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def stratified_sample(df, by='Species', max_rows=MAX_PLOT_POINTS, seed=0):
+    """
+    Samples up to max_rows rows, split evenly between the groups so that small
+    groups are not drowned out by large ones.
+
+    Parameters:
+    - df (DataFrame): The data.
+    - by (str): The column to stratify on.
+    - max_rows (int): Total number of rows to keep.
+    - seed (int): Seed for the random generator.
+
+    Returns:
+    - DataFrame: The sampled rows, in their original order.
+    """
+    if len(df) <= max_rows:
+        return df
+    rng = np.random.default_rng(seed)
+    groups = df.groupby(by, observed=True).indices
+    per_group = max(1, max_rows // max(len(groups), 1))
+    chosen = [positions if len(positions) <= per_group else rng.choice(positions, per_group, replace=False)
+              for positions in groups.values()]
+    return df.iloc[np.sort(np.concatenate(chosen))]
+
+
+def fit_lines(df, x, y, by='Species'):
+    """
+    Fits y = slope * x + intercept for each group on every row, from one pass of
+    grouped sums (closed-form least squares). Rows with a non-finite x or y, or a
+    missing group, are ignored.
+
+    Parameters:
+    - df (DataFrame): The data.
+    - x (str): The predictor column.
+    - y (str): The response column.
+    - by (str): The grouping column.
+
+    Returns:
+    - dict: group -> (slope, intercept, x min, x max, rows used).
+    """
+    xs = df[x].to_numpy(dtype=np.float64)
+    ys = df[y].to_numpy(dtype=np.float64)
+    codes, labels = df[by].factorize()
+    # factorize gives missing labels the code -1, which bincount rejects
+    valid = np.isfinite(xs) & np.isfinite(ys) & (codes >= 0)
+    codes, xs, ys = codes[valid], xs[valid], ys[valid]
+    groups = len(labels)
+
+    count = np.bincount(codes, minlength=groups)
+    sum_x = np.bincount(codes, xs, minlength=groups)
+    sum_y = np.bincount(codes, ys, minlength=groups)
+    sum_xx = np.bincount(codes, xs * xs, minlength=groups)
+    sum_xy = np.bincount(codes, xs * ys, minlength=groups)
+    x_min = np.full(groups, np.inf)
+    x_max = np.full(groups, -np.inf)
+    np.minimum.at(x_min, codes, xs)
+    np.maximum.at(x_max, codes, xs)
+
+    fits = {}
+    for code, label in enumerate(labels):
+        n = count[code]
+        denominator = n * sum_xx[code] - sum_x[code] ** 2
+        if n < 2 or denominator == 0:
+            continue
+        slope = (n * sum_xy[code] - sum_x[code] * sum_y[code]) / denominator
+        intercept = (sum_y[code] - slope * sum_x[code]) / n
+        fits[label] = (slope, intercept, x_min[code], x_max[code], int(n))
+    return fits
+
+
+def scalable_scatter_with_regression(df, output_file='iris_scatter_with_regression.pdf', x='Sepal Ratio',
+                                     y='Petal Ratio', by='Species', max_points=MAX_PLOT_POINTS):
+    """
+    Draws the scatter plot with per-species regression lines: points from a
+    stratified sample (rasterised), lines fitted on all rows.
+
+    Parameters:
+    - df (DataFrame): The data, with the ratio columns.
+    - output_file (str): The filename for the saved plot.
+    - x (str): Column on the x-axis.
+    - y (str): Column on the y-axis.
+    - by (str): Column used for colours and separate lines.
+    - max_points (int): Number of points drawn.
+    """
+    plt = import_pyplot()
+    sample = stratified_sample(df, by, max_points)
+    fits = fit_lines(df, x, y, by)
+
+    fig, ax = plt.subplots(figsize=(9, 6))
+    for number, (label, group) in enumerate(sample.groupby(by, observed=True)):
+        color = f"C{number}"
+        ax.scatter(group[x], group[y], s=50 if len(df) <= max_points else 8, alpha=0.7,
+                   marker=MARKERS[number % len(MARKERS)], color=color, label=label, rasterized=True)
+        if label in fits:
+            slope, intercept, low, high, _ = fits[label]
+            ax.plot([low, high], [slope * low + intercept, slope * high + intercept], color=color)
+    ax.legend(title=by)
+    ax.set_title('Scatter Plot of Sepal Ratio vs. Petal Ratio with Regression Lines')
+    ax.set_xlabel('Sepal Ratio (Sepal.Length / Sepal.Width)')
+    ax.set_ylabel('Petal Ratio (Petal.Length / Petal.Width)')
+    if len(sample) < len(df):
+        ax.text(0.01, 0.01, f"{len(sample):,} of {len(df):,} rows shown; lines fitted on all rows",
+                transform=ax.transAxes, fontsize=8, color='gray')
+    fig.savefig(output_file, dpi=150)
+    plt.close(fig)
+
+
+def _bin_indices(values, bins):
+    """
+    Puts each value in one of bins equal-width bins spanning the finite values.
+
+    Returns:
+    - tuple: (bin edges, int array of bin numbers with -1 for non-finite values),
+      or (None, None) if no value is finite.
+    """
+    finite = np.isfinite(values)
+    if not finite.any():
+        return None, None
+    low, high = values[finite].min(), values[finite].max()
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    edges = np.linspace(low, high, bins + 1)
+    indices = np.full(len(values), -1, dtype=np.int64)
+    scaled = (values[finite] - low) * (bins / (high - low))
+    indices[finite] = np.minimum(scaled.astype(np.int64), bins - 1)
+    return edges, indices
+
+
+def scalable_pair_plot(df, columns, output_file='iris_pair_plot.png', by='Species', off_diagonal='hist2d',
+                       max_points=MAX_PLOT_POINTS, bins=40):
+    """
+    Draws a pair plot that scales to millions of rows. The diagonal shows
+    per-species histograms of every row. The off-diagonal panels show 2-D
+    histograms (log-scaled counts) of every row, or a stratified sample coloured
+    by species. Binning is done in NumPy, so matplotlib only ever draws
+    bins x bins cells or max_points points per panel.
+
+    Parameters:
+    - df (DataFrame): The data.
+    - columns (list): The numeric columns to plot.
+    - output_file (str): The filename for the saved plot.
+    - by (str): Column used for colours.
+    - off_diagonal (str): 'hist2d' or 'sample'.
+    - max_points (int): Number of points drawn per panel in 'sample' mode.
+    - bins (int): Bins per axis of every histogram.
+    """
+    from matplotlib.colors import LogNorm
+    plt = import_pyplot()
+    # Every column is binned once; each panel is then a bincount over two index arrays
+    edges, indices = {}, {}
+    for column in columns:
+        edges[column], indices[column] = _bin_indices(df[column].to_numpy(dtype=np.float64), bins)
+    codes, labels = df[by].factorize()
+    # One colour per species, shared by the histograms and the sampled panels
+    colors = {label: f"C{number}" for number, label in enumerate(labels)}
+    sample = stratified_sample(df, by, max_points) if off_diagonal == 'sample' else None
+
+    size = len(columns)
+    fig, axes = plt.subplots(size, size, figsize=(2.5 * size, 2.5 * size), squeeze=False)
+    for row, y in enumerate(columns):
+        for col, x in enumerate(columns):
+            ax = axes[row, col]
+            if edges[x] is None or edges[y] is None:
+                pass
+            elif row == col:
+                valid = (indices[x] >= 0) & (codes >= 0)
+                counts = np.bincount(codes[valid] * bins + indices[x][valid], minlength=len(labels) * bins)
+                for number, label in enumerate(labels):
+                    ax.stairs(counts[number * bins:(number + 1) * bins], edges[x], fill=True, alpha=0.5,
+                              color=colors[label], label=label)
+            elif off_diagonal == 'sample':
+                for label, group in sample.groupby(by, observed=True):
+                    ax.scatter(group[x], group[y], s=4, alpha=0.5, color=colors[label], rasterized=True)
+            else:
+                valid = (indices[x] >= 0) & (indices[y] >= 0)
+                counts = np.bincount(indices[y][valid] * bins + indices[x][valid], minlength=bins * bins)
+                counts = counts.reshape(bins, bins).astype(np.float64)
+                counts[counts == 0] = np.nan
+                ax.pcolormesh(edges[x], edges[y], counts, norm=LogNorm(), cmap='viridis', rasterized=True)
+            if row == size - 1:
+                ax.set_xlabel(x)
+            if col == 0:
+                ax.set_ylabel(y)
+    axes[0, 0].legend(fontsize=7)
+    fig.tight_layout()
+    fig.savefig(output_file, dpi=100)
+    plt.close(fig)
@@ -0,0 +1,272 @@
+# iris_streaming.py
+
+# Out-of-core statistics for iris-schema CSV files too large to load at once.
+# The file is read in chunks with compact dtypes (float32 measurements, a
+# categorical species column). Each chunk is folded into running counts and
+# co-moments, which can also be merged across files, so memory use depends on
+# the chunk size and not on the file size.
+
+import numpy as np
+import pandas as pd
+
+from iris_features import IRIS_FEATURES, add_features
+
+# Measurement columns, and the ratio features derived from them
+IRIS_MEASUREMENTS = ['Sepal.Length', 'Sepal.Width', 'Petal.Length', 'Petal.Width']
+IRIS_NUMERIC_COLUMNS = IRIS_MEASUREMENTS + list(IRIS_FEATURES)
+
+# Explicit dtypes, so pandas neither guesses per chunk nor stores floats as float64
+IRIS_DTYPES = dict({column: 'float32' for column in IRIS_MEASUREMENTS}, Species='category')
+
+
+class RunningMoments:
+    """
+    Count, means and co-moments of a set of columns, updated a block at a time.
+    Two instances built from different parts of the data can be merged, which
+    gives the same result as one pass over all of it.
+
+    Parameters:
+    - columns (list): Names of the columns being tracked.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        width = len(self.columns)
+        self.count = 0
+        self.mean = np.zeros(width)
+        self.comoment = np.zeros((width, width))
+        self.minimum = np.full(width, np.inf)
+        self.maximum = np.full(width, -np.inf)
+        # Rows left out because a value was NaN or infinite
+        self.skipped = 0
+
+    def update(self, block):
+        """
+        Adds a block of rows.
+
+        Parameters:
+        - block (ndarray): 2-D array with one column per tracked column. Rows with a
+          NaN or infinite value are skipped.
+        """
+        block = np.asarray(block, dtype=np.float64)
+        finite = np.isfinite(block).all(axis=1)
+        self.skipped += int(len(block) - finite.sum())
+        block = block[finite]
+        if not len(block):
+            return
+        other = RunningMoments(self.columns)
+        other.count = len(block)
+        other.mean = block.mean(axis=0)
+        centred = block - other.mean
+        other.comoment = centred.T @ centred
+        other.minimum = block.min(axis=0)
+        other.maximum = block.max(axis=0)
+        self.merge(other)
+
+    def merge(self, other):
+        """
+        Merges another RunningMoments over the same columns into this one.
+
+        Parameters:
+        - other (RunningMoments): The statistics to merge in.
+
+        Returns:
+        - RunningMoments: self.
+        """
+        self.skipped += other.skipped
+        if not other.count:
+            return self
+        if not self.count:
+            self.count = other.count
+            self.mean = other.mean.copy()
+            self.comoment = other.comoment.copy()
+        else:
+            # Chan et al.'s pairwise update of the means and co-moments
+            total = self.count + other.count
+            delta = other.mean - self.mean
+            self.comoment = self.comoment + other.comoment + np.outer(delta, delta) * (self.count * other.count / total)
+            self.mean = self.mean + delta * (other.count / total)
+            self.count = total
+        self.minimum = np.minimum(self.minimum, other.minimum)
+        self.maximum = np.maximum(self.maximum, other.maximum)
+        return self
+
+    def covariance(self):
+        """
+        Returns the sample covariance matrix as a DataFrame.
+        """
+        divisor = max(self.count - 1, 1)
+        return pd.DataFrame(self.comoment / divisor, index=self.columns, columns=self.columns)
+
+    def correlation(self):
+        """
+        Returns the Pearson correlation matrix as a DataFrame. Rows with a NaN in any
+        column were dropped as a whole by update() (listwise deletion), whereas
+        DataFrame.corr() drops them per pair of columns. So this matches
+        DataFrame.corr() on data without missing values, or after dropna().
+        """
+        deviations = np.sqrt(np.diag(self.comoment))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            correlation = self.comoment / np.outer(deviations, deviations)
+        np.fill_diagonal(correlation, np.where(deviations > 0, 1.0, np.nan))
+        return pd.DataFrame(correlation, index=self.columns, columns=self.columns)
+
+    def summary(self):
+        """
+        Returns count, mean, std, min and max per column as a DataFrame.
+        """
+        std = np.sqrt(np.diag(self.comoment) / max(self.count - 1, 1))
+        return pd.DataFrame({'count': self.count, 'mean': self.mean, 'std': std,
+                             'min': self.minimum, 'max': self.maximum}, index=self.columns)
+
+
+def add_ratio_columns(chunk, buffers=None):
+    """
+    Adds the ratio features to a chunk in float32. A zero denominator gives NaN,
+    which the running moments then skip.
+
+    Parameters:
+    - chunk (DataFrame): A chunk with the measurement columns.
+    - buffers (dict): Output buffers reused from the previous chunk (see add_features).
+
+    Returns:
+    - DataFrame: The same chunk with the ratio columns added.
+    """
+    add_features(chunk, IRIS_FEATURES, zero_division='nan', dtype=np.float32, buffers=buffers)
+    return chunk
+
+
+class IrisStatistics:
+    """
+    Everything the streaming mode computes for one or more iris-schema files:
+    row and species counts, the column dtypes and running moments of the
+    measurement and ratio columns.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.species_counts = {}
+        self.dtypes = None
+        self.moments = RunningMoments(IRIS_NUMERIC_COLUMNS)
+
+    def update(self, chunk):
+        """
+        Folds a chunk (with its ratio columns) into the statistics.
+        """
+        if self.dtypes is None:
+            self.dtypes = chunk.dtypes.astype(str).to_dict()
+        self.rows += len(chunk)
+        for species, count in chunk['Species'].value_counts(sort=False).items():
+            self.species_counts[species] = self.species_counts.get(species, 0) + int(count)
+        self.moments.update(chunk[IRIS_NUMERIC_COLUMNS].to_numpy(dtype=np.float64))
+
+    def merge(self, other):
+        """
+        Merges the statistics of another file or chunk range into these.
+
+        Returns:
+        - IrisStatistics: self.
+        """
+        self.rows += other.rows
+        for species, count in other.species_counts.items():
+            self.species_counts[species] = self.species_counts.get(species, 0) + count
+        if self.dtypes is None:
+            self.dtypes = other.dtypes
+        self.moments.merge(other.moments)
+        return self
+
+
+def correct_chunk(chunk, corrections):
+    """
+    Applies the part of a patch file that falls in a chunk, using the chunk's
+    position in the file to translate row numbers.
+
+    Parameters:
+    - chunk (DataFrame): A chunk as returned by read_csv, indexed by row position in the file.
+    - corrections (tuple): (row patches, rules) as returned by iris_corrections.load_corrections.
+
+    Returns:
+    - int: The number of cells changed.
+    """
+    from iris_corrections import apply_corrections
+
+    patches, rules = corrections
+    first = chunk.index[0] if len(chunk) else 0
+    if len(patches):
+        inside = (patches.index > first) & (patches.index <= first + len(chunk))
+        patches = patches[inside].set_axis(patches.index[inside] - first)
+    return len(apply_corrections(chunk, patches, rules))
+
+
+def read_iris_statistics(csv_file, chunksize=1_000_000, corrections=None):
+    """
+    Reads a CSV file in chunks, corrects each chunk, adds its ratio features and
+    folds it into the statistics. Errors from reading the file are raised.
+
+    Parameters:
+    - csv_file (str): Path to the iris CSV file.
+    - chunksize (int): Rows per chunk; this bounds the memory used.
+    - corrections (tuple): Optional (row patches, rules) from iris_corrections.load_corrections,
+      applied to each chunk before the features are added.
+
+    Returns:
+    - IrisStatistics: The statistics of the file.
+    """
+    stats = IrisStatistics()
+    # Each chunk is discarded once it has been folded in, so its ratio buffers can be reused
+    buffers = {}
+    for chunk in pd.read_csv(csv_file, dtype=IRIS_DTYPES, chunksize=chunksize):
+        if corrections is not None:
+            correct_chunk(chunk, corrections)
+        stats.update(add_ratio_columns(chunk, buffers))
+    return stats
+
+
+def stream_iris_statistics(csv_file='iris.csv', chunksize=1_000_000, corrections=None):
+    """
+    Computes the iris statistics from a CSV file read in chunks.
+
+    Parameters:
+    - csv_file (str): Path to the iris CSV file.
+    - chunksize (int): Rows per chunk; this bounds the memory used.
+    - corrections (tuple): Optional (row patches, rules) from iris_corrections.load_corrections,
+      applied to each chunk before the features are added.
+
+    Returns:
+    - IrisStatistics: The statistics, or None if the file could not be read.
+    """
+    try:
+        stats = read_iris_statistics(csv_file, chunksize, corrections)
+    except FileNotFoundError:
+        print(f"Error: The file '{csv_file}' was not found.")
+        return None
+    except pd.errors.EmptyDataError:
+        print("Error: The CSV file is empty.")
+        return None
+    except (pd.errors.ParserError, ValueError) as e:
+        print(f"Error: The CSV file is corrupt or improperly formatted: {e}")
+        return None
+    return stats
+
+
+def print_iris_statistics(stats):
+    """
+    Prints the streaming statistics in the same shape as load_and_inspect_data does.
+
+    Parameters:
+    - stats (IrisStatistics): The statistics to print.
+    """
+    print(f"Number of data points: {stats.rows}\n")
+    print("Data types of the columns:")
+    for column, dtype in (stats.dtypes or {}).items():
+        print(f"{column:<15} {dtype}")
+    print()
+    print(f"Number of species: {len(stats.species_counts)}")
+    print("Rows per species:")
+    for species, count in sorted(stats.species_counts.items()):
+        print(f"{species:<15} {count}")
+    print()
+    print("Column summary:")
+    print(stats.moments.summary(), "\n")
+    if stats.moments.skipped:
+        print(f"{stats.moments.skipped} rows with missing values or zero widths were left out of the statistics.\n")
@@ -1,59 +1,156 @@
+# numpy_array_thing.py
+
+# Generates random integer arrays whose row sums are all even and whose total is
+# a multiple of k, then runs some indexing and statistics on a small one.
+# The constraints are enforced with whole-array mask arithmetic, so the same
+# code handles 20x5 and 10,000,000x64 arrays, optionally a block of rows at a
+# time and straight into a preallocated (or memory-mapped) output array.
+
 import numpy as np
 
-def numpyArrayThingy():
-    # Part 1: Create the array with specific conditions
-    print("Part 1: Creating a 2D NumPy array with specific conditions............ ; - ; \n")
+from array_statistics import fused_statistics, replace_above
+
+# Rows adjusted per step when searching for room to fix the total
+TOTAL_FIX_BLOCK_ROWS = 4096
+
+
+def smallest_int_dtype(low, high):
+    """
+    Returns the smallest integer dtype that holds every value in [low, high].
+    """
+    return np.result_type(np.min_scalar_type(low), np.min_scalar_type(high))
+
+
+def make_row_sums_even(arr, low, high):
+    """
+    Makes the sum of every row even by moving the first element of each odd row
+    one step towards the inside of [low, high]. Works in place.
+
+    Parameters:
+    - arr (ndarray): 2-D integer array with values in [low, high].
+    - low (int): Smallest allowed value.
+    - high (int): Largest allowed value (must be greater than low).
 
-    # Set random seed for reproducibility , Not sure if its allowed, works both ways. uncomment if want to test
-    # np.random.seed(0)
+    Returns:
+    - int: The total of the adjusted array.
+    """
+    row_sums = arr.sum(axis=1, dtype=np.int64)
+    odd = np.flatnonzero(row_sums & 1)
+    first = arr[odd, 0]
+    up = first < high
+    arr[odd, 0] = np.where(up, first + 1, first - 1)
+    # Each odd row moved by exactly one, so the total follows without another pass
+    return int(row_sums.sum()) + 2 * int(up.sum()) - len(odd)
 
 
+def fix_total(arr, total, low, high, k):
+    """
+    Makes the total of arr a multiple of k without changing the parity of any row:
+    every element is only moved by an even amount. Elements are taken from the last
+    row backwards, a block of rows at a time, until the change has been absorbed.
+
+    Parameters:
+    - arr (ndarray): 2-D integer array with values in [low, high]; modified in place.
+    - total (int): The current total of arr.
+    - low (int): Smallest allowed value.
+    - high (int): Largest allowed value.
+    - k (int): The divisor.
+
+    Returns:
+    - bool: True if the total is now a multiple of k, False if no even change fits.
+    """
+    # Even changes that reach a multiple of k, smallest first
+    changes = sorted((change for change in range(-2 * k, 2 * k + 1)
+                      if change % 2 == 0 and (total + change) % k == 0), key=abs)
+    for change in changes:
+        if change == 0:
+            return True
+        # Plan the steps first, so nothing is changed if this change doesn't fit
+        remaining = abs(change)
+        plan = []
+        for stop in range(len(arr), 0, -TOTAL_FIX_BLOCK_ROWS):
+            block = arr[max(stop - TOTAL_FIX_BLOCK_ROWS, 0):stop]
+            flat = block.reshape(-1)[::-1]
+            room = ((high - flat) if change > 0 else (flat - low)).astype(np.int64) // 2 * 2
+            steps = np.minimum(room, np.maximum(remaining - (np.cumsum(room) - room), 0))
+            plan.append((block, flat, steps.astype(arr.dtype)))
+            remaining -= int(steps.sum())
+            if not remaining:
+                break
+        if remaining:
+            continue
+        for block, flat, steps in plan:
+            if change > 0:
+                flat += steps
+            else:
+                flat -= steps
+            if not np.may_share_memory(flat, block):
+                # reshape had to copy a non-contiguous block (e.g. a strided out=), so write it back
+                block[...] = flat[::-1].reshape(block.shape)
+        return True
+    return False
+
+
+def generate_constrained_array(shape, low=10, high=100, k=5, rng=None, chunk_rows=None, dtype=None, out=None):
+    """
+    Generates random integers in [low, high] where every row sum is even and the
+    total is a multiple of k.
+
+    Parameters:
+    - shape (tuple): (rows, columns).
+    - low (int): Smallest value.
+    - high (int): Largest value.
+    - k (int): The total is made a multiple of this.
+    - rng (np.random.Generator or int): Generator or seed; None draws fresh entropy.
+    - chunk_rows (int): Fill and fix the array this many rows at a time, so only one
+      chunk of temporaries exists at once. None does it in one go. The values drawn
+      for a given seed depend on the chunk size.
+    - dtype (numpy dtype): Element type; defaults to the smallest one holding [low, high].
+    - out (ndarray): Array to fill, e.g. an np.memmap; must have the given shape.
+
+    Returns:
+    - ndarray: The array, or None if the constraints cannot be met.
+    """
+    rows, columns = shape
+    if high <= low or k < 1 or columns < 1:
+        print("Error: need low < high, k >= 1 and at least one column.")
+        return None
+    rng = np.random.default_rng(rng)
+    if out is None:
+        out = np.empty(shape, dtype=dtype or smallest_int_dtype(low, high))
+    chunk_rows = chunk_rows or max(rows, 1)
+
+    total = 0
+    for start in range(0, rows, chunk_rows):
+        block = out[start:start + chunk_rows]
+        block[...] = rng.integers(low, high, size=block.shape, dtype=block.dtype, endpoint=True)
+        total += make_row_sums_even(block, low, high)
+
+    if not fix_total(out, total, low, high, k):
+        print(f"Error: cannot make the total a multiple of {k} with values in [{low}, {high}].")
+        return None
+    return out
+
+
+def numpyArrayThingy(seed=None):
+    # Part 1: Create the array with specific conditions
+    print("Part 1: Creating a 2D NumPy array with specific conditions............ ; - ; \n")
+
+    # Pass a seed for reproducibility, None gives a different array every run
+    rng = np.random.default_rng(seed)
 
     # Generate initial array with random integers between 10 and 100
-    arr = np.random.randint(10, 101, size=(20, 5))
+    arr = rng.integers(10, 100, size=(20, 5), endpoint=True)
     print("Initial array:\n", arr)
 
-    # Ensure the sum of each row is even
-    for i in range(arr.shape[0]):
-        row_sum = arr[i].sum()
-        if row_sum % 2 != 0:
-            # Sum is odd, adjust one element in the row
-            # Find an element to adjust
-            for j in range(arr.shape[1]):
-                if arr[i, j] < 100:
-                    arr[i, j] += 1  # Increase by 1
-                    break
-                elif arr[i, j] > 10:
-                    arr[i, j] -= 1  # Decrease by 1
-                    break
-
-    # Verify that the sum of each row is even
-    row_sums = arr.sum(axis=1)
-    assert np.all(row_sums % 2 == 0), "Not all row sums are even."
+    # Ensure the sum of each row is even, then that the total sum is a multiple of 5
+    total_sum = make_row_sums_even(arr, 10, 100)
+    fix_total(arr, total_sum, 10, 100, 5)
 
-    # Ensure the total sum is a multiple of 5
-    total_sum = arr.sum()
-    remainder = total_sum % 5
-    if remainder != 0:
-        # Adjust the last element to make the total sum a multiple of 5
-        adjustment = (5 - remainder)
-        if arr[-1, -1] + adjustment <= 100:
-            arr[-1, -1] += adjustment
-        elif arr[-1, -1] - remainder >= 10:
-            arr[-1, -1] -= remainder
-        else:
-            # Find another element to adjust
-            for i in range(arr.shape[0]):
-                for j in range(arr.shape[1]):
-                    if arr[i, j] + adjustment <= 100:
-                        arr[i, j] += adjustment
-                        break
-                    elif arr[i, j] - remainder >= 10:
-                        arr[i, j] -= remainder
-                        break
-
-    # Verify that the total sum is a multiple of 5
+    # Verify both conditions
+    row_sums = arr.sum(axis=1)
     total_sum = arr.sum()
+    assert np.all(row_sums % 2 == 0), "Not all row sums are even."
     assert total_sum % 5 == 0, "Total sum is not a multiple of 5."
 
     print("\nAdjusted array:\n", arr)
@@ -64,39 +161,114 @@ def numpyArrayThingy():
     # Part 2: Array indexing and loops
     print("\nPart 2: Extracting and replacing elements...\n")
 
+    # One pass gathers everything Parts 2 and 3 print, before anything is replaced
+    # The array is small, so the divisible values are kept in memory to print them
+    divisible = []
+    stats = fused_statistics(arr, divisor=15, divisible_out=divisible)
+
     # Extract and print all elements divisible by both 3 and 5
-    divisible_by_15 = arr[(arr % 15 == 0)]
     print("Elements divisible by both 3 and 5 (i.e., divisible by 15):")
-    print(divisible_by_15)
+    print(np.concatenate(divisible))
 
     # Calculate the mean of the entire array
-    mean_value = arr.mean()
-    print("\nMean of the array:", mean_value)
+    print("\nMean of the array:", stats.mean)
 
-    # Replace elements greater than 75 with the mean
-    arr_replaced = arr.copy()
-    arr_replaced[arr_replaced > 75] = int(mean_value)
+    # Replace elements greater than 75 with the mean, in place since the statistics are already taken
+    replace_above(arr, 75, int(stats.mean))
 
     print("\nArray after replacing elements greater than 75 with the mean:")
-    print(arr_replaced)
+    print(arr)
 
     # Part 3: Statistical operations
     print("\nPart 3: Performing statistical operations...\n")
 
-    # Calculate the mean and standard deviation of all values in the array
-    overall_mean = arr.mean()
-    overall_std = arr.std()
-    print(f"Mean of all values: {overall_mean}")
-    print(f"Standard deviation of all values: {overall_std}")
+    # Mean and standard deviation of all values in the array (before the replacement)
+    print(f"Mean of all values: {stats.mean}")
+    print(f"Standard deviation of all values: {stats.std}")
 
-    # Find the median value of the array
-    median_value = np.median(arr)
-    print(f"Median value of the array: {median_value}")
+    # Median value of the array, found without a full sort
+    print(f"Median value of the array: {stats.median}")
+
+    # Variance for each column
+    print(f"Variance for each column:\n{stats.column_var}")
+
+def print_array_statistics(stats):
+    """
+    Prints the statistics of a (possibly memory-mapped) array.
+
+    Parameters:
+    - stats (ArrayStatistics): As returned by fused_statistics.
+    """
+    print(f"Number of values: {stats.count}")
+    print(f"Min / max: {stats.minimum} / {stats.maximum}")
+    print(f"Mean of all values: {stats.mean}")
+    print(f"Standard deviation of all values: {stats.std}")
+    print(f"Median value of the array: {stats.median}")
+    print(f"Variance for each column:\n{stats.column_var}")
+    if stats.divisible_count is not None:
+        print(f"Elements divisible by the divisor: {stats.divisible_count}")
+
+
+def run_cli(argv=None):
+    """
+    Command line entry point. Without a subcommand it runs numpyArrayThingy;
+    'generate' and 'stats' work on .npy files of any size through memory maps.
+
+    Parameters:
+    - argv (list): Command line arguments (defaults to sys.argv).
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Constrained random arrays and their statistics.")
+    parser.add_argument('--seed', type=int, default=None, help="Seed for the random generator.")
+    commands = parser.add_subparsers(dest='command')
+    generate = commands.add_parser('generate', help="Write a constrained array to a .npy file.")
+    generate.add_argument('output', help="The .npy file to create.")
+    generate.add_argument('--rows', type=int, default=1_000_000, help="Number of rows.")
+    generate.add_argument('--columns', type=int, default=64, help="Number of columns.")
+    generate.add_argument('--low', type=int, default=10, help="Smallest value.")
+    generate.add_argument('--high', type=int, default=100, help="Largest value.")
+    generate.add_argument('--k', type=int, default=5, help="The total is made a multiple of this.")
+    generate.add_argument('--chunk-rows', type=int, default=1_000_000, help="Rows generated at a time.")
+    stats = commands.add_parser('stats', help="Print the statistics of a .npy file, read a block at a time.")
+    stats.add_argument('input', help="The .npy file to read.")
+    stats.add_argument('--divisor', type=int, default=15, help="Count the values divisible by this.")
+    stats.add_argument('--divisible-out', default=None,
+                       help="Also write the divisible values to this .npy file, a block at a time.")
+    stats.add_argument('--replace-above', type=float, default=None,
+                       help="Then replace values above this with the mean, in place in the file.")
+    args = parser.parse_args(argv)
+
+    if args.command is None:
+        numpyArrayThingy(args.seed)
+    elif args.command == 'generate':
+        from array_store import create_npy
+        out = create_npy(args.output, (args.rows, args.columns), smallest_int_dtype(args.low, args.high))
+        if generate_constrained_array(out.shape, args.low, args.high, args.k, args.seed, args.chunk_rows,
+                                      out=out) is not None:
+            out.flush()
+            print(f"Saved a {args.rows} x {args.columns} {out.dtype} array to '{args.output}'.")
+    else:
+        from array_store import open_npy
+        arr = open_npy(args.input, 'r+' if args.replace_above is not None else 'r')
+        if arr is None:
+            return
+        if args.divisible_out is not None and args.divisor:
+            from array_store import NpyWriter
+            with NpyWriter(args.divisible_out, arr.dtype) as writer:
+                result = fused_statistics(arr, args.divisor, divisible_out=writer)
+        else:
+            result = fused_statistics(arr, args.divisor)
+        if result is None:
+            return
+        print_array_statistics(result)
+        if args.divisible_out is not None and args.divisor:
+            print(f"Saved the divisible values to '{args.divisible_out}'.")
+        if args.replace_above is not None:
+            replaced = replace_above(arr, args.replace_above, int(result.mean))
+            print(f"Replaced {replaced} values above {args.replace_above} with {int(result.mean)}.")
 
-    # Compute the variance for each column
-    column_variances = arr.var(axis=0)
-    print(f"Variance for each column:\n{column_variances}")
 
-# Call the function to execute the code
-# Very similar to a rubix cube cypher I've done before, But that was in c
-numpyArrayThingy()
+if __name__ == "__main__":
+    # Very similar to a rubix cube cypher I've done before, But that was in c
+    run_cli()
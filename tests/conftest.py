@@ -0,0 +1,59 @@
+# conftest.py
+
+# Shared fixtures for the test suite. The scripts are flat top-level modules,
+# so the project folder (and benchmarks/, for the stub API) is put on sys.path.
+
+import os
+import sys
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, PROJECT_DIR)
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'benchmarks'))
+
+
+@pytest.fixture
+def stub_api():
+    """
+    Runs the local stub APOD API for one test.
+
+    Yields:
+    - tuple: (server, api_url).
+    """
+    from apod_stub_server import start_stub_server
+
+    server, api_url = start_stub_server(quota_limit=100000)
+    yield server, api_url
+    server.shutdown()
+
+
+class FakeClock:
+    """
+    Stands in for time.monotonic and time.sleep: sleeping just moves the clock on.
+    """
+
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def fake_clock(monkeypatch):
+    """
+    Replaces time.monotonic and time.sleep with a FakeClock for one test.
+    """
+    import time
+
+    clock = FakeClock()
+    monkeypatch.setattr(time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(time, 'sleep', clock.sleep)
+    return clock
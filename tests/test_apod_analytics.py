@@ -0,0 +1,111 @@
+# test_apod_analytics.py
+
+import json
+
+import numpy as np
+import pytest
+
+from apod_analytics import build_apod_columns, compute_media_analytics, main, update_media_totals
+from apod_data_processing import analyze_apod_media
+
+
+def make_record(date, media_type='image', explanation='x'):
+    return {'date': date, 'title': 'T', 'explanation': explanation, 'url': '', 'media_type': media_type}
+
+
+RECORDS = [
+    make_record('2019-12-30', 'video', 'a' * 10),
+    make_record('2019-12-31', 'image', 'b' * 30),
+    make_record('2020-01-01', 'image', 'c' * 30),
+    make_record('2020-01-03', 'other', ''),
+    make_record('2020-02-01', None, 'd' * 5),
+]
+
+
+def test_columns_and_totals():
+    columns = build_apod_columns(RECORDS)
+    assert len(columns) == 5
+    assert columns.media.tolist() == [1, 0, 0, 2, 2]
+    assert columns.explanation_lengths.tolist() == [10, 30, 30, 0, 5]
+
+    analytics = compute_media_analytics(columns, top_k=2, window=3)
+    assert analytics['totals'] == {'image': 2, 'video': 1, 'other': 2, 'records': 5}
+    assert analytics['by_year'] == {'2019': {'image': 1, 'video': 1, 'other': 0},
+                                    '2020': {'image': 1, 'video': 0, 'other': 2}}
+    assert list(analytics['by_month']) == ['2019-12', '2020-01', '2020-02']
+    # Ties keep the earlier record, like the original loop
+    assert analytics['explanation_length']['longest_date'] == '2019-12-31'
+    assert analytics['top_longest'] == [{'date': '2019-12-31', 'length': 30}, {'date': '2020-01-01', 'length': 30}]
+    assert analytics['explanation_length']['mean'] == 15.0
+    assert analytics['explanation_length']['percentiles']['50'] == np.percentile([10, 30, 30, 0, 5], 50)
+    json.dumps(analytics)
+
+
+def test_rolling_window_counts_empty_days():
+    analytics = compute_media_analytics(build_apod_columns(RECORDS), window=3)
+    rolling = analytics['rolling']
+    # Windows ending 2020-01-01 .. 2020-02-01, one per calendar day
+    assert rolling['date'][0] == '2020-01-01' and rolling['date'][-1] == '2020-02-01'
+    assert rolling['records'][:4] == [3, 2, 2, 1]
+    assert rolling['video_share'][0] == round(1 / 3, 4)
+    assert rolling['mean_explanation_length'][3] == 0.0
+    assert compute_media_analytics(build_apod_columns(RECORDS), window=400)['rolling']['date'] == []
+
+
+def test_missing_dates_are_left_out_of_the_periods():
+    columns = build_apod_columns([make_record(None), make_record('2020-05-05', 'video')])
+    analytics = compute_media_analytics(columns)
+    assert analytics['totals']['records'] == 2
+    assert analytics['by_year'] == {'2020': {'image': 0, 'video': 1, 'other': 0}}
+
+
+def test_invalid_date_names_the_record(capsys):
+    with pytest.raises(ValueError, match=r"record 2 has an invalid date '2020-13-01'"):
+        build_apod_columns([make_record('2020-01-01'), make_record('2020-13-01')])
+    assert analyze_apod_media([make_record('2020-01-01'), make_record('2020-13-01')]) is None
+    assert 'malformed record' in capsys.readouterr().out
+
+
+def test_empty_input_is_analysed_without_errors(capsys):
+    analytics = analyze_apod_media([])
+    assert analytics == {'totals': {'image': 0, 'video': 0, 'other': 0, 'records': 0}}
+    output = capsys.readouterr().out
+    assert 'Total number of images: 0' in output
+    assert 'no APOD records' in output
+
+
+def test_running_totals_match_a_full_recount():
+    totals = None
+    for start in range(0, len(RECORDS), 2):
+        totals = update_media_totals(totals, build_apod_columns(RECORDS[start:start + 2]))
+    totals = update_media_totals(totals, build_apod_columns([]))
+    full = compute_media_analytics(build_apod_columns(RECORDS))
+    assert totals['totals'] == full['totals']
+    assert totals['by_year'] == full['by_year']
+    assert totals['explanation_length']['mean'] == full['explanation_length']['mean']
+    assert totals['explanation_length']['max'] == 30
+    assert totals['explanation_length']['longest_date'] == '2019-12-31'
+
+
+@pytest.mark.parametrize('option, value', [('--window', '0'), ('--window', '-3'), ('--window', 'week'),
+                                           ('--top-k', '-3'), ('--top-k', 'all')])
+def test_main_rejects_out_of_range_sizes(option, value, capsys):
+    with pytest.raises(SystemExit) as excinfo:
+        main([option, value])
+    assert excinfo.value.code == 2
+    assert f'argument {option}' in capsys.readouterr().err
+
+
+@pytest.mark.parametrize('top_k', [0, -3])
+def test_top_k_below_one_lists_nothing(top_k):
+    assert compute_media_analytics(build_apod_columns(RECORDS), top_k=top_k)['top_longest'] == []
+
+
+def test_main_prints_the_analytics_as_json(tmp_path, capsys):
+    data_file = tmp_path / 'apod_data.json'
+    data_file.write_text(json.dumps(RECORDS))
+    main([str(data_file), '--window', '2'])
+    analytics = json.loads(capsys.readouterr().out)
+    assert analytics['rolling']['window'] == 2
+    main([str(data_file), '--no-rolling'])
+    assert 'rolling' not in json.loads(capsys.readouterr().out)
@@ -0,0 +1,146 @@
+# test_apod_backfill.py
+
+import datetime
+import json
+import os
+
+from apod_backfill import DONE, FAILED, PENDING, BackfillJournal, journal_path_for, main, run_backfill
+from apod_http_client import ApodClient
+from apod_store import JsonlAppender
+
+JAN_1 = datetime.date(2020, 1, 1)
+
+
+def days(count, start=JAN_1):
+    return [start + datetime.timedelta(days=n) for n in range(count)]
+
+
+def fetch_options():
+    return {'requests_per_second': 1000.0, 'update_search': False,
+            'client': ApodClient(max_retries=0, sleep=lambda seconds: None)}
+
+
+def test_failed_dates_back_off_then_give_up(tmp_path):
+    journal = BackfillJournal(str(tmp_path / 'journal.jsonl'), retry_delay=10.0, max_retry_delay=25.0,
+                              max_attempts=3)
+    assert journal.plan(days(2)) == 2
+    assert journal.plan(days(3)) == 1
+    assert journal.due(now=0) == days(3)
+
+    journal.mark_done('2020-01-01')
+    journal.mark_failed('2020-01-02', now=100)
+    assert journal.due(now=105) == [datetime.date(2020, 1, 3)]
+    assert journal.due(now=110) == [datetime.date(2020, 1, 2), datetime.date(2020, 1, 3)]
+
+    # The delay doubles with each attempt, up to max_retry_delay
+    journal.mark_failed('2020-01-02', now=110)
+    assert journal.entries['2020-01-02']['next_retry'] == 130
+    assert journal.next_retry_time() == 130
+    journal.mark_failed('2020-01-02', now=130)
+    assert journal.entries['2020-01-02']['attempts'] == 3
+    assert journal.next_retry_time() is None
+    assert datetime.date(2020, 1, 2) not in journal.due(now=10 ** 9)
+    assert journal.counts() == {PENDING: 1, FAILED: 1, DONE: 1, 'gave_up': 1}
+    journal.close()
+
+
+def test_journal_is_reloaded_and_compacted(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = BackfillJournal(path)
+    journal.plan(days(3))
+    journal.mark_failed('2020-01-02', now=0)
+    journal.mark_done('2020-01-02')
+    journal.close()
+
+    # The last line for a date is its state
+    journal = BackfillJournal(path)
+    assert journal.entries['2020-01-02']['state'] == DONE
+    assert journal.entries['2020-01-02']['attempts'] == 2
+    journal.compact()
+    journal.close()
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = [json.loads(line) for line in f]
+    assert [line['date'] for line in lines] == ['2020-01-01', '2020-01-02', '2020-01-03']
+
+
+def test_status_does_not_create_or_rewrite_the_journal(tmp_path, capsys):
+    store = str(tmp_path / 'apod_data.jsonl')
+    main(['--store', store, 'status'])
+    assert json.loads(capsys.readouterr().out)[PENDING] == 0
+    assert not os.path.exists(journal_path_for(store))
+
+    # A log long enough to be compacted on the next write is left as it is
+    journal = BackfillJournal(journal_path_for(store))
+    for _ in range(1100):
+        journal.mark_done('2020-01-01')
+    journal.close()
+    with open(journal_path_for(store), 'rb') as f:
+        before = f.read()
+    main(['--store', store, 'status'])
+    assert json.loads(capsys.readouterr().out)[DONE] == 1
+    with open(journal_path_for(store), 'rb') as f:
+        assert f.read() == before
+
+    # The next write compacts it
+    journal = BackfillJournal(journal_path_for(store))
+    journal.plan(days(2))
+    journal.close()
+    with open(journal_path_for(store), 'r', encoding='utf-8') as f:
+        assert len(f.readlines()) == 2
+
+
+def test_failed_dates_are_retried_on_the_next_run(tmp_path, stub_api):
+    server, api_url = stub_api
+    server.failing_dates.add('2020-01-03')
+    store = str(tmp_path / 'apod_data.jsonl')
+
+    counts = run_backfill('DEMO_KEY', days(5), store_path=store, api_url=api_url, retry_delay=0.0,
+                          **fetch_options())
+    assert counts == {PENDING: 0, FAILED: 1, DONE: 4, 'gave_up': 0}
+
+    server.failing_dates.clear()
+    requests_before = server.request_count
+    counts = run_backfill('DEMO_KEY', [], store_path=store, api_url=api_url, retry_delay=0.0, **fetch_options())
+    assert counts == {PENDING: 0, FAILED: 0, DONE: 5, 'gave_up': 0}
+    # Only the failed date was requested again
+    assert server.request_count - requests_before == 1
+
+
+def test_interrupted_backfill_resumes_from_the_journal(tmp_path, stub_api):
+    server, api_url = stub_api
+    store = str(tmp_path / 'apod_data.jsonl')
+    # A run planned ten dates and stored three of them, then died before updating the journal
+    journal = BackfillJournal(journal_path_for(store))
+    journal.plan(days(10))
+    journal.close()
+    with JsonlAppender(store) as appender:
+        for day in days(3):
+            appender.append({'date': day.isoformat(), 'title': 'Stored', 'explanation': '', 'url': '',
+                             'media_type': 'image'})
+
+    counts = run_backfill('DEMO_KEY', [], store_path=store, api_url=api_url, use_range=False, **fetch_options())
+    assert counts[DONE] == 10
+    assert server.request_count == 7
+
+
+def test_wait_retries_until_nothing_is_left(tmp_path, stub_api, monkeypatch):
+    import time
+
+    server, api_url = stub_api
+    server.failing_dates.add('2020-01-02')
+    store = str(tmp_path / 'apod_data.jsonl')
+    clock = [time.time()]
+    sleeps = []
+
+    def fake_sleep(seconds):
+        # The outage is over by the time the retry comes round
+        sleeps.append(seconds)
+        clock[0] += seconds
+        server.failing_dates.clear()
+
+    monkeypatch.setattr(time, 'time', lambda: clock[0])
+    monkeypatch.setattr(time, 'sleep', fake_sleep)
+    counts = run_backfill('DEMO_KEY', days(3), store_path=store, api_url=api_url, wait=True, retry_delay=60.0,
+                          **fetch_options())
+    assert counts[DONE] == 3 and counts[FAILED] == 0
+    assert sleeps == [60.0]
@@ -0,0 +1,79 @@
+# test_apod_columnar_export.py
+
+import datetime
+import os
+
+import pytest
+
+from apod_columnar_export import export_apod_columnar, read_apod_columnar
+from apod_store import JsonlAppender
+
+pa = pytest.importorskip('pyarrow')
+
+
+def make_record(date, media_type='image'):
+    return {'date': date, 'title': f"Title {date}", 'explanation': f"Explanation for {date}.",
+            'url': f"https://apod.example/{date}.jpg", 'media_type': media_type}
+
+
+RECORDS = [make_record('2020-03-01'), make_record('2019-12-31', 'video'), make_record('2020-01-01'),
+           make_record('2018-06-15', 'other')]
+
+
+@pytest.mark.parametrize('file_format', ['parquet', 'arrow'])
+def test_export_round_trip(tmp_path, file_format):
+    output_dir = str(tmp_path / 'apod_columnar')
+    assert export_apod_columnar(RECORDS, output_dir=output_dir, file_format=file_format) == 4
+    assert sorted(os.listdir(os.path.join(output_dir, 'summary'))) == ['year=2018', 'year=2019', 'year=2020']
+    assert not os.path.exists(output_dir + '.tmp')
+
+    summary = read_apod_columnar(output_dir)
+    assert summary.column_names == ['date', 'title', 'media_type', 'url']
+    assert summary.schema.field('date').type == pa.date32()
+    assert pa.types.is_dictionary(summary.schema.field('media_type').type)
+    assert summary['date'].to_pylist() == [datetime.date(2018, 6, 15), datetime.date(2019, 12, 31),
+                                           datetime.date(2020, 1, 1), datetime.date(2020, 3, 1)]
+    assert summary['media_type'].to_pylist() == ['other', 'video', 'image', 'image']
+
+    explanations = read_apod_columnar(output_dir, part='explanations', years=[2020])
+    assert explanations['explanation'].to_pylist() == ['Explanation for 2020-01-01.', 'Explanation for 2020-03-01.']
+    titles = read_apod_columnar(output_dir, years=['2019'], columns=['title'])
+    assert titles.column_names == ['title'] and titles['title'].to_pylist() == ['Title 2019-12-31']
+
+
+def test_export_streams_from_a_data_file_and_replaces_the_old_export(tmp_path):
+    store = str(tmp_path / 'apod_data.jsonl')
+    output_dir = str(tmp_path / 'apod_columnar')
+    with JsonlAppender(store) as appender:
+        for record in RECORDS:
+            appender.append(record)
+    export_apod_columnar(RECORDS[:1] + [make_record('2010-01-01')], output_dir=output_dir)
+    assert export_apod_columnar(data_file=store, output_dir=output_dir) == 4
+    # The 2010 partition from the earlier export is gone
+    assert 'year=2010' not in os.listdir(os.path.join(output_dir, 'summary'))
+
+
+@pytest.mark.parametrize('file_format', ['parquet', 'arrow'])
+def test_records_without_a_date_are_kept(tmp_path, file_format):
+    output_dir = str(tmp_path / 'apod_columnar')
+    records = RECORDS + [make_record(None)]
+    del records[-1]['date']
+    records.append(make_record(None))
+    assert export_apod_columnar(records, output_dir=output_dir, file_format=file_format) == 6
+    assert 'year=__null__' in os.listdir(os.path.join(output_dir, 'summary'))
+
+    summary = read_apod_columnar(output_dir)
+    assert summary.num_rows == 6
+    assert summary['date'].null_count == 2
+    assert sorted(summary['title'].to_pylist()[-2:]) == ['Title None', 'Title None']
+    assert read_apod_columnar(output_dir, years=[2020]).num_rows == 2
+
+
+def test_bad_input_is_reported(tmp_path, capsys):
+    output_dir = str(tmp_path / 'apod_columnar')
+    assert export_apod_columnar(RECORDS, output_dir=output_dir, file_format='csv') is None
+    assert export_apod_columnar([make_record('not a date')], output_dir=output_dir) is None
+    assert not os.path.exists(output_dir)
+    assert read_apod_columnar(output_dir) is None
+    output = capsys.readouterr().out
+    assert "unknown columnar format 'csv'" in output and 'Run export_apod_columnar first' in output
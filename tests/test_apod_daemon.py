@@ -0,0 +1,115 @@
+# test_apod_daemon.py
+
+import datetime
+import json
+import os
+import urllib.request
+
+import pytest
+
+from apod_analytics import build_apod_columns, compute_media_analytics
+from apod_daemon import ApodDaemon, DaemonMetrics, start_metrics_server
+from apod_http_client import ApodClient
+from apod_store import read_jsonl
+
+TODAY = datetime.date(2020, 1, 10)
+
+
+@pytest.fixture
+def daemon(tmp_path, stub_api):
+    server, api_url = stub_api
+    daemon = ApodDaemon('DEMO_KEY', store_path=str(tmp_path / 'apod_data.jsonl'),
+                        csv_file=str(tmp_path / 'apod_summary.csv'),
+                        stats_file=str(tmp_path / 'apod_media_stats.json'), lookback_days=3, api_url=api_url)
+    daemon.client = ApodClient(max_retries=0, sleep=lambda seconds: None)
+    yield daemon
+    daemon.client.close()
+
+
+def test_cycle_fetches_the_newest_days_and_updates_the_derived_files(daemon):
+    assert daemon.run_cycle(TODAY) == 3
+    assert [record['date'] for record in read_jsonl(daemon.store_path)] == ['2020-01-08', '2020-01-09', '2020-01-10']
+    with open(daemon.csv_file, 'r', encoding='utf-8') as f:
+        assert len(f.read().splitlines()) == 4
+    with open(daemon.stats_file, 'r', encoding='utf-8') as f:
+        totals = json.load(f)['totals']
+    expected = compute_media_analytics(build_apod_columns(read_jsonl(daemon.store_path)))
+    assert totals['totals'] == expected['totals']
+
+    # The next day only needs one request
+    assert daemon.run_cycle(TODAY + datetime.timedelta(days=1)) == 1
+    assert daemon.run_cycle(TODAY + datetime.timedelta(days=1)) == 0
+    metrics = daemon.metrics
+    assert metrics.counters['apod_poll_cycles_total'] == 3
+    assert metrics.counters['apod_items_fetched_total'] == 4
+    assert metrics.gauges['apod_store_records'] == 4
+    assert metrics.errors == {}
+
+
+def test_unpublished_today_is_pending_not_an_error(daemon, stub_api):
+    server, _ = stub_api
+    server.unpublished_dates.add(TODAY.isoformat())
+    assert daemon.run_cycle(TODAY) == 2
+    assert daemon.metrics.errors == {}
+    assert daemon.metrics.gauges['apod_pending_dates'] == 1
+    assert daemon.metrics.gauges['apod_last_success_timestamp_seconds'] > 0
+
+    # Once it is published, the next cycle picks it up
+    server.unpublished_dates.clear()
+    assert daemon.run_cycle(TODAY) == 1
+    assert daemon.metrics.gauges['apod_pending_dates'] == 0
+
+
+def test_other_failures_are_counted_as_errors(daemon, stub_api):
+    server, _ = stub_api
+    # A missing older day is a real gap, and a server error is never "pending"
+    server.unpublished_dates.add('2020-01-08')
+    server.failing_dates.add(TODAY.isoformat())
+    assert daemon.run_cycle(TODAY) == 1
+    assert daemon.metrics.errors == {'fetch': 1}
+    assert daemon.metrics.gauges['apod_pending_dates'] == 0
+    assert daemon.metrics.gauges['apod_last_success_timestamp_seconds'] > 0
+
+
+def test_a_failed_csv_update_is_counted_and_retried(daemon):
+    # A directory in the CSV's place makes the write fail
+    os.mkdir(daemon.csv_file)
+    assert daemon.run_cycle(TODAY) == 3
+    assert daemon.metrics.errors == {'csv': 1}
+    assert not os.path.exists(daemon.stats_file)
+
+    # Nothing new is fetched, but the next cycle still brings the CSV up to date
+    os.rmdir(daemon.csv_file)
+    assert daemon.run_cycle(TODAY) == 0
+    with open(daemon.csv_file, 'r', encoding='utf-8') as f:
+        assert len(f.read().splitlines()) == 4
+    with open(daemon.stats_file, 'r', encoding='utf-8') as f:
+        assert json.load(f)['totals']['totals']['records'] == 3
+    assert daemon.metrics.errors == {'csv': 1}
+
+
+def test_metrics_are_rendered_and_served():
+    metrics = DaemonMetrics()
+    metrics.record_fetch(0.3, 5, 2, {'latency_p50': 0.01, 'requests': 2})
+    metrics.record_fetch(100.0, 1, 1, {'latency_p50': 0.02})
+    metrics.record_error('csv')
+    text = metrics.render()
+    assert 'apod_items_fetched_total 6' in text
+    assert 'apod_fetch_duration_seconds_bucket{le="0.25"} 0' in text
+    assert 'apod_fetch_duration_seconds_bucket{le="0.5"} 1' in text
+    assert 'apod_fetch_duration_seconds_bucket{le="60.0"} 1' in text
+    assert 'apod_fetch_duration_seconds_bucket{le="+Inf"} 2' in text
+    assert 'apod_errors_total{stage="csv"} 1' in text
+    assert 'apod_http_request_latency_seconds{stat="p50"} 0.02' in text
+    assert 'apod_items_per_day 6' in text
+    # Items older than a day drop out of the daily gauge
+    assert metrics.items_per_day(now=metrics.recent_items[-1][0] + 86401) == 0
+
+    server = start_metrics_server(metrics, port=0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url) as response:
+            assert response.headers['Content-Type'].startswith('text/plain')
+            assert '# TYPE apod_poll_cycles_total counter' in response.read().decode('utf-8')
+    finally:
+        server.shutdown()
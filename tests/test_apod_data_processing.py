@@ -0,0 +1,147 @@
+# test_apod_data_processing.py
+
+import csv
+import json
+import os
+
+import apod_data_processing
+from apod_data_processing import load_summary_state, summary_state_path, write_apod_summary_to_csv
+from apod_store import JsonlAppender, load_apod_dataset
+
+
+def make_record(day):
+    return {'date': f"2020-01-{day:02d}", 'title': f"Picture {day}", 'explanation': 'Text.',
+            'url': f"https://apod.example/{day}.jpg", 'media_type': 'image'}
+
+
+def append_days(path, days):
+    with JsonlAppender(path) as store:
+        for day in days:
+            store.append(make_record(day))
+
+
+def csv_dates(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return [row['date'] for row in csv.DictReader(f)]
+
+
+def count_formatted_rows(monkeypatch):
+    formatted = []
+    summary_row = apod_data_processing.summary_row
+
+    def counting_summary_row(entry):
+        formatted.append(entry['date'])
+        return summary_row(entry)
+
+    monkeypatch.setattr(apod_data_processing, 'summary_row', counting_summary_row)
+    return formatted
+
+
+def test_only_new_records_are_read_and_appended(tmp_path, monkeypatch):
+    store = str(tmp_path / 'apod_data.jsonl')
+    csv_file = str(tmp_path / 'apod_summary.csv')
+    append_days(store, [1, 2, 3])
+    write_apod_summary_to_csv(data_file=store, csv_file=csv_file)
+    assert csv_dates(csv_file) == ['01/01/2020', '02/01/2020', '03/01/2020']
+    state = load_summary_state(csv_file, store)
+    assert state['record_count'] == 3 and state['data_size'] == os.path.getsize(store)
+
+    append_days(store, [4, 5])
+    formatted = count_formatted_rows(monkeypatch)
+    write_apod_summary_to_csv(data_file=store, csv_file=csv_file)
+    assert formatted == ['2020-01-04', '2020-01-05']
+    assert csv_dates(csv_file) == ['01/01/2020', '02/01/2020', '03/01/2020', '04/01/2020', '05/01/2020']
+
+
+def test_a_run_with_nothing_new_changes_nothing(tmp_path, monkeypatch, capsys):
+    store = str(tmp_path / 'apod_data.jsonl')
+    csv_file = str(tmp_path / 'apod_summary.csv')
+    append_days(store, [1, 2])
+    write_apod_summary_to_csv(data_file=store, csv_file=csv_file)
+    with open(csv_file, 'rb') as f:
+        before = f.read()
+
+    # A fresh run picks up the saved state and reads no records
+    formatted = count_formatted_rows(monkeypatch)
+    capsys.readouterr()
+    write_apod_summary_to_csv(data_file=store, csv_file=csv_file)
+    output = capsys.readouterr().out
+    assert 'Resuming export' in output and 'No new entries' in output
+    assert formatted == []
+    with open(csv_file, 'rb') as f:
+        assert f.read() == before
+
+
+def test_loaded_dataset_resumes_after_the_exported_records(tmp_path, monkeypatch):
+    store = str(tmp_path / 'apod_data.jsonl')
+    csv_file = str(tmp_path / 'apod_summary.csv')
+    append_days(store, [1, 2])
+    write_apod_summary_to_csv(load_apod_dataset(store), csv_file=csv_file)
+    append_days(store, [3])
+
+    formatted = count_formatted_rows(monkeypatch)
+    write_apod_summary_to_csv(load_apod_dataset(store), csv_file=csv_file)
+    assert formatted == ['2020-01-03']
+    assert csv_dates(csv_file) == ['01/01/2020', '02/01/2020', '03/01/2020']
+
+
+def test_edited_csv_makes_the_state_stale(tmp_path, capsys):
+    store = str(tmp_path / 'apod_data.jsonl')
+    csv_file = str(tmp_path / 'apod_summary.csv')
+    append_days(store, [1, 2])
+    write_apod_summary_to_csv(data_file=store, csv_file=csv_file)
+    # Someone adds a row by hand, so the CSV no longer matches the saved state
+    with open(csv_file, 'a', encoding='utf-8', newline='') as f:
+        f.write('04/01/2020,Hand-written,image,https://apod.example/4.jpg\r\n')
+    assert load_summary_state(csv_file, store) is None
+
+    append_days(store, [3, 4])
+    capsys.readouterr()
+    write_apod_summary_to_csv(data_file=store, csv_file=csv_file)
+    assert 'Resuming export' not in capsys.readouterr().out
+    # The fallback skips every date already in the CSV
+    assert csv_dates(csv_file) == ['01/01/2020', '02/01/2020', '04/01/2020', '03/01/2020']
+    assert load_summary_state(csv_file, store)['record_count'] == 4
+
+
+def test_replaced_store_makes_the_state_stale(tmp_path):
+    store = str(tmp_path / 'apod_data.jsonl')
+    csv_file = str(tmp_path / 'apod_summary.csv')
+    append_days(store, [1, 2, 3])
+    write_apod_summary_to_csv(data_file=store, csv_file=csv_file)
+
+    # A smaller store can't be the one that was exported
+    os.remove(store)
+    append_days(store, [5])
+    assert load_summary_state(csv_file, store) is None
+    write_apod_summary_to_csv(data_file=store, csv_file=csv_file)
+    assert csv_dates(csv_file) == ['01/01/2020', '02/01/2020', '03/01/2020', '05/01/2020']
+
+
+def test_state_for_a_json_array_needs_the_same_file(tmp_path):
+    data_file = str(tmp_path / 'apod_data.json')
+    csv_file = str(tmp_path / 'apod_summary.csv')
+    with open(data_file, 'w', encoding='utf-8') as f:
+        json.dump([make_record(1), make_record(2)], f)
+    write_apod_summary_to_csv(data_file=data_file, csv_file=csv_file)
+    assert load_summary_state(csv_file, data_file)['record_count'] == 2
+    assert load_summary_state(csv_file, str(tmp_path / 'other.json')) is None
+
+    with open(data_file, 'w', encoding='utf-8') as f:
+        json.dump([make_record(2), make_record(1), make_record(3)], f)
+    assert load_summary_state(csv_file, data_file) is None
+    write_apod_summary_to_csv(data_file=data_file, csv_file=csv_file)
+    assert csv_dates(csv_file) == ['01/01/2020', '02/01/2020', '03/01/2020']
+
+
+def test_unreadable_state_file_is_ignored(tmp_path):
+    store = str(tmp_path / 'apod_data.jsonl')
+    csv_file = str(tmp_path / 'apod_summary.csv')
+    append_days(store, [1])
+    write_apod_summary_to_csv(data_file=store, csv_file=csv_file)
+    with open(summary_state_path(csv_file), 'w', encoding='utf-8') as f:
+        f.write('{"record_count": ')
+    assert load_summary_state(csv_file, store) is None
+    append_days(store, [2])
+    write_apod_summary_to_csv(data_file=store, csv_file=csv_file)
+    assert csv_dates(csv_file) == ['01/01/2020', '02/01/2020']
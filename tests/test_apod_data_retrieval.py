@@ -0,0 +1,172 @@
+# test_apod_data_retrieval.py
+
+import datetime
+import json
+import os
+
+import apod_data_retrieval
+from apod_data_retrieval import TokenBucket, fetch_multiple_apod_data
+from apod_http_client import ApodClient
+
+
+def read_dates(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return sorted(json.loads(line)['date'] for line in f if line.strip())
+
+
+def test_token_bucket_allows_a_burst_then_paces_requests(fake_clock):
+    bucket = TokenBucket(rate=2.0, capacity=3)
+    for _ in range(3):
+        bucket.acquire()
+    assert fake_clock.sleeps == []
+
+    bucket.acquire()
+    assert sum(fake_clock.sleeps) == 0.5
+
+
+def test_token_bucket_never_exceeds_its_rate(fake_clock):
+    bucket = TokenBucket(rate=5.0, capacity=1)
+    start = fake_clock.now
+    for _ in range(51):
+        bucket.acquire()
+    # One token up front, then one every 1/rate seconds
+    assert abs((fake_clock.now - start) - 10.0) < 1e-9
+
+
+def test_token_bucket_slows_down_when_the_quota_runs_low(fake_clock):
+    bucket = TokenBucket(rate=5.0, capacity=5, low_water=10, quota_window=3600.0)
+    bucket.update_from_headers({'X-RateLimit-Remaining': '4'})
+    assert bucket.rate == 4 / 3600.0
+    assert bucket.tokens <= 1.0
+
+    bucket.update_from_headers({'X-RateLimit-Remaining': 'not a number'})
+    assert bucket.rate == 4 / 3600.0
+    bucket.update_from_headers({'X-RateLimit-Remaining': '500'})
+    assert bucket.rate == 5.0
+
+
+def test_fetch_per_day_stores_every_date_once(tmp_path, stub_api):
+    server, api_url = stub_api
+    output_file = str(tmp_path / 'apod_data.jsonl')
+    stats = fetch_multiple_apod_data('DEMO_KEY', '01/01/2020', '20/01/2020', max_workers=4,
+                                     requests_per_second=1000.0, output_file=output_file, api_url=api_url,
+                                     use_range=False, update_search=False)
+    assert stats['fetched'] == 20
+    assert stats['http_requests'] == 20
+    expected = [(datetime.date(2020, 1, 1) + datetime.timedelta(days=n)).isoformat() for n in range(20)]
+    assert read_dates(output_file) == expected
+
+    # A second run finds every date in the store and sends no requests
+    stats = fetch_multiple_apod_data('DEMO_KEY', '01/01/2020', '20/01/2020', requests_per_second=1000.0,
+                                     output_file=output_file, api_url=api_url, use_range=False,
+                                     update_search=False)
+    assert stats['http_requests'] == 0
+    assert read_dates(output_file) == expected
+    assert os.path.exists(output_file + '.idx.npz')
+
+
+def test_fetch_reports_dates_that_keep_failing(tmp_path, stub_api):
+    server, api_url = stub_api
+    server.failing_dates.add('2020-01-03')
+    output_file = str(tmp_path / 'apod_data.jsonl')
+    client = ApodClient(max_retries=1, sleep=lambda seconds: None)
+    stats = fetch_multiple_apod_data('DEMO_KEY', '01/01/2020', '05/01/2020', requests_per_second=1000.0,
+                                     output_file=output_file, api_url=api_url, use_range=False,
+                                     client=client, update_search=False)
+    assert stats['fetched'] == 4
+    assert stats['failed_dates'] == ['2020-01-03']
+
+
+def test_split_into_ranges_caps_and_breaks_at_gaps():
+    day = datetime.date(2020, 1, 1)
+    dates = [day + datetime.timedelta(days=n) for n in list(range(250)) + [260, 261]]
+    ranges = apod_data_retrieval.split_into_ranges(dates, chunk_days=100)
+    assert [(start - day).days for start, _ in ranges] == [0, 100, 200, 260]
+    assert [(end - start).days + 1 for start, end in ranges] == [100, 100, 50, 2]
+    assert apod_data_retrieval.split_into_ranges([]) == []
+
+
+def test_fetch_by_range_sends_one_request_per_chunk(tmp_path, stub_api):
+    server, api_url = stub_api
+    output_file = str(tmp_path / 'apod_data.jsonl')
+    stats = fetch_multiple_apod_data('DEMO_KEY', '01/01/2020', '19/05/2020', requests_per_second=1000.0,
+                                     output_file=output_file, api_url=api_url, chunk_days=50,
+                                     update_search=False)
+    # 140 days in chunks of 50
+    assert stats['http_requests'] == 3
+    assert stats['fetched'] == 140
+    assert len(read_dates(output_file)) == 140
+
+
+def test_failed_range_falls_back_to_single_days(tmp_path, stub_api):
+    server, api_url = stub_api
+    server.failing_dates.add('2020-01-15')
+    output_file = str(tmp_path / 'apod_data.jsonl')
+    client = ApodClient(max_retries=0, sleep=lambda seconds: None)
+    stats = fetch_multiple_apod_data('DEMO_KEY', '01/01/2020', '10/02/2020', requests_per_second=1000.0,
+                                     output_file=output_file, api_url=api_url, chunk_days=20,
+                                     client=client, update_search=False)
+    # Only the chunk holding the failing date is refetched one day at a time
+    assert stats['http_requests'] == 3 + 20
+    assert stats['fetched'] == 40
+    assert stats['failed_dates'] == ['2020-01-15']
+
+
+def test_dates_missing_from_a_range_response_are_retried(tmp_path, stub_api, monkeypatch):
+    server, api_url = stub_api
+    get_range = apod_data_retrieval.get_apod_range_data
+
+    def drop_one_record(*args, **kwargs):
+        return [record for record in get_range(*args, **kwargs) if record['date'] != '2020-01-04']
+
+    monkeypatch.setattr(apod_data_retrieval, 'get_apod_range_data', drop_one_record)
+    output_file = str(tmp_path / 'apod_data.jsonl')
+    stats = fetch_multiple_apod_data('DEMO_KEY', '01/01/2020', '10/01/2020', requests_per_second=1000.0,
+                                     output_file=output_file, api_url=api_url, update_search=False)
+    assert stats['http_requests'] == 2
+    assert stats['fetched'] == 10
+    assert stats['failed_dates'] == []
+    assert '2020-01-04' in read_dates(output_file)
+
+
+def test_range_records_without_a_valid_date_are_fetched_again(tmp_path, stub_api, monkeypatch):
+    server, api_url = stub_api
+    get_range = apod_data_retrieval.get_apod_range_data
+
+    def break_some_dates(*args, **kwargs):
+        records = get_range(*args, **kwargs)
+        records[1]['date'] = None
+        records[2]['date'] = '2020-13-02'
+        records[3]['date'] = '2019-12-31'
+        del records[4]['date']
+        return records
+
+    monkeypatch.setattr(apod_data_retrieval, 'get_apod_range_data', break_some_dates)
+    output_file = str(tmp_path / 'apod_data.jsonl')
+    stats = fetch_multiple_apod_data('DEMO_KEY', '01/01/2020', '10/01/2020', requests_per_second=1000.0,
+                                     output_file=output_file, api_url=api_url, update_search=False)
+    assert stats['http_requests'] == 1 + 4
+    assert stats['fetched'] == 10
+    assert stats['failed_dates'] == []
+    expected = [(datetime.date(2020, 1, 1) + datetime.timedelta(days=n)).isoformat() for n in range(10)]
+    assert read_dates(output_file) == expected
+
+
+def test_single_day_response_with_the_wrong_date_is_a_failure(tmp_path, stub_api, monkeypatch):
+    server, api_url = stub_api
+    get_day = apod_data_retrieval.get_apod_data
+
+    def wrong_date(*args, **kwargs):
+        data = get_day(*args, **kwargs)
+        if data['date'] == '2020-01-02':
+            data['date'] = 'yesterday'
+        return data
+
+    monkeypatch.setattr(apod_data_retrieval, 'get_apod_data', wrong_date)
+    output_file = str(tmp_path / 'apod_data.jsonl')
+    stats = fetch_multiple_apod_data('DEMO_KEY', '01/01/2020', '03/01/2020', requests_per_second=1000.0,
+                                     output_file=output_file, api_url=api_url, use_range=False,
+                                     update_search=False)
+    assert stats['fetched'] == 2
+    assert stats['failed_dates'] == ['2020-01-02']
+    assert read_dates(output_file) == ['2020-01-01', '2020-01-03']
@@ -0,0 +1,92 @@
+# test_apod_http_client.py
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+from apod_http_client import ApodClient, parse_retry_after
+
+
+class FakeTransport(BaseAdapter):
+    """
+    Answers each request with the next scripted reply: a (status, headers) tuple or an exception.
+    """
+
+    def __init__(self, replies):
+        super().__init__()
+        self.replies = list(replies)
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        status, headers = reply
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(headers)
+        response._content = b'{}'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def make_client(replies, **kwargs):
+    transport = FakeTransport(replies)
+    sleeps = []
+    client = ApodClient(transport=transport, sleep=sleeps.append, **kwargs)
+    return client, transport, sleeps
+
+
+def test_temporary_failure_is_retried():
+    client, transport, sleeps = make_client([(503, {}), (200, {})], backoff_factor=0.5)
+    response = client.get('https://api.example/apod', params={'date': '2020-01-01'})
+    assert response.status_code == 200
+    assert len(transport.requests) == 2
+    assert len(sleeps) == 1 and 0 <= sleeps[0] <= 0.5
+    stats = client.stats()
+    assert (stats['requests'], stats['retries'], stats['failures']) == (2, 1, 0)
+
+
+def test_client_errors_are_not_retried():
+    client, transport, sleeps = make_client([(404, {})])
+    assert client.get('https://api.example/apod').status_code == 404
+    assert sleeps == []
+
+
+def test_retry_after_is_honoured_up_to_max_backoff():
+    client, transport, sleeps = make_client([(429, {'Retry-After': '2'}), (429, {'Retry-After': '120'}),
+                                             (200, {})], max_backoff=10.0)
+    assert client.get('https://api.example/apod').status_code == 200
+    assert sleeps == [2.0, 10.0]
+
+
+def test_last_error_response_is_returned_after_max_retries():
+    client, transport, sleeps = make_client([(500, {})] * 3, max_retries=2)
+    assert client.get('https://api.example/apod').status_code == 500
+    assert len(sleeps) == 2
+    assert client.stats()['failures'] == 1
+
+
+def test_connection_error_is_raised_after_max_retries():
+    error = requests.exceptions.ConnectionError('refused')
+    client, transport, sleeps = make_client([error] * 3, max_retries=2, backoff_factor=1.0)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.get('https://api.example/apod')
+    assert len(transport.requests) == 3
+    # Full jitter: attempt n waits at most backoff_factor * 2**n
+    assert 0 <= sleeps[0] <= 1.0 and 0 <= sleeps[1] <= 2.0
+    assert client.stats()['failures'] == 1
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('3') == 3.0
+    assert parse_retry_after('-1') == 0.0
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after(None) is None
@@ -0,0 +1,60 @@
+# test_apod_index.py
+
+import datetime
+
+from apod_index import index_path_for, load_date_index
+from apod_store import JsonlAppender
+
+
+def make_record(date):
+    return {'date': date, 'title': f"Picture for {date}", 'explanation': '', 'url': '', 'media_type': 'image'}
+
+
+def write_store(path, dates):
+    with JsonlAppender(str(path)) as store:
+        for date in dates:
+            store.append(make_record(date))
+
+
+def test_lookups_and_gaps(tmp_path):
+    path = tmp_path / 'apod_data.jsonl'
+    write_store(path, ['2020-01-03', '2020-01-01', '2020-01-05', '2020-01-01'])
+    index = load_date_index(str(path))
+
+    assert len(index) == 3
+    assert '2020-01-05' in index and '2020-01-02' not in index
+    assert [record['date'] for record in index.lookup_range('2020-01-01', '2020-01-04')] == ['2020-01-01', '2020-01-03']
+    assert index.missing_dates('2020-01-01', '2020-01-05') == [datetime.date(2020, 1, 2), datetime.date(2020, 1, 4)]
+    assert index.lookup('2020-01-02') is None
+
+
+def test_index_catches_up_with_appends(tmp_path):
+    path = tmp_path / 'apod_data.jsonl'
+    write_store(path, ['2020-01-01'])
+    load_date_index(str(path))
+    write_store(path, ['2020-01-02'])
+
+    index = load_date_index(str(path))
+    assert len(index) == 2
+    assert index.lookup('2020-01-02')['title'] == 'Picture for 2020-01-02'
+    assert (tmp_path / 'apod_data.jsonl.idx.npz').exists()
+    assert index_path_for(str(path)).endswith('.idx.npz')
+
+
+def test_invalid_dates_are_skipped(tmp_path, capsys):
+    path = tmp_path / 'apod_data.jsonl'
+    write_store(path, ['2020-01-01', '2020-13-01', '2020-01-02'])
+    with JsonlAppender(str(path)) as store:
+        store.append({'date': 20200103, 'title': 'not a string'})
+        store.append({'title': 'no date'})
+
+    index = load_date_index(str(path))
+    assert len(index) == 2
+    assert index.missing_dates('2020-01-01', '2020-01-03') == [datetime.date(2020, 1, 3)]
+    output = capsys.readouterr().out
+    assert "'2020-13-01'" in output and '20200103' in output
+
+    # The bad lines have been passed over, so the next load doesn't warn again
+    write_store(path, ['2020-01-03'])
+    assert len(load_date_index(str(path))) == 3
+    assert 'invalid date' not in capsys.readouterr().out
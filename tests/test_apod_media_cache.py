@@ -0,0 +1,173 @@
+# test_apod_media_cache.py
+
+import datetime
+import hashlib
+import os
+
+import pytest
+import requests
+
+from apod_http_client import ApodClient
+from apod_media_cache import MediaCache
+from apod_stub_server import fake_apod_entry, fake_png, start_stub_server
+
+
+@pytest.fixture
+def media_server():
+    server, api_url = start_stub_server(serve_images=True)
+    yield server
+    server.shutdown()
+
+
+def stub_records(server, first='2020-01-01', days=10):
+    start = datetime.date.fromisoformat(first)
+    return [fake_apod_entry((start + datetime.timedelta(days=n)).isoformat(), server.media_base_url)
+            for n in range(days)]
+
+
+def make_cache(tmp_path, **kwargs):
+    return MediaCache(str(tmp_path / 'cache'), client=ApodClient(max_retries=0), **kwargs)
+
+
+class ScriptedClient:
+    """
+    Answers each GET with the next scripted status code and records the headers sent.
+    """
+
+    def __init__(self, statuses, body=b'', before_reply=None):
+        self.statuses = list(statuses)
+        self.body = body
+        self.before_reply = before_reply
+        self.sent_headers = []
+
+    def get(self, url, params=None, rate_limiter=None, headers=None):
+        self.sent_headers.append(headers or {})
+        if self.before_reply:
+            self.before_reply()
+        response = requests.Response()
+        response.status_code = self.statuses.pop(0)
+        response._content = self.body if response.status_code == 200 else b''
+        response.headers['ETag'] = '"v1"'
+        response.url = url
+        return response
+
+
+def test_images_are_downloaded_then_revalidated(tmp_path, media_server):
+    records = stub_records(media_server)
+    images = [record for record in records if record['media_type'] == 'image']
+    cache = make_cache(tmp_path)
+
+    counts = cache.cache_records(records, thumbnails=False)
+    assert counts['downloaded'] == len(images)
+    assert counts['videos'] == len(records) - len(images)
+    for record in images:
+        path = cache.path_for(record['url'])
+        with open(path, 'rb') as f:
+            content = f.read()
+        assert content == fake_png(datetime.date.fromisoformat(record['date']).toordinal())
+        assert os.path.basename(path) == hashlib.sha256(content).hexdigest() + '.png'
+
+    # A new cache object reads the manifest and only sends conditional requests
+    cache = make_cache(tmp_path)
+    counts = cache.cache_records(records, thumbnails=False)
+    assert counts['not-modified'] == len(images)
+    assert counts['downloaded'] == 0
+    assert media_server.image_request_count == 2 * len(images)
+
+
+def test_videos_are_recorded_but_not_downloaded(tmp_path, media_server):
+    records = [record for record in stub_records(media_server, days=14) if record['media_type'] == 'video']
+    assert records
+    cache = make_cache(tmp_path)
+    counts = cache.cache_records(records, thumbnails=False)
+    assert counts['videos'] == len(records)
+    assert media_server.image_request_count == 0
+    for record in records:
+        assert cache.entries[record['url']] == {'media_type': 'video', 'date': record['date'], 'skipped': True}
+        assert cache.path_for(record['url']) is None
+
+
+def test_the_same_content_is_stored_once(tmp_path, media_server):
+    record = stub_records(media_server, days=1)[0]
+    cache = make_cache(tmp_path)
+    assert cache.fetch(record['url']) == 'downloaded'
+    assert cache.fetch(record['url'] + '?size=large') == 'downloaded'
+    assert cache.path_for(record['url']) == cache.path_for(record['url'] + '?size=large')
+    assert cache.total_size() == len(fake_png(datetime.date.fromisoformat(record['date']).toordinal()))
+
+
+def test_least_recently_used_files_are_evicted(tmp_path, media_server):
+    images = [record for record in stub_records(media_server) if record['media_type'] == 'image'][:3]
+    cache = make_cache(tmp_path)
+    for record in images:
+        cache.fetch(record['url'], record['date'])
+    paths = [cache.path_for(record['url']) for record in images]
+    # Make the first image the most recently used and the second the oldest
+    for record, last_access in zip(images, [300, 100, 200]):
+        cache.entries[record['url']]['last_access'] = last_access
+
+    # Room for everything but the oldest file
+    limit = cache.total_size() - cache.entries[images[1]['url']]['size']
+    assert cache.evict(max_bytes=limit) == 1
+    assert images[1]['url'] not in cache.entries
+    assert not os.path.exists(paths[1])
+    assert os.path.exists(paths[0]) and os.path.exists(paths[2])
+    assert cache.evict(max_bytes=limit) == 0
+
+
+def test_content_under_two_extensions_is_stored_and_evicted_once(tmp_path):
+    cache = MediaCache(str(tmp_path / 'cache'), client=ScriptedClient([200, 200], body=b'same image'))
+    assert cache.fetch('https://apod.example/a.jpg') == 'downloaded'
+    assert cache.fetch('https://apod.example/b.jpeg') == 'downloaded'
+    sha256 = hashlib.sha256(b'same image').hexdigest()
+    assert cache.path_for('https://apod.example/b.jpeg') == cache.path_for('https://apod.example/a.jpg')
+    assert [os.path.basename(path) for path in cache.stored_object_paths(sha256)] == [sha256 + '.jpg']
+
+    # A second copy left by an older cache is removed along with the first
+    with open(cache.object_path(sha256, '.jpeg'), 'wb') as f:
+        f.write(b'same image')
+    assert cache.evict(max_bytes=0) == 1
+    assert cache.stored_object_paths(sha256) == []
+    assert cache.entries == {}
+
+
+def test_thumbnails_are_generated_for_new_images(tmp_path, media_server):
+    pytest.importorskip('PIL')
+    from PIL import Image
+
+    records = [record for record in stub_records(media_server, days=3) if record['media_type'] == 'image']
+    cache = make_cache(tmp_path)
+    counts = cache.cache_records(records, thumbnail_workers=1)
+    assert counts['thumbnails'] == len(records)
+    for record in records:
+        thumbnail = cache.thumbnail_path(cache.entries[record['url']]['sha256'])
+        with Image.open(thumbnail) as image:
+            assert image.format == 'JPEG'
+            assert image.size == (64, 48)
+    # Existing thumbnails are not made again
+    assert cache.make_thumbnails(max_workers=1) == 0
+
+
+def test_a_304_without_a_cached_copy_fails(tmp_path):
+    client = ScriptedClient([304])
+    cache = MediaCache(str(tmp_path / 'cache'), client=client)
+    assert cache.fetch('https://apod.example/image/a.png') == 'failed'
+    assert cache.entries == {}
+    assert client.sent_headers == [{}]
+
+
+def test_entry_evicted_during_revalidation_is_downloaded_again(tmp_path):
+    url = 'https://apod.example/image/a.png'
+    client = ScriptedClient([200], body=b'first')
+    cache = MediaCache(str(tmp_path / 'cache'), client=client)
+    assert cache.fetch(url) == 'downloaded'
+
+    # The conditional request answers 304, but the entry is evicted before that is seen
+    client.statuses = [304, 200]
+    client.body = b'second'
+    client.before_reply = lambda: cache.evict(max_bytes=0)
+    assert cache.fetch(url) == 'downloaded'
+    assert client.sent_headers[-2] == {'If-None-Match': '"v1"'}
+    assert client.sent_headers[-1] == {}
+    with open(cache.path_for(url), 'rb') as f:
+        assert f.read() == b'second'
@@ -0,0 +1,178 @@
+# test_apod_search.py
+
+import json
+import math
+
+import pytest
+
+import apod_search
+from apod_search import SearchIndex, main, parse_query, tokenize, update_search_index
+from apod_store import JsonlAppender
+
+
+def make_record(date, title, explanation=''):
+    return {'date': date, 'title': title, 'explanation': explanation, 'url': '', 'media_type': 'image'}
+
+
+def dates_of(results):
+    return [result['date'] for result in results]
+
+
+def test_tokenize_and_parse_query():
+    assert tokenize("M31's core, NGC-7000!") == ['m31', 's', 'core', 'ngc', '7000']
+    assert parse_query('betelgeuse "Red Supergiant" star ""') == (['betelgeuse', 'star'], [['red', 'supergiant']])
+
+
+def reference_bm25(records, term):
+    """
+    Scores every record for one term with the textbook BM25 formula.
+    """
+    tokens = [tokenize(record['title']) + tokenize(record['explanation']) for record in records]
+    average_length = sum(map(len, tokens)) / len(tokens)
+    df = sum(term in doc for doc in tokens)
+    idf = math.log(1 + (len(tokens) - df + 0.5) / (df + 0.5))
+    scores = {}
+    for record, doc in zip(records, tokens):
+        tf = doc.count(term)
+        if tf:
+            norm = apod_search.BM25_K1 * (1 - apod_search.BM25_B + apod_search.BM25_B * len(doc) / average_length)
+            scores[record['date']] = idf * tf * (apod_search.BM25_K1 + 1) / (tf + norm)
+    return scores
+
+
+def test_results_are_ranked_by_bm25(tmp_path):
+    records = [
+        make_record('2020-01-01', 'Andromeda', 'The nebula glows. A nebula, another nebula.'),
+        make_record('2020-01-02', 'Orion Nebula', 'A long explanation about stars, dust, gas and many other things.'),
+        make_record('2020-01-03', 'Comet', 'No match here.'),
+        make_record('2020-01-04', 'Nebula', 'Nebula.'),
+        make_record('2020-01-05', 'Nebula', 'Nebula.'),
+    ]
+    index = SearchIndex(str(tmp_path / 'index'))
+    index.add_records(records)
+    results = index.search('Nebula')
+
+    expected = reference_bm25(records, 'nebula')
+    assert {result['date']: result['score'] for result in results} == pytest.approx(expected, abs=1e-4)
+    # Best match first; equal scores put the newest date first
+    assert dates_of(results) == ['2020-01-05', '2020-01-04', '2020-01-01', '2020-01-02']
+    assert dates_of(index.search('nebula', limit=1)) == ['2020-01-05']
+    assert index.search('unknownword') == []
+    assert index.search('""') == []
+
+
+def test_phrase_queries_need_consecutive_words(tmp_path):
+    index = SearchIndex(str(tmp_path / 'index'))
+    index.add_records([
+        make_record('2020-01-01', 'Dark dust lanes', 'Lanes of dust cross the galaxy.'),
+        make_record('2020-01-02', 'Galaxy', 'Dust and lanes, but not together.'),
+        make_record('2020-01-03', 'A view of dust', 'Lanes are visible.'),
+    ])
+    assert dates_of(index.search('"dust lanes"')) == ['2020-01-01']
+    # A phrase never spans the title and the explanation
+    assert dates_of(index.search('"dust lanes" galaxy')) == ['2020-01-01']
+    assert dates_of(index.search('"lanes of dust"')) == ['2020-01-01']
+    assert index.search('"dust galaxy"') == []
+
+
+def test_newer_segments_supersede_older_copies(tmp_path):
+    index = SearchIndex(str(tmp_path / 'index'))
+    index.add_records([make_record('2020-01-01', 'Old title about Mars'), make_record('2020-01-02', 'Mars again')])
+    index.add_records([make_record('2020-01-01', 'Corrected title about Jupiter')])
+
+    assert dates_of(index.search('mars')) == ['2020-01-02']
+    assert dates_of(index.search('jupiter')) == ['2020-01-01']
+    assert dates_of(index.search('title')) == ['2020-01-01']
+
+    # Reopening the index reads the same segments from its manifest
+    index.close()
+    index = SearchIndex(str(tmp_path / 'index'))
+    assert len(index.segments) == 2
+    assert dates_of(index.search('mars')) == ['2020-01-02']
+
+
+def test_the_last_copy_of_a_date_in_one_batch_wins(tmp_path):
+    index = SearchIndex(str(tmp_path / 'index'))
+    assert index.add_records([make_record('2020-01-01', 'First'), make_record('2020-01-01', 'Second'),
+                              make_record('not a date', 'Third'), make_record(None, 'Fourth'),
+                              make_record(20200101, 'Fifth')]) == 1
+    assert index.search('fifth') == []
+    assert index.search('first') == []
+    assert dates_of(index.search('second')) == ['2020-01-01']
+
+
+def test_merge_keeps_the_newest_copy_of_each_date(tmp_path, monkeypatch):
+    monkeypatch.setattr(apod_search, 'MAX_SEGMENTS', 3)
+    index = SearchIndex(str(tmp_path / 'index'))
+    for version in range(4):
+        index.add_records([make_record('2020-01-01', f"Version{version} shared"),
+                           make_record(f"2020-02-0{version + 1}", 'shared')])
+    assert len(index.segments) == 1
+    assert index.search('version0') == [] and index.search('version2') == []
+    assert dates_of(index.search('version3')) == ['2020-01-01']
+    assert sorted(dates_of(index.search('shared'))) == ['2020-01-01', '2020-02-01', '2020-02-02',
+                                                        '2020-02-03', '2020-02-04']
+
+
+def test_catch_up_indexes_only_new_records(tmp_path):
+    store = str(tmp_path / 'apod_data.jsonl')
+    index_dir = str(tmp_path / 'index')
+    with JsonlAppender(store) as appender:
+        appender.append(make_record('2020-01-01', 'Saturn rings'))
+    assert update_search_index(store, index_dir) == 1
+    assert update_search_index(store, index_dir) == 0
+
+    with JsonlAppender(store) as appender:
+        appender.append(make_record('2020-01-02', 'Saturn moons'))
+        appender.append(make_record('2020-01-01', 'Saturn rings in colour'))
+    assert update_search_index(store, index_dir) == 2
+    index = SearchIndex(index_dir)
+    assert sorted(dates_of(index.search('saturn'))) == ['2020-01-01', '2020-01-02']
+    assert dates_of(index.search('colour')) == ['2020-01-01']
+
+
+def test_cli_build_update_and_query(tmp_path, capsys):
+    store = str(tmp_path / 'apod_data.jsonl')
+    index_dir = str(tmp_path / 'index')
+    assert main(['--index-dir', index_dir, 'query', 'pillars']) == 1
+    assert 'Run the \'build\' subcommand first' in capsys.readouterr().out
+
+    with JsonlAppender(store) as appender:
+        appender.append(make_record('2020-01-01', 'Pillars of Creation', 'The Eagle Nebula.'))
+    main(['--index-dir', index_dir, 'build', '--store', store])
+    assert 'Indexed 1 records' in capsys.readouterr().out
+    main(['--index-dir', index_dir, 'update', '--store', store])
+    assert 'Indexed 0 records' in capsys.readouterr().out
+    # build starts over instead of adding a second copy
+    main(['--index-dir', index_dir, 'build', '--store', store])
+    assert 'Indexed 1 records' in capsys.readouterr().out
+
+    main(['--index-dir', index_dir, 'query', '"eagle nebula"', '--store', store])
+    output = capsys.readouterr().out
+    assert output.startswith('2020-01-01') and 'Pillars of Creation' in output
+    main(['--index-dir', index_dir, 'query', 'comet', '--store', store])
+    assert 'No matches found.' in capsys.readouterr().out
+
+
+def test_cli_build_migrates_a_fresh_json_archive(tmp_path, capsys):
+    legacy = tmp_path / 'apod_data.json'
+    legacy.write_text(json.dumps([make_record('2020-01-02', 'Orion Nebula'), make_record('2020-01-01', 'Pillars')]))
+    store = str(tmp_path / 'apod_data.jsonl')
+    index_dir = str(tmp_path / 'index')
+
+    assert main(['--index-dir', index_dir, 'build', '--store', store]) == 0
+    assert 'Indexed 2 records' in capsys.readouterr().out
+    index = SearchIndex(index_dir)
+    assert dates_of(index.search('orion')) == ['2020-01-02']
+    index.close()
+
+
+def test_cli_build_rejects_a_missing_or_json_array_store(tmp_path, capsys):
+    index_dir = str(tmp_path / 'index')
+    assert main(['--index-dir', index_dir, 'build', '--store', str(tmp_path / 'apod_data.jsonl')]) == 1
+    assert 'not found' in capsys.readouterr().out
+
+    legacy = tmp_path / 'apod_data.json'
+    legacy.write_text(json.dumps([make_record('2020-01-01', 'Pillars')]))
+    assert main(['--index-dir', index_dir, 'update', '--store', str(legacy)]) == 1
+    assert 'is not a JSON Lines store' in capsys.readouterr().out
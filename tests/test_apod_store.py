@@ -0,0 +1,152 @@
+# test_apod_store.py
+
+import json
+import os
+
+import pytest
+
+from apod_store import (JsonlAppender, ensure_store, iter_json_array, iter_jsonl_tail, iter_records, load_apod_dataset,
+                        migrate_json_to_jsonl, read_jsonl)
+
+
+def make_record(date, title=None):
+    return {'date': date, 'title': title or f"Picture for {date}", 'explanation': 'Café ☄ text.',
+            'url': f"https://apod.example/{date}.jpg", 'media_type': 'image'}
+
+
+def write_json(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+def test_migration_sorts_by_date_and_keeps_the_legacy_file(tmp_path):
+    json_path = str(tmp_path / 'apod_data.json')
+    jsonl_path = str(tmp_path / 'apod_data.jsonl')
+    records = [make_record('2020-01-03'), make_record('2020-01-01'), make_record('2020-01-02')]
+    write_json(json_path, records)
+    with open(json_path, 'rb') as f:
+        legacy_bytes = f.read()
+
+    assert migrate_json_to_jsonl(json_path, jsonl_path) == 3
+    assert read_jsonl(jsonl_path) == sorted(records, key=lambda item: item['date'])
+    assert not os.path.exists(jsonl_path + '.tmp')
+    with open(json_path, 'rb') as f:
+        assert f.read() == legacy_bytes
+
+
+def test_ensure_store_migrates_only_once(tmp_path):
+    json_path = str(tmp_path / 'apod_data.json')
+    jsonl_path = str(tmp_path / 'apod_data.jsonl')
+    write_json(json_path, [make_record('2020-01-01')])
+    ensure_store(jsonl_path, json_path)
+    with JsonlAppender(jsonl_path) as store:
+        store.append(make_record('2020-01-02'))
+
+    # The store exists now, so the legacy file must not overwrite it
+    ensure_store(jsonl_path, json_path)
+    assert [record['date'] for record in read_jsonl(jsonl_path)] == ['2020-01-01', '2020-01-02']
+
+
+def test_ensure_store_ignores_a_corrupt_legacy_file(tmp_path):
+    json_path = tmp_path / 'apod_data.json'
+    json_path.write_text('[{"date": ', encoding='utf-8')
+    jsonl_path = str(tmp_path / 'apod_data.jsonl')
+    ensure_store(jsonl_path, str(json_path))
+    assert not os.path.exists(jsonl_path)
+
+
+def test_appender_recovers_from_a_half_written_line(tmp_path):
+    path = str(tmp_path / 'apod_data.jsonl')
+    with JsonlAppender(path) as store:
+        first_offset = store.append(make_record('2020-01-01'))
+    # Simulate a crash in the middle of writing the next record
+    with open(path, 'ab') as f:
+        f.write(b'{"date": "2020-01-0')
+
+    with JsonlAppender(path) as store:
+        offset = store.append(make_record('2020-01-03'))
+    assert first_offset == 0
+    assert [record['date'] for record in read_jsonl(path)] == ['2020-01-01', '2020-01-03']
+
+    # The new record starts where its offset says it does
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        assert json.loads(f.readline())['date'] == '2020-01-03'
+
+
+def test_iter_jsonl_tail_stops_before_an_unfinished_line(tmp_path):
+    path = str(tmp_path / 'apod_data.jsonl')
+    with JsonlAppender(path) as store:
+        store.append(make_record('2020-01-01'))
+        second = store.append(make_record('2020-01-02'))
+    with open(path, 'ab') as f:
+        f.write(b'{"date": "2020-01-03"')
+
+    tail = list(iter_jsonl_tail(path, second))
+    assert [record['date'] for _, _, record in tail] == ['2020-01-02']
+    start, end, _ = tail[0]
+    assert start == second
+    # The next read picks up from the end of the last complete line
+    assert list(iter_jsonl_tail(path, end)) == []
+
+
+def test_dataset_is_cached_until_the_file_changes(tmp_path):
+    path = str(tmp_path / 'apod_data.jsonl')
+    with JsonlAppender(path) as store:
+        store.append(make_record('2020-01-01'))
+
+    dataset = load_apod_dataset(path)
+    assert len(dataset) == 1 and dataset[0]['date'] == '2020-01-01'
+    assert load_apod_dataset(path) is dataset
+    assert load_apod_dataset(path, use_cache=False) is not dataset
+
+    with JsonlAppender(path) as store:
+        store.append(make_record('2020-01-02'))
+    reloaded = load_apod_dataset(path)
+    assert [record['date'] for record in reloaded] == ['2020-01-01', '2020-01-02']
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 64, 1 << 16])
+def test_iter_json_array_matches_json_load(tmp_path, chunk_size):
+    path = str(tmp_path / 'apod_data.json')
+    records = [make_record(f"2020-01-{day:02d}", title='Braces {[ ]}, "quotes" and \\ slashes') for day in range(1, 30)]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(records, f, ensure_ascii=False, indent=2)
+    assert list(iter_json_array(path, chunk_size=chunk_size)) == records
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3])
+@pytest.mark.parametrize('text', ['[]', '  [ ]\n', '[1, 2, 3]', '[{"a": [1, {"b": null}]}, "x"]',
+                                  '[1, 23, 456, {"a": 1}, "xy", true]', '[-12.5e+3,1234,null,false,7]',
+                                  '[true,null, 98765 ,"\\u00e9"]'])
+def test_iter_json_array_handles_any_elements(tmp_path, text, chunk_size):
+    path = tmp_path / 'data.json'
+    path.write_text(text, encoding='utf-8')
+    assert list(iter_json_array(str(path), chunk_size=chunk_size)) == json.loads(text)
+
+
+def test_iter_json_array_stops_reading_at_malformed_input(tmp_path):
+    path = tmp_path / 'data.json'
+    path.write_text('[1, {"a": nope}, ' + '"padding", ' * 10000 + '2]', encoding='utf-8')
+    with pytest.raises(json.JSONDecodeError) as excinfo:
+        list(iter_json_array(str(path), chunk_size=16))
+    # Raised once the bad value is read, not after buffering the whole file
+    assert len(excinfo.value.doc) < 64
+
+
+@pytest.mark.parametrize('text', ['', '{"date": "2020-01-01"}', '[{"date": "2020-01-01"}', '[1 2]', '[1, {"a": '])
+def test_iter_json_array_rejects_bad_input(tmp_path, text):
+    path = tmp_path / 'data.json'
+    path.write_text(text, encoding='utf-8')
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_array(str(path), chunk_size=3))
+
+
+def test_iter_records_reads_either_format(tmp_path):
+    records = [make_record('2020-01-01'), make_record('2020-01-02')]
+    json_path = str(tmp_path / 'apod_data.json')
+    jsonl_path = str(tmp_path / 'apod_data.jsonl')
+    write_json(json_path, records)
+    migrate_json_to_jsonl(json_path, jsonl_path)
+    assert list(iter_records(json_path)) == records
+    assert list(iter_records(jsonl_path)) == records
@@ -0,0 +1,155 @@
+# test_array_statistics.py
+
+import numpy as np
+import pytest
+
+import array_statistics
+from array_statistics import chunked_median, fused_statistics, replace_above
+from array_store import NpyWriter
+
+
+def random_array(dtype, shape, seed=0):
+    rng = np.random.default_rng(seed)
+    dtype = np.dtype(dtype)
+    if dtype.kind in 'ui':
+        info = np.iinfo(dtype)
+        return rng.integers(info.min, info.max, size=shape, endpoint=True, dtype=dtype)
+    return (rng.standard_normal(shape) * 1000).astype(dtype)
+
+
+@pytest.mark.parametrize('dtype', ['int8', 'uint8', 'int16', 'uint16', 'int32', 'float32', 'float64'])
+@pytest.mark.parametrize('shape', [(1001,), (250, 7), (1, 1)])
+def test_fused_statistics_match_numpy(dtype, shape):
+    arr = random_array(dtype, shape)
+    stats = fused_statistics(arr, divisor=3, chunk_rows=64)
+    wide = arr.astype(np.float64)
+
+    assert stats.count == arr.size
+    assert stats.median == np.median(arr)
+    assert stats.mean == pytest.approx(np.mean(wide), rel=1e-12, abs=1e-9)
+    assert stats.var == pytest.approx(np.var(wide), rel=1e-10, abs=1e-9)
+    assert stats.std == pytest.approx(np.std(wide), rel=1e-10, abs=1e-9)
+    assert (stats.minimum, stats.maximum) == (arr.min(), arr.max())
+    np.testing.assert_allclose(stats.column_mean, wide.reshape(len(arr), -1).mean(axis=0), rtol=1e-12, atol=1e-9)
+    assert stats.divisible_count == np.count_nonzero(arr % 3 == 0)
+
+
+def test_divisible_values_are_only_collected_on_request(tmp_path):
+    arr = random_array('int16', (500, 4), seed=3)
+    assert fused_statistics(arr, chunk_rows=64).divisible_count is None
+
+    divisible = []
+    stats = fused_statistics(arr, divisor=15, chunk_rows=64, divisible_out=divisible)
+    np.testing.assert_array_equal(np.concatenate(divisible), arr[arr % 15 == 0])
+    assert stats.divisible_count == sum(map(len, divisible))
+
+    path = str(tmp_path / 'divisible.npy')
+    with NpyWriter(path, arr.dtype) as writer:
+        fused_statistics(arr, divisor=15, chunk_rows=64, divisible_out=writer)
+    np.testing.assert_array_equal(np.load(path), arr[arr % 15 == 0])
+
+
+@pytest.mark.parametrize('dtype', ['int32', 'float32', 'float64'])
+@pytest.mark.parametrize('size', [1, 2, 999, 1000])
+def test_chunked_median_matches_np_median(dtype, size):
+    arr = random_array(dtype, (size,), seed=size)
+    assert chunked_median(arr, arr.size, arr.min(), arr.max(), chunk_rows=97) == np.median(arr)
+
+
+def test_chunked_median_with_ties_and_a_constant_array():
+    arr = np.repeat(np.array([1.5, 2.5, 2.5, 7.0]), 50)
+    assert chunked_median(arr, arr.size, arr.min(), arr.max(), chunk_rows=13) == np.median(arr)
+    constant = np.full(10, 4.0)
+    assert chunked_median(constant, constant.size, 4.0, 4.0) == 4.0
+
+
+def test_memmap_goes_through_the_chunked_median(tmp_path, monkeypatch):
+    arr = np.lib.format.open_memmap(str(tmp_path / 'data.npy'), mode='w+', dtype=np.float64, shape=(300, 5))
+    arr[:] = random_array('float64', (300, 5), seed=7)
+    calls = []
+    original = array_statistics.chunked_median
+
+    def counting_median(*args, **kwargs):
+        calls.append(args)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(array_statistics, 'chunked_median', counting_median)
+
+    stats = fused_statistics(arr, chunk_rows=32)
+    assert len(calls) == 1
+    assert stats.median == np.median(np.asarray(arr))
+
+
+def test_empty_array_returns_none(capsys):
+    assert fused_statistics(np.array([], dtype=np.int16)) is None
+    assert 'empty array' in capsys.readouterr().out
+
+
+def test_replace_above_works_in_place_by_blocks():
+    arr = random_array('int16', (100, 3), seed=2)
+    above = arr > 1000
+    expected = np.where(above, -1, arr)
+    assert replace_above(arr, 1000, -1, chunk_rows=7) == int(above.sum())
+    np.testing.assert_array_equal(arr, expected)
+
+
+def narrow_median_passes(monkeypatch, bins=16, max_candidates=50):
+    """
+    Shrinks the histogram so a few hundred values need several passes, and records
+    how many values each call collects for the final partition.
+    """
+    monkeypatch.setattr(array_statistics, 'MEDIAN_BINS', bins)
+    monkeypatch.setattr(array_statistics, 'MEDIAN_MAX_CANDIDATES', max_candidates)
+    collected = []
+    original = np.concatenate
+
+    def recording_concatenate(arrays, *args, **kwargs):
+        result = original(arrays, *args, **kwargs)
+        collected.append(len(result))
+        return result
+
+    monkeypatch.setattr(array_statistics.np, 'concatenate', recording_concatenate)
+    return collected
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('size', [999, 1000])
+def test_chunked_median_narrows_a_skewed_array_to_a_bounded_set(monkeypatch, seed, size):
+    rng = np.random.default_rng(seed)
+    # Almost every value sits in a sliver of the range, next to one huge outlier
+    arr = np.concatenate([rng.lognormal(0.0, 0.001, size - 1), [1e9]]).reshape(-1, 1)
+    expected = np.median(arr)
+    collected = narrow_median_passes(monkeypatch)
+    assert chunked_median(arr, arr.size, arr.min(), arr.max(), chunk_rows=97) == expected
+    assert collected and max(collected) <= 50
+
+
+def test_chunked_median_stops_at_a_value_repeated_past_the_bound(monkeypatch):
+    arr = np.concatenate([np.linspace(-5.0, 5.0, 40), np.full(500, 1.25), np.linspace(2.0, 3.0, 40)])
+    collected = narrow_median_passes(monkeypatch)
+    assert chunked_median(arr, arr.size, arr.min(), arr.max(), chunk_rows=64) == np.median(arr) == 1.25
+    assert all(size <= 50 for size in collected)
+
+
+@pytest.mark.parametrize('dtype', ['int32', 'int64', 'float32'])
+def test_chunked_median_with_several_passes_matches_np_median(monkeypatch, dtype):
+    arr = random_array(dtype, (2000,), seed=11)
+    narrow_median_passes(monkeypatch, bins=4, max_candidates=3)
+    assert chunked_median(arr, arr.size, arr.min(), arr.max(), chunk_rows=128) == np.median(arr)
+
+
+@pytest.mark.parametrize('memmap', [False, True])
+@pytest.mark.parametrize('position', [0, 3, -1])
+def test_nan_gives_a_nan_median_like_np_median(tmp_path, memmap, position):
+    values = random_array('float64', (40, 2), seed=3)
+    values.reshape(-1)[position] = np.nan
+    if memmap:
+        arr = np.lib.format.open_memmap(str(tmp_path / 'data.npy'), mode='w+', dtype=np.float64, shape=values.shape)
+        arr[:] = values
+    else:
+        arr = values
+    stats = fused_statistics(arr, chunk_rows=7)
+    assert np.isnan(np.median(values))
+    assert np.isnan(stats.median)
+    assert np.isnan(stats.minimum) and np.isnan(stats.maximum)
+    assert np.isnan(array_statistics.median(np.array([[1.0, np.nan], [2.0, 3.0]])))
@@ -0,0 +1,121 @@
+# test_array_store.py
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from array_store import (NPY_HEADER_BYTES, NpyWriter, _npy_header, array_correlation, convert_iris_csv,
+                         iris_statistics_from_arrays, load_iris_arrays, open_npy)
+from iris_streaming import IRIS_MEASUREMENTS, stream_iris_statistics
+
+
+def write_iris_csv(path, rows, seed=0):
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame(rng.uniform(0.1, 8.0, size=(rows, 4)).round(2), columns=IRIS_MEASUREMENTS)
+    frame['Species'] = rng.choice(['setosa', 'versicolor', 'virginica'], size=rows)
+    frame.to_csv(path, index=False)
+    return frame
+
+
+@pytest.mark.parametrize('columns', [None, 3])
+def test_npy_writer_rewrites_the_header_with_the_final_shape(tmp_path, columns):
+    path = str(tmp_path / 'data.npy')
+    shape = (-1,) if columns is None else (-1, columns)
+    blocks = [np.arange(start, start + 3 * rows, dtype=np.int64).reshape(shape)
+              for start, rows in [(0, 4), (100, 1), (200, 6)]]
+    with NpyWriter(path, np.float32, columns) as writer:
+        for block in blocks:
+            writer.append(block)
+
+    expected = np.concatenate(blocks).astype(np.float32)
+    loaded = np.load(path)
+    assert loaded.dtype == np.float32
+    np.testing.assert_array_equal(loaded, expected)
+    memmap = open_npy(path)
+    assert memmap.offset == NPY_HEADER_BYTES
+    np.testing.assert_array_equal(memmap, expected)
+
+
+def test_an_empty_npy_writer_gives_an_empty_array(tmp_path):
+    path = str(tmp_path / 'empty.npy')
+    NpyWriter(path, np.int8).close()
+    assert np.load(path).shape == (0,)
+
+
+def test_npy_header_has_a_fixed_size():
+    assert len(_npy_header(np.float64, (10 ** 15, 4))) == NPY_HEADER_BYTES
+    with pytest.raises(ValueError):
+        _npy_header(np.float64, (10 ** 15,) * 8)
+
+
+def test_open_npy_reports_a_missing_or_invalid_file(tmp_path, capsys):
+    assert open_npy(str(tmp_path / 'missing.npy')) is None
+    assert 'was not found' in capsys.readouterr().out
+    (tmp_path / 'bad.npy').write_bytes(b'not an array')
+    assert open_npy(str(tmp_path / 'bad.npy')) is None
+    assert 'is not a valid .npy file' in capsys.readouterr().out
+
+
+def test_convert_iris_csv_keeps_species_codes_consistent_across_chunks(tmp_path):
+    csv_file = tmp_path / 'iris.csv'
+    # Each chunk of 3 rows holds a different subset of the species, and one is missing
+    species = ['setosa', 'setosa', 'virginica', 'virginica', None, 'versicolor', 'setosa']
+    frame = pd.DataFrame({
+        'Sepal.Length': [5.1, 4.9, 6.3, 5.8, 7.1, 6.0, 5.5],
+        'Sepal.Width': [3.5, 3.0, 3.3, 2.7, 3.0, 2.2, 2.4],
+        'Petal.Length': [1.4, 1.4, 6.0, 5.1, 5.9, 4.0, 3.8],
+        'Petal.Width': [0.2, 0.2, 2.5, 1.9, 2.1, 1.0, 1.1],
+        'Species': species,
+    })
+    frame.to_csv(csv_file, index=False)
+    directory = tmp_path / 'arrays'
+    assert convert_iris_csv(str(csv_file), str(directory), chunksize=3) == len(frame)
+
+    measurements, codes, names = load_iris_arrays(str(directory))
+    assert names == json.loads((directory / 'species.json').read_text())
+    np.testing.assert_array_equal(measurements, frame[IRIS_MEASUREMENTS].to_numpy(dtype=np.float32))
+    decoded = [names[code] if code >= 0 else None for code in codes]
+    assert decoded == species
+
+
+def test_convert_iris_csv_reports_a_missing_file(tmp_path, capsys):
+    assert convert_iris_csv(str(tmp_path / 'missing.csv'), str(tmp_path / 'arrays')) is None
+    assert 'was not found' in capsys.readouterr().out
+
+
+def test_load_iris_arrays_needs_the_species_names(tmp_path, capsys):
+    write_iris_csv(tmp_path / 'iris.csv', 5)
+    directory = tmp_path / 'arrays'
+    convert_iris_csv(str(tmp_path / 'iris.csv'), str(directory))
+    (directory / 'species.json').unlink()
+    assert load_iris_arrays(str(directory)) is None
+    assert 'has no species.json' in capsys.readouterr().out
+
+
+def test_statistics_from_arrays_match_streaming_the_csv(tmp_path):
+    csv_file = tmp_path / 'iris.csv'
+    frame = write_iris_csv(csv_file, 400, seed=1)
+    directory = str(tmp_path / 'arrays')
+    convert_iris_csv(str(csv_file), directory, chunksize=64)
+
+    from_arrays = iris_statistics_from_arrays(directory, chunk_rows=50)
+    streamed = stream_iris_statistics(str(csv_file), chunksize=64)
+    assert from_arrays.rows == streamed.rows == len(frame)
+    assert from_arrays.species_counts == streamed.species_counts
+    np.testing.assert_allclose(from_arrays.moments.mean, streamed.moments.mean, rtol=1e-9)
+    np.testing.assert_allclose(from_arrays.moments.correlation().to_numpy(),
+                               streamed.moments.correlation().to_numpy(), rtol=1e-9)
+
+
+def test_array_correlation_skips_rows_with_nan_or_inf():
+    rng = np.random.default_rng(2)
+    arr = rng.normal(size=(300, 3))
+    arr[:, 2] += arr[:, 0]
+    arr[10, 1] = np.nan
+    arr[20, 2] = np.inf
+    correlation = array_correlation(arr, columns=['a', 'b', 'c'], chunk_rows=64)
+    assert list(correlation.columns) == ['a', 'b', 'c']
+    expected = np.corrcoef(np.delete(arr, [10, 20], axis=0), rowvar=False)
+    np.testing.assert_allclose(correlation.to_numpy(), expected, rtol=1e-9)
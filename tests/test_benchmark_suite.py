@@ -0,0 +1,65 @@
+# test_benchmark_suite.py
+
+import json
+
+import pytest
+
+import benchmark_suite
+from benchmark_suite import compare_with_baseline, main
+
+
+def make_results(**metrics):
+    entry = {'stage': 'iris_load', 'scale': 'small', 'seconds': 1.0, 'peak_rss_mb': 100.0,
+             'rss_increase_mb': 20.0, 'alloc_peak_mb': 30.0}
+    entry.update(metrics)
+    return {'meta': {}, 'results': [entry]}
+
+
+def test_compare_flags_only_increases_beyond_tolerance_and_noise():
+    baseline = make_results()
+    assert compare_with_baseline(make_results(), baseline) == []
+    # 20% slower is within the default 25% tolerance
+    assert compare_with_baseline(make_results(seconds=1.2), baseline) == []
+    # 50% more, but 10 MB is not above the noise floor
+    assert compare_with_baseline(make_results(rss_increase_mb=30.0), baseline) == []
+    assert compare_with_baseline(make_results(seconds=2.0, alloc_peak_mb=60.0), baseline) == [
+        ('iris_load', 'small', 'seconds', 1.0, 2.0),
+        ('iris_load', 'small', 'alloc_peak_mb', 30.0, 60.0),
+    ]
+    # Stages missing from the baseline are not compared
+    assert compare_with_baseline(make_results(stage='iris_plot', seconds=9.0), baseline) == []
+
+
+def test_compare_handles_zero_and_null_baselines():
+    zero = make_results(rss_increase_mb=0.0)
+    assert compare_with_baseline(make_results(rss_increase_mb=15.0), zero) == [
+        ('iris_load', 'small', 'rss_increase_mb', 0.0, 15.0)]
+    # alloc_peak_mb is null when the tracemalloc run was skipped
+    null = make_results(alloc_peak_mb=None)
+    assert compare_with_baseline(make_results(alloc_peak_mb=500.0), null) == []
+    assert compare_with_baseline(make_results(alloc_peak_mb=None), make_results()) == []
+
+
+@pytest.mark.parametrize('baseline_metrics, new_metrics, status, expected', [
+    ({}, {}, 0, 'No regressions against'),
+    ({}, {'seconds': 2.0}, 1, 'REGRESSION iris_load (small): seconds 1.000 -> 2.000 (+100%)'),
+    ({'rss_increase_mb': 0.0}, {'rss_increase_mb': 15.0}, 1,
+     'REGRESSION iris_load (small): rss_increase_mb 0.000 -> 15.000 (+15.000 from zero)'),
+    ({'alloc_peak_mb': None}, {'alloc_peak_mb': 500.0}, 0, 'No regressions against'),
+])
+def test_main_compares_with_the_baseline(tmp_path, monkeypatch, capsys, baseline_metrics, new_metrics,
+                                         status, expected):
+    monkeypatch.setattr(benchmark_suite, 'run_suite', lambda *args: make_results(**new_metrics))
+    baseline = tmp_path / 'baseline.json'
+    baseline.write_text(json.dumps(make_results(**baseline_metrics)))
+    output = tmp_path / 'results.json'
+    assert main(['--output', str(output), '--baseline', str(baseline)]) == status
+    assert expected in capsys.readouterr().out
+    assert json.loads(output.read_text()) == make_results(**new_metrics)
+
+
+def test_main_reports_an_unreadable_baseline(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(benchmark_suite, 'run_suite', lambda *args: make_results())
+    missing = tmp_path / 'missing.json'
+    assert main(['--output', str(tmp_path / 'results.json'), '--baseline', str(missing)]) == 1
+    assert 'could not read the baseline' in capsys.readouterr().out
@@ -0,0 +1,157 @@
+# test_instrumentation.py
+
+import json
+import logging
+
+import pytest
+
+import instrumentation
+from instrumentation import (NOOP_SPAN, STAGE_DURATION_METRIC, Instrumentation, JsonlSink, LoggingSink,
+                             PrometheusTextSink)
+
+
+class RecordingSink:
+    def __init__(self):
+        self.spans = []
+        self.closed = 0
+
+    def on_span(self, finished):
+        self.spans.append(finished)
+
+    def close(self, registry):
+        self.closed += 1
+
+
+@pytest.fixture
+def restore_registry(monkeypatch):
+    """
+    Puts the module-level registry back after the test, closing any it configured.
+    """
+    monkeypatch.setattr(instrumentation, '_registry', instrumentation._registry)
+    yield
+    instrumentation.get_instrumentation().close()
+
+
+def test_spans_record_their_parent_attributes_and_errors():
+    sink = RecordingSink()
+    registry = Instrumentation([sink])
+    with registry.span('outer', source='test') as outer:
+        with registry.span('inner'):
+            pass
+        outer.set(records=3)
+    with pytest.raises(KeyError):
+        with registry.span('failing'):
+            raise KeyError('x')
+
+    inner, outer, failing = sink.spans
+    assert (inner.name, inner.parent) == ('inner', 'outer')
+    assert (outer.parent, outer.attributes) == (None, {'source': 'test', 'records': 3})
+    assert outer.duration >= inner.duration >= 0
+    assert (failing.status, failing.attributes) == ('error', {'error': 'KeyError'})
+    assert registry.histograms[(STAGE_DURATION_METRIC, (('stage', 'outer'),))].count == 1
+    assert registry.counters == {('stage_errors_total', (('stage', 'failing'),)): 1}
+
+
+def test_counters_and_histograms_render_as_prometheus_text():
+    registry = Instrumentation()
+    registry.count('records_total', 2, source='api')
+    registry.count('records_total', source='api')
+    registry.observe('latency_seconds', 0.25, buckets=(0.1, 0.5))
+    registry.observe('latency_seconds', 0.75, buckets=(0.1, 0.5))
+    assert registry.render_prometheus().splitlines() == [
+        '# TYPE records_total counter',
+        'records_total{source="api"} 3',
+        '# TYPE latency_seconds histogram',
+        'latency_seconds_bucket{le="0.1"} 0',
+        'latency_seconds_bucket{le="0.5"} 1',
+        'latency_seconds_bucket{le="+Inf"} 2',
+        'latency_seconds_sum 1.0',
+        'latency_seconds_count 2',
+    ]
+    assert Instrumentation().render_prometheus() == ''
+
+
+def test_a_disabled_registry_records_nothing():
+    sink = RecordingSink()
+    registry = Instrumentation([sink], enabled=False)
+    assert registry.span('stage') is NOOP_SPAN
+    with registry.span('stage') as current:
+        current.set(records=1)
+    registry.count('records_total')
+    registry.observe('latency_seconds', 1.0)
+    assert (sink.spans, registry.counters, registry.histograms) == ([], {}, {})
+
+
+def test_jsonl_sink_writes_spans_and_the_metrics_on_close(tmp_path):
+    path = tmp_path / 'trace.jsonl'
+    registry = Instrumentation([JsonlSink(str(path))])
+    with registry.span('apod.read') as current:
+        current.set(records=5)
+    registry.count('records_total', 5)
+    registry.close()
+    registry.close()
+
+    span_line, metrics = [json.loads(line) for line in path.read_text().splitlines()]
+    assert (span_line['type'], span_line['name'], span_line['status']) == ('span', 'apod.read', 'ok')
+    assert span_line['attributes'] == {'records': 5}
+    assert metrics['type'] == 'metrics'
+    assert metrics['counters'] == {'records_total': 5}
+    assert metrics['histograms'][STAGE_DURATION_METRIC + '{stage="apod.read"}']['count'] == 1
+
+
+def test_prometheus_sink_replaces_the_file_on_close(tmp_path):
+    path = tmp_path / 'metrics.prom'
+    path.write_text('stale\n')
+    registry = Instrumentation([PrometheusTextSink(str(path))])
+    registry.count('records_total', 4)
+    registry.close()
+    assert path.read_text() == registry.render_prometheus()
+    assert not (tmp_path / 'metrics.prom.tmp').exists()
+
+
+def test_logging_sink_logs_spans_and_counters(caplog):
+    registry = Instrumentation([LoggingSink(logging.getLogger('apod.test'))])
+    with caplog.at_level(logging.INFO, logger='apod.test'):
+        with registry.span('iris.load') as current:
+            current.set(rows=150)
+        registry.count('rows_total', 150)
+        registry.close()
+    messages = [record.getMessage() for record in caplog.records]
+    assert messages[0].startswith('iris.load finished in ') and messages[0].endswith('(ok) rows=150')
+    assert 'rows_total = 150' in messages
+
+
+def test_module_functions_and_stage_follow_the_configured_registry(restore_registry):
+    @instrumentation.stage('apod.fetch')
+    def fetch(value):
+        return value * 2
+
+    instrumentation.configure(enabled=False)
+    assert fetch(2) == 4
+    assert instrumentation.span('apod.fetch') is NOOP_SPAN
+
+    sink = RecordingSink()
+    registry = instrumentation.configure([sink], verbose=True)
+    assert fetch(3) == 6
+    instrumentation.count('records_total', 2)
+    instrumentation.observe('latency_seconds', 0.01)
+    assert [finished.name for finished in sink.spans] == ['apod.fetch']
+    assert fetch.__name__ == 'fetch'
+    assert registry.counters == {('records_total', ()): 2}
+    assert instrumentation.verbose()
+
+    instrumentation.configure()
+    assert sink.closed == 1
+
+
+def test_configure_from_env_builds_the_requested_sinks(tmp_path, restore_registry):
+    registry = instrumentation.configure_from_env({})
+    assert (registry.enabled, registry.sinks) == (False, [])
+
+    trace, metrics = str(tmp_path / 'trace.jsonl'), str(tmp_path / 'metrics.prom')
+    registry = instrumentation.configure_from_env({'APOD_TRACE': trace, 'APOD_METRICS_FILE': metrics,
+                                                   'APOD_LOG_SPANS': '0', 'APOD_VERBOSE': '1'})
+    assert registry.enabled and registry.verbose
+    assert [type(sink) for sink in registry.sinks] == [JsonlSink, PrometheusTextSink]
+    registry.close()
+    assert (tmp_path / 'metrics.prom').exists()
@@ -0,0 +1,87 @@
+# test_iris_batch.py
+
+import csv
+
+import numpy as np
+import pandas as pd
+
+from iris_batch import analyze_shard, expand_shards, run_batch
+from iris_streaming import stream_iris_statistics
+
+IRIS_COLUMNS = ['Sepal.Length', 'Sepal.Width', 'Petal.Length', 'Petal.Width']
+
+
+def random_iris(rows, seed):
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame(rng.uniform(0.5, 8.0, size=(rows, 4)).round(1), columns=IRIS_COLUMNS)
+    frame['Species'] = rng.choice(['setosa', 'versicolor', 'virginica'], size=rows)
+    return frame
+
+
+def write_shards(directory, sizes):
+    frames = []
+    for seed, rows in enumerate(sizes):
+        frame = random_iris(rows, seed)
+        frame.to_csv(directory / f'shard_{seed}.csv', index=False)
+        frames.append(frame)
+    return frames
+
+
+def test_merged_shards_match_streaming_the_concatenation(tmp_path):
+    frames = write_shards(tmp_path, [120, 7, 300])
+    pd.concat(frames).to_csv(tmp_path / 'all.csv', index=False)
+
+    total, results = run_batch([str(tmp_path / 'shard_*.csv')], max_workers=2, chunksize=50,
+                               report_file=None)
+    whole = stream_iris_statistics(str(tmp_path / 'all.csv'))
+    assert len(results) == 3
+    assert total.rows == whole.rows == 427
+    assert total.species_counts == whole.species_counts
+    np.testing.assert_allclose(total.moments.mean, whole.moments.mean, rtol=1e-9)
+    np.testing.assert_allclose(total.moments.correlation().to_numpy(),
+                               whole.moments.correlation().to_numpy(), rtol=1e-9)
+
+
+def test_report_has_one_row_per_shard(tmp_path):
+    frames = write_shards(tmp_path, [40, 60])
+    report = tmp_path / 'report.csv'
+    run_batch([str(tmp_path / 'shard_*.csv')], max_workers=1, report_file=str(report))
+
+    with open(report, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert [row['shard'] for row in rows] == [str(tmp_path / 'shard_0.csv'), str(tmp_path / 'shard_1.csv')]
+    for row, frame in zip(rows, frames):
+        assert int(row['rows']) == len(frame)
+        for species, count in frame['Species'].value_counts().items():
+            assert int(row[species]) == count
+        assert -1 <= float(row['highest_negative_value']) <= float(row['highest_positive_value']) < 1
+
+
+def test_a_missing_shard_is_counted_as_failed(tmp_path, capsys):
+    write_shards(tmp_path, [25])
+    missing = str(tmp_path / 'missing.csv')
+    total, results = run_batch([str(tmp_path / 'shard_0.csv'), missing], max_workers=1, report_file=None)
+    assert list(results) == [str(tmp_path / 'shard_0.csv')]
+    assert total.rows == 25
+    out = capsys.readouterr().out
+    assert f"could not analyse '{missing}'" in out
+    assert 'Analysed 1 of 2 shards (25 rows, 1 failed)' in out
+
+
+def test_no_readable_shard_returns_none(tmp_path):
+    assert run_batch([str(tmp_path / 'missing.csv')], max_workers=1) == (None, {})
+
+
+def test_analyze_shard_reports_the_error_instead_of_raising(tmp_path):
+    empty = tmp_path / 'empty.csv'
+    empty.write_text('')
+    path, stats, error = analyze_shard(str(empty))
+    assert (path, stats) == (str(empty), None)
+    assert error
+
+
+def test_expand_shards_globs_dedups_and_keeps_unmatched_names(tmp_path):
+    write_shards(tmp_path, [1, 1])
+    first, second = str(tmp_path / 'shard_0.csv'), str(tmp_path / 'shard_1.csv')
+    missing = str(tmp_path / 'missing.csv')
+    assert expand_shards([str(tmp_path / 'shard_*.csv'), first, missing]) == sorted([first, second, missing])
@@ -0,0 +1,97 @@
+# test_iris_corrections.py
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from iris_corrections import apply_corrections, correct_from_file, load_corrections
+from iris_streaming import IRIS_DTYPES, correct_chunk
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IRIS_CSV = os.path.join(PROJECT_DIR, 'iris.csv')
+
+
+def small_frame():
+    return pd.DataFrame({
+        'Sepal.Length': [5.1, 4.9, 4.7, 4.6],
+        'Sepal.Width': [3.5, 3.0, 3.2, 3.1],
+        'Petal.Length': [1.4, 1.4, 1.3, 1.5],
+        'Petal.Width': [0.2, 0.0, 0.2, -0.2],
+        'Species': ['setosa', 'setosa', 'setosa', 'setosa'],
+    })
+
+
+def test_shipped_patch_file_makes_the_known_iris_fixes():
+    df = pd.read_csv(IRIS_CSV)
+    expected = df.copy()
+    # The two rows the analysis script used to fix by hand with iloc
+    expected.iloc[34] = [4.9, 3.1, 1.5, 0.2, 'setosa']
+    expected.iloc[37] = [4.9, 3.6, 1.4, 0.1, 'setosa']
+
+    audit = correct_from_file(df, os.path.join(PROJECT_DIR, 'iris_corrections.csv'))
+    pd.testing.assert_frame_equal(df, expected)
+    assert set(audit['row']) == {35, 38}
+    assert (audit['source'] == 'patch').all()
+
+
+def test_only_changed_cells_are_audited(tmp_path):
+    patch_file = tmp_path / 'patch.csv'
+    patch_file.write_text('row,Sepal.Width,Petal.Length\n2,3.3,\n3,3.2,9.9\n2,3.4,\n', encoding='utf-8')
+    df = small_frame()
+    patches, rules = load_corrections(str(patch_file))
+    audit = apply_corrections(df, patches, rules)
+
+    # The last patch for row 2 wins, an empty cell leaves its value alone, and
+    # Sepal.Width of row 3 already was 3.2
+    assert df['Sepal.Width'].tolist() == [3.5, 3.4, 3.2, 3.1]
+    assert df['Petal.Length'].tolist() == [1.4, 1.4, 9.9, 1.5]
+    assert audit[['row', 'column']].values.tolist() == [[2, 'Sepal.Width'], [3, 'Petal.Length']]
+    assert audit['old'].tolist() == [3.0, 1.3]
+
+
+def test_json_rules_run_after_row_patches(tmp_path):
+    patch_file = tmp_path / 'patch.json'
+    patch_file.write_text(json.dumps({
+        'rows': [{'row': 1, 'Petal.Width': 0.0}, {'row': 99, 'Petal.Width': 1.0}],
+        'rules': [{'where': '`Petal.Width` <= 0', 'set': {'Petal.Width': 0.1, 'Species': 'unknown'}},
+                  {'where': 'not valid python (', 'set': {'Petal.Width': 5.0}}],
+    }), encoding='utf-8')
+    df = small_frame()
+    df['Species'] = df['Species'].astype('category')
+    audit = apply_corrections(df, *load_corrections(str(patch_file)))
+
+    assert df['Petal.Width'].tolist() == [0.1, 0.1, 0.2, 0.1]
+    assert df['Species'].tolist() == ['unknown', 'unknown', 'setosa', 'unknown']
+    assert audit['source'].value_counts().to_dict() == {'rule 1': 6, 'patch': 1}
+
+
+def test_float32_columns_keep_their_dtype():
+    df = small_frame().astype({'Sepal.Width': np.float32})
+    patches = pd.DataFrame({'Sepal.Width': [3.5, 2.9]}, index=pd.Index([1, 2], name='row'))
+    audit = apply_corrections(df, patches)
+    assert df['Sepal.Width'].dtype == np.float32
+    # 3.5 read back as float32 is the same value, so only row 2 changed
+    assert audit['row'].tolist() == [2]
+
+
+def test_chunked_corrections_match_the_whole_file():
+    loaded = load_corrections(os.path.join(PROJECT_DIR, 'iris_corrections.csv'))
+    whole = pd.read_csv(IRIS_CSV, dtype=IRIS_DTYPES)
+    expected = len(apply_corrections(whole, *loaded))
+
+    changed = 0
+    chunks = []
+    for chunk in pd.read_csv(IRIS_CSV, dtype=IRIS_DTYPES, chunksize=36):
+        changed += correct_chunk(chunk, loaded)
+        chunks.append(chunk)
+    assert changed == expected
+    # Chunks can end up with different categories, so compare the labels as strings
+    combined = pd.concat(chunks).astype({'Species': str})
+    pd.testing.assert_frame_equal(combined, whole.astype({'Species': str}))
+
+
+def test_missing_patch_file_returns_none(tmp_path, capsys):
+    assert load_corrections(str(tmp_path / 'missing.csv')) is None
+    assert 'was not found' in capsys.readouterr().out
@@ -0,0 +1,124 @@
+# test_iris_data_analysis_thing.py
+
+import os
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+import iris_data_analysis_thing
+from iris_data_analysis_thing import run_cli
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('pandas', 'numpy', 'seaborn', 'matplotlib')
+
+
+def write_iris_csv(path):
+    pd.DataFrame({
+        'Sepal.Length': [5.1, 4.9, 6.3, 5.8, 6.1],
+        'Sepal.Width': [3.5, 3.0, 3.3, 2.7, 2.8],
+        'Petal.Length': [1.4, 1.4, 6.0, 5.1, 4.7],
+        'Petal.Width': [0.2, 0.2, 2.5, 1.9, 1.2],
+        'Species': ['setosa', 'setosa', 'virginica', 'virginica', 'versicolor'],
+    }).to_csv(path, index=False)
+    return str(path)
+
+
+def imported_after(code, cwd):
+    """
+    Runs code in a fresh interpreter and returns which of HEAVY_MODULES it imported.
+    """
+    script = f"import sys\n{code}\nprint(sorted(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, '-c', script], cwd=cwd, capture_output=True, text=True, check=True,
+                            env=dict(os.environ, PYTHONPATH=PROJECT_DIR, MPLBACKEND='Agg'))
+    return result.stdout.strip().splitlines()[-1]
+
+
+def test_import_and_help_do_not_load_the_heavy_libraries(tmp_path):
+    assert imported_after('import iris_data_analysis_thing', tmp_path) == '[]'
+    code = ("import iris_data_analysis_thing\n"
+            "try:\n    iris_data_analysis_thing.run_cli(['--help'])\nexcept SystemExit:\n    pass")
+    assert imported_after(code, tmp_path) == '[]'
+
+
+def test_inspect_loads_pandas_but_not_the_plotting_libraries(tmp_path):
+    csv_file = write_iris_csv(tmp_path / 'iris.csv')
+    code = f"import iris_data_analysis_thing\niris_data_analysis_thing.run_cli(['--csv', {csv_file!r}, 'inspect'])"
+    assert imported_after(code, tmp_path) == "['numpy', 'pandas']"
+
+
+def test_subcommands_run_only_the_steps_they_need(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(iris_data_analysis_thing, 'prepare_data',
+                        lambda csv_file, step, corrections, audit: calls.append(('prepare', csv_file, step)) or 'df')
+    monkeypatch.setattr(iris_data_analysis_thing, 'save_corrected_data',
+                        lambda df, output: calls.append(('save', output)))
+    monkeypatch.setattr(iris_data_analysis_thing, 'calculate_correlations', lambda df: calls.append(('correlate',)))
+    monkeypatch.setattr(iris_data_analysis_thing, 'create_scatter_plot_with_regression',
+                        lambda df, output, scalable, max_points: calls.append(('scatter', output, scalable, max_points)))
+    monkeypatch.setattr(iris_data_analysis_thing, 'create_pair_plot',
+                        lambda df, output, scalable, off_diagonal, max_points:
+                        calls.append(('pair', output, scalable, off_diagonal, max_points)))
+
+    run_cli(['--csv', 'data.csv', 'inspect'])
+    assert calls == [('prepare', 'data.csv', 'inspect')]
+    calls.clear()
+    run_cli(['correct', '--output', 'out.csv'])
+    assert calls == [('prepare', 'iris.csv', 'correct'), ('save', 'out.csv')]
+    calls.clear()
+    run_cli(['features'])
+    assert calls == [('prepare', 'iris.csv', 'features'), ('save', 'iris_corrected.csv')]
+    calls.clear()
+    run_cli(['correlate'])
+    assert calls == [('prepare', 'iris.csv', 'features'), ('correlate',)]
+    calls.clear()
+    run_cli(['plot', '--kind', 'pair', '--no-scalable', '--max-points', '50', '--off-diagonal', 'sample'])
+    assert calls == [('prepare', 'iris.csv', 'features'), ('pair', 'iris_pair_plot.png', False, 'sample', 50)]
+    calls.clear()
+    run_cli(['plot', '--kind', 'scatter', '--scalable'])
+    assert calls == [('prepare', 'iris.csv', 'features'),
+                     ('scatter', 'iris_scatter_with_regression.pdf', True, None)]
+
+
+def test_no_subcommand_runs_the_whole_pipeline(monkeypatch):
+    calls = []
+    monkeypatch.setattr(iris_data_analysis_thing, 'main', calls.append)
+    run_cli(['--csv', 'data.csv'])
+    assert calls == ['data.csv']
+
+
+def test_invalid_arguments_are_rejected(capsys):
+    with pytest.raises(SystemExit) as excinfo:
+        run_cli(['plot', '--kind', 'histogram'])
+    assert excinfo.value.code == 2
+    assert 'invalid choice' in capsys.readouterr().err
+
+
+def test_features_writes_the_corrected_csv_and_a_missing_file_is_reported(tmp_path, capsys):
+    csv_file = write_iris_csv(tmp_path / 'iris.csv')
+    output = tmp_path / 'features.csv'
+    run_cli(['--csv', csv_file, 'features', '--output', str(output)])
+    saved = pd.read_csv(output)
+    assert {'Petal Ratio', 'Sepal Ratio'} <= set(saved.columns)
+    assert saved['Petal Ratio'].iloc[0] == pytest.approx(1.4 / 0.2)
+
+    capsys.readouterr()
+    run_cli(['--csv', str(tmp_path / 'missing.csv'), 'features', '--output', str(tmp_path / 'never.csv')])
+    assert 'was not found' in capsys.readouterr().out
+    assert not (tmp_path / 'never.csv').exists()
+
+
+def test_chunked_correlate_matches_the_in_memory_path(tmp_path, capsys):
+    csv_file = write_iris_csv(tmp_path / 'iris.csv')
+    run_cli(['--csv', csv_file, 'correlate'])
+    in_memory = capsys.readouterr().out
+    run_cli(['--csv', csv_file, '--chunksize', '2', 'correlate'])
+    streamed = capsys.readouterr().out
+
+    assert 'Successfully loaded' in in_memory and 'Successfully loaded' not in streamed
+
+    def highest(output):
+        return [line for line in output.splitlines() if line.startswith('Highest')]
+
+    assert highest(streamed) == highest(in_memory) and len(highest(streamed)) == 2
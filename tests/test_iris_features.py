@@ -0,0 +1,97 @@
+# test_iris_features.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from iris_features import IRIS_FEATURES, add_features, compute_ratio
+
+NUMERATOR = np.array([1.0, 2.0, 0.0, -3.0, np.nan, 4.0])
+DENOMINATOR = np.array([2.0, 0.0, 0.0, 0.0, 1.0, np.nan])
+
+
+def iris_frame():
+    return pd.DataFrame({
+        'Sepal.Length': [5.1, 4.9, 6.3, 5.8],
+        'Sepal.Width': [3.5, 3.0, 0.0, 2.7],
+        'Petal.Length': [1.4, 1.4, 6.0, 5.1],
+        'Petal.Width': [0.2, 0.0, 2.5, 1.9],
+        'Species': ['setosa', 'setosa', 'virginica', 'virginica'],
+    })
+
+
+@pytest.mark.parametrize('use_numexpr', [False, True])
+@pytest.mark.parametrize('zero_division, expected', [
+    ('nan', [0.5, np.nan, np.nan, np.nan, np.nan, np.nan]),
+    ('inf', [0.5, np.inf, np.nan, -np.inf, np.nan, np.nan]),
+    (-1.0, [0.5, -1.0, -1.0, -1.0, np.nan, np.nan]),
+])
+def test_compute_ratio_policies(zero_division, expected, use_numexpr):
+    if use_numexpr:
+        pytest.importorskip('numexpr')
+    result = compute_ratio(NUMERATOR, DENOMINATOR, zero_division=zero_division, use_numexpr=use_numexpr)
+    np.testing.assert_array_equal(result, expected)
+
+
+def test_compute_ratio_writes_into_the_front_of_a_longer_buffer():
+    out = np.full(10, 7.0)
+    result = compute_ratio(NUMERATOR[:2], DENOMINATOR[:2], out, use_numexpr=False)
+    assert np.shares_memory(result, out)
+    np.testing.assert_array_equal(out[:2], [0.5, np.nan])
+    np.testing.assert_array_equal(out[2:], 7.0)
+
+
+def test_add_features_matches_plain_division_and_counts_zeros():
+    df = iris_frame()
+    zero_counts = add_features(df, use_numexpr=False)
+    assert zero_counts == {'Petal Ratio': 1, 'Sepal Ratio': 1}
+    for name, (numerator, denominator) in IRIS_FEATURES.items():
+        expected = (df[numerator] / df[denominator]).replace([np.inf, -np.inf], np.nan)
+        pd.testing.assert_series_equal(df[name], expected, check_names=False)
+
+
+def test_error_policy_leaves_the_frame_unchanged():
+    df = iris_frame()
+    zero_counts = add_features(df, zero_division='error', use_numexpr=False)
+    assert zero_counts == {'Petal Ratio': 1, 'Sepal Ratio': 1}
+    assert list(df.columns) == list(iris_frame().columns)
+
+    df = iris_frame().drop(index=[1, 2])
+    assert add_features(df, zero_division='error', use_numexpr=False) == {'Petal Ratio': 0, 'Sepal Ratio': 0}
+    assert 'Petal Ratio' in df
+
+
+def test_dtype_sets_the_result_type():
+    df = iris_frame()
+    add_features(df, dtype=np.float32, use_numexpr=False)
+    assert df['Petal Ratio'].dtype == np.float32
+    np.testing.assert_allclose(df['Petal Ratio'].iloc[0], 7.0, rtol=1e-6)
+    df = iris_frame()
+    add_features(df, use_numexpr=False)
+    assert df['Petal Ratio'].dtype == np.float64
+
+
+def test_buffers_are_allocated_once_and_reused_for_smaller_frames():
+    buffers = {}
+    first = iris_frame()
+    add_features(first, buffers=buffers, use_numexpr=False)
+    assert set(buffers) == set(IRIS_FEATURES)
+    petal_buffer = buffers['Petal Ratio']
+    np.testing.assert_allclose(first['Petal Ratio'], [7.0, np.nan, 2.4, 5.1 / 1.9])
+
+    second = iris_frame().iloc[:2].copy()
+    add_features(second, buffers=buffers, use_numexpr=False)
+    assert buffers['Petal Ratio'] is petal_buffer
+    np.testing.assert_allclose(second['Petal Ratio'], [7.0, np.nan])
+    # The first frame owns its column, so reusing the buffer leaves it intact
+    np.testing.assert_allclose(first['Petal Ratio'].iloc[:2], [7.0, np.nan])
+
+
+def test_buffers_are_replaced_when_too_small_or_of_another_dtype():
+    buffers = {'Petal Ratio': np.empty(2), 'Sepal Ratio': np.empty(10, dtype=np.float32)}
+    small, other_dtype = buffers['Petal Ratio'], buffers['Sepal Ratio']
+    df = iris_frame()
+    add_features(df, buffers=buffers, use_numexpr=False)
+    assert buffers['Petal Ratio'] is not small and len(buffers['Petal Ratio']) == len(df)
+    assert buffers['Sepal Ratio'] is not other_dtype and buffers['Sepal Ratio'].dtype == np.float64
+    np.testing.assert_allclose(df['Sepal Ratio'].iloc[0], 5.1 / 3.5)
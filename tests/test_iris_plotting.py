@@ -0,0 +1,99 @@
+# test_iris_plotting.py
+
+import numpy as np
+import pandas as pd
+import pytest
+from matplotlib.colors import to_rgba
+
+import iris_plotting
+from iris_plotting import _bin_indices, fit_lines, scalable_pair_plot, stratified_sample
+
+SPECIES = ['virginica', 'setosa', 'versicolor']
+
+
+def random_frame(rows, seed):
+    rng = np.random.default_rng(seed)
+    species = rng.choice(SPECIES, size=rows)
+    x = rng.uniform(1.0, 3.0, size=rows)
+    slopes = pd.Series(species).map({'virginica': 2.0, 'setosa': -0.5, 'versicolor': 1.0}).to_numpy()
+    y = slopes * x + rng.normal(0.0, 0.1, size=rows)
+    return pd.DataFrame({'x': x, 'y': y, 'Species': species})
+
+
+def test_fit_lines_matches_polyfit():
+    df = random_frame(600, 1)
+    fits = fit_lines(df, 'x', 'y')
+    assert set(fits) == set(SPECIES)
+    for label, group in df.groupby('Species'):
+        slope, intercept = np.polyfit(group['x'], group['y'], 1)
+        fitted_slope, fitted_intercept, low, high, rows = fits[label]
+        np.testing.assert_allclose([fitted_slope, fitted_intercept], [slope, intercept], rtol=1e-8, atol=1e-10)
+        assert (low, high, rows) == (group['x'].min(), group['x'].max(), len(group))
+
+
+def test_fit_lines_ignores_non_finite_values_and_missing_groups():
+    df = random_frame(200, 2)
+    clean = fit_lines(df, 'x', 'y')
+    dirty = pd.concat([df, pd.DataFrame({
+        'x': [np.nan, 1.0, np.inf, 2.0],
+        'y': [1.0, np.nan, 1.0, 100.0],
+        'Species': ['setosa', 'setosa', 'virginica', None],
+    })], ignore_index=True)
+    fits = fit_lines(dirty, 'x', 'y')
+    assert set(fits) == set(clean)
+    for label in clean:
+        np.testing.assert_allclose(fits[label], clean[label], rtol=1e-12)
+
+
+def test_fit_lines_skips_groups_without_a_line():
+    df = pd.DataFrame({'x': [1.0, 2.0, 3.0, 5.0, 5.0], 'y': [1.0, 2.0, 3.0, 1.0, 2.0],
+                       'Species': ['a', 'a', 'a', 'b', 'b']})
+    df.loc[5] = [1.0, 1.0, 'c']
+    fits = fit_lines(df, 'x', 'y')
+    # 'b' has a single x value and 'c' a single row
+    assert list(fits) == ['a']
+    np.testing.assert_allclose(fits['a'][:2], [1.0, 0.0], atol=1e-12)
+
+
+def test_stratified_sample_keeps_small_groups():
+    df = pd.DataFrame({'value': np.arange(1010),
+                       'Species': ['rare'] * 10 + ['common'] * 1000})
+    sample = stratified_sample(df, max_rows=100)
+    assert sample['Species'].value_counts().to_dict() == {'common': 50, 'rare': 10}
+    assert sample.index.is_monotonic_increasing
+    assert stratified_sample(df, max_rows=2000) is df
+
+
+def test_bin_indices():
+    edges, indices = _bin_indices(np.array([0.0, 1.0, np.nan, 10.0, 5.0]), 10)
+    np.testing.assert_array_equal(edges, np.linspace(0.0, 10.0, 11))
+    np.testing.assert_array_equal(indices, [0, 1, -1, 9, 5])
+    edges, indices = _bin_indices(np.array([3.0, 3.0]), 4)
+    assert edges[0] < 3.0 < edges[-1]
+    assert _bin_indices(np.array([np.nan, np.inf]), 4) == (None, None)
+
+
+@pytest.mark.parametrize('off_diagonal', ['hist2d', 'sample'])
+def test_pair_plot_uses_one_colour_per_species(tmp_path, monkeypatch, off_diagonal):
+    plt = iris_plotting.import_pyplot()
+    figures = []
+    monkeypatch.setattr(plt, 'close', figures.append)
+    df = random_frame(300, 3)
+    output_file = tmp_path / 'pairs.png'
+    scalable_pair_plot(df, ['x', 'y'], str(output_file), off_diagonal=off_diagonal, max_points=60, bins=8)
+    assert output_file.stat().st_size > 0
+
+    axes = figures[0].axes
+    diagonal = {patch.get_label(): patch.get_facecolor()[:3] for patch in axes[0].patches}
+    assert set(diagonal) == set(SPECIES)
+    # Colours follow the order of first appearance
+    assert diagonal[df['Species'].iloc[0]] == to_rgba('C0')[:3]
+    assert len(set(diagonal.values())) == len(SPECIES)
+    if off_diagonal == 'sample':
+        scatter = [tuple(collection.get_facecolor()[0][:3]) for collection in axes[1].collections]
+        # The sample is drawn in sorted species order
+        assert scatter == [diagonal[label] for label in sorted(SPECIES)]
+    else:
+        assert len(axes[1].collections) == 1
+    monkeypatch.undo()
+    plt.close(figures[0])
@@ -0,0 +1,92 @@
+# test_iris_streaming.py
+
+import numpy as np
+import pandas as pd
+
+from iris_streaming import IRIS_NUMERIC_COLUMNS, RunningMoments, stream_iris_statistics
+
+COLUMNS = ['a', 'b', 'c']
+
+
+def random_block(rows, seed):
+    rng = np.random.default_rng(seed)
+    return rng.normal(loc=[1.0, -50.0, 1e4], scale=[0.5, 3.0, 10.0], size=(rows, 3))
+
+
+def test_merge_matches_numpy_on_the_combined_data():
+    blocks = [random_block(rows, seed) for seed, rows in enumerate([1, 17, 250, 3])]
+    parts = []
+    for block in blocks:
+        moments = RunningMoments(COLUMNS)
+        moments.update(block)
+        parts.append(moments)
+    merged = RunningMoments(COLUMNS)
+    for moments in parts:
+        merged.merge(moments)
+
+    data = np.vstack(blocks)
+    assert merged.count == len(data)
+    np.testing.assert_allclose(merged.mean, data.mean(axis=0), rtol=1e-12)
+    np.testing.assert_allclose(merged.covariance().to_numpy(), np.cov(data, rowvar=False), rtol=1e-9)
+    np.testing.assert_allclose(merged.correlation().to_numpy(), np.corrcoef(data, rowvar=False), rtol=1e-9)
+    np.testing.assert_array_equal(merged.minimum, data.min(axis=0))
+    np.testing.assert_array_equal(merged.maximum, data.max(axis=0))
+    np.testing.assert_allclose(merged.summary()['std'].to_numpy(), data.std(axis=0, ddof=1), rtol=1e-9)
+
+
+def test_merge_order_does_not_matter():
+    first, second = RunningMoments(COLUMNS), RunningMoments(COLUMNS)
+    first.update(random_block(40, 1))
+    second.update(random_block(60, 2))
+    left = RunningMoments(COLUMNS).merge(first).merge(second)
+    right = RunningMoments(COLUMNS).merge(second).merge(first)
+    np.testing.assert_allclose(left.mean, right.mean, rtol=1e-12)
+    np.testing.assert_allclose(left.comoment, right.comoment, rtol=1e-12)
+
+
+def test_rows_with_nan_or_inf_are_skipped():
+    block = random_block(10, 3)
+    block[2, 0] = np.nan
+    block[5, 1] = np.inf
+    moments = RunningMoments(COLUMNS)
+    moments.update(block)
+    moments.merge(RunningMoments(COLUMNS))
+    assert (moments.count, moments.skipped) == (8, 2)
+    np.testing.assert_allclose(moments.mean, np.delete(block, [2, 5], axis=0).mean(axis=0), rtol=1e-12)
+
+
+def test_streaming_matches_pandas_whatever_the_chunk_size(tmp_path):
+    csv_file = tmp_path / 'iris.csv'
+    rng = np.random.default_rng(4)
+    frame = pd.DataFrame(rng.uniform(0.5, 8.0, size=(500, 4)).round(1),
+                         columns=['Sepal.Length', 'Sepal.Width', 'Petal.Length', 'Petal.Width'])
+    frame['Species'] = rng.choice(['setosa', 'versicolor', 'virginica'], size=len(frame))
+    frame.to_csv(csv_file, index=False)
+
+    whole = stream_iris_statistics(str(csv_file), chunksize=len(frame))
+    chunked = stream_iris_statistics(str(csv_file), chunksize=37)
+    assert chunked.rows == whole.rows == 500
+    assert chunked.species_counts == frame['Species'].value_counts().to_dict()
+    np.testing.assert_allclose(chunked.moments.mean, whole.moments.mean, rtol=1e-9)
+    np.testing.assert_allclose(chunked.moments.comoment, whole.moments.comoment, rtol=1e-9)
+
+    means = chunked.moments.summary()['mean']
+    expected = frame.iloc[:, :4].astype(np.float32).astype(np.float64).mean()
+    np.testing.assert_allclose(means[expected.index].to_numpy(), expected.to_numpy(), rtol=1e-9)
+    assert list(chunked.moments.columns) == IRIS_NUMERIC_COLUMNS
+
+
+def test_missing_file_returns_none(tmp_path, capsys):
+    assert stream_iris_statistics(str(tmp_path / 'missing.csv')) is None
+    assert 'was not found' in capsys.readouterr().out
+
+
+def test_rows_with_a_nan_are_dropped_listwise():
+    block = random_block(50, 5)
+    block[[3, 17], 2] = np.nan
+    moments = RunningMoments(COLUMNS)
+    moments.update(block)
+    frame = pd.DataFrame(block, columns=COLUMNS)
+    # Matches pandas once the incomplete rows are dropped, not pandas' pairwise deletion
+    np.testing.assert_allclose(moments.correlation().to_numpy(), frame.dropna().corr().to_numpy(), rtol=1e-9)
+    assert not np.allclose(moments.correlation().loc['a', 'b'], frame.corr().loc['a', 'b'], rtol=1e-12)
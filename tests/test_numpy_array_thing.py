@@ -0,0 +1,81 @@
+# test_numpy_array_thing.py
+
+import numpy as np
+import pytest
+
+from numpy_array_thing import fix_total, generate_constrained_array, run_cli
+
+
+def check_constraints(arr, low, high, k):
+    wide = np.asarray(arr).astype(np.int64)
+    assert (wide.sum(axis=1) % 2 == 0).all()
+    assert wide.sum() % k == 0
+    assert wide.min() >= low and wide.max() <= high
+
+
+def make_out(layout, shape, tmp_path):
+    rows, columns = shape
+    if layout == 'contiguous':
+        return np.zeros(shape, dtype=np.int16)
+    if layout == 'column-slice':
+        # Rows are not contiguous, so reshape(-1) has to copy
+        return np.zeros((rows, columns * 2), dtype=np.int16)[:, :columns]
+    if layout == 'strided':
+        return np.zeros((rows, columns * 2), dtype=np.int16)[:, ::2]
+    if layout == 'fortran':
+        return np.zeros(shape, dtype=np.int16, order='F')
+    return np.lib.format.open_memmap(str(tmp_path / 'out.npy'), mode='w+', dtype=np.int16, shape=shape)
+
+
+@pytest.mark.parametrize('layout', ['contiguous', 'column-slice', 'strided', 'fortran', 'memmap'])
+@pytest.mark.parametrize('chunk_rows', [None, 7])
+@pytest.mark.parametrize('seed', range(10))
+def test_constraints_hold_for_any_output_layout(tmp_path, layout, chunk_rows, seed):
+    low, high, k = 10, 100, 97
+    out = make_out(layout, (50, 8), tmp_path)
+    result = generate_constrained_array((50, 8), low, high, k, rng=seed, chunk_rows=chunk_rows, out=out)
+    assert result is out
+    check_constraints(out, low, high, k)
+
+
+def test_fix_spans_several_blocks_of_a_strided_output(monkeypatch):
+    import numpy_array_thing
+
+    # Tiny blocks, so the change is spread over many of them
+    monkeypatch.setattr(numpy_array_thing, 'TOTAL_FIX_BLOCK_ROWS', 2)
+    arr = np.zeros((40, 12), dtype=np.int16)[:, :6]
+    arr[:] = 12
+    # Each value can only move by 2, so +120 needs 60 values: five blocks of 12
+    assert fix_total(arr, int(arr.sum()), 10, 14, 1000)
+    check_constraints(arr, 10, 14, 1000)
+    assert int(arr.sum()) == 3000
+
+def test_default_dtype_and_reproducibility():
+    first = generate_constrained_array((20, 5), rng=42)
+    assert first.dtype == np.uint8
+    np.testing.assert_array_equal(first, generate_constrained_array((20, 5), rng=42))
+    check_constraints(first, 10, 100, 5)
+
+
+def test_impossible_constraints_return_none(capsys):
+    # Every value is 11 or 12 and there is one column: an even row means 12, so the
+    # total is always 12 * rows and can't be a multiple of 5 for 3 rows
+    assert generate_constrained_array((3, 1), low=11, high=12, k=5, rng=0) is None
+    assert 'cannot make the total' in capsys.readouterr().out
+    assert generate_constrained_array((3, 2), low=5, high=5) is None
+
+
+def test_stats_cli_counts_divisible_values_and_writes_them_on_request(tmp_path, capsys):
+    data = str(tmp_path / 'data.npy')
+    run_cli(['--seed', '4', 'generate', data, '--rows', '200', '--columns', '8', '--chunk-rows', '64'])
+    arr = np.load(data)
+    expected = arr[arr % 15 == 0]
+    capsys.readouterr()
+
+    run_cli(['stats', data])
+    assert f'Elements divisible by the divisor: {len(expected)}' in capsys.readouterr().out
+
+    divisible = str(tmp_path / 'divisible.npy')
+    run_cli(['stats', data, '--divisible-out', divisible])
+    assert 'Saved the divisible values' in capsys.readouterr().out
+    np.testing.assert_array_equal(np.load(divisible), expected)